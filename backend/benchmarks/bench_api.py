@@ -0,0 +1,147 @@
+"""
+Load-test the optimization endpoints in process, to measure the request
+parsing and response serialization around the solver.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_api
+    python -m benchmarks.bench_api --endpoints validate --points 2000 --requests 200 --concurrency 8
+
+A local load generator drives the router through httpx's ASGI transport,
+so no server or network is involved: each request is validated, solved
+(in a solver thread, with the mock Haversine matrix) and encoded exactly
+as under uvicorn. "validate" posts --points stops to /validate-request,
+which is parsing only, and "columnar" posts the same stops as parallel
+arrays in `stops`; "optimize" posts a route the size of one vehicle
+load (15 small parcels) with its distance matrix in the response, a
+different route each time so the result cache does not answer it; "batch"
+streams --batch-routes such routes from /optimize/batch. Reported are
+requests per second and latency percentiles per endpoint.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Solve in a thread so the benchmark measures the web layer, not process start-up
+os.environ.setdefault("SOLVER_WORKERS", "0")
+os.environ.setdefault("SOLVER_MAX_QUEUE", "1000")
+os.environ.setdefault("TRACING_ENABLED", "0")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from routes.optimizer import router  # noqa: E402
+
+# Per-request info logs would dominate the timings
+logging.disable(logging.INFO)
+
+ROUTE_STOPS = 15
+JSON_HEADERS = {"content-type": "application/json"}
+
+
+def points_payload(n: int, seed: int) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "id": f"d{k}", "lat": 28.45 + float(rng.random()) * 0.3, "lon": 77.0 + float(rng.random()) * 0.35,
+            "address": f"Stop {k}", "size": "small", "priority": int(rng.integers(1, 6))
+        }
+        for k in range(n)
+    ]
+
+
+def route_payload(n: int, seed: int, **options) -> Dict:
+    return {
+        "delivery_points": points_payload(n, seed),
+        "vehicle": {"type": "van", "capacity": "large", "fuel_efficiency": 12.0},
+        "start_location": {"id": "depot", "lat": 28.6139, "lon": 77.209, "address": "Depot",
+                           "size": "small", "priority": 1},
+        "consider_traffic": False,
+        "algorithm": "2opt",
+        **options
+    }
+
+
+def columnar_payload(n: int, seed: int, **options) -> Dict:
+    body = route_payload(n, seed, **options)
+    points = body.pop("delivery_points")
+    body["stops"] = {key: [p[key] for p in points] for key in points[0]}
+    return body
+
+
+def payloads(args) -> Dict[str, Tuple[str, List[Dict]]]:
+    """Path and request bodies per endpoint; requests cycle through the bodies."""
+    return {
+        "validate": ("/api/v1/validate-request", [route_payload(args.points, 0)]),
+        "columnar": ("/api/v1/validate-request", [columnar_payload(args.points, 0)]),
+        "optimize": ("/api/v1/optimize", [
+            route_payload(ROUTE_STOPS, seed, include_distance_matrix=True)
+            for seed in range(args.warmup + args.requests)
+        ]),
+        "batch": ("/api/v1/optimize/batch", [{
+            "requests": [route_payload(ROUTE_STOPS, seed) for seed in range(args.batch_routes)]
+        }])
+    }
+
+
+async def load(client: httpx.AsyncClient, path: str, bodies: List[Dict], requests: int,
+               concurrency: int) -> List[float]:
+    """Send `requests` posts from `concurrency` workers; returns each latency in ms."""
+    # Encoded once, so the generator's own JSON encoding stays out of the timings
+    contents = [json.dumps(body).encode() for body in bodies]
+    latencies: List[float] = []
+    remaining = [requests]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            content = contents[remaining[0] % len(contents)]
+            started = time.perf_counter()
+            response = await client.post(path, content=content, headers=JSON_HEADERS)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+async def run(args):
+    app = FastAPI()
+    app.include_router(router)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print(f"{'endpoint':>9} {'requests':>9} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+        for name, (path, bodies) in payloads(args).items():
+            if name not in args.endpoints:
+                continue
+            # Warm-up takes the last bodies, the timed requests the first ones
+            await load(client, path, bodies[-args.warmup:] or bodies, args.warmup, 1)
+            started = time.perf_counter()
+            latencies = await load(client, path, bodies[:args.requests], args.requests, args.concurrency)
+            elapsed = time.perf_counter() - started
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            print(f"{name:>9} {len(latencies):>9} {len(latencies) / elapsed:>8.1f} "
+                  f"{p50:>9.1f} {p95:>9.1f} {p99:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process API load benchmark")
+    parser.add_argument("--endpoints", nargs="+", choices=["validate", "columnar", "optimize", "batch"],
+                        default=["validate", "columnar", "optimize", "batch"])
+    parser.add_argument("--points", type=int, default=2000, help="stops posted to /validate-request")
+    parser.add_argument("--batch-routes", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
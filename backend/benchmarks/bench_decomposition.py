@@ -0,0 +1,124 @@
+"""
+Benchmark the cluster-first fleet solve (FleetDecomposition through the
+SolverPool) against optimize_fleet() on the whole instance.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_decomposition
+    python -m benchmarks.bench_decomposition --points 300 600 1000 --cluster-points 150 300 --workers 4
+
+Instances are stops spread over Delhi, either uniformly or in a dozen
+neighbourhood clusters, with random parcel sizes and a fleet of large vans
+sized to carry the load with 10% slack. Both solves use Haversine matrices
+at a fixed traffic multiplier and the same search time limit per solve.
+The objective is the summed goal cost of all routes (minutes for "time");
+gap is the decomposed objective relative to the undecomposed one.
+"""
+import argparse
+import asyncio
+import math
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from core.optimizer import DeliveryPoint, FleetPlan, RouteOptimizer, Vehicle
+from core.solver_pool import SolverPool
+
+SIZES = ["small", "medium", "large"]
+
+
+def fleet_instance(layout: str, n: int, seed: int) -> Tuple[List[DeliveryPoint], List[Vehicle], DeliveryPoint]:
+    rng = np.random.default_rng(seed)
+    if layout == "uniform":
+        lats = 28.45 + rng.random(n) * 0.3
+        lons = 77.0 + rng.random(n) * 0.35
+    else:
+        centres = np.column_stack((28.45 + rng.random(12) * 0.3, 77.0 + rng.random(12) * 0.35))
+        picked = centres[rng.integers(0, 12, n)]
+        lats = picked[:, 0] + rng.normal(0, 0.01, n)
+        lons = picked[:, 1] + rng.normal(0, 0.01, n)
+    sizes = rng.choice(SIZES, n, p=[0.5, 0.3, 0.2])
+    points = [
+        DeliveryPoint(f"d{k}", float(lats[k]), float(lons[k]), "", str(sizes[k]), int(rng.integers(1, 6)))
+        for k in range(n)
+    ]
+    optimizer = RouteOptimizer()
+    demand = sum(optimizer.size_weights[p.size] for p in points)
+    vans = math.ceil(1.1 * demand / optimizer.capacity_limits["large"])
+    vehicles = [Vehicle("van", "large", 12.0)] * vans
+    return points, vehicles, DeliveryPoint("depot", 28.6139, 77.209, "", "small", 1)
+
+
+def objective(plan: FleetPlan, goal: str) -> float:
+    if goal == "distance":
+        return sum(route.total_distance_km for route in plan.routes)
+    if goal == "fuel":
+        return sum(route.estimated_fuel_cost for route in plan.routes)
+    return float(sum(route.total_time_minutes for route in plan.routes))
+
+
+def used_vehicles(plan: FleetPlan) -> int:
+    return sum(1 for route in plan.routes if len(route.route_order) > 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet decomposition benchmark")
+    parser.add_argument("--points", type=int, nargs="+", default=[300, 600, 1000])
+    parser.add_argument("--cluster-points", type=int, nargs="+", default=[150, 300])
+    parser.add_argument("--goal", choices=["time", "distance", "fuel"], default="time")
+    parser.add_argument("--time-limit-ms", type=float, default=2000.0,
+                        help="search budget of each solve (whole instance, cluster or boundary)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="solver processes for the cluster solves (0 runs them in a thread)")
+    parser.add_argument("--seeds", type=int, default=2)
+    args = parser.parse_args()
+
+    optimizer = RouteOptimizer()
+    optimizer.fleet_time_limit_ms = args.time_limit_ms
+    pool = SolverPool(max_workers=args.workers, timeout_seconds=3600)
+
+    def matrix(points: List[DeliveryPoint]):
+        return optimizer.build_distance_matrix(points, traffic_multiplier=1.0)
+
+    async def fetch_matrices(point_lists: List[List[DeliveryPoint]]):
+        return [matrix(points) for points in point_lists]
+
+    print(f"{'layout':>9} {'N':>5} {'cluster':>8} {'clusters':>9} {'full (ms)':>10} {'split (ms)':>11} "
+          f"{'vans':>9} {'full obj':>10} {'split obj':>10} {'gap %':>7}")
+    for n in args.points:
+        for layout in ("uniform", "clustered"):
+            for cluster_points in args.cluster_points:
+                full_ms = split_ms = full_cost = split_cost = gap = 0.0
+                full_vans = split_vans = clusters = 0
+                for seed in range(args.seeds):
+                    points, vehicles, depot = fleet_instance(layout, n, seed)
+
+                    started = time.perf_counter()
+                    full = optimizer.optimize_fleet(points, vehicles, depot, matrix([depot] + points),
+                                                    optimization_goal=args.goal)
+                    full_ms += (time.perf_counter() - started) * 1000
+
+                    started = time.perf_counter()
+                    split = asyncio.run(pool.optimize_fleet_decomposed(
+                        points, vehicles, depot, fetch_matrices, optimization_goal=args.goal,
+                        time_limit_ms=args.time_limit_ms, max_cluster_points=cluster_points
+                    ))
+                    split_ms += (time.perf_counter() - started) * 1000
+
+                    full_cost += objective(full, args.goal)
+                    split_cost += objective(split, args.goal)
+                    gap += 100.0 * (objective(split, args.goal) / objective(full, args.goal) - 1.0)
+                    full_vans += used_vehicles(full)
+                    split_vans += used_vehicles(split)
+                    clusters += split.search_stats["clusters"]
+
+                runs = args.seeds
+                print(f"{layout:>9} {n:>5} {cluster_points:>8} {clusters / runs:>9.1f} {full_ms / runs:>10.0f} "
+                      f"{split_ms / runs:>11.0f} {f'{full_vans / runs:.0f}/{split_vans / runs:.0f}':>9} "
+                      f"{full_cost / runs:>10.1f} {split_cost / runs:>10.1f} {gap / runs:>7.2f}")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
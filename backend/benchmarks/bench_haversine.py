@@ -0,0 +1,88 @@
+"""
+Benchmark the vectorized Haversine matrix builder against the legacy
+pair-by-pair loop.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_haversine
+    python -m benchmarks.bench_haversine --sizes 50 500 5000 --repeat 3
+
+The legacy loop builds N^2 nested dicts, so above --legacy-max points it is
+timed on a sample of rows and extrapolated (marked "est." in the output).
+"""
+import argparse
+import math
+import random
+import time
+from typing import Dict, List
+
+from core.geo import build_haversine_matrices, build_haversine_matrix
+
+
+def legacy_matrix(points: List[Dict], rows: int) -> Dict[str, Dict[str, Dict]]:
+    """The original RouteOptimizer.build_distance_matrix loop (first `rows` rows)."""
+    matrix = {}
+    for i, p1 in enumerate(points[:rows]):
+        matrix[p1["id"]] = {}
+        for j, p2 in enumerate(points):
+            if i == j:
+                matrix[p1["id"]][p2["id"]] = {"distance_km": 0.0, "duration_minutes": 0, "traffic_delay_minutes": 0}
+                continue
+            lat1, lat2 = math.radians(p1["lat"]), math.radians(p2["lat"])
+            dlat = math.radians(p2["lat"] - p1["lat"])
+            dlon = math.radians(p2["lon"] - p1["lon"])
+            a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+            distance = 6371 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+            duration = (distance / 20) * 60
+            matrix[p1["id"]][p2["id"]] = {
+                "distance_km": distance,
+                "duration_minutes": int(duration),
+                "traffic_delay_minutes": int(duration * 0.2)
+            }
+    return matrix
+
+
+def random_points(n: int, seed: int = 7) -> List[Dict]:
+    """Uniform points over a Delhi-sized bounding box."""
+    rng = random.Random(seed)
+    return [
+        {"id": f"p{i}", "lat": 28.40 + rng.random() * 0.45, "lon": 76.85 + rng.random() * 0.55}
+        for i in range(n)
+    ]
+
+
+def best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Haversine matrix builder benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--legacy-max", type=int, default=500,
+                        help="largest N timed in full with the legacy loop")
+    args = parser.parse_args()
+
+    print(f"{'N':>6} {'legacy (s)':>14} {'vectorized (s)':>15} {'all profiles (s)':>17} {'speedup':>9}")
+    for n in args.sizes:
+        points = random_points(n)
+        ids = [p["id"] for p in points]
+        lats = [p["lat"] for p in points]
+        lons = [p["lon"] for p in points]
+
+        rows = n if n <= args.legacy_max else max(1, args.legacy_max * args.legacy_max // n)
+        legacy = best_of(args.repeat, lambda: legacy_matrix(points, rows)) * (n / rows)
+        vectorized = best_of(args.repeat, lambda: build_haversine_matrix(ids, lats, lons))
+        all_profiles = best_of(args.repeat, lambda: build_haversine_matrices(ids, lats, lons))
+
+        legacy_label = f"{legacy:.4f}" + (" est." if rows < n else "")
+        print(f"{n:>6} {legacy_label:>14} {vectorized:>15.4f} {all_profiles:>17.4f} {legacy / vectorized:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
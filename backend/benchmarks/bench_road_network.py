@@ -0,0 +1,119 @@
+"""
+Benchmark the offline road-network engine: contraction hierarchy build
+time and many-to-many matrix time, checked against plain Dijkstra.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_road_network
+    python -m benchmarks.bench_road_network --side 250 --sizes 100 1000
+    python -m benchmarks.bench_road_network --osm delhi.osm --sizes 1000
+
+Without --osm the graph is a synthetic city: a jittered street grid with
+150 m blocks, faster arterials every 5th and 10th street, one-way side
+streets and 8% of the links missing. --side sets its width in streets
+(250 gives about 62,000 nodes). Matrix points are drawn uniformly over
+the graph's bounding box and snapped to it; the reported time includes
+snapping. --verify rows of every matrix are recomputed with networkx's
+Dijkstra on the original graph and must match exactly.
+"""
+import argparse
+import time
+
+import networkx as nx
+import numpy as np
+
+from core.geo import haversine_distance_matrix, haversine_pairs_km
+from core.road_network import (ContractionHierarchy, RoadGraph, RoadNetwork, UNREACHABLE, pack_keys)
+
+BLOCK_KM = 0.15
+
+
+def synthetic_city(side: int, seed: int = 0) -> RoadGraph:
+    rng = np.random.default_rng(seed)
+    lat0, lon0 = 28.50, 77.10
+    grid = np.arange(side * side).reshape(side, side)
+    lats = lat0 + (np.arange(side)[:, None] * BLOCK_KM + rng.normal(0, 0.02, (side, side))) / 111.0
+    lons = lon0 + (np.arange(side)[None, :] * BLOCK_KM + rng.normal(0, 0.02, (side, side))) / (
+        111.0 * np.cos(np.radians(lat0)))
+
+    tails, heads, speeds = [], [], []
+    # Horizontal links run along streets numbered by row, vertical ones by column
+    for a, b, street in ((grid[:, :-1], grid[:, 1:], np.arange(side)[:, None]),
+                         (grid[:-1, :], grid[1:, :], np.arange(side)[None, :])):
+        street = np.broadcast_to(street, a.shape).ravel()
+        a, b = a.ravel(), b.ravel()
+        speed = np.where(street % 10 == 0, 45.0, np.where(street % 5 == 0, 30.0, 20.0))
+        two_way = (street % 5 == 0) | (street % 3 != 1)
+        keep = rng.random(a.size) > 0.08
+        a, b, speed, two_way = a[keep], b[keep], speed[keep], two_way[keep]
+        tails += [a, b[two_way]]
+        heads += [b, a[two_way]]
+        speeds += [speed, speed[two_way]]
+
+    tails, heads, speeds = np.concatenate(tails), np.concatenate(heads), np.concatenate(speeds)
+    lats, lons = lats.ravel(), lons.ravel()
+    distance_m = haversine_pairs_km(lats[tails], lons[tails], lats[heads], lons[heads], decimals=None) * 1000.0
+    return RoadGraph(lats, lons, tails, heads, distance_m, distance_m / (speeds / 3.6))
+
+
+def dijkstra_graph(graph: RoadGraph) -> nx.DiGraph:
+    keys = pack_keys(graph.time_s, graph.distance_m)
+    digraph = nx.DiGraph()
+    for tail, head, key in zip(graph.tails.tolist(), graph.heads.tolist(), keys.tolist()):
+        if tail != head and key < digraph.get_edge_data(tail, head, {"key": UNREACHABLE})["key"]:
+            digraph.add_edge(tail, head, key=key)
+    return digraph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Road-network engine benchmark")
+    parser.add_argument("--osm", help="OSM XML extract (.osm or .osm.gz) instead of the synthetic city")
+    parser.add_argument("--side", type=int, default=150, help="synthetic city width in streets")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--verify", type=int, default=5, help="matrix rows checked with Dijkstra")
+    parser.add_argument("--save", help="save the hierarchy (.npz) for ROAD_NETWORK_PATH")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    graph = RoadGraph.from_osm(args.osm) if args.osm else synthetic_city(args.side)
+    graph = graph.largest_component()
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    hierarchy = ContractionHierarchy.build(graph)
+    built = time.perf_counter() - started
+    print(f"graph: {len(graph)} nodes, {graph.heads.size} edges (loaded in {loaded:.1f} s)")
+    print(f"hierarchy: {hierarchy.keys.size} edges, {int(hierarchy.level.max()) + 1} levels "
+          f"(built in {built:.1f} s)")
+    if args.save:
+        hierarchy.save(args.save)
+
+    network = RoadNetwork(hierarchy)
+    digraph = dijkstra_graph(graph) if args.verify else None
+    rng = np.random.default_rng(1)
+    print(f"{'N':>6} {'matrix (s)':>11} {'detour':>7} {'verified':>9}")
+    for n in args.sizes:
+        lats = rng.uniform(graph.lats.min(), graph.lats.max(), n)
+        lons = rng.uniform(graph.lons.min(), graph.lons.max(), n)
+        started = time.perf_counter()
+        minutes, km = network.costs(lats, lons, lats, lons)
+        elapsed = time.perf_counter() - started
+
+        straight = haversine_distance_matrix(lats, lons, decimals=None)
+        off_diagonal = ~np.eye(n, dtype=bool)
+        detour = float(np.median(km[off_diagonal] / np.maximum(straight[off_diagonal], 1e-3)))
+
+        verified = "-"
+        if digraph is not None:
+            nodes, _ = network.snap(lats, lons)
+            keys = hierarchy.many_to_many(nodes[:args.verify], nodes)
+            for row, source in enumerate(nodes[:args.verify].tolist()):
+                lengths = nx.single_source_dijkstra_path_length(digraph, source, weight="key")
+                expected = np.array([lengths.get(node, UNREACHABLE) for node in nodes.tolist()])
+                if not np.array_equal(expected, keys[row]):
+                    raise AssertionError(f"Row {row} differs from Dijkstra")
+            verified = f"{min(args.verify, n)} rows"
+        print(f"{n:>6} {elapsed:>11.3f} {detour:>7.2f} {verified:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark time-window-aware routing against unconstrained 2-opt on
+Solomon-style instances.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_time_windows
+    python -m benchmarks.bench_time_windows --customers 100 200 --density 0.25 0.5 1.0 --seeds 3
+
+Instances follow the Solomon layout: customers on a 100 x 100 grid around a
+central depot, 10 minutes of service, travel time equal to Euclidean
+distance. R instances are uniform, C instances clustered and RC a mix.
+Windows are placed around the arrival times of a noisy sweep tour (so every
+instance is feasible) for the given fraction of customers; the rest have
+none. Routes are open, as in RouteOptimizer.
+"""
+import argparse
+import time
+from typing import Tuple
+
+import numpy as np
+
+from core.local_search import LocalSearch
+from core.time_windows import TimeWindows, time_window_insertion
+from core.two_opt import TwoOptEngine
+
+SERVICE_MINUTES = 10.0
+
+
+def customer_coordinates(kind: str, n: int, rng: np.random.Generator) -> np.ndarray:
+    """Depot first, then n customers laid out as Solomon R, C or RC."""
+    uniform = rng.random((n, 2)) * 100
+    centres = rng.random((8, 2)) * 80 + 10
+    clustered = np.clip(centres[rng.integers(0, 8, n)] + rng.normal(0, 4, (n, 2)), 0, 100)
+    if kind == "R":
+        customers = uniform
+    elif kind == "C":
+        customers = clustered
+    else:
+        customers = np.where((np.arange(n) % 2 == 0)[:, None], uniform, clustered)
+    return np.vstack(([[50.0, 50.0]], customers))
+
+
+def solomon_instance(kind: str, n: int, density: float, half_width: float,
+                     seed: int) -> Tuple[np.ndarray, TimeWindows]:
+    rng = np.random.default_rng(seed)
+    xy = customer_coordinates(kind, n, rng)
+    travel = np.sqrt(((xy[:, None, :] - xy[None, :, :]) ** 2).sum(axis=-1))
+
+    service = np.full(n + 1, SERVICE_MINUTES)
+    service[0] = 0.0
+    reference = TimeWindows(travel, np.full(n + 1, -np.inf), np.full(n + 1, np.inf), service, 0.0)
+    angle = np.arctan2(xy[1:, 1] - 50, xy[1:, 0] - 50) + rng.normal(0, 0.3, n)
+    tour = [0] + (np.argsort(angle) + 1).tolist()
+    arrival = np.empty(n + 1)
+    arrival[tour] = reference.schedule(tour)[0]
+
+    earliest = np.full(n + 1, -np.inf)
+    latest = np.full(n + 1, np.inf)
+    windowed = rng.random(n + 1) < density
+    windowed[0] = False
+    earliest[windowed] = np.maximum(arrival[windowed] - half_width * rng.random(windowed.sum()), 0.0)
+    latest[windowed] = arrival[windowed] + half_width * rng.random(windowed.sum())
+    return travel, TimeWindows(travel, earliest, latest, service, 0.0)
+
+
+def nearest_neighbor(cost: np.ndarray) -> list:
+    route = [0]
+    unvisited = list(range(1, cost.shape[0]))
+    while unvisited:
+        k = int(np.argmin(cost[route[-1], unvisited]))
+        route.append(unvisited.pop(k))
+    return route
+
+
+def path_cost(cost: np.ndarray, route: list) -> float:
+    order = np.asarray(route, dtype=np.intp)
+    return float(cost[order[:-1], order[1:]].sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-window routing benchmark")
+    parser.add_argument("--customers", type=int, nargs="+", default=[100])
+    parser.add_argument("--density", type=float, nargs="+", default=[0.25, 0.5, 0.75, 1.0],
+                        help="fraction of customers with a time window")
+    parser.add_argument("--half-width", type=float, default=60.0,
+                        help="maximum minutes a window extends either side of the reference arrival")
+    parser.add_argument("--seeds", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'class':>5} {'N':>5} {'density':>8} {'2-opt (ms)':>11} {'VND (ms)':>9} {'late':>5} "
+          f"{'TW 2-opt (ms)':>14} {'TW VND (ms)':>12} {'late':>5} {'cost ratio':>11}")
+    for n in args.customers:
+        for kind in ("R", "C", "RC"):
+            for density in args.density:
+                plain_ms = plain_vnd_ms = tw_two_opt_ms = tw_vnd_ms = 0.0
+                plain_late = tw_late = 0
+                ratio = 0.0
+                for seed in range(args.seeds):
+                    cost, windows = solomon_instance(kind, n, density, args.half_width, seed)
+
+                    # Unconstrained: nearest neighbour, 2-opt, then VND, windows ignored
+                    started = time.perf_counter()
+                    plain = TwoOptEngine(cost).improve(nearest_neighbor(cost))
+                    plain_ms += (time.perf_counter() - started) * 1000
+                    plain = LocalSearch(cost, [plain]).run()[0]
+                    plain_vnd_ms += (time.perf_counter() - started) * 1000
+                    plain_late += int((windows.lateness(plain) > 0).sum())
+
+                    # Time windows: deadline-ordered insertion, window-checked 2-opt, then VND
+                    started = time.perf_counter()
+                    route = time_window_insertion(cost, 0, range(1, n + 1), windows)
+                    engine = TwoOptEngine(cost)
+                    engine.move_filter = windows.reversal_filter(route, lambda: engine.moves_applied)
+                    engine.improve(route)
+                    tw_two_opt_ms += (time.perf_counter() - started) * 1000
+                    route = LocalSearch(cost, [route], windows=windows).run()[0]
+                    tw_vnd_ms += (time.perf_counter() - started) * 1000
+                    tw_late += int((windows.lateness(route) > 0).sum())
+                    ratio += path_cost(cost, route) / path_cost(cost, plain)
+
+                runs = args.seeds
+                print(f"{kind:>5} {n:>5} {density:>8.2f} {plain_ms / runs:>11.1f} {plain_vnd_ms / runs:>9.1f} "
+                      f"{plain_late / runs:>5.1f} "
+                      f"{tw_two_opt_ms / runs:>14.1f} {tw_vnd_ms / runs:>12.1f} {tw_late / runs:>5.1f} "
+                      f"{ratio / runs:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Benchmark instances for the RouteOptimizer suite (benchmarks.suite).
+
+Synthetic instances are seeded, so the same name always gives the same
+stops: "uniform" spreads stops evenly over a 30 x 35 km box around central
+Delhi, "clustered" puts them in a dozen neighbourhoods, and "delhi" mixes a
+dense core around the warehouse of data/mock_deliveries.json with pockets
+around its sample addresses, drawing parcel sizes and priorities from the
+sample deliveries. Their matrices are Haversine at a fixed traffic
+multiplier, so results do not depend on the time of day.
+
+load_tsplib() reads TSPLIB (TSP) and CVRPLIB (CVRP) files with their own
+integer edge weights. Their best known solutions are closed tours, so
+instance.closed asks the suite to count the return to the depot.
+"""
+import json
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.cost_matrix import CostMatrix
+from core.geo import build_haversine_matrix
+from core.optimizer import DeliveryPoint, Vehicle
+
+MOCK_DELIVERIES = os.path.join(os.path.dirname(__file__), "..", "..", "data", "mock_deliveries.json")
+
+SIZE_WEIGHTS = {"small": 1.0, "medium": 1.5, "large": 2.0}
+CAPACITY_LIMITS = {"small": 3, "medium": 8, "large": 15}
+DELHI_CENTRE = (28.6139, 77.2090)
+
+
+@dataclass
+class BenchmarkInstance:
+    name: str
+    start_location: DeliveryPoint
+    delivery_points: List[DeliveryPoint]
+    distance_matrix: CostMatrix
+    # Fleet for optimize_fleet(); None when the instance is a plain TSP
+    vehicles: Optional[List[Vehicle]] = None
+    # Single-route runs are only meaningful when one vehicle can carry everything
+    routes_single: bool = True
+    # Objective counts the return to the start location (TSPLIB / CVRPLIB)
+    closed: bool = False
+    best_known: Optional[float] = None
+    goals: Tuple[str, ...] = ("time", "distance", "fuel")
+    # Overrides for RouteOptimizer.size_weights / capacity_limits
+    size_weights: Dict[str, float] = field(default_factory=lambda: dict(SIZE_WEIGHTS))
+    capacity_limits: Dict[str, float] = field(default_factory=lambda: dict(CAPACITY_LIMITS))
+
+    @property
+    def size(self) -> int:
+        return len(self.delivery_points)
+
+    def single_vehicle(self) -> Vehicle:
+        """A van that can carry the whole instance, so single-route runs measure routing only."""
+        self.capacity_limits["unlimited"] = sum(self.size_weights[p.size] for p in self.delivery_points)
+        return Vehicle("van", "unlimited", 12.0)
+
+
+def haversine_instance(name: str, start: Tuple[float, float], lats: np.ndarray, lons: np.ndarray,
+                       sizes: List[str], priorities: List[int]) -> BenchmarkInstance:
+    start_location = DeliveryPoint("depot", start[0], start[1], "Warehouse", "small", 1)
+    points = [
+        DeliveryPoint(f"d{k}", round(float(lats[k]), 6), round(float(lons[k]), 6), f"Stop {k}", sizes[k], priorities[k])
+        for k in range(len(sizes))
+    ]
+    all_points = [start_location] + points
+    matrix = build_haversine_matrix(
+        [p.id for p in all_points], [p.lat for p in all_points], [p.lon for p in all_points],
+        vehicle_type="van", traffic_multiplier=1.0
+    )
+    demand = sum(SIZE_WEIGHTS[size] for size in sizes)
+    # Large vans with 10% spare capacity
+    vehicles = [Vehicle("van", "large", 12.0)] * math.ceil(1.1 * demand / CAPACITY_LIMITS["large"])
+    return BenchmarkInstance(name, start_location, points, matrix, vehicles=vehicles)
+
+
+def uniform_instance(n: int, seed: int = 0) -> BenchmarkInstance:
+    rng = np.random.default_rng(seed)
+    lats = 28.45 + rng.random(n) * 0.3
+    lons = 77.0 + rng.random(n) * 0.35
+    sizes = rng.choice(list(SIZE_WEIGHTS), n, p=[0.5, 0.3, 0.2]).tolist()
+    return haversine_instance(f"uniform-{n}-s{seed}", DELHI_CENTRE, lats, lons, sizes,
+                              rng.integers(1, 6, n).tolist())
+
+
+def clustered_instance(n: int, seed: int = 0, clusters: int = 12) -> BenchmarkInstance:
+    rng = np.random.default_rng(seed)
+    centres = np.column_stack((28.45 + rng.random(clusters) * 0.3, 77.0 + rng.random(clusters) * 0.35))
+    picked = centres[rng.integers(0, clusters, n)]
+    lats = picked[:, 0] + rng.normal(0, 0.01, n)
+    lons = picked[:, 1] + rng.normal(0, 0.01, n)
+    sizes = rng.choice(list(SIZE_WEIGHTS), n, p=[0.5, 0.3, 0.2]).tolist()
+    return haversine_instance(f"clustered-{n}-s{seed}", DELHI_CENTRE, lats, lons, sizes,
+                              rng.integers(1, 6, n).tolist())
+
+
+def delhi_instance(n: int, seed: int = 0, path: str = MOCK_DELIVERIES) -> BenchmarkInstance:
+    """
+    Stops around the sample data: 60% in a dense core around the warehouse
+    (about 5 km across), the rest around the sample addresses. Sizes and
+    priorities are drawn from the sample deliveries.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    samples = data["delivery_points"]
+    start = (data["start_location"]["lat"], data["start_location"]["lon"])
+
+    rng = np.random.default_rng(seed)
+    anchors = np.array([[p["lat"], p["lon"]] for p in samples])
+    core = rng.random(n) < 0.6
+    centre = np.where(core[:, None], np.array(start), anchors[rng.integers(0, len(anchors), n)])
+    spread = np.where(core, 0.025, 0.012)[:, None]
+    coords = centre + rng.normal(0, 1, (n, 2)) * spread
+    picks = rng.integers(0, len(samples), n)
+    sizes = [samples[k]["size"] for k in picks.tolist()]
+    # A few samples would make every stop the same priority, so jitter around them
+    priorities = np.clip(np.array([samples[k]["priority"] for k in picks.tolist()]) + rng.integers(-1, 2, n), 1, 5)
+    return haversine_instance(f"delhi-{n}-s{seed}", start, coords[:, 0], coords[:, 1], sizes, priorities.tolist())
+
+
+GENERATORS = {
+    "uniform": uniform_instance,
+    "clustered": clustered_instance,
+    "delhi": delhi_instance
+}
+
+
+def _tsplib_weights(kind: str, coords: np.ndarray) -> np.ndarray:
+    """Integer edge weights for the TSPLIB coordinate types."""
+    if kind == "GEO":
+        def radians(values):
+            degrees = np.trunc(values)
+            return np.pi * (degrees + 5.0 * (values - degrees) / 3.0) / 180.0
+        lat, lon = radians(coords[:, 0]), radians(coords[:, 1])
+        q1 = np.cos(lon[:, None] - lon[None, :])
+        q2 = np.cos(lat[:, None] - lat[None, :])
+        q3 = np.cos(lat[:, None] + lat[None, :])
+        weights = np.floor(6378.388 * np.arccos(np.clip(0.5 * ((1 + q1) * q2 - (1 - q1) * q3), -1, 1)) + 1.0)
+        np.fill_diagonal(weights, 0)
+        return weights
+    delta = coords[:, None, :] - coords[None, :, :]
+    if kind == "ATT":
+        r = np.sqrt((delta ** 2).sum(axis=-1) / 10.0)
+        t = np.rint(r)
+        return np.where(t < r, t + 1, t)
+    euclid = np.sqrt((delta ** 2).sum(axis=-1))
+    if kind == "CEIL_2D":
+        return np.ceil(euclid)
+    if kind == "EUC_2D":
+        return np.floor(euclid + 0.5)
+    raise ValueError(f"Unsupported EDGE_WEIGHT_TYPE: {kind}")
+
+
+def _explicit_weights(fmt: str, values: List[float], n: int) -> np.ndarray:
+    weights = np.zeros((n, n))
+    if fmt == "FULL_MATRIX":
+        return np.array(values[:n * n], dtype=np.float64).reshape(n, n)
+    rows = {
+        "UPPER_ROW": [(i, j) for i in range(n) for j in range(i + 1, n)],
+        "LOWER_ROW": [(i, j) for i in range(n) for j in range(i)],
+        "UPPER_DIAG_ROW": [(i, j) for i in range(n) for j in range(i, n)],
+        "LOWER_DIAG_ROW": [(i, j) for i in range(n) for j in range(i + 1)]
+    }
+    if fmt not in rows:
+        raise ValueError(f"Unsupported EDGE_WEIGHT_FORMAT: {fmt}")
+    for (i, j), value in zip(rows[fmt], values):
+        weights[i, j] = weights[j, i] = value
+    return weights
+
+
+def _read_sections(path: str) -> Tuple[Dict[str, str], Dict[str, List[List[str]]]]:
+    """Split a TSPLIB file into its KEY: value header and its data sections."""
+    header: Dict[str, str] = {}
+    sections: Dict[str, List[List[str]]] = {}
+    current = None
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line == "EOF":
+                continue
+            if ":" in line and not line[0].isdigit() and not line[0] == "-":
+                key, value = line.split(":", 1)
+                header[key.strip().upper()] = value.strip()
+                current = None
+            elif line.split()[0].endswith("_SECTION"):
+                current = line.split()[0].upper()
+                sections[current] = []
+            elif current is not None:
+                sections[current].append(line.split())
+    return header, sections
+
+
+def read_best_known(path: str, weights: np.ndarray) -> Optional[float]:
+    """
+    Best known cost from a solution file next to the instance: a CVRPLIB
+    .sol ("Cost 784") or a TSPLIB .opt.tour, which is priced on weights.
+    """
+    stem = os.path.splitext(path)[0]
+    if os.path.exists(stem + ".sol"):
+        with open(stem + ".sol") as f:
+            for line in f:
+                if line.lower().startswith("cost"):
+                    return float(line.split()[1])
+    if os.path.exists(stem + ".opt.tour"):
+        _, sections = _read_sections(stem + ".opt.tour")
+        tour = [int(v) - 1 for row in sections.get("TOUR_SECTION", []) for v in row if int(v) > 0]
+        if tour:
+            return float(sum(weights[a, b] for a, b in zip(tour, tour[1:] + tour[:1])))
+    return None
+
+
+def load_tsplib(path: str, best_known: Optional[float] = None) -> BenchmarkInstance:
+    """
+    TSPLIB TSP or CVRPLIB CVRP instance. Node 1 (or the DEPOT_SECTION node)
+    is the start location, weights go into both distance and duration, and
+    CVRP demands become sizes weighted by their demand against one
+    capacity class holding CAPACITY.
+    """
+    header, sections = _read_sections(path)
+    name = header.get("NAME", os.path.splitext(os.path.basename(path))[0])
+    n = int(header["DIMENSION"])
+    kind = header.get("EDGE_WEIGHT_TYPE", "EUC_2D").upper()
+
+    coords = np.array([[float(v) for v in row[1:3]] for row in sections.get("NODE_COORD_SECTION", [])])
+    if kind == "EXPLICIT":
+        values = [float(v) for row in sections["EDGE_WEIGHT_SECTION"] for v in row]
+        weights = _explicit_weights(header.get("EDGE_WEIGHT_FORMAT", "FULL_MATRIX").upper(), values, n)
+    else:
+        weights = _tsplib_weights(kind, coords)
+    if coords.size == 0:
+        coords = np.zeros((n, 2))
+
+    depot = 0
+    if "DEPOT_SECTION" in sections:
+        depot = int(sections["DEPOT_SECTION"][0][0]) - 1
+    demands = {int(row[0]) - 1: float(row[1]) for row in sections.get("DEMAND_SECTION", [])}
+
+    def size_of(k: int) -> str:
+        return f"q{demands[k]:g}" if demands else "small"
+
+    # Coordinates only place the stops (e.g. for sweeps); costs come from the weights
+    points = [
+        DeliveryPoint(f"n{k + 1}", float(coords[k, 1]), float(coords[k, 0]), f"Node {k + 1}", size_of(k), 1)
+        for k in range(n)
+    ]
+    order = [depot] + [k for k in range(n) if k != depot]
+    matrix = CostMatrix(
+        [points[k].id for k in order],
+        distance_km=weights[np.ix_(order, order)],
+        duration_minutes=np.rint(weights[np.ix_(order, order)])
+    )
+
+    instance = BenchmarkInstance(
+        name=name,
+        start_location=points[depot],
+        delivery_points=[points[k] for k in order[1:]],
+        distance_matrix=matrix,
+        closed=True,
+        best_known=best_known if best_known is not None else read_best_known(path, weights),
+        goals=("distance",)
+    )
+    if demands:
+        capacity = float(header["CAPACITY"])
+        instance.size_weights = {size_of(k): demands[k] for k in range(n)}
+        instance.capacity_limits = {"cvrp": capacity}
+        fleet = re.search(r"-k(\d+)", name)
+        count = int(fleet.group(1)) if fleet else math.ceil(sum(demands.values()) / capacity)
+        instance.vehicles = [Vehicle("van", "cvrp", 12.0)] * count
+        instance.routes_single = False
+    return instance
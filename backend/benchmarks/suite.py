@@ -0,0 +1,276 @@
+"""
+Benchmark suite and regression check for RouteOptimizer.
+
+Run from the backend directory:
+
+    python -m benchmarks.suite run --output results.json
+    python -m benchmarks.suite run --generators delhi --sizes 50 200 --seeds 3 --output results.json
+    python -m benchmarks.suite run --tsplib path/to/berlin52.tsp path/to/A-n32-k5.vrp --output lib.json
+    python -m benchmarks.suite compare baseline.json results.json --time-threshold 0.2 --quality-threshold 0.01
+
+"run" solves every instance (see benchmarks.instances) with every algorithm
+and goal: the optimize() algorithms on one vehicle that can carry
+everything, and "fleet" (optimize_fleet) on the instance's fleet. Each
+case records the median wall time over --repeat runs, the peak memory
+traced by tracemalloc in a separate run, and the objective: the summed goal
+cost of the routes (minutes, km or INR of fuel), plus the return to the
+depot on TSPLIB/CVRPLIB instances. The gap is measured against the best
+known solution when there is one (solution files next to TSPLIB/CVRPLIB
+instances, or --best-known), then against a proven optimum from "exact"
+(run on instances of up to RouteOptimizer.exact_max_stops stops),
+otherwise against the best objective any algorithm found for that instance
+and goal in the same run.
+
+"compare" matches cases by instance, algorithm and goal and exits with
+status 1 when a case got slower by more than --time-threshold (and by more
+than --min-time-ms) or its objective worse by more than --quality-threshold.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.instances import GENERATORS, BenchmarkInstance, load_tsplib
+from core.optimizer import RouteOptimizer
+
+ROUTE_ALGORITHMS = ["2opt", "vnd", "simulated_annealing", "guided_local_search", "exact"]
+ALGORITHMS = ROUTE_ALGORITHMS + ["fleet"]
+GOALS = ["time", "distance", "fuel"]
+
+
+def solve(instance: BenchmarkInstance, algorithm: str, goal: str, time_limit_ms: Optional[float],
+          seed: int) -> Tuple[List[Tuple[List[str], float]], Dict]:
+    """Solve once; returns each route's stop ids with its vehicle's fuel efficiency, and the search stats."""
+    optimizer = RouteOptimizer()
+    vehicle = instance.single_vehicle()
+    optimizer.size_weights = instance.size_weights
+    optimizer.capacity_limits = instance.capacity_limits
+    if algorithm == "fleet":
+        plan = optimizer.optimize_fleet(
+            instance.delivery_points, instance.vehicles, instance.start_location, instance.distance_matrix,
+            optimization_goal=goal, time_limit_ms=time_limit_ms
+        )
+        routes = [(route.route_order, v.fuel_efficiency) for route, v in zip(plan.routes, plan.vehicles)]
+        return routes, dict(plan.search_stats or {}, unassigned=len(plan.unassigned),
+                            vehicles_used=sum(1 for route, _ in routes if len(route) > 1))
+    route = optimizer.optimize(
+        instance.delivery_points, vehicle, instance.start_location, instance.distance_matrix,
+        optimization_goal=goal, algorithm=algorithm, time_limit_ms=time_limit_ms, seed=seed
+    )
+    return [(route.route_order, vehicle.fuel_efficiency)], dict(route.search_stats or {})
+
+
+def objective(instance: BenchmarkInstance, routes: List[Tuple[List[str], float]], goal: str) -> float:
+    """Goal cost of the routes on the instance's own matrix."""
+    matrix = instance.distance_matrix
+    cost = matrix.edge_costs(goal)
+    depot = matrix.index[instance.start_location.id]
+    fuel_price = RouteOptimizer().fuel_price_per_liter
+    total = 0.0
+    for route_ids, fuel_efficiency in routes:
+        route = np.asarray(matrix.indices(route_ids), dtype=np.intp)
+        if route.size < 2:
+            continue
+        if instance.closed:
+            route = np.append(route, depot)
+        value = float(cost[route[:-1], route[1:]].sum(dtype=np.float64))
+        total += value * fuel_price / fuel_efficiency if goal == "fuel" else value
+    return total
+
+
+def run_case(instance: BenchmarkInstance, algorithm: str, goal: str, time_limit_ms: Optional[float],
+             seed: int, repeat: int, measure_memory: bool) -> Dict:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        routes, stats = solve(instance, algorithm, goal, time_limit_ms, seed)
+        times.append((time.perf_counter() - started) * 1000)
+
+    peak_mb = None
+    if measure_memory:
+        # Tracing slows the solve down, so memory gets a run of its own
+        tracemalloc.start()
+        solve(instance, algorithm, goal, time_limit_ms, seed)
+        peak_mb = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        tracemalloc.stop()
+
+    return {
+        "instance": instance.name,
+        "points": instance.size,
+        "closed": instance.closed,
+        "algorithm": algorithm,
+        "goal": goal,
+        "wall_ms": round(statistics.median(times), 2),
+        "peak_memory_mb": peak_mb,
+        "objective": round(objective(instance, routes, goal), 3),
+        "algorithm_used": stats.get("algorithm"),
+        "iterations": stats.get("iterations"),
+        "improvements": stats.get("improvements"),
+        "vehicles_used": stats.get("vehicles_used", 1),
+        "unassigned": stats.get("unassigned", 0),
+        "optimal": stats.get("optimal", False)
+    }
+
+
+def add_gaps(results: List[Dict], best_known: Dict[Tuple[str, str], float]):
+    """
+    Gap of each case to the best known solution, a proven optimum, else the
+    best found in this run. Fleet plans and single routes are different
+    problems, so each is only compared with its own kind.
+    """
+    def key(result: Dict) -> Tuple[str, str, bool]:
+        return result["instance"], result["goal"], result["algorithm"] == "fleet"
+
+    best_found: Dict[Tuple[str, str, bool], float] = {}
+    optimum: Dict[Tuple[str, str, bool], float] = {}
+    for result in results:
+        if result["unassigned"] == 0:
+            best_found[key(result)] = min(best_found.get(key(result), float("inf")), result["objective"])
+        # Exact solves are optimal for open routes, so they are no reference for closed tours
+        if result["optimal"] and not result["closed"]:
+            optimum[key(result)] = result["objective"]
+    for result in results:
+        known = best_known.get((result["instance"], result["goal"]))
+        if known is not None:
+            result["reference"], result["reference_value"] = "best_known", known
+        elif key(result) in optimum:
+            result["reference"], result["reference_value"] = "optimal", optimum[key(result)]
+        elif key(result) in best_found:
+            result["reference"], result["reference_value"] = "best_found", best_found[key(result)]
+        else:
+            result["reference"], result["reference_value"] = None, None
+        reference = result["reference_value"]
+        result["gap_pct"] = round(100.0 * (result["objective"] / reference - 1.0), 3) if reference else None
+
+
+def load_best_known(path: Optional[str]) -> Dict[str, object]:
+    """{instance: value} or {instance: {goal: value}}; a bare value is the "distance" objective."""
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def build_instances(args) -> List[BenchmarkInstance]:
+    instances = [
+        GENERATORS[generator](n, seed)
+        for generator in args.generators for n in args.sizes for seed in range(args.seeds)
+    ]
+    instances.extend(load_tsplib(path) for path in args.tsplib)
+    return instances
+
+
+def run(args) -> int:
+    instances = build_instances(args)
+    extra_best = load_best_known(args.best_known)
+    best_known: Dict[Tuple[str, str], float] = {}
+    results = []
+
+    print(f"{'instance':>22} {'algorithm':>20} {'goal':>8} {'wall (ms)':>10} {'peak (MB)':>10} {'objective':>11}")
+    for instance in instances:
+        known = extra_best.get(instance.name, instance.best_known)
+        for goal in (g for g in args.goals if g in instance.goals):
+            value = known.get(goal) if isinstance(known, dict) else (known if goal == "distance" else None)
+            if value is not None:
+                best_known[(instance.name, goal)] = float(value)
+            for algorithm in args.algorithms:
+                if (algorithm == "fleet" and not instance.vehicles) or (algorithm != "fleet" and not instance.routes_single):
+                    continue
+                if algorithm == "exact" and instance.size > RouteOptimizer().exact_max_stops:
+                    continue
+                result = run_case(instance, algorithm, goal, args.time_limit_ms, args.seed,
+                                  args.repeat, not args.no_memory)
+                results.append(result)
+                peak = f"{result['peak_memory_mb']:.2f}" if result["peak_memory_mb"] is not None else "-"
+                print(f"{instance.name:>22} {algorithm:>20} {goal:>8} {result['wall_ms']:>10.1f} "
+                      f"{peak:>10} {result['objective']:>11.2f}")
+
+    add_gaps(results, best_known)
+    report = {
+        "created": datetime.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor()
+        },
+        "settings": {
+            "time_limit_ms": args.time_limit_ms,
+            "seed": args.seed,
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {len(results)} results to {args.output}")
+    return 0
+
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = {(r["instance"], r["algorithm"], r["goal"]): r for r in json.load(f)["results"]}
+    with open(args.current) as f:
+        current = json.load(f)["results"]
+
+    regressions = 0
+    print(f"{'instance':>22} {'algorithm':>20} {'goal':>8} {'wall (ms)':>22} {'objective':>26} {'status':>10}")
+    for result in current:
+        base = baseline.get((result["instance"], result["algorithm"], result["goal"]))
+        if base is None:
+            continue
+        slower = (result["wall_ms"] > base["wall_ms"] * (1 + args.time_threshold) and
+                  result["wall_ms"] - base["wall_ms"] > args.min_time_ms)
+        worse = result["objective"] > base["objective"] * (1 + args.quality_threshold) + 1e-9
+        status = "/".join(label for label, failed in (("time", slower), ("quality", worse)) if failed) or "ok"
+        regressions += slower or worse
+        print(f"{result['instance']:>22} {result['algorithm']:>20} {result['goal']:>8} "
+              f"{base['wall_ms']:>9.1f} -> {result['wall_ms']:<9.1f} "
+              f"{base['objective']:>11.2f} -> {result['objective']:<11.2f} {status:>10}")
+
+    print(f"{regressions} regression(s) in {len(current)} cases")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RouteOptimizer benchmark suite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="solve the instances and record results")
+    run_parser.add_argument("--generators", nargs="*", choices=list(GENERATORS), default=list(GENERATORS))
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[12, 50, 200])
+    run_parser.add_argument("--seeds", type=int, default=1, help="instances per generator and size")
+    run_parser.add_argument("--tsplib", nargs="*", default=[], help="TSPLIB .tsp or CVRPLIB .vrp files")
+    run_parser.add_argument("--algorithms", nargs="+", choices=ALGORITHMS, default=ALGORITHMS)
+    run_parser.add_argument("--goals", nargs="+", choices=GOALS, default=GOALS)
+    run_parser.add_argument("--time-limit-ms", type=float, default=1000.0)
+    run_parser.add_argument("--seed", type=int, default=0, help="seed for the randomized algorithms")
+    run_parser.add_argument("--repeat", type=int, default=1, help="timed runs per case (the median is kept)")
+    run_parser.add_argument("--no-memory", action="store_true", help="skip the peak memory run")
+    run_parser.add_argument("--best-known", help="JSON file of best known objectives by instance name")
+    run_parser.add_argument("--output", help="write results to this JSON file")
+
+    compare_parser = commands.add_parser("compare", help="fail on regressions against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--time-threshold", type=float, default=0.2,
+                                help="allowed relative wall time increase")
+    compare_parser.add_argument("--quality-threshold", type=float, default=0.01,
+                                help="allowed relative objective increase")
+    compare_parser.add_argument("--min-time-ms", type=float, default=5.0,
+                                help="ignore slowdowns smaller than this (timer noise)")
+
+    args = parser.parse_args()
+    sys.exit(run(args) if args.command == "run" else compare(args))
+
+
+if __name__ == "__main__":
+    main()
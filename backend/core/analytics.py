@@ -0,0 +1,64 @@
+from typing import Dict, List, Mapping, Sequence
+
+import numpy as np
+
+SIZES = ("small", "medium", "large")
+# Priorities run 1 (highest) to 5; anything above is counted as low
+MAX_PRIORITY = 5
+
+
+def count_inversions(values: Sequence[int]) -> int:
+    """
+    Number of pairs i < j with values[i] > values[j], in O(n log k) for k
+    distinct values: values are ranked and each one counts the earlier,
+    larger values with a Fenwick (binary indexed) tree over the ranks.
+    """
+    if len(values) < 2:
+        return 0
+    _, ranks = np.unique(np.asarray(values), return_inverse=True)
+    size = int(ranks.max()) + 1
+    tree = [0] * (size + 1)
+    inversions = 0
+    for seen, rank in enumerate(ranks.tolist()):
+        # Earlier values at or below this rank; the rest of the seen ones are larger
+        k = rank + 1
+        at_most = 0
+        while k > 0:
+            at_most += tree[k]
+            k -= k & -k
+        inversions += seen - at_most
+        k = rank + 1
+        while k <= size:
+            tree[k] += 1
+            k += k & -k
+    return inversions
+
+
+def priority_adherence(route: Sequence[str], priorities: Mapping[str, int]) -> float:
+    """
+    Share of stop pairs (after the start) served in priority order, i.e.
+    1 - inversions / pairs over the stops that have a priority.
+    """
+    ordered = [priorities[point_id] for point_id in route[1:] if point_id in priorities]
+    pairs = len(ordered) * (len(ordered) - 1) // 2
+    if pairs == 0:
+        return 1.0
+    return 1.0 - count_inversions(ordered) / pairs
+
+
+def point_histograms(points: Sequence) -> Dict[str, List[int]]:
+    """
+    Package size and priority counts of delivery points in one pass: each
+    point gets a joint (size, priority) code and a single bincount gives
+    both marginals. Returns counts indexed like SIZES and priorities 1..5.
+    """
+    size_codes = {size: k for k, size in enumerate(SIZES)}
+    codes = np.fromiter(
+        (size_codes[p.size] * MAX_PRIORITY + min(p.priority, MAX_PRIORITY) - 1 for p in points),
+        dtype=np.intp, count=len(points)
+    )
+    joint = np.bincount(codes, minlength=len(SIZES) * MAX_PRIORITY).reshape(len(SIZES), MAX_PRIORITY)
+    return {
+        "sizes": joint.sum(axis=1).tolist(),
+        "priorities": joint.sum(axis=0).tolist()
+    }
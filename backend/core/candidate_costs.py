@@ -0,0 +1,205 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from core.geo import VEHICLE_SPEEDS_KMH, haversine_km, haversine_pairs_km, travel_time_arrays
+from core.spatial_index import GridIndex
+
+
+class CandidateCosts:
+    """
+    Travel costs for K-nearest candidate edges only, for instances too large
+    for a dense CostMatrix.
+
+    Row k of `neighbors` lists the K nearest points of ids[k] by straight-line
+    distance, and distance_km / duration_minutes / traffic_delay_minutes hold
+    the cost of each of those edges (N x K, the same dtypes as CostMatrix), so
+    memory grows as O(N*K) instead of O(N^2). Any other edge is estimated from
+    the coordinates: Haversine distance times detour_factor, driven at
+    speed_kmh with traffic_multiplier. Searches only score candidate moves,
+    so estimates are mostly needed for the edge a move closes up.
+
+    The class mirrors the parts of CostMatrix that RouteOptimizer uses to
+    report a route (ids, index, entry, route_totals, distances_from).
+    """
+
+    DISTANCE_DECIMALS = 3
+
+    def __init__(self, ids: Sequence[str], lats: Sequence[float], lons: Sequence[float],
+                 neighbors: np.ndarray, distance_km: np.ndarray, duration_minutes: np.ndarray,
+                 traffic_delay_minutes: np.ndarray, speed_kmh: float = 20.0,
+                 traffic_multiplier: float = 1.0, detour_factor: float = 1.0, symmetric: bool = False):
+        self.ids: List[str] = list(ids)
+        self.index: Dict[str, int] = {point_id: k for k, point_id in enumerate(self.ids)}
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.neighbors = np.asarray(neighbors, dtype=np.intp)
+        self.distance_km = np.asarray(distance_km, dtype=np.float32)
+        self.duration_minutes = np.asarray(duration_minutes, dtype=np.int32)
+        self.traffic_delay_minutes = np.asarray(traffic_delay_minutes, dtype=np.int32)
+        self.speed_kmh = speed_kmh
+        self.traffic_multiplier = traffic_multiplier
+        self.detour_factor = detour_factor
+        # Costs computed from coordinates alone are the same both ways
+        self.symmetric = symmetric
+        self._edge_costs: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_points(cls, ids: Sequence[str], lats: Sequence[float], lons: Sequence[float], k: int,
+                    vehicle_type: str = "van", traffic_multiplier: float = 1.0) -> "CandidateCosts":
+        """Haversine candidate costs, matching the mock dense matrix edge for edge."""
+        neighbors = GridIndex(lats, lons).knn(k)
+        costs = cls(
+            ids, lats, lons, neighbors,
+            np.zeros(neighbors.shape, np.float32), np.zeros(neighbors.shape, np.int32),
+            np.zeros(neighbors.shape, np.int32), VEHICLE_SPEEDS_KMH.get(vehicle_type, 20),
+            traffic_multiplier, symmetric=True
+        )
+        rows = np.repeat(np.arange(len(costs.ids)), neighbors.shape[1])
+        distance, duration, delay = costs.estimate(rows, neighbors.ravel())
+        costs.distance_km[...] = distance.reshape(neighbors.shape)
+        costs.duration_minutes[...] = duration.reshape(neighbors.shape)
+        costs.traffic_delay_minutes[...] = delay.reshape(neighbors.shape)
+        return costs
+
+    def calibrate(self):
+        """
+        Fit the estimate for non-candidate edges to the candidate costs (e.g.
+        road distances from the API): median detour over the straight line,
+        median speed and median traffic delay ratio.
+        """
+        rows = np.repeat(np.arange(len(self.ids)), self.neighbors.shape[1])
+        straight = haversine_pairs_km(self.lats[rows], self.lons[rows],
+                                      self.lats[self.neighbors.ravel()], self.lons[self.neighbors.ravel()], None)
+        distance = self.distance_km.ravel().astype(np.float64)
+        duration = self.duration_minutes.ravel().astype(np.float64)
+        delay = self.traffic_delay_minutes.ravel().astype(np.float64)
+        usable = (straight > 0.05) & (distance > 0) & (duration > 0)
+        if usable.sum() < 10:
+            return
+        self.detour_factor = float(max(np.median(distance[usable] / straight[usable]), 1.0))
+        self.speed_kmh = float(60.0 * np.median(distance[usable] / duration[usable]))
+        self.traffic_multiplier = float(1.0 + np.median(delay[usable] / duration[usable]))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, point_id: str) -> bool:
+        return point_id in self.index
+
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the candidate arrays."""
+        return (self.neighbors.nbytes + self.distance_km.nbytes + self.duration_minutes.nbytes +
+                self.traffic_delay_minutes.nbytes + self.lats.nbytes + self.lons.nbytes +
+                sum(costs.nbytes for costs in self._edge_costs.values()))
+
+    def indices(self, point_ids: Sequence[str]) -> List[int]:
+        """Map point ids to indices."""
+        return [self.index[point_id] for point_id in point_ids]
+
+    def estimate(self, i: np.ndarray, j: np.ndarray):
+        """Estimated (distance, duration, delay) arrays for edges i -> j from coordinates."""
+        distance = haversine_pairs_km(self.lats[i], self.lons[i], self.lats[j], self.lons[j])
+        if self.detour_factor != 1.0:
+            distance = np.round(distance * self.detour_factor, 2).astype(np.float32)
+        duration, delay = travel_time_arrays(distance, self.speed_kmh, self.traffic_multiplier)
+        return distance, duration, delay
+
+    def estimate_cost(self, optimization_goal: str, i: int, j: int) -> float:
+        """Scalar goal cost estimate of edge i -> j, for searches that price one edge at a time."""
+        if i == j:
+            return 0.0
+        distance = round(haversine_km(self.lats.item(i), self.lons.item(i), self.lats.item(j), self.lons.item(j)), 2)
+        if self.detour_factor != 1.0:
+            distance = round(distance * self.detour_factor, 2)
+        if optimization_goal != "time":
+            return distance
+        base_minutes = distance * (60.0 / self.speed_kmh)
+        return float(int(base_minutes) + int(base_minutes * (self.traffic_multiplier - 1.0)))
+
+    def lookup(self, i: np.ndarray, j: np.ndarray):
+        """
+        (distance, duration, delay) arrays for edges i -> j: candidate values
+        where j is a candidate of i, estimates elsewhere. O(K) per edge.
+        """
+        i = np.asarray(i, dtype=np.intp)
+        j = np.asarray(j, dtype=np.intp)
+        hit = self.neighbors[i] == j[:, None]
+        found = hit.any(axis=1)
+        slot = hit.argmax(axis=1)
+        distance = self.distance_km[i, slot]
+        duration = self.duration_minutes[i, slot]
+        delay = self.traffic_delay_minutes[i, slot]
+        missing = np.flatnonzero(~found)
+        if missing.size:
+            distance, duration, delay = distance.copy(), duration.copy(), delay.copy()
+            distance[missing], duration[missing], delay[missing] = self.estimate(i[missing], j[missing])
+            same = missing[i[missing] == j[missing]]
+            distance[same] = duration[same] = delay[same] = 0
+        return distance, duration, delay
+
+    def edge_costs(self, optimization_goal: str) -> np.ndarray:
+        """Per-candidate-edge costs (N x K) for the goal, as CostMatrix.edge_costs."""
+        key = "time" if optimization_goal == "time" else "distance"
+        if key not in self._edge_costs:
+            if key == "time":
+                self._edge_costs[key] = (self.duration_minutes + self.traffic_delay_minutes).astype(np.float64)
+            else:
+                self._edge_costs[key] = self.distance_km.astype(np.float64)
+        return self._edge_costs[key]
+
+    def pair_costs(self, optimization_goal: str, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        """Goal costs of arbitrary edges i -> j (float64)."""
+        distance, duration, delay = self.lookup(i, j)
+        if optimization_goal == "time":
+            return duration.astype(np.float64) + delay
+        return distance.astype(np.float64)
+
+    def route_totals(self, route: Sequence[int]) -> Dict[str, float]:
+        """Sum distance, duration and traffic delay along a route of indices."""
+        if len(route) < 2:
+            return {"distance_km": 0.0, "duration_minutes": 0, "traffic_delay_minutes": 0}
+        order = np.asarray(route, dtype=np.intp)
+        distance, duration, delay = self.lookup(order[:-1], order[1:])
+        return {
+            "distance_km": float(distance.sum(dtype=np.float64)),
+            "duration_minutes": int(duration.sum(dtype=np.int64)),
+            "traffic_delay_minutes": int(delay.sum(dtype=np.int64))
+        }
+
+    def distances_from(self, i: int, targets: Sequence[int]) -> np.ndarray:
+        """Distances from point i to each target."""
+        targets = np.asarray(targets, dtype=np.intp)
+        return self.lookup(np.full(targets.size, i, dtype=np.intp), targets)[0]
+
+    def entry(self, i: int, j: int) -> Dict:
+        """Nested-dict style entry for a single edge."""
+        distance, duration, delay = self.lookup([i], [j])
+        return {
+            "distance_km": round(float(distance[0]), self.DISTANCE_DECIMALS),
+            "duration_minutes": int(duration[0]),
+            "traffic_delay_minutes": int(delay[0])
+        }
+
+    def to_nested(self) -> Dict[str, Dict[str, Dict]]:
+        """Nested-dict form of the candidate edges only (for API responses)."""
+        distance = np.round(self.distance_km.astype(np.float64), self.DISTANCE_DECIMALS).tolist()
+        duration = self.duration_minutes.tolist()
+        delay = self.traffic_delay_minutes.tolist()
+        neighbors = self.neighbors.tolist()
+        return {
+            from_id: {
+                self.ids[j]: {
+                    "distance_km": distance[i][t],
+                    "duration_minutes": duration[i][t],
+                    "traffic_delay_minutes": delay[i][t]
+                }
+                for t, j in enumerate(neighbors[i])
+            }
+            for i, from_id in enumerate(self.ids)
+        }
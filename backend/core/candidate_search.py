@@ -0,0 +1,288 @@
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.candidate_costs import CandidateCosts
+from core.spatial_index import GridIndex
+
+EPSILON = 1e-9
+
+
+class CandidateSearch:
+    """
+    Open-route construction and descent that only ever looks at candidate
+    edges, for instances with thousands of stops.
+
+    The route is built by nearest neighbour over each node's candidate list,
+    falling back to a grid search over the unvisited points when every
+    candidate is taken. It is then improved by 2-opt and Or-opt moves that
+    make a node adjacent to one of its candidates, driven by a don't-look-bit
+    queue: only nodes next to a changed edge are re-examined. Every step is
+    O(K) apart from applying a move, so a pass costs O(N * K) instead of the
+    O(N^2) of the dense engines.
+
+    The route and node positions are NumPy arrays and every move is applied
+    as one to three segment reversals. On asymmetric costs, reversing a
+    segment also reverses its interior edges; their cost is priced in O(1)
+    from prefix sums over the route's forward and backward edge costs.
+    """
+
+    MAX_CHAIN = 3
+
+    def __init__(self, costs: CandidateCosts, optimization_goal: str,
+                 time_budget_ms: Optional[float] = None, or_opt: bool = True):
+        self.costs = costs
+        self.goal = optimization_goal
+        self.time_budget_ms = time_budget_ms
+        self.or_opt = or_opt
+        self.symmetric = costs.symmetric
+
+        # Goal cost of every candidate edge, keyed by i * N + j
+        n = len(costs)
+        edge = costs.edge_costs(optimization_goal)
+        keys = np.arange(n, dtype=np.int64)[:, None] * n + costs.neighbors
+        self._size = n
+        self._edge: Dict[int, float] = dict(zip(keys.ravel().tolist(), edge.ravel().tolist()))
+        # Candidates of each node, cheapest first
+        rank = np.argsort(edge, axis=1, kind="stable")
+        self._ranked = np.take_along_axis(costs.neighbors, rank, axis=1)
+
+        self.iterations = 0
+        self.evaluations = 0
+        self.moves = {"2opt": 0, "or_opt": 0}
+        self.elapsed_ms = 0.0
+        self.timed_out = False
+
+    def cost(self, i: int, j: int) -> float:
+        """Goal cost of edge i -> j: the candidate value, or an estimate."""
+        value = self._edge.get(i * self._size + j)
+        if value is None:
+            return self.costs.estimate_cost(self.goal, i, j)
+        return value
+
+    def nearest_neighbor(self, start: int, stops: Sequence[int]) -> List[int]:
+        """Nearest-neighbour route from start over the stops, using candidate lists first."""
+        unvisited = np.zeros(self._size, dtype=bool)
+        unvisited[np.asarray(stops, dtype=np.intp)] = True
+        unvisited[start] = False
+        remaining = int(unvisited.sum())
+        grid: Optional[GridIndex] = None
+        ranked = self._ranked
+
+        route = [start]
+        current = start
+        while remaining:
+            free = ranked[current][unvisited[ranked[current]]]
+            if free.size:
+                current = int(free[0])
+            else:
+                if grid is None:
+                    grid = GridIndex(self.costs.lats, self.costs.lons)
+                current = grid.nearest(current, unvisited)
+            unvisited[current] = False
+            route.append(current)
+            remaining -= 1
+        return route
+
+    def improve(self, route: Sequence[int]) -> List[int]:
+        """Run the descent until no candidate move improves the route or time runs out."""
+        started = time.perf_counter()
+        deadline = started + self.time_budget_ms / 1000.0 if self.time_budget_ms is not None else None
+        self.iterations = 0
+        self.evaluations = 0
+        self.moves = {"2opt": 0, "or_opt": 0}
+        self.timed_out = False
+
+        self._route = np.asarray(route, dtype=np.intp)
+        self._pos = np.full(self._size, -1, dtype=np.intp)
+        self._pos[self._route] = np.arange(self._route.size)
+        on_route = self._pos >= 0
+        # Candidate lists restricted to the nodes on this route
+        self._neighbors = {
+            int(x): [int(y) for y in self._ranked[x] if on_route[y]] for x in self._route.tolist()
+        }
+        if not self.symmetric:
+            self._init_edge_costs()
+
+        if self._route.size >= 3:
+            queue = deque(self._route.tolist())
+            queued = np.zeros(self._size, dtype=bool)
+            queued[self._route] = True
+            while queue:
+                if deadline is not None and self.iterations % 64 == 0 and time.perf_counter() > deadline:
+                    self.timed_out = True
+                    break
+                x = queue.popleft()
+                queued[x] = False
+                self.iterations += 1
+                touched = self._improve_node(x)
+                for node in touched:
+                    if not queued[node]:
+                        queued[node] = True
+                        queue.append(node)
+
+        self.elapsed_ms = (time.perf_counter() - started) * 1000.0
+        return self._route.tolist()
+
+    def stats(self) -> Dict:
+        return {
+            "iterations": self.iterations,
+            "improvements": sum(self.moves.values()),
+            "moves": dict(self.moves),
+            "evaluations": self.evaluations,
+            "candidate_neighbors": self.costs.k,
+            "elapsed_ms": round(self.elapsed_ms, 1),
+            "timed_out": self.timed_out
+        }
+
+    def _init_edge_costs(self):
+        """Forward and backward cost of each route edge, with lazily rebuilt prefix sums."""
+        route = self._route.tolist()
+        self._fwd = np.array([self.cost(a, b) for a, b in zip(route, route[1:])] + [0.0])
+        self._bwd = np.array([self.cost(b, a) for a, b in zip(route, route[1:])] + [0.0])
+        self._prefix: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def _reversal_change(self, i: int, j: int) -> float:
+        """Cost change of the edges inside route[i:j] when it is reversed."""
+        if self.symmetric or j - i < 2:
+            return 0.0
+        if self._prefix is None:
+            self._prefix = (np.concatenate(([0.0], np.cumsum(self._fwd))),
+                            np.concatenate(([0.0], np.cumsum(self._bwd))))
+        fwd, bwd = self._prefix
+        return float((bwd[j - 1] - bwd[i]) - (fwd[j - 1] - fwd[i]))
+
+    def _reverse(self, i: int, j: int):
+        """Reverse route[i:j] in place (1 <= i < j <= len(route))."""
+        if j - i < 2:
+            return
+        route = self._route
+        route[i:j] = route[i:j][::-1]
+        self._pos[route[i:j]] = np.arange(i, j)
+        if not self.symmetric:
+            fwd, bwd = self._fwd, self._bwd
+            inner_fwd = fwd[i:j - 1][::-1].copy()
+            fwd[i:j - 1] = bwd[i:j - 1][::-1]
+            bwd[i:j - 1] = inner_fwd
+            for k in (i - 1, j - 1):
+                if k + 1 < route.size:
+                    a, b = int(route[k]), int(route[k + 1])
+                    fwd[k] = self.cost(a, b)
+                    bwd[k] = self.cost(b, a)
+            self._prefix = None
+
+    def _two_opt_delta(self, i: int, j: int) -> float:
+        """Cost change of reversing route[i:j]; j == len(route) reverses the tail."""
+        route = self._route
+        cost = self.cost
+        a, b, c = int(route[i - 1]), int(route[i]), int(route[j - 1])
+        delta = cost(a, c) - cost(a, b)
+        if j < route.size:
+            e = int(route[j])
+            delta += cost(b, e) - cost(c, e)
+        self.evaluations += 1
+        return delta + self._reversal_change(i, j)
+
+    def _or_opt_delta(self, s: int, length: int, t: int, reverse: bool) -> float:
+        """
+        Cost change of moving route[s:s + length] between route[t] and
+        route[t + 1], reversed if asked (t outside s - 1 .. s + length - 1).
+        """
+        route = self._route
+        cost = self.cost
+        n = route.size
+        prev, first, last = int(route[s - 1]), int(route[s]), int(route[s + length - 1])
+        delta = -cost(prev, first)
+        if s + length < n:
+            after = int(route[s + length])
+            delta += cost(prev, after) - cost(last, after)
+        x = int(route[t])
+        head, tail = (last, first) if reverse else (first, last)
+        delta += cost(x, head)
+        if t + 1 < n:
+            y = int(route[t + 1])
+            delta += cost(tail, y) - cost(x, y)
+        if reverse:
+            delta += self._reversal_change(s, s + length)
+        self.evaluations += 1
+        return delta
+
+    def _apply_or_opt(self, s: int, length: int, t: int, reverse: bool):
+        """Move the chain as a rotation of the enclosing segment (three reversals)."""
+        end = s + length
+        if t >= end:
+            if not reverse:
+                self._reverse(s, end)
+            self._reverse(end, t + 1)
+            self._reverse(s, t + 1)
+        else:
+            self._reverse(t + 1, s)
+            if not reverse:
+                self._reverse(s, end)
+            self._reverse(t + 1, end)
+
+    def _improve_node(self, x: int) -> List[int]:
+        """
+        Apply the best improving move that joins x to one of its candidates.
+        Returns the endpoints of the changed edges (empty when x is settled).
+        """
+        route = self._route
+        pos = self._pos
+        cost = self.cost
+        n = route.size
+        p = int(pos[x])
+        best_delta = -EPSILON
+        best = None
+
+        # Gain criterion: candidates are sorted, and a move whose new edge at x
+        # is no cheaper than both edges x loses is left to its other endpoints
+        longest_adjacent = max(
+            max(cost(int(route[p - 1]), x), cost(x, int(route[p - 1]))) if p > 0 else 0.0,
+            max(cost(x, int(route[p + 1])), cost(int(route[p + 1]), x)) if p < n - 1 else 0.0
+        )
+
+        for y in self._neighbors[x]:
+            if cost(x, y) >= longest_adjacent:
+                break
+            q = int(pos[y])
+            lo, hi = (p, q) if p < q else (q, p)
+            # 2-opt: route[lo] and route[hi] become adjacent as (a, c) or as (b, e)
+            for i, j in ((lo + 1, hi + 1), (lo, hi)):
+                if i >= 1 and i + 2 <= j <= n:
+                    delta = self._two_opt_delta(i, j)
+                    if delta < best_delta:
+                        best_delta, best = delta, ("2opt", i, j)
+
+            if not self.or_opt:
+                continue
+            # Or-opt: chains starting or ending at x, placed right after or before y
+            for length in range(1, self.MAX_CHAIN + 1):
+                for s in (p, p - length + 1):
+                    if s < 1 or s + length > n:
+                        continue
+                    at_start = s == p
+                    for t, reverse in ((q, not at_start), (q - 1, at_start)):
+                        if t < 0 or s - 1 <= t <= s + length - 1:
+                            continue
+                        delta = self._or_opt_delta(s, length, t, reverse)
+                        if delta < best_delta:
+                            best_delta, best = delta, ("or_opt", s, length, t, reverse)
+                    if length == 1:
+                        break
+
+        if best is None:
+            return []
+        if best[0] == "2opt":
+            _, i, j = best
+            touched = [route[i - 1], route[i], route[j - 1]] + ([route[j]] if j < n else [])
+            touched = [int(k) for k in touched]
+            self._reverse(i, j)
+        else:
+            _, s, length, t, reverse = best
+            ends = {s - 1, s, s + length - 1, s + length, t, t + 1}
+            touched = [int(route[k]) for k in ends if 0 <= k < n]
+            self._apply_or_opt(s, length, t, reverse)
+        self.moves[best[0]] += 1
+        return touched + [x]
@@ -0,0 +1,163 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class CostMatrix:
+    """
+    Dense travel-cost matrix over integer point indices.
+
+    Row/column k of every array belongs to ids[k]. Distances are stored as
+    contiguous float32 arrays and minutes as int32, which keeps an N=500
+    matrix at a few megabytes instead of 250k nested dicts. The nested
+    Dict[str, Dict[str, Dict]] form is only built on request via to_nested().
+    """
+
+    DISTANCE_DECIMALS = 3
+
+    def __init__(self, ids: Sequence[str],
+                 distance_km: Optional[np.ndarray] = None,
+                 duration_minutes: Optional[np.ndarray] = None,
+                 traffic_delay_minutes: Optional[np.ndarray] = None):
+        n = len(ids)
+        self.ids: List[str] = list(ids)
+        self.index: Dict[str, int] = {point_id: k for k, point_id in enumerate(self.ids)}
+        self.distance_km = self._as_array(distance_km, n, np.float32)
+        self.duration_minutes = self._as_array(duration_minutes, n, np.int32)
+        self.traffic_delay_minutes = self._as_array(traffic_delay_minutes, n, np.int32)
+        self._edge_costs: Dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def _as_array(values: Optional[np.ndarray], n: int, dtype) -> np.ndarray:
+        if values is None:
+            return np.zeros((n, n), dtype=dtype)
+        array = np.ascontiguousarray(values, dtype=dtype)
+        if array.shape != (n, n):
+            raise ValueError(f"Matrix shape {array.shape} does not match {n} points")
+        return array
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, point_id: str) -> bool:
+        return point_id in self.index
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the matrix arrays."""
+        return (self.distance_km.nbytes + self.duration_minutes.nbytes +
+                self.traffic_delay_minutes.nbytes +
+                sum(costs.nbytes for costs in self._edge_costs.values()))
+
+    def indices(self, point_ids: Sequence[str]) -> List[int]:
+        """Map point ids to matrix indices."""
+        return [self.index[point_id] for point_id in point_ids]
+
+    def edge_costs(self, optimization_goal: str) -> np.ndarray:
+        """
+        Per-edge cost array for the optimization goal.
+        "time" is duration plus traffic delay; "distance" and "fuel" both use
+        distance, since fuel cost is proportional to it.
+        """
+        key = "time" if optimization_goal == "time" else "distance"
+        if key not in self._edge_costs:
+            if key == "time":
+                self._edge_costs[key] = (self.duration_minutes + self.traffic_delay_minutes).astype(np.float32)
+            else:
+                self._edge_costs[key] = self.distance_km
+        return self._edge_costs[key]
+
+    def route_totals(self, route: Sequence[int]) -> Dict[str, float]:
+        """Sum distance, duration and traffic delay along a route of indices."""
+        if len(route) < 2:
+            return {"distance_km": 0.0, "duration_minutes": 0, "traffic_delay_minutes": 0}
+        order = np.asarray(route, dtype=np.intp)
+        src, dst = order[:-1], order[1:]
+        return {
+            "distance_km": float(self.distance_km[src, dst].sum(dtype=np.float64)),
+            "duration_minutes": int(self.duration_minutes[src, dst].sum(dtype=np.int64)),
+            "traffic_delay_minutes": int(self.traffic_delay_minutes[src, dst].sum(dtype=np.int64))
+        }
+
+    def distances_from(self, i: int, targets: Sequence[int]) -> np.ndarray:
+        """Distances from point i to each target."""
+        return self.distance_km[i, np.asarray(targets, dtype=np.intp)]
+
+    def entry(self, i: int, j: int) -> Dict:
+        """Nested-dict style entry for a single edge."""
+        return {
+            "distance_km": round(float(self.distance_km[i, j]), self.DISTANCE_DECIMALS),
+            "duration_minutes": int(self.duration_minutes[i, j]),
+            "traffic_delay_minutes": int(self.traffic_delay_minutes[i, j])
+        }
+
+    def subset(self, point_ids: Sequence[str]) -> "CostMatrix":
+        """Matrix restricted to the given points, in the given order."""
+        order = np.asarray(self.indices(point_ids), dtype=np.intp)
+        grid = np.ix_(order, order)
+        return CostMatrix(
+            point_ids,
+            self.distance_km[grid],
+            self.duration_minutes[grid],
+            self.traffic_delay_minutes[grid]
+        )
+
+    def with_point(self, point_id: str, outgoing: Sequence[np.ndarray],
+                   incoming: Sequence[np.ndarray]) -> "CostMatrix":
+        """
+        Copy of the matrix with one point's row and column set, appended when
+        the id is new. outgoing/incoming are (distance_km, duration_minutes,
+        traffic_delay_minutes) arrays from and to the existing points in index
+        order; the point's own entry, if it already exists, is ignored.
+        """
+        n = len(self.ids)
+        k = self.index.get(point_id, n)
+        size = max(n, k + 1)
+        arrays = []
+        for array, row, column in zip(
+            (self.distance_km, self.duration_minutes, self.traffic_delay_minutes), outgoing, incoming
+        ):
+            grown = np.zeros((size, size), dtype=array.dtype)
+            grown[:n, :n] = array
+            grown[k, :n] = row
+            grown[:n, k] = column
+            grown[k, k] = 0
+            arrays.append(grown)
+        return CostMatrix(self.ids + [point_id] if k == n else self.ids, *arrays)
+
+    @classmethod
+    def from_nested(cls, point_ids: Sequence[str], nested: Dict[str, Dict[str, Dict]]) -> "CostMatrix":
+        """
+        Build a matrix from the legacy nested-dict format.
+        Pairs missing from the dict are left at zero.
+        """
+        matrix = cls(point_ids)
+        for i, from_id in enumerate(matrix.ids):
+            row = nested.get(from_id)
+            if not row:
+                continue
+            for j, to_id in enumerate(matrix.ids):
+                data = row.get(to_id)
+                if data is None:
+                    continue
+                matrix.distance_km[i, j] = data["distance_km"]
+                matrix.duration_minutes[i, j] = data["duration_minutes"]
+                matrix.traffic_delay_minutes[i, j] = data["traffic_delay_minutes"]
+        return matrix
+
+    def to_nested(self) -> Dict[str, Dict[str, Dict]]:
+        """Produce the legacy nested-dict format (for API responses only)."""
+        distance = np.round(self.distance_km.astype(np.float64), self.DISTANCE_DECIMALS).tolist()
+        duration = self.duration_minutes.tolist()
+        delay = self.traffic_delay_minutes.tolist()
+        return {
+            from_id: {
+                to_id: {
+                    "distance_km": distance[i][j],
+                    "duration_minutes": duration[i][j],
+                    "traffic_delay_minutes": delay[i][j]
+                }
+                for j, to_id in enumerate(self.ids)
+            }
+            for i, from_id in enumerate(self.ids)
+        }
@@ -0,0 +1,245 @@
+import heapq
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.optimizer import DeliveryPoint, FleetPlan, OptimizedRoute, RouteOptimizer, Vehicle
+from core.spatial_index import GridIndex
+
+EPSILON = 1e-9
+
+
+def sweep_clusters(depot_lat: float, depot_lon: float, lats: Sequence[float], lons: Sequence[float],
+                   demand: Sequence[float], capacity_target: float, max_points: int) -> List[np.ndarray]:
+    """
+    Sweep partition: stops are ordered by bearing from the depot, starting
+    after the widest empty sector, and a new cluster is started whenever the
+    next stop would take the current one over capacity_target demand or
+    max_points stops. Returns the stop indices of each cluster in sweep
+    order, so consecutive clusters are geographic neighbours.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if lats.size == 0:
+        return []
+    bearing = np.arctan2(lats - depot_lat, (lons - depot_lon) * math.cos(math.radians(depot_lat)))
+    order = np.argsort(bearing, kind="stable")
+    swept = bearing[order]
+    gaps = np.diff(np.append(swept, swept[0] + 2 * math.pi))
+    order = np.roll(order, -((int(np.argmax(gaps)) + 1) % order.size))
+
+    clusters: List[np.ndarray] = []
+    current: List[int] = []
+    load = 0.0
+    for k in order.tolist():
+        if current and (load + demand[k] > capacity_target + EPSILON or len(current) >= max_points):
+            clusters.append(np.asarray(current, dtype=np.intp))
+            current, load = [], 0.0
+        current.append(k)
+        load += demand[k]
+    clusters.append(np.asarray(current, dtype=np.intp))
+    return clusters
+
+
+def allocate_vehicles(capacities: Sequence[float], cluster_demands: Sequence[float]) -> List[List[int]]:
+    """
+    Hand out vehicles, largest first, each to the cluster with the most
+    demand not yet covered. Returns the vehicle indices of each cluster.
+    """
+    uncovered = [(-float(d), c) for c, d in enumerate(cluster_demands)]
+    heapq.heapify(uncovered)
+    allocation: List[List[int]] = [[] for _ in cluster_demands]
+    for v in sorted(range(len(capacities)), key=lambda v: -capacities[v]):
+        remaining, c = heapq.heappop(uncovered)
+        allocation[c].append(v)
+        heapq.heappush(uncovered, (remaining + capacities[v], c))
+    return allocation
+
+
+@dataclass
+class FleetCluster:
+    points: List[DeliveryPoint]
+    vehicles: List[Vehicle]
+    # Index of each vehicle in the caller's fleet
+    fleet_indices: List[int]
+    # Vehicles added because the fleet had none left for this cluster
+    seeded: int = 0
+
+
+@dataclass
+class RouteEntry:
+    cluster: int
+    vehicle: Vehicle
+    route: OptimizedRoute
+    load: float
+    fleet_index: Optional[int] = None
+
+
+class FleetDecomposition:
+    """
+    Cluster-first plan for fleets too large to solve as one problem.
+
+    Stops are split into sweep clusters whose demand (by size_weights) is a
+    whole number of the largest vehicle's capacity, about max_cluster_points
+    stops each, and the fleet is shared out in proportion to cluster demand.
+    Each cluster is then an ordinary optimize_fleet() problem with its own
+    small matrix, so clusters can be solved in parallel. Afterwards, the
+    routes on either side of each boundary between neighbouring clusters are
+    re-optimized together (repair_fleet_routes) to undo the worst cuts.
+
+    The caller drives the solves: cluster_problems() lists the cluster
+    solves, boundary_waves() the repairs (pairs in one wave share no routes
+    and can run concurrently), and fleet_plan() merges the results.
+    """
+
+    def __init__(self, optimizer: RouteOptimizer, delivery_points: List[DeliveryPoint],
+                 vehicles: List[Vehicle], start_location: DeliveryPoint,
+                 allow_additional_vehicles: bool = True, max_cluster_points: int = 300,
+                 boundary_routes: int = 3):
+        if not vehicles:
+            raise ValueError("At least one vehicle is required")
+        self.optimizer = optimizer
+        self.start_location = start_location
+        self.points_by_id = {p.id: p for p in delivery_points}
+        self.fleet_size = len(vehicles)
+        self.boundary_routes = boundary_routes
+
+        demand = np.array([optimizer.size_weights[p.size] for p in delivery_points], dtype=np.float64)
+        capacities = [float(optimizer.capacity_limits[v.capacity]) for v in vehicles]
+        largest = max(range(len(vehicles)), key=lambda v: capacities[v])
+        # Whole vehicles per cluster, so little capacity is stranded at the cuts
+        mean_demand = float(demand.mean()) if demand.size else 1.0
+        per_cluster = max(1, round(max_cluster_points * mean_demand / capacities[largest]))
+        groups = sweep_clusters(
+            start_location.lat, start_location.lon,
+            [p.lat for p in delivery_points], [p.lon for p in delivery_points],
+            demand, per_cluster * capacities[largest], max_cluster_points
+        )
+        allocation = allocate_vehicles(capacities, [float(demand[g].sum()) for g in groups])
+
+        self.clusters: List[FleetCluster] = []
+        self.unassigned: List[str] = []
+        for group, fleet_indices in zip(groups, allocation):
+            points = [delivery_points[k] for k in group.tolist()]
+            cluster = FleetCluster(points, [vehicles[v] for v in fleet_indices], list(fleet_indices))
+            if not cluster.vehicles:
+                if allow_additional_vehicles:
+                    cluster.vehicles = [vehicles[largest]]
+                    cluster.seeded = 1
+                else:
+                    self.unassigned.extend(p.id for p in points)
+            self.clusters.append(cluster)
+
+        self.entries: List[RouteEntry] = []
+        self.additional_vehicles = 0
+        self.cluster_stats: List[Dict] = []
+        self.repair_stats: List[Dict] = []
+
+    def cluster_problems(self) -> List[Tuple[int, FleetCluster]]:
+        """Clusters that need a solve (those with at least one vehicle)."""
+        return [(c, cluster) for c, cluster in enumerate(self.clusters) if cluster.vehicles]
+
+    def add_cluster_plan(self, c: int, plan: FleetPlan):
+        cluster = self.clusters[c]
+        for k, (vehicle, route, load) in enumerate(zip(plan.vehicles, plan.routes, plan.loads)):
+            fleet_index = cluster.fleet_indices[k] if k < len(cluster.fleet_indices) else None
+            self.entries.append(RouteEntry(c, vehicle, route, load, fleet_index))
+        self.additional_vehicles += plan.additional_vehicles + cluster.seeded
+        self.unassigned.extend(plan.unassigned)
+        self.cluster_stats.append(plan.search_stats or {})
+
+    def boundary_waves(self) -> List[List[Tuple[int, int]]]:
+        """
+        Pairs of consecutive clusters in sweep order (the last wraps to the
+        first), split into two waves so that no cluster is in two pairs of
+        the same wave.
+        """
+        count = len(self.clusters)
+        if count < 2:
+            return []
+        pairs = [(c, c + 1) for c in range(count - 1)]
+        if count > 2:
+            pairs.append((count - 1, 0))
+        waves = [pairs[0::2], pairs[1::2]]
+        # With an odd count the wrap-around pair shares cluster 0 with the first pair
+        if count > 2 and count % 2 == 1:
+            waves[0].remove((count - 1, 0))
+            waves.append([(count - 1, 0)])
+        return [wave for wave in waves if wave]
+
+    def boundary_entries(self, a: int, b: int) -> List[int]:
+        """
+        Routes of clusters a and b that serve stops next to the other
+        cluster: stops with one of their nearest neighbours across the
+        boundary, counted per route. Up to boundary_routes routes per side.
+        """
+        stops: List[Tuple[int, DeliveryPoint]] = [
+            (e, self.points_by_id[point_id])
+            for e, entry in enumerate(self.entries) if entry.cluster in (a, b)
+            for point_id in entry.route.route_order[1:]
+        ]
+        if len(stops) < 2:
+            return []
+
+        owner = np.array([e for e, _ in stops], dtype=np.intp)
+        side = np.array([self.entries[e].cluster == b for e in owner.tolist()])
+        neighbors = GridIndex([p.lat for _, p in stops], [p.lon for _, p in stops]).knn(8)
+        on_boundary = (side[neighbors] != side[:, None]).any(axis=1)
+
+        counts: Dict[int, int] = {}
+        for e in owner[on_boundary].tolist():
+            counts[e] = counts.get(e, 0) + 1
+        chosen = []
+        for cluster in (a, b):
+            ranked = sorted((e for e in counts if self.entries[e].cluster == cluster), key=lambda e: -counts[e])
+            chosen.extend(ranked[:self.boundary_routes])
+        return chosen
+
+    def repair_problem(self, entry_ids: List[int]) -> Tuple[List[List[str]], List[Vehicle], List[DeliveryPoint]]:
+        """Stop ids of each route, their vehicles and the stops, for repair_fleet_routes()."""
+        routes = [self.entries[e].route.route_order[1:] for e in entry_ids]
+        stops = [self.points_by_id[point_id] for route in routes for point_id in route]
+        return routes, [self.entries[e].vehicle for e in entry_ids], stops
+
+    def apply_repair(self, entry_ids: List[int], plan: FleetPlan):
+        for e, route, load in zip(entry_ids, plan.routes, plan.loads):
+            self.entries[e].route = route
+            self.entries[e].load = load
+        self.repair_stats.append(plan.search_stats or {})
+
+    def fleet_plan(self, elapsed_ms: float) -> FleetPlan:
+        """
+        Merge the cluster plans: the caller's vehicles first, in their
+        original order, then the vehicles added along the way.
+        """
+        fleet: List[Optional[RouteEntry]] = [None] * self.fleet_size
+        extra = []
+        for entry in self.entries:
+            if entry.fleet_index is not None:
+                fleet[entry.fleet_index] = entry
+            else:
+                extra.append(entry)
+        entries = [entry for entry in fleet if entry is not None] + extra
+
+        repair_ms = sum(s.get("elapsed_ms", 0.0) for s in self.repair_stats)
+        return FleetPlan(
+            vehicles=[entry.vehicle for entry in entries],
+            routes=[entry.route for entry in entries],
+            loads=[round(entry.load, 2) for entry in entries],
+            additional_vehicles=self.additional_vehicles,
+            unassigned=self.unassigned,
+            search_stats={
+                "algorithm": "sweep_decomposition_with_vnd",
+                "iterations": sum(s.get("iterations", 0) for s in self.cluster_stats + self.repair_stats),
+                "improvements": sum(s.get("improvements", 0) for s in self.cluster_stats + self.repair_stats),
+                "elapsed_ms": round(elapsed_ms, 1),
+                "clusters": len(self.clusters),
+                "largest_cluster": max((len(cluster.points) for cluster in self.clusters), default=0),
+                "cluster_search_ms": round(sum(s.get("elapsed_ms", 0.0) for s in self.cluster_stats), 1),
+                "boundary_repairs": len(self.repair_stats),
+                "boundary_improvements": sum(s.get("improvements", 0) for s in self.repair_stats),
+                "boundary_repair_ms": round(repair_ms, 1)
+            }
+        )
@@ -0,0 +1,183 @@
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.lower_bounds import EPSILON, OneTreeBound
+from core.priority import PriorityPenalty
+
+# Rows of the Held-Karp layer expanded at once, bounding the (rows, n, n) temporary
+HELD_KARP_CHUNK = 2048
+
+
+def held_karp(cost: np.ndarray, penalty: Optional[PriorityPenalty] = None) -> Tuple[List[int], float]:
+    """
+    Optimal open path from node 0 through every other node of cost, by
+    Held-Karp dynamic programming over subsets: O(2^n * n^2) time and
+    O(2^n * n) memory for n = len(cost) - 1, so practical up to about 16.
+
+    best[S, k] is the cheapest path from 0 through the set S ending at k.
+    Subsets are processed one popcount layer at a time, each layer extended
+    by every missing node in a single NumPy step. Works on asymmetric costs.
+    A PriorityPenalty (in the indices of cost) is exact here too: a node
+    added to a set of size s lands at position s + 1.
+    Returns the route as indices of cost (starting at 0) and its cost.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    n = cost.shape[0] - 1
+    if n <= 0:
+        return [0], 0.0
+    inner = cost[1:, 1:]
+    # arrival[s, k]: the penalty of stop k at position s (zero without a penalty)
+    arrival = np.zeros((n + 1, n))
+    if penalty is not None:
+        arrival = penalty.weight * np.arange(n + 1)[:, None] * penalty.urgency[None, 1:]
+    full = 1 << n
+    masks = np.arange(full, dtype=np.int64)
+    members = ((masks[:, None] >> np.arange(n)) & 1).astype(bool)
+    popcount = members.sum(axis=1)
+
+    best = np.full((full, n), np.inf)
+    parent = np.full((full, n), -1, dtype=np.int8)
+    singles = np.arange(n)
+    best[1 << singles, singles] = cost[0, 1:] + arrival[1]
+
+    for size in range(1, n):
+        layer = np.nonzero(popcount == size)[0]
+        for lo in range(0, layer.size, HELD_KARP_CHUNK):
+            subsets = layer[lo:lo + HELD_KARP_CHUNK]
+            # extended[r, j, k]: path through subsets[r] ending at j, then j -> k
+            extended = best[subsets][:, :, None] + (inner + arrival[size + 1])[None, :, :]
+            via = extended.argmin(axis=1)
+            value = np.take_along_axis(extended, via[:, None, :], axis=1)[:, 0, :]
+            # Each (S + k, k) is reached from exactly one S, so plain assignment suffices
+            rows, nodes = np.nonzero(~members[subsets])
+            targets = subsets[rows] | (np.int64(1) << nodes)
+            best[targets, nodes] = value[rows, nodes]
+            parent[targets, nodes] = via[rows, nodes]
+
+    end = int(best[full - 1].argmin())
+    total = float(best[full - 1, end])
+    path = []
+    subset = full - 1
+    while end >= 0:
+        path.append(end + 1)
+        previous = int(parent[subset, end])
+        subset &= ~(1 << end)
+        end = previous
+    return [0] + path[::-1], total
+
+
+class BranchAndBound:
+    """
+    Depth-first branch-and-bound for the optimal open path from node 0.
+
+    A partial route ending at node l is bounded by its cost plus the 1-tree
+    bound (OneTreeBound) on the path from l through the unvisited nodes,
+    with the Lagrangian penalties found by subgradient ascent at the root.
+
+    Children are tried cheapest edge first, starting from the initial route
+    as the incumbent. When the time budget runs out the best route is
+    returned with the smallest bound of the open subproblems, so the
+    optimality gap is known either way.
+
+    With a PriorityPenalty a route's cost includes its ordering penalty,
+    and the bound adds the smallest penalty the unvisited nodes can still
+    pay: the most urgent ones in the earliest free positions.
+    """
+
+    ASCENT_ITERATIONS = 50
+
+    def __init__(self, cost: np.ndarray, time_budget_ms: Optional[float] = None,
+                 penalty: Optional[PriorityPenalty] = None):
+        self.cost = np.asarray(cost, dtype=np.float64)
+        self.time_budget_ms = time_budget_ms
+        self.one_tree = OneTreeBound(self.cost)
+        self.penalty = penalty
+
+        self.nodes = 0
+        self.pruned = 0
+        self.improvements = 0
+        self.root_bound = 0.0
+        self.lower_bound = 0.0
+        self.best_cost = float("inf")
+        self.optimal = False
+        self.elapsed_ms = 0.0
+
+    def run(self, initial_route: Sequence[int]) -> List[int]:
+        """Search from the initial route (indices of cost starting at 0); returns the best route."""
+        started = time.perf_counter()
+        deadline = started + self.time_budget_ms / 1000.0 if self.time_budget_ms is not None else None
+        cost = self.cost
+        n = cost.shape[0]
+        best_route = list(initial_route)
+        order = np.asarray(best_route, dtype=np.intp)
+        travel = float(cost[order[:-1], order[1:]].sum())
+        self.best_cost = travel + self._route_penalty(best_route)
+        self.root_bound = (self.one_tree.ascend(travel, self.ASCENT_ITERATIONS) +
+                           self._penalty_bound(np.arange(1, n), 1))
+
+        # Stack entries: (parent bound, route, visited flags, route cost)
+        visited = np.zeros(n, dtype=bool)
+        visited[0] = True
+        stack = [(self.root_bound, [0], visited, 0.0)]
+        timed_out = False
+        while stack:
+            if deadline is not None and self.nodes % 64 == 0 and time.perf_counter() > deadline:
+                timed_out = True
+                break
+            parent_bound, route, visited, route_cost = stack.pop()
+            if parent_bound >= self.best_cost - EPSILON:
+                self.pruned += 1
+                continue
+            self.nodes += 1
+            last = route[-1]
+            remaining = np.nonzero(~visited)[0]
+            if remaining.size == 0:
+                if route_cost < self.best_cost - EPSILON:
+                    self.best_cost, best_route = route_cost, route
+                    self.improvements += 1
+                continue
+            node_bound = (route_cost + self.one_tree.bound(last, remaining) +
+                          self._penalty_bound(remaining, len(route)))
+            if node_bound >= self.best_cost - EPSILON:
+                self.pruned += 1
+                continue
+            step = cost[last, remaining]
+            if self.penalty is not None:
+                step = step + self.penalty.weight * len(route) * self.penalty.urgency[remaining]
+            # Push the most expensive child first so the cheapest step is explored first
+            for r in np.argsort(-step, kind="stable").tolist():
+                k = int(remaining[r])
+                child = visited.copy()
+                child[k] = True
+                stack.append((node_bound, route + [k], child, route_cost + float(step[r])))
+
+        self.optimal = not timed_out
+        open_bounds = [entry[0] for entry in stack]
+        self.lower_bound = self.best_cost if self.optimal else min([self.best_cost] + open_bounds)
+        self.elapsed_ms = (time.perf_counter() - started) * 1000.0
+        return best_route
+
+    def _route_penalty(self, route: Sequence[int]) -> float:
+        return self.penalty.route_penalty(route) if self.penalty is not None else 0.0
+
+    def _penalty_bound(self, remaining: np.ndarray, first_position: int) -> float:
+        """Smallest penalty of remaining in positions first_position onwards (rearrangement inequality)."""
+        if self.penalty is None or remaining.size == 0:
+            return 0.0
+        urgency = np.sort(self.penalty.urgency[remaining])[::-1]
+        positions = np.arange(first_position, first_position + remaining.size)
+        return self.penalty.weight * float(urgency @ positions)
+
+    def stats(self) -> Dict:
+        return {
+            "iterations": self.nodes,
+            "improvements": self.improvements,
+            "pruned": self.pruned,
+            "elapsed_ms": round(self.elapsed_ms, 1),
+            "optimal": self.optimal,
+            "best_cost": round(float(self.best_cost), 3),
+            "root_lower_bound": round(float(self.root_bound), 3),
+            "lower_bound": round(float(self.lower_bound), 3)
+        }
@@ -0,0 +1,233 @@
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.time_windows import TimeWindows
+
+EPSILON = 1e-9
+
+
+def clarke_wright(cost: np.ndarray, depot: int, stops: Sequence[int], demand: np.ndarray,
+                  capacity: float, max_routes: Optional[int] = None,
+                  neighbor_k: Optional[int] = 40,
+                  windows: Optional[TimeWindows] = None) -> List[List[int]]:
+    """
+    Clarke-Wright savings construction for open routes from a shared depot.
+
+    Every stop starts on its own route; appending the route that starts at j
+    to the route that ends at i saves cost[depot, j] - cost[i, j]. Merges are
+    applied in decreasing order of saving while the merged load fits the
+    capacity. Only the neighbor_k nearest stops of each stop are paired, so
+    the candidate list is O(n * k) instead of O(n^2). If more than max_routes
+    routes remain, merges with negative savings are applied as well.
+
+    With time windows, a merge must also keep every window of the appended
+    route: leaving i, the service start of j may only move back within its
+    forward time slack, an O(1) check. Stops that are late even when served
+    first keep that lateness as their deadline.
+
+    Returns routes of matrix indices, each starting at the depot.
+    """
+    stops = np.asarray(stops, dtype=np.intp)
+    n = stops.size
+    if n == 0:
+        return []
+
+    # Candidate pairs (i, j) in local indices
+    sub = cost[np.ix_(stops, stops)].astype(np.float64)
+    np.fill_diagonal(sub, np.inf)
+    if neighbor_k is not None and neighbor_k < n - 1:
+        cols = np.argpartition(sub, neighbor_k - 1, axis=1)[:, :neighbor_k]
+        rows = np.repeat(np.arange(n), neighbor_k)
+        cols = cols.ravel()
+    else:
+        rows, cols = np.nonzero(~np.eye(n, dtype=bool))
+    savings = cost[depot, stops[cols]] - sub[rows, cols]
+    order = np.argsort(-savings, kind="stable")
+    rows, cols, savings = rows[order].tolist(), cols[order].tolist(), savings[order].tolist()
+
+    local_demand = demand[stops].astype(np.float64)
+    nxt = [-1] * n
+    route_id = list(range(n))
+    members = [[k] for k in range(n)]
+    head = list(range(n))
+    tail = list(range(n))
+    load = local_demand.tolist()
+    route_count = n
+
+    if windows is not None:
+        # Service start, slack and deadline of each stop within its current route
+        size = windows.travel.shape[0]
+        start = np.zeros(size)
+        slack = np.zeros(size)
+        deadline = windows.latest.copy()
+        for k in stops.tolist():
+            windows.refresh([depot, k], start, slack, deadline)
+
+    def reschedule(r: int):
+        route = [depot]
+        k = head[r]
+        while k != -1:
+            route.append(int(stops[k]))
+            k = nxt[k]
+        windows.refresh(route, start, slack, deadline)
+
+    def merge(i: int, j: int) -> bool:
+        ra, rb = route_id[i], route_id[j]
+        if ra == rb or tail[ra] != i or head[rb] != j:
+            return False
+        if load[ra] + load[rb] > capacity + EPSILON:
+            return False
+        if windows is not None:
+            x, y = stops[i], stops[j]
+            if not windows.push_feasible(start[x] + windows.service[x], x, y, True, start, slack):
+                return False
+        nxt[i] = j
+        # Relabel the smaller route into the larger one
+        keep, drop = (ra, rb) if len(members[ra]) >= len(members[rb]) else (rb, ra)
+        for k in members[drop]:
+            route_id[k] = keep
+        members[keep].extend(members[drop])
+        members[drop] = []
+        head[keep], tail[keep] = head[ra], tail[rb]
+        load[keep] = load[ra] + load[rb]
+        if windows is not None:
+            reschedule(keep)
+        return True
+
+    for i, j, saving in zip(rows, cols, savings):
+        if saving <= 0:
+            break
+        if merge(i, j):
+            route_count -= 1
+
+    if max_routes is not None and route_count > max_routes:
+        for i, j, saving in zip(rows, cols, savings):
+            if saving > 0:
+                continue
+            if merge(i, j):
+                route_count -= 1
+                if route_count <= max_routes:
+                    break
+
+    routes = []
+    for r in range(n):
+        if not members[r]:
+            continue
+        route = [depot]
+        k = head[r]
+        while k != -1:
+            route.append(int(stops[k]))
+            k = nxt[k]
+        routes.append(route)
+    return routes
+
+
+def split_trips(route: Sequence[int], demand: np.ndarray, capacity: float,
+                pair_cost: Callable[[np.ndarray, np.ndarray], np.ndarray]) -> List[List[int]]:
+    """
+    Optimal split of one open route from the depot (route[0]) into trips
+    that each fit the capacity, keeping the stop order and returning to the
+    depot to reload between trips (route first, cluster second).
+
+    The trip over stops a..b costs depot -> a, the route's own edges up to b
+    and b -> depot, except the last trip, which ends at its last stop like
+    the route. The best split is a shortest path over route positions;
+    pair_cost(i, j) gives the cost arrays of edges i -> j, and only trips
+    that fit the capacity are priced. Returns the trips as lists of stops.
+    """
+    depot = int(route[0])
+    stops = np.asarray(route[1:], dtype=np.intp)
+    n = stops.size
+    if n == 0:
+        return []
+    load = np.concatenate(([0.0], np.cumsum(demand[stops], dtype=np.float64)))
+    if float(np.diff(load).max()) > capacity + EPSILON:
+        raise ValueError("A delivery exceeds the vehicle capacity")
+
+    depots = np.full(n, depot, dtype=np.intp)
+    outbound = pair_cost(depots, stops)
+    inbound = pair_cost(stops, depots)
+    inbound[-1] = 0.0
+    along = np.concatenate(([0.0], np.cumsum(pair_cost(stops[:-1], stops[1:]))))
+
+    # best[e]: cheapest split of the first e stops; previous[e]: where its last trip starts
+    best = np.full(n + 1, np.inf)
+    best[0] = 0.0
+    previous = np.zeros(n + 1, dtype=np.intp)
+    for a in range(n):
+        # Trips starting at stop a can run to any stop before `end`
+        end = int(np.searchsorted(load, load[a] + capacity + EPSILON, side="right")) - 1
+        last = np.arange(a, end)
+        cost = best[a] + outbound[a] + along[last] - along[a] + inbound[last]
+        better = cost < best[last + 1]
+        best[last[better] + 1] = cost[better]
+        previous[last[better] + 1] = a
+
+    trips = []
+    e = n
+    while e > 0:
+        a = int(previous[e])
+        trips.append(stops[a:e].tolist())
+        e = a
+    return trips[::-1]
+
+
+def assign_routes(routes: List[List[int]], loads: Sequence[float],
+                  capacities: Sequence[float]) -> Tuple[List[Optional[int]], List[int]]:
+    """
+    Best-fit assignment of routes to vehicles, heaviest route first.
+    Returns the route index assigned to each vehicle (None when idle) and the
+    indices of routes that no free vehicle can carry.
+    """
+    assigned: List[Optional[int]] = [None] * len(capacities)
+    free = sorted(range(len(capacities)), key=lambda v: capacities[v])
+    leftover = []
+    for r in sorted(range(len(routes)), key=lambda r: -loads[r]):
+        fit = next((v for v in free if capacities[v] + EPSILON >= loads[r]), None)
+        if fit is None:
+            leftover.append(r)
+            continue
+        assigned[fit] = r
+        free.remove(fit)
+    return assigned, leftover
+
+
+def cheapest_insertion(cost: np.ndarray, routes: List[List[int]], loads: List[float],
+                       capacities: Sequence[float], stop: int, demand: float,
+                       windows: Optional[TimeWindows] = None) -> bool:
+    """
+    Insert a stop at its cheapest feasible position across all routes.
+    Updates routes and loads in place; returns False if no route has room.
+    With time windows, positions that keep every window are preferred over
+    cheaper ones, and otherwise the one causing the least lateness.
+    """
+    best = None
+    if windows is not None:
+        size = windows.travel.shape[0]
+        start = np.zeros(size)
+        slack = np.zeros(size)
+        deadline = windows.latest.copy()
+    for r, route in enumerate(routes):
+        if loads[r] + demand > capacities[r] + EPSILON:
+            continue
+        order = np.asarray(route, dtype=np.intp)
+        xs = order
+        ys = np.append(order[1:], order[-1])
+        has_y = np.arange(order.size) < order.size - 1
+        delta = cost[xs, stop] + np.where(has_y, cost[stop, ys] - cost[xs, ys], 0.0)
+        late = np.zeros(order.size)
+        if windows is not None:
+            windows.refresh(route, start, slack, deadline)
+            depart = start[order] + windows.service[order]
+            late = windows.insertion_lateness(depart, xs, stop, ys, has_y, start, slack, deadline)
+        # Rank on (lateness caused, cost)
+        p = int(np.lexsort((delta, late))[0])
+        if best is None or (late[p], delta[p]) < best[0]:
+            best = ((float(late[p]), float(delta[p])), r, p)
+    if best is None:
+        return False
+    _, r, p = best
+    routes[r].insert(p + 1, int(stop))
+    loads[r] += demand
+    return True
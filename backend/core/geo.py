@@ -0,0 +1,143 @@
+import math
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.cost_matrix import CostMatrix
+
+EARTH_RADIUS_KM = 6371.0
+
+# Traffic multipliers based on time of day
+TRAFFIC_MULTIPLIERS = {
+    "peak": 1.8,      # 8-10 AM, 5-7 PM
+    "moderate": 1.3,  # 10 AM - 5 PM
+    "low": 1.0        # 7 PM - 8 AM
+}
+
+# Base speeds for different vehicle types (km/h)
+VEHICLE_SPEEDS_KMH = {
+    "motorcycle": 25,
+    "van": 20,
+    "truck": 15
+}
+
+# Row block size for matrix builds; bounds float64 temporaries to a few MB per block
+BLOCK_ROWS = 512
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Calculate Haversine distance between two points in kilometers."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return EARTH_RADIUS_KM * (2 * math.atan2(math.sqrt(a), math.sqrt(1 - a)))
+
+
+def traffic_bucket(current_time: Optional[datetime] = None) -> str:
+    """Return the traffic bucket (peak/moderate/low) for a time of day."""
+    h = (current_time or datetime.now()).hour
+    if (8 <= h < 10) or (17 <= h < 19):
+        return "peak"
+    elif 10 <= h < 17:
+        return "moderate"
+    return "low"
+
+
+def haversine_distance_matrix(lats: Sequence[float], lons: Sequence[float],
+                              dest_lats: Optional[Sequence[float]] = None,
+                              dest_lons: Optional[Sequence[float]] = None,
+                              decimals: Optional[int] = 2) -> np.ndarray:
+    """
+    Pairwise Haversine distances (km) from every origin to every destination,
+    computed by NumPy broadcasting in row blocks. Destinations default to the
+    origins. Returns a float32 array rounded to `decimals` (None keeps full precision).
+    """
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    if dest_lats is None:
+        dlat_all, dlon_all = lat, lon
+    else:
+        dlat_all = np.radians(np.asarray(dest_lats, dtype=np.float64))
+        dlon_all = np.radians(np.asarray(dest_lons, dtype=np.float64))
+    cos_dest = np.cos(dlat_all)
+
+    out = np.empty((lat.size, dlat_all.size), dtype=np.float32)
+    for start in range(0, lat.size, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, lat.size)
+        lat_block = lat[start:stop, None]
+        a = np.sin((dlat_all - lat_block) * 0.5)
+        a *= a
+        b = np.sin((dlon_all - lon[start:stop, None]) * 0.5)
+        b *= b
+        b *= np.cos(lat_block) * cos_dest
+        a += b
+        np.clip(a, 0.0, 1.0, out=a)
+        # 2 * asin(sqrt(a)) == 2 * atan2(sqrt(a), sqrt(1 - a)) on [0, 1]
+        np.sqrt(a, out=a)
+        np.arcsin(a, out=a)
+        a *= 2 * EARTH_RADIUS_KM
+        if decimals is not None:
+            np.round(a, decimals, out=a)
+        out[start:stop] = a
+    return out
+
+
+def haversine_pairs_km(lats1: Sequence[float], lons1: Sequence[float],
+                       lats2: Sequence[float], lons2: Sequence[float],
+                       decimals: Optional[int] = 2) -> np.ndarray:
+    """
+    Element-wise Haversine distances (km) between two equally long lists of
+    points, as float32 rounded like haversine_distance_matrix.
+    """
+    lat1 = np.radians(np.asarray(lats1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lats2, dtype=np.float64))
+    dlon = np.radians(np.asarray(lons2, dtype=np.float64) - np.asarray(lons1, dtype=np.float64))
+    a = np.sin((lat2 - lat1) * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon * 0.5) ** 2
+    distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    if decimals is not None:
+        distance = np.round(distance, decimals)
+    return distance.astype(np.float32)
+
+
+def travel_time_arrays(distance_km: np.ndarray, speed_kmh: float,
+                       traffic_multiplier: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Free-flow duration and traffic delay (whole minutes) for a distance array.
+    Matches the Distance Matrix API convention: duration excludes traffic and
+    the delay is the extra time the traffic multiplier adds on top.
+    """
+    base_minutes = distance_km.astype(np.float64) * (60.0 / speed_kmh)
+    duration = base_minutes.astype(np.int32)
+    delay = (base_minutes * (traffic_multiplier - 1.0)).astype(np.int32)
+    return duration, delay
+
+
+def build_haversine_matrix(ids: Sequence[str], lats: Sequence[float], lons: Sequence[float],
+                           vehicle_type: str = "van", traffic_multiplier: float = 1.0) -> CostMatrix:
+    """Build a full Haversine CostMatrix for one vehicle type and traffic multiplier."""
+    distance = haversine_distance_matrix(lats, lons)
+    duration, delay = travel_time_arrays(
+        distance, VEHICLE_SPEEDS_KMH.get(vehicle_type, 20), traffic_multiplier
+    )
+    return CostMatrix(ids, distance, duration, delay)
+
+
+def build_haversine_matrices(ids: Sequence[str], lats: Sequence[float], lons: Sequence[float],
+                             vehicle_types: Sequence[str] = tuple(VEHICLE_SPEEDS_KMH),
+                             traffic_profiles: Sequence[str] = tuple(TRAFFIC_MULTIPLIERS)
+                             ) -> Dict[Tuple[str, str], CostMatrix]:
+    """
+    Build matrices for every (vehicle type, traffic profile) combination.
+    Distances are computed once and the distance array is shared by all results.
+    """
+    distance = haversine_distance_matrix(lats, lons)
+    matrices = {}
+    for vehicle_type in vehicle_types:
+        for profile in traffic_profiles:
+            duration, delay = travel_time_arrays(
+                distance, VEHICLE_SPEEDS_KMH.get(vehicle_type, 20), TRAFFIC_MULTIPLIERS[profile]
+            )
+            matrices[(vehicle_type, profile)] = CostMatrix(ids, distance, duration, delay)
+    return matrices
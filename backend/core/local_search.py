@@ -0,0 +1,799 @@
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from core.priority import PriorityPenalty
+from core.time_windows import TimeWindows
+from core.two_opt import TwoOptEngine
+
+EPSILON = 1e-9
+
+
+def rotated(count: int, start: int) -> Iterable[int]:
+    """range(count) starting at `start` and wrapping around."""
+    start = start % count if count else 0
+    return list(range(start, count)) + list(range(start))
+
+
+class LocalSearchOperator:
+    """
+    One neighbourhood of the variable-neighbourhood descent.
+    improve() looks for an improving move, applies it and returns True,
+    or returns False when the neighbourhood is locally optimal.
+
+    Scans resume at the route where the last improvement was found, and
+    intra-route operators skip routes that have not changed since they were
+    last found locally optimal, so a descent over many routes does not rescan
+    settled routes after every move.
+    """
+
+    name = "operator"
+    inter_route = False
+
+    def __init__(self):
+        self._start = 0
+        self._settled: Dict[int, int] = {}
+
+    def is_settled(self, search: "LocalSearch", r: int) -> bool:
+        return self._settled.get(r) == search.versions[r]
+
+    def settle(self, search: "LocalSearch", r: int):
+        self._settled[r] = search.versions[r]
+
+    def improve(self, search: "LocalSearch") -> bool:
+        raise NotImplementedError
+
+
+class TwoOptOperator(LocalSearchOperator):
+    """Intra-route segment reversal, run to a local optimum by TwoOptEngine."""
+
+    name = "2opt"
+
+    def __init__(self, neighbor_k: Optional[int] = None, dont_look_bits: bool = False):
+        super().__init__()
+        self.neighbor_k = neighbor_k
+        self.dont_look_bits = dont_look_bits
+
+    def improve(self, search: "LocalSearch") -> bool:
+        improved = False
+        for r, route in enumerate(search.routes):
+            if len(route) < 4 or self.is_settled(search, r):
+                continue
+            engine = TwoOptEngine(
+                search.cost,
+                neighbor_k=self.neighbor_k,
+                dont_look_bits=self.dont_look_bits,
+                symmetric=search.symmetric,
+                penalty=search.penalty
+            )
+            if search.windows is not None:
+                engine.move_filter = search.windows.reversal_filter(route, lambda: engine.moves_applied)
+            engine.improve(route)
+            search.evaluations += engine.evaluations
+            if engine.moves_applied:
+                search.moves[self.name] += engine.moves_applied - 1
+                search.route_changed(r)
+                improved = True
+            self.settle(search, r)
+        return improved
+
+
+class OrOptOperator(LocalSearchOperator):
+    """
+    Intra-route move of a chain of 1..max_chain consecutive stops to a better
+    position, optionally reversed. Chain length 1 is the intra-route relocate.
+    """
+
+    name = "or_opt"
+
+    def __init__(self, max_chain: int = 3):
+        super().__init__()
+        self.max_chain = max_chain
+
+    def improve(self, search: "LocalSearch") -> bool:
+        for r in rotated(len(search.routes), self._start):
+            if self.is_settled(search, r):
+                continue
+            if self._improve_route(search, r):
+                self._start = r
+                return True
+            self.settle(search, r)
+        return False
+
+    def _improve_route(self, search: "LocalSearch", r: int) -> bool:
+        cost = search.cost
+        order = np.asarray(search.routes[r], dtype=np.intp)
+        n = order.size
+        penalty = search.penalty
+        if penalty is not None:
+            urgency, urgency_at = penalty.prefix(order)
+        for length in range(1, self.max_chain + 1):
+            for s in range(1, n - length + 1):
+                chain = order[s:s + length]
+                first, last, prev = chain[0], chain[-1], order[s - 1]
+                has_next = s + length < n
+                removal = cost[prev, first] - (cost[prev, order[s + length]] - cost[last, order[s + length]]
+                                               if has_next else 0.0)
+
+                rest = np.concatenate((order[:s], order[s + length:]))
+                xs, ys, has_y = search.insertion_slots(rest)
+                base = np.where(has_y, -cost[xs, ys], 0.0)
+                delta = cost[xs, first] + np.where(has_y, cost[last, ys], 0.0) + base - removal
+                if penalty is not None:
+                    # Inserted after rest[p], the chain starts at position p + 1
+                    delta += penalty.chain_move(urgency, urgency_at, s, length, np.arange(1, rest.size + 1))
+                delta[s - 1] = np.inf  # original position
+                candidates = [(delta, False)]
+
+                if length > 1:
+                    internal = search.path_cost(chain)
+                    reversed_internal = search.path_cost(chain[::-1])
+                    reversed_delta = (cost[xs, last] + np.where(has_y, cost[first, ys], 0.0) + base - removal +
+                                      (reversed_internal - internal))
+                    if penalty is not None:
+                        reversed_delta += penalty.chain_move(
+                            urgency, urgency_at, s, length, np.arange(1, rest.size + 1), reverse=True
+                        )
+                    candidates.append((reversed_delta, True))
+
+                search.evaluations += sum(d.size for d, _ in candidates)
+                for values, reverse in candidates:
+                    moved = (chain[::-1] if reverse else chain).tolist()
+                    if search.windows is not None:
+                        values = np.where(search.chain_reachable(order, s, length, xs, moved[0]), values, np.inf)
+
+                    def keeps_windows(p: int) -> bool:
+                        # Re-simulate the stretch between the chain's old and new position
+                        if p < s:
+                            return search.replacement_ok(r, p + 1, s + length, moved + order[p + 1:s].tolist())
+                        return search.replacement_ok(r, s, p + length + 1,
+                                                     order[s + length:p + length + 1].tolist() + moved)
+
+                    p = search.best_move(values, keeps_windows)
+                    if p is not None:
+                        search.routes[r] = np.concatenate((rest[:p + 1], moved, rest[p + 1:])).tolist()
+                        search.route_changed(r)
+                        return True
+        return False
+
+
+class RelocateOperator(LocalSearchOperator):
+    """Inter-route move of a single stop into another route, subject to capacity."""
+
+    name = "relocate"
+    inter_route = True
+
+    def improve(self, search: "LocalSearch") -> bool:
+        if search.neighbors is not None:
+            return self._improve_granular(search)
+        cost = search.cost
+        for a in rotated(len(search.routes), self._start):
+            route_a = search.routes[a]
+            order_a = np.asarray(route_a, dtype=np.intp)
+            n = order_a.size
+            for s in range(1, n):
+                u = order_a[s]
+                prev = order_a[s - 1]
+                removal = cost[prev, u]
+                if s + 1 < n:
+                    removal += cost[u, order_a[s + 1]] - cost[prev, order_a[s + 1]]
+                if not search.removal_ok(prev, order_a[s + 1] if s + 1 < n else -1):
+                    continue
+                for b in range(len(search.routes)):
+                    if b == a or not search.fits(b, search.demand_of(u)):
+                        continue
+                    route_b = search.routes[b]
+                    xs, ys, has_y = search.insertion_slots(np.asarray(route_b, dtype=np.intp))
+                    delta = (cost[xs, u] + np.where(has_y, cost[u, ys] - cost[xs, ys], 0.0)) - removal
+                    if search.penalty is not None:
+                        delta += search.relocation_penalty(u, xs, np.full(xs.size, b))
+                    delta = np.where(search.insertion_ok(xs, [u], ys, has_y), delta, np.inf)
+                    search.evaluations += delta.size
+                    p = int(np.argmin(delta))
+                    if delta[p] < -EPSILON:
+                        del route_a[s]
+                        route_b.insert(p + 1, int(u))
+                        search.route_changed(a)
+                        search.route_changed(b)
+                        self._start = a
+                        return True
+        return False
+
+    def _improve_granular(self, search: "LocalSearch") -> bool:
+        """Insert each stop next to (before or after) one of its nearest stops, or into an empty route."""
+        cost = search.cost
+        for a in rotated(len(search.routes), self._start):
+            route_a = search.routes[a]
+            for s in range(1, len(route_a)):
+                u = route_a[s]
+                prev = route_a[s - 1]
+                removal = cost[prev, u]
+                if s + 1 < len(route_a):
+                    removal += cost[u, route_a[s + 1]] - cost[prev, route_a[s + 1]]
+                if not search.removal_ok(prev, route_a[s + 1] if s + 1 < len(route_a) else -1):
+                    continue
+
+                near = search.neighbors[u]
+                near = near[(search.route_of[near] != a) & (search.route_of[near] >= 0)]
+                # After x (x -> u -> succ x) and before x (pred x -> u -> x)
+                after_y = search.succ[near]
+                has_y = after_y >= 0
+                after_y = np.where(has_y, after_y, near)
+                xs = np.concatenate((near, search.pred[near]))
+                ys = np.concatenate((after_y, near))
+                has_y = np.concatenate((has_y, np.ones(near.size, dtype=bool)))
+                targets = np.concatenate((search.route_of[near], search.route_of[near]))
+                positions = np.concatenate((search.pos[near] + 1, search.pos[near]))
+                delta = cost[xs, u] + np.where(has_y, cost[u, ys] - cost[xs, ys], 0.0) - removal
+                if search.penalty is not None:
+                    delta += search.relocation_penalty(u, xs, targets)
+                delta = np.where(search.insertion_ok(xs, [u], ys, has_y), delta, np.inf)
+
+                empty = [b for b in search.empty_routes if b != a]
+                if empty:
+                    depots = np.asarray([search.routes[b][0] for b in empty], dtype=np.intp)
+                    into_empty = cost[depots, u] - removal
+                    if search.penalty is not None:
+                        into_empty += search.relocation_penalty(u, depots, np.asarray(empty, dtype=np.intp))
+                    into_empty = np.where(search.insertion_ok(depots, [u], depots, False), into_empty, np.inf)
+                    delta = np.concatenate((delta, into_empty))
+                    targets = np.concatenate((targets, np.asarray(empty, dtype=np.intp)))
+                    positions = np.concatenate((positions, np.ones(len(empty), dtype=np.intp)))
+
+                if not delta.size:
+                    continue
+                loads = np.asarray(search.loads)[targets]
+                feasible = loads + search.demand_of(u) <= search.capacity_array(targets) + EPSILON
+                delta = np.where(feasible, delta, np.inf)
+                search.evaluations += delta.size
+                k = int(np.argmin(delta))
+                if delta[k] < -EPSILON:
+                    b = int(targets[k])
+                    del route_a[s]
+                    search.routes[b].insert(int(positions[k]), int(u))
+                    search.route_changed(a)
+                    search.route_changed(b)
+                    self._start = a
+                    return True
+        return False
+
+
+class SwapOperator(LocalSearchOperator):
+    """Exchange of two stops, within a route or between two routes."""
+
+    name = "swap"
+
+    def improve(self, search: "LocalSearch") -> bool:
+        return self._improve_intra(search) or (len(search.routes) > 1 and self._improve_inter(search))
+
+    def _improve_intra(self, search: "LocalSearch") -> bool:
+        cost = search.cost
+        for r, route in enumerate(search.routes):
+            if self.is_settled(search, r):
+                continue
+            order = np.asarray(route, dtype=np.intp)
+            n = order.size
+            for i in range(1, n - 1):
+                u, pu, nu = order[i], order[i - 1], order[i + 1]
+                js = np.arange(i + 1, n)
+                v = order[js]
+                pv = order[js - 1]
+                has_nv = js + 1 < n
+                nv = order[np.minimum(js + 1, n - 1)]
+                old = cost[pu, u] + cost[u, nu] + cost[pv, v] + np.where(has_nv, cost[v, nv], 0.0)
+                new = cost[pu, v] + cost[v, nu] + cost[pv, u] + np.where(has_nv, cost[u, nv], 0.0)
+                delta = new - old
+                # Adjacent pair: pu -> u -> nu -> nv becomes pu -> nu -> u -> nv
+                delta[0] = (cost[pu, nu] + cost[nu, u] - cost[pu, u] - cost[u, nu] +
+                            (cost[u, nv[0]] - cost[nu, nv[0]] if has_nv[0] else 0.0))
+                if search.penalty is not None:
+                    urgency = search.penalty.urgency
+                    delta += search.penalty.swap(urgency[u], urgency[v], i, js)
+                search.evaluations += delta.size
+
+                def keeps_windows(k: int) -> bool:
+                    j = i + 1 + k
+                    return search.replacement_ok(r, i, j + 1, [route[j]] + route[i + 1:j] + [route[i]])
+
+                k = search.best_move(delta, keeps_windows)
+                if k is not None:
+                    j = i + 1 + k
+                    route[i], route[j] = route[j], route[i]
+                    search.route_changed(r)
+                    return True
+            self.settle(search, r)
+        return False
+
+    def _improve_inter(self, search: "LocalSearch") -> bool:
+        if search.neighbors is not None:
+            return self._improve_inter_granular(search)
+        cost = search.cost
+        for a in rotated(len(search.routes), self._start):
+            route_a = search.routes[a]
+            order_a = np.asarray(route_a, dtype=np.intp)
+            for s in range(1, order_a.size):
+                u, pu = order_a[s], order_a[s - 1]
+                has_nu = s + 1 < order_a.size
+                nu = order_a[s + 1] if has_nu else u
+                out_u = cost[pu, u] + (cost[u, nu] if has_nu else 0.0)
+                for b in range(a + 1, len(search.routes)):
+                    order_b = np.asarray(search.routes[b], dtype=np.intp)
+                    m = order_b.size
+                    if m < 2:
+                        continue
+                    ts = np.arange(1, m)
+                    v = order_b[ts]
+                    pv = order_b[ts - 1]
+                    has_nv = ts + 1 < m
+                    nv = order_b[np.minimum(ts + 1, m - 1)]
+                    feasible = search.swap_fits(a, b, search.demand_of(u), search.demand_array(v))
+                    in_a = cost[pu, v] + (cost[v, nu] if has_nu else 0.0) - out_u
+                    in_b = (cost[pv, u] + np.where(has_nv, cost[u, nv], 0.0) -
+                            cost[pv, v] - np.where(has_nv, cost[v, nv], 0.0))
+                    feasible &= search.insertion_ok(pu, [v], nu, has_nu)
+                    feasible &= search.insertion_ok(pv, [u], nv, has_nv)
+                    delta = in_a + in_b
+                    if search.penalty is not None:
+                        delta += search.penalty.swap(search.penalty.urgency[u], search.penalty.urgency[v], s, ts)
+                    delta = np.where(feasible, delta, np.inf)
+                    search.evaluations += delta.size
+                    k = int(np.argmin(delta))
+                    if delta[k] < -EPSILON:
+                        t = k + 1
+                        route_b = search.routes[b]
+                        route_a[s], route_b[t] = route_b[t], route_a[s]
+                        search.route_changed(a)
+                        search.route_changed(b)
+                        self._start = a
+                        return True
+        return False
+
+    def _improve_inter_granular(self, search: "LocalSearch") -> bool:
+        """Swap each stop with one of its nearest stops on another route."""
+        cost = search.cost
+        for a in rotated(len(search.routes), self._start):
+            route_a = search.routes[a]
+            for s in range(1, len(route_a)):
+                u = route_a[s]
+                pu = route_a[s - 1]
+                has_nu = s + 1 < len(route_a)
+                nu = route_a[s + 1] if has_nu else u
+
+                v = search.neighbors[u]
+                v = v[(search.route_of[v] != a) & (search.route_of[v] >= 0)]
+                if not v.size:
+                    continue
+                b = search.route_of[v]
+                pv = search.pred[v]
+                nv = search.succ[v]
+                has_nv = nv >= 0
+                nv = np.where(has_nv, nv, v)
+
+                demand_u = search.demand_of(u)
+                demand_v = search.demand_array(v)
+                loads_b = np.asarray(search.loads)[b]
+                feasible = ((search.loads[a] - demand_u + demand_v <= search.capacity_of(a) + EPSILON) &
+                            (loads_b - demand_v + demand_u <= search.capacity_array(b) + EPSILON))
+                in_a = (cost[pu, v] + (cost[v, nu] if has_nu else 0.0) -
+                        cost[pu, u] - (cost[u, nu] if has_nu else 0.0))
+                in_b = (cost[pv, u] + np.where(has_nv, cost[u, nv], 0.0) -
+                        cost[pv, v] - np.where(has_nv, cost[v, nv], 0.0))
+                feasible &= search.insertion_ok(pu, [v], nu, has_nu)
+                feasible &= search.insertion_ok(pv, [u], nv, has_nv)
+                delta = in_a + in_b
+                if search.penalty is not None:
+                    delta += search.penalty.swap(search.penalty.urgency[u], search.penalty.urgency[v],
+                                                 s, search.pos[v])
+                delta = np.where(feasible, delta, np.inf)
+                search.evaluations += delta.size
+                k = int(np.argmin(delta))
+                if delta[k] < -EPSILON:
+                    rb = int(b[k])
+                    t = int(search.pos[v[k]])
+                    route_b = search.routes[rb]
+                    route_a[s], route_b[t] = route_b[t], route_a[s]
+                    search.route_changed(a)
+                    search.route_changed(rb)
+                    self._start = a
+                    return True
+        return False
+
+
+class TwoOptStarOperator(LocalSearchOperator):
+    """
+    Inter-route tail exchange: A[:i+1] + B[j+1:] and B[:j+1] + A[i+1:].
+    Tails keep their direction, so the delta is exact on asymmetric matrices.
+    """
+
+    name = "2opt_star"
+    inter_route = True
+
+    def improve(self, search: "LocalSearch") -> bool:
+        if search.neighbors is not None:
+            return self._improve_granular(search)
+        cost = search.cost
+        for a in rotated(len(search.routes), self._start):
+            order_a = np.asarray(search.routes[a], dtype=np.intp)
+            prefix_a = search.prefix_loads(order_a)
+            for b in range(a + 1, len(search.routes)):
+                order_b = np.asarray(search.routes[b], dtype=np.intp)
+                prefix_b = search.prefix_loads(order_b)
+                m = order_b.size
+                js = np.arange(m)
+                has_bn = js + 1 < m
+                bj = order_b
+                bn = order_b[np.minimum(js + 1, m - 1)]
+                for i in range(order_a.size):
+                    has_an = i + 1 < order_a.size
+                    ai = order_a[i]
+                    an = order_a[i + 1] if has_an else ai
+                    delta = (np.where(has_bn, cost[ai, bn] - cost[bj, bn], 0.0) +
+                             ((cost[bj, an] - cost[ai, an]) if has_an else 0.0))
+                    if search.penalty is not None:
+                        delta += search.tail_exchange_penalty(a, ai, np.full(m, b), order_b)
+                    load_a = prefix_a[i] + (prefix_b[-1] - prefix_b)
+                    load_b = prefix_b + (prefix_a[-1] - prefix_a[i])
+                    feasible = (load_a <= search.capacity_of(a) + EPSILON) & (load_b <= search.capacity_of(b) + EPSILON)
+                    if not has_an:
+                        feasible &= has_bn  # both tails empty is a no-op
+                    # Each tail keeps its own slack once it follows the other route's head
+                    feasible &= search.insertion_ok(ai, [], bn, has_bn)
+                    feasible &= search.insertion_ok(bj, [], an, has_an)
+                    delta = np.where(feasible, delta, np.inf)
+                    search.evaluations += delta.size
+                    j = int(np.argmin(delta))
+                    if delta[j] < -EPSILON:
+                        route_a, route_b = search.routes[a], search.routes[b]
+                        search.routes[a] = route_a[:i + 1] + route_b[j + 1:]
+                        search.routes[b] = route_b[:j + 1] + route_a[i + 1:]
+                        search.route_changed(a)
+                        search.route_changed(b)
+                        self._start = a
+                        return True
+        return False
+
+    def _improve_granular(self, search: "LocalSearch") -> bool:
+        """Exchange tails so that a stop is followed by one of its nearest stops on another route."""
+        cost = search.cost
+        for a in rotated(len(search.routes), self._start):
+            route_a = search.routes[a]
+            for i in range(1, len(route_a)):
+                ai = route_a[i]
+                has_an = i + 1 < len(route_a)
+                an = route_a[i + 1] if has_an else ai
+
+                bn = search.neighbors[ai]
+                bn = bn[(search.route_of[bn] != a) & (search.route_of[bn] >= 0)]
+                if not bn.size:
+                    continue
+                b = search.route_of[bn]
+                bj = search.pred[bn]
+                delta = cost[ai, bn] - cost[bj, bn] + ((cost[bj, an] - cost[ai, an]) if has_an else 0.0)
+                if search.penalty is not None:
+                    delta += search.tail_exchange_penalty(a, ai, b, bj)
+
+                # Loads after the exchange, from loads carried up to ai and up to bj
+                head_a = search.prefix_load[ai]
+                head_b = np.where(search.pos[bn] > 1, search.prefix_load[bj], 0.0)
+                loads_b = np.asarray(search.loads)[b]
+                load_a = head_a + (loads_b - head_b)
+                load_b = head_b + (search.loads[a] - head_a)
+                feasible = ((load_a <= search.capacity_of(a) + EPSILON) &
+                            (load_b <= search.capacity_array(b) + EPSILON))
+                # Each tail keeps its own slack once it follows the other route's head
+                feasible &= search.insertion_ok(ai, [], bn, True)
+                feasible &= search.insertion_ok(bj, [], an, has_an)
+                delta = np.where(feasible, delta, np.inf)
+                search.evaluations += delta.size
+                k = int(np.argmin(delta))
+                if delta[k] < -EPSILON:
+                    rb = int(b[k])
+                    j = int(search.pos[bn[k]]) - 1
+                    route_b = search.routes[rb]
+                    search.routes[a] = route_a[:i + 1] + route_b[j + 1:]
+                    search.routes[rb] = route_b[:j + 1] + route_a[i + 1:]
+                    search.route_changed(a)
+                    search.route_changed(rb)
+                    self._start = a
+                    return True
+        return False
+
+
+def default_operators() -> List[LocalSearchOperator]:
+    """Neighbourhoods in VND order: cheapest and most productive first."""
+    return [TwoOptOperator(), OrOptOperator(), SwapOperator(), RelocateOperator(), TwoOptStarOperator()]
+
+
+class LocalSearch:
+    """
+    Variable-neighbourhood descent over one or more open routes.
+
+    Each route is a list of cost-matrix indices starting at its depot.
+    Every operator scores moves as O(1) deltas on the cost matrix
+    (vectorized per anchor) and capacity is checked from route loads.
+    After any improvement the descent restarts from the first operator; it
+    stops at a local optimum of all neighbourhoods or when the time budget
+    runs out.
+
+    With neighbor_k set, inter-route moves are granular: a stop is only
+    relocated next to, swapped with, or linked by a tail exchange to one of
+    its neighbor_k nearest stops (relocation into empty routes is always
+    tried). Each anchor then costs O(k), which keeps large fleets tractable.
+
+    With time windows, every stop keeps its service start and forward time
+    slack. Inter-route moves only insert stops and reconnect route tails, so
+    they are checked in O(1) per candidate against that slack; intra-route
+    moves re-simulate just the reordered stretch, and only for improving
+    candidates. No move may make a stop later than its window end (or, for
+    a stop that is already late, later than it currently is).
+
+    With a PriorityPenalty the objective is travel cost plus the penalty of
+    every route. Each stop keeps the urgency carried up to it along its
+    route, so every operator adds the penalty change of its moves in O(1).
+    """
+
+    # Improving candidates re-simulated per anchor before giving up on it
+    MAX_WINDOW_CHECKS = 32
+
+    def __init__(self, cost: np.ndarray, routes: List[List[int]],
+                 demand: Optional[np.ndarray] = None,
+                 capacities: Optional[Sequence[float]] = None,
+                 operators: Optional[List[LocalSearchOperator]] = None,
+                 time_budget_ms: Optional[float] = None,
+                 symmetric: Optional[bool] = None,
+                 neighbor_k: Optional[int] = None,
+                 windows: Optional[TimeWindows] = None,
+                 penalty: Optional[PriorityPenalty] = None):
+        # Deltas are summed in float64 so rounding cannot make a move and its inverse both improve
+        self.cost = np.asarray(cost, dtype=np.float64)
+        self.routes = [list(route) for route in routes]
+        self.demand = demand
+        self.capacities = list(capacities) if capacities is not None else None
+        self.operators = operators if operators is not None else default_operators()
+        self.time_budget_ms = time_budget_ms
+        self.symmetric = TwoOptEngine.is_symmetric(cost) if symmetric is None else symmetric
+
+        self.loads = [self._route_load(route) for route in self.routes]
+        self.versions = [0] * len(self.routes)
+
+        # Per-stop route, position, neighbours along the route and load carried so far
+        size = self.cost.shape[0]
+        self.route_of = np.full(size, -1, dtype=np.intp)
+        self.pos = np.zeros(size, dtype=np.intp)
+        self.pred = np.full(size, -1, dtype=np.intp)
+        self.succ = np.full(size, -1, dtype=np.intp)
+        self.prefix_load = np.zeros(size, dtype=np.float64)
+        self.empty_routes = set()
+
+        # Urgency carried up to each stop and per route (depots carry none)
+        self.penalty = penalty
+        if penalty is not None:
+            self.prefix_urgency = np.zeros(size, dtype=np.float64)
+            self.route_urgency = np.zeros(len(self.routes), dtype=np.float64)
+
+        # Per-stop service start, forward time slack and the latest allowed start
+        self.windows = windows
+        if windows is not None:
+            self.start_time = np.full(size, windows.departure)
+            self.slack = np.full(size, np.inf)
+            self.deadline = np.full(size, np.inf)
+        for r in range(len(self.routes)):
+            self._index_route(r)
+        self.neighbors = self._build_neighbors(neighbor_k) if neighbor_k else None
+
+        self.moves: Dict[str, int] = {op.name: 0 for op in self.operators}
+        self.evaluations = 0
+        self.iterations = 0
+        self.elapsed_ms = 0.0
+        self.timed_out = False
+
+    def _build_neighbors(self, k: int) -> np.ndarray:
+        """K nearest stops of every stop (rows indexed by matrix index)."""
+        stops = np.asarray(sorted({node for route in self.routes for node in route[1:]}), dtype=np.intp)
+        neighbors = np.full((self.cost.shape[0], 0), -1, dtype=np.intp)
+        if stops.size < 2:
+            return neighbors
+        k = min(k, stops.size - 1)
+        sub = self.cost[np.ix_(stops, stops)].copy()
+        np.fill_diagonal(sub, np.inf)
+        nearest = np.argpartition(sub, k - 1, axis=1)[:, :k]
+        neighbors = np.full((self.cost.shape[0], k), -1, dtype=np.intp)
+        neighbors[stops] = stops[nearest]
+        return neighbors
+
+    # Helpers shared by the operators
+
+    def demand_of(self, node) -> float:
+        return float(self.demand[node]) if self.demand is not None else 0.0
+
+    def demand_array(self, nodes: np.ndarray) -> np.ndarray:
+        if self.demand is None:
+            return np.zeros(len(nodes))
+        return self.demand[nodes]
+
+    def capacity_of(self, r: int) -> float:
+        return self.capacities[r] if self.capacities is not None else np.inf
+
+    def fits(self, r: int, extra: float) -> bool:
+        return self.loads[r] + extra <= self.capacity_of(r) + EPSILON
+
+    def swap_fits(self, a: int, b: int, demand_u: float, demand_v: np.ndarray) -> np.ndarray:
+        """Capacity feasibility of swapping u (in a) with each v (in b)."""
+        return ((self.loads[a] - demand_u + demand_v <= self.capacity_of(a) + EPSILON) &
+                (self.loads[b] - demand_v + demand_u <= self.capacity_of(b) + EPSILON))
+
+    def prefix_loads(self, order: np.ndarray) -> np.ndarray:
+        """Load carried by route[:k+1] for every k (the depot carries nothing)."""
+        loads = np.cumsum(self.demand_array(order), dtype=np.float64)
+        return loads - loads[0]
+
+    @staticmethod
+    def insertion_slots(order: np.ndarray):
+        """Insertion points after each position: (xs, ys, has_y) with ys padded at the end."""
+        xs = order
+        ys = np.append(order[1:], order[-1])
+        has_y = np.arange(order.size) < order.size - 1
+        return xs, ys, has_y
+
+    def path_cost(self, order: Sequence[int]) -> float:
+        order = np.asarray(order, dtype=np.intp)
+        if order.size < 2:
+            return 0.0
+        return float(self.cost[order[:-1], order[1:]].sum(dtype=np.float64))
+
+    def route_changed(self, r: int):
+        self.loads[r] = self._route_load(self.routes[r])
+        self.versions[r] += 1
+        self._index_route(r)
+        self.iterations += 1
+
+    def _index_route(self, r: int):
+        route = self.routes[r]
+        if len(route) < 2:
+            self.empty_routes.add(r)
+            if self.penalty is not None:
+                self.route_urgency[r] = 0.0
+            return
+        self.empty_routes.discard(r)
+        order = np.asarray(route, dtype=np.intp)
+        stops = order[1:]
+        self.route_of[stops] = r
+        self.pos[stops] = np.arange(1, order.size)
+        self.pred[stops] = order[:-1]
+        self.succ[stops[:-1]] = stops[1:]
+        self.succ[stops[-1]] = -1
+        self.prefix_load[stops] = np.cumsum(self.demand_array(stops), dtype=np.float64)
+        if self.penalty is not None:
+            self.prefix_urgency[stops] = np.cumsum(self.penalty.urgency[stops])
+            self.route_urgency[r] = self.prefix_urgency[stops[-1]]
+        if self.windows is not None:
+            self.windows.refresh(route, self.start_time, self.slack, self.deadline)
+
+    def relocation_penalty(self, u: int, xs: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """
+        Penalty change of moving stop u to just after each x (a stop or the
+        depot) of route targets: the stops after u's old place move up one
+        position, those after x move down one.
+        """
+        urgency = self.penalty.urgency[u]
+        removal = urgency * self.pos[u] + (self.route_urgency[self.route_of[u]] - self.prefix_urgency[u])
+        after_x = self.route_urgency[targets] - self.prefix_urgency[xs]
+        return self.penalty.weight * (urgency * (self.pos[xs] + 1) + after_x - removal)
+
+    def tail_exchange_penalty(self, a: int, ai: int, targets: np.ndarray, bjs: np.ndarray) -> np.ndarray:
+        """
+        Penalty change of exchanging the tail of route a after ai with the
+        tail of each route in targets after the matching bj: each tail moves
+        by the difference of the two cut positions.
+        """
+        i = self.pos[ai]
+        j = self.pos[bjs]
+        tail_a = self.route_urgency[a] - self.prefix_urgency[ai]
+        tail_b = self.route_urgency[targets] - self.prefix_urgency[bjs]
+        return self.penalty.weight * (i - j) * (tail_b - tail_a)
+
+    def insertion_ok(self, xs, nodes: List, ys, has_y) -> np.ndarray:
+        """
+        Window feasibility (O(1) per candidate) of placing `nodes` between
+        each x and y of the current routes; always True without windows.
+        """
+        if self.windows is None:
+            return np.asarray(True)
+        depart = self.start_time[xs] + self.windows.service[xs]
+        return self.windows.insertion_feasible(
+            depart, xs, nodes, ys, has_y, self.start_time, self.slack, self.deadline
+        )
+
+    def removal_ok(self, prev: int, nxt: int) -> bool:
+        """Whether the route still keeps its windows once the stop between prev and nxt (-1: none) leaves."""
+        if self.windows is None or nxt < 0:
+            return True
+        return bool(self.insertion_ok(prev, [], nxt, True))
+
+    def replacement_ok(self, r: int, lo: int, hi: int, nodes: Sequence[int]) -> bool:
+        """Exact window check of replacing routes[r][lo:hi] with nodes, in O(len(nodes))."""
+        return self.windows is None or self.windows.replacement_feasible(
+            self.routes[r], lo, hi, nodes, self.start_time, self.slack, self.deadline
+        )
+
+    def chain_reachable(self, order: np.ndarray, s: int, length: int, xs: np.ndarray, head: int) -> np.ndarray:
+        """
+        O(1) necessary window check of moving order[s:s + length] after each x
+        of the remaining route: the chain's new first stop, `head`, must be
+        reachable by its deadline. Stops before the chain keep their start;
+        stops after it start at most as much earlier as the removal saves.
+        """
+        windows = self.windows
+        chain = order[s:s + length]
+        saved = (windows.travel[order[s - 1], chain[0]] + windows.service[chain].sum() +
+                 windows.travel[chain[:-1], chain[1:]].sum())
+        if s + length < order.size:
+            saved += windows.travel[chain[-1], order[s + length]] - windows.travel[order[s - 1], order[s + length]]
+        begin = self.start_time[xs]
+        after = np.arange(xs.size) >= s
+        begin = np.where(after, np.maximum(windows.earliest[xs], begin - max(saved, 0.0)), begin)
+        return begin + windows.service[xs] + windows.travel[xs, head] <= self.deadline[head] + EPSILON
+
+    def best_move(self, delta: np.ndarray, check: Callable[[int], bool]) -> Optional[int]:
+        """
+        Index of the most improving candidate, or None. With windows, improving
+        candidates are tried in order of delta until `check` accepts one.
+        """
+        if self.windows is None:
+            k = int(np.argmin(delta))
+            return k if delta[k] < -EPSILON else None
+        improving = np.flatnonzero(delta < -EPSILON)
+        improving = improving[np.argsort(delta[improving], kind="stable")]
+        for k in improving[:self.MAX_WINDOW_CHECKS]:
+            if check(int(k)):
+                return int(k)
+        return None
+
+    def capacity_array(self, routes: np.ndarray) -> np.ndarray:
+        if self.capacities is None:
+            return np.full(routes.size, np.inf)
+        return np.asarray(self.capacities, dtype=np.float64)[routes]
+
+    def _route_load(self, route: List[int]) -> float:
+        if self.demand is None or len(route) < 2:
+            return 0.0
+        return float(self.demand[np.asarray(route[1:], dtype=np.intp)].sum())
+
+    def total_cost(self) -> float:
+        """Travel cost of all routes, plus their priority penalty when set."""
+        total = sum(self.path_cost(route) for route in self.routes)
+        if self.penalty is not None:
+            total += sum(self.penalty.route_penalty(route) for route in self.routes)
+        return total
+
+    def run(self) -> List[List[int]]:
+        """Run the descent and return the improved routes."""
+        started = time.perf_counter()
+        deadline = started + self.time_budget_ms / 1000.0 if self.time_budget_ms else None
+        operators = [op for op in self.operators if len(self.routes) > 1 or not op.inter_route]
+
+        k = 0
+        while k < len(operators):
+            if deadline is not None and time.perf_counter() >= deadline:
+                self.timed_out = True
+                break
+            operator = operators[k]
+            if operator.improve(self):
+                self.moves[operator.name] += 1
+                k = 0
+            else:
+                k += 1
+
+        self.elapsed_ms = (time.perf_counter() - started) * 1000
+        return self.routes
+
+    def stats(self) -> Dict:
+        return {
+            "iterations": self.iterations,
+            "improvements": sum(self.moves.values()),
+            "moves": dict(self.moves),
+            "evaluations": self.evaluations,
+            "elapsed_ms": round(self.elapsed_ms, 1),
+            "timed_out": self.timed_out
+        }
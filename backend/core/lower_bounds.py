@@ -0,0 +1,209 @@
+from typing import Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from core.candidate_costs import CandidateCosts
+from core.cost_matrix import CostMatrix
+from core.geo import haversine_pairs_km
+
+EPSILON = 1e-9
+
+
+def mst_weight(weights: np.ndarray, nodes: np.ndarray, degree: Optional[np.ndarray] = None) -> float:
+    """
+    Prim's minimum spanning tree weight over nodes of a dense symmetric
+    weight matrix, in O(n^2); adds tree degrees to degree when given.
+    """
+    if nodes.size <= 1:
+        return 0.0
+    sub = weights[np.ix_(nodes, nodes)]
+    in_tree = np.zeros(nodes.size, dtype=bool)
+    in_tree[0] = True
+    link = sub[0].copy()
+    source = np.zeros(nodes.size, dtype=np.intp)
+    link[0] = np.inf
+    total = 0.0
+    for _ in range(nodes.size - 1):
+        k = int(link.argmin())
+        total += link[k]
+        if degree is not None:
+            degree[nodes[k]] += 1
+            degree[nodes[source[k]]] += 1
+        in_tree[k] = True
+        link[k] = np.inf
+        closer = ~in_tree & (sub[k] < link)
+        link[closer] = sub[k][closer]
+        source[closer] = k
+    return float(total)
+
+
+class OneTreeBound:
+    """
+    1-tree lower bounds on open paths over a dense cost matrix.
+
+    A path from node l through every node of a set R is a spanning tree of
+    R plus one edge from l, so it costs at least the cheapest edge from l
+    into R plus a minimum spanning tree of R. Edge weights are the symmetric
+    min(c[i, j], c[j, i]), which keeps the bound valid on asymmetric costs.
+
+    Lagrangian node penalties p (Held and Karp) tighten it: with
+    c'[i, j] = c[i, j] + p[i] + p[j] any path costs at least
+    min c'[l, R] + MST'(R) - 2 * sum(p[R]) + min(p[R]), for every p.
+    ascend() searches p by subgradient ascent at the root, O(n^2) per step.
+    """
+
+    def __init__(self, cost: np.ndarray):
+        cost = np.asarray(cost, dtype=np.float64)
+        self.symmetric_cost = np.minimum(cost, cost.T)
+        self.penalties = np.zeros(cost.shape[0])
+        self._weights = self.symmetric_cost
+
+    def bound(self, last: int, remaining: np.ndarray, degree: Optional[np.ndarray] = None) -> float:
+        """Lower bound on the cheapest path from last through every node of remaining."""
+        if remaining.size == 0:
+            return 0.0
+        p = self.penalties
+        entry = self.symmetric_cost[last, remaining] + p[remaining]
+        k = int(entry.argmin())
+        if degree is not None:
+            degree[remaining[k]] += 1
+        tree = mst_weight(self._weights, remaining, degree)
+        return float(entry[k] + tree - 2.0 * p[remaining].sum() + p[remaining].min())
+
+    def set_penalties(self, penalties: np.ndarray):
+        self.penalties = penalties
+        self._weights = self.symmetric_cost + penalties[:, None] + penalties[None, :]
+
+    def ascend(self, upper: float, iterations: int = 50) -> float:
+        """
+        Subgradient ascent on the penalties of the path from node 0 through
+        every other node (degree 2 for every stop but the far end), with
+        Polyak steps towards upper, a known path cost. Keeps the best
+        penalties found and returns their bound.
+        """
+        n = self.symmetric_cost.shape[0]
+        remaining = np.arange(1, n)
+        best_bound = self.bound(0, remaining)
+        best_penalties = self.penalties.copy()
+        step = 2.0
+        for _ in range(iterations):
+            degree = np.zeros(n)
+            value = self.bound(0, remaining, degree)
+            if value > best_bound + EPSILON:
+                best_bound, best_penalties = value, self.penalties.copy()
+            gradient = degree[remaining] - 2.0
+            # The path's far end has degree 1; the min(p) term in the bound rewards one such node
+            gradient[int(self.penalties[remaining].argmin())] += 1.0
+            norm = float((gradient ** 2).sum())
+            if norm == 0.0:
+                break
+            penalties = self.penalties.copy()
+            penalties[remaining] += step * max(upper - value, EPSILON) / norm * gradient
+            self.set_penalties(penalties)
+            step *= 0.9
+        self.set_penalties(best_penalties)
+        return best_bound
+
+
+def held_karp_bound(cost: np.ndarray, upper: float, iterations: int = 50) -> float:
+    """
+    Held-Karp (Lagrangian 1-tree) lower bound on the open path from node 0
+    through every other node of cost, given the cost upper of any such path.
+    iterations=0 gives the plain 1-tree bound.
+    """
+    if cost.shape[0] <= 1:
+        return 0.0
+    return OneTreeBound(cost).ascend(upper, iterations)
+
+
+def candidate_degree_bound(costs: CandidateCosts, optimization_goal: str, start: int = 0) -> float:
+    """
+    Lower bound on the open path from start through every point of a
+    CandidateCosts, in O(N*K log(N*K)) without a dense matrix.
+
+    Every stop of a path has two incident edges (one at either end), so the
+    path costs at least half the sum, over all points, of each point's two
+    cheapest incident edges, less the larger one at start and at the
+    unknown far end. Incident edges are the candidate edges touching a
+    point (the cheaper direction), plus a floor for every other edge: those
+    are estimated from the coordinates and at least as long as the point's
+    K-th nearest neighbour, so they cost at least that neighbour's estimate.
+    """
+    n = len(costs)
+    k = costs.k
+    if n <= 1 or k == 0:
+        return 0.0
+    rows = np.repeat(np.arange(n), k)
+    cols = costs.neighbors.ravel()
+    # One entry per unordered pair, so an edge listed by both ends is not used twice at a point
+    low, high = np.minimum(rows, cols), np.maximum(rows, cols)
+    _, first = np.unique(low.astype(np.int64) * n + high, return_index=True)
+    low, high = low[first], high[first]
+    weight = np.minimum(costs.pair_costs(optimization_goal, low, high),
+                        costs.pair_costs(optimization_goal, high, low))
+
+    farthest = costs.neighbors[:, -1]
+    distance, duration, delay = costs.estimate(np.arange(n), farthest)
+    floor = distance.astype(np.float64) if optimization_goal != "time" else duration.astype(np.float64) + delay
+    # Neighbours are ranked on a local planar projection, the estimates on great-circle distance
+    floor *= 0.99
+
+    node = np.concatenate([low, high])
+    edge = np.concatenate([weight, weight])
+    order = np.lexsort((edge, node))
+    node, edge = node[order], edge[order]
+    starts = np.searchsorted(node, np.arange(n))
+    counts = np.bincount(node, minlength=n)
+    cheapest = np.full((n, 4), np.inf)
+    has_one = counts >= 1
+    has_two = counts >= 2
+    cheapest[has_one, 0] = edge[starts[has_one]]
+    cheapest[has_two, 1] = edge[starts[has_two] + 1]
+    cheapest[:, 2] = cheapest[:, 3] = floor
+    cheapest = np.sort(cheapest, axis=1)
+    first_edge, second_edge = cheapest[:, 0], cheapest[:, 1]
+
+    others = np.delete(second_edge, start)
+    total = first_edge.sum() + second_edge.sum() - second_edge[start] - others.max()
+    return float(max(total / 2.0, 0.0))
+
+
+def reload_radial_bound(costs: CandidateCosts, start: int, demand: np.ndarray, capacity: float) -> float:
+    """
+    Lower bound on any route from start that serves demand (indexed like
+    costs) in loads of at most capacity, returning to start to reload
+    between them. Every cost is at least the straight-line distance (road
+    distances from the API, estimates as Haversine times a detour factor of
+    at least 1), so a load that reaches a stop at Haversine distance r from
+    start and returns covers at least 2r, and so at least 2 * demand * r /
+    capacity summed over its stops. The last load need not return, which
+    saves at most the largest r.
+    """
+    stops = np.flatnonzero(demand > 0)
+    if stops.size == 0 or capacity <= 0:
+        return 0.0
+    radius = haversine_pairs_km(np.full(stops.size, costs.lats[start]), np.full(stops.size, costs.lons[start]),
+                                costs.lats[stops], costs.lons[stops], decimals=None).astype(np.float64)
+    # Slack for road distances, which are not measured on the Haversine sphere
+    radius *= 0.99
+    total = 2.0 * float(np.dot(demand[stops], radius)) / capacity - float(radius.max())
+    return max(total, 0.0)
+
+
+def route_lower_bound(distance_matrix: Union[CostMatrix, CandidateCosts], route: Sequence[int],
+                      optimization_goal: str = "distance", upper: Optional[float] = None,
+                      iterations: int = 50) -> Tuple[float, str]:
+    """
+    Lower bound on any open route from route[0] through the other points of
+    route, and the method used: on a CostMatrix the Held-Karp bound given
+    upper (the route's own cost will do), or the plain 1-tree without it or
+    with iterations=0; on CandidateCosts (which a route always covers in
+    full) the candidate degree bound.
+    """
+    if isinstance(distance_matrix, CandidateCosts):
+        return candidate_degree_bound(distance_matrix, optimization_goal, route[0]), "candidate_degree"
+    order = np.asarray(route, dtype=np.intp)
+    cost = distance_matrix.edge_costs(optimization_goal)[np.ix_(order, order)].astype(np.float64)
+    if upper is None or iterations == 0:
+        return held_karp_bound(cost, 0.0, 0), "one_tree"
+    return held_karp_bound(cost, upper, iterations), "held_karp"
@@ -0,0 +1,337 @@
+import math
+import random
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from core.local_search import LocalSearch, OrOptOperator, TwoOptOperator
+from core.priority import PriorityPenalty
+from core.two_opt import TwoOptEngine
+
+EPSILON = 1e-9
+
+
+def path_cost(cost: np.ndarray, route: List[int]) -> float:
+    order = np.asarray(route, dtype=np.intp)
+    if order.size < 2:
+        return 0.0
+    return float(cost[order[:-1], order[1:]].sum(dtype=np.float64))
+
+
+class AnytimeImprover:
+    """
+    Base class for improvers that run until a wall-clock deadline and always
+    return the best route seen. The first position of the route never moves
+    and the route is open, as in TwoOptEngine. With a PriorityPenalty the
+    objective (and every cost reported) includes its ordering penalty.
+    """
+
+    name = "anytime"
+
+    def __init__(self, cost: np.ndarray, time_limit_ms: float, seed: Optional[int] = None,
+                 symmetric: Optional[bool] = None, penalty: Optional[PriorityPenalty] = None):
+        self.cost = np.asarray(cost, dtype=np.float64)
+        self.time_limit_ms = time_limit_ms
+        self.rng = random.Random(seed)
+        self.symmetric = TwoOptEngine.is_symmetric(cost) if symmetric is None else symmetric
+        self.penalty = penalty
+        # The penalty in the local indices of the route being improved
+        self._local_penalty: Optional[PriorityPenalty] = None
+
+        self.iterations = 0
+        self.improvements = 0
+        self.elapsed_ms = 0.0
+        self.initial_cost = 0.0
+        self.best_cost = 0.0
+
+    def run(self, route: List[int]) -> List[int]:
+        raise NotImplementedError
+
+    def _localize(self, nodes: np.ndarray):
+        if self.penalty is not None:
+            self._local_penalty = self.penalty.subset(nodes)
+
+    def objective(self, cost: np.ndarray, route: List[int]) -> float:
+        """Travel cost of a route in local indices, plus its penalty."""
+        total = path_cost(cost, route)
+        if self._local_penalty is not None:
+            total += self._local_penalty.route_penalty(route)
+        return total
+
+    def stats(self) -> Dict:
+        return {
+            "iterations": self.iterations,
+            "improvements": self.improvements,
+            "elapsed_ms": round(self.elapsed_ms, 1),
+            "initial_cost": round(self.initial_cost, 3),
+            "best_cost": round(self.best_cost, 3)
+        }
+
+
+class SimulatedAnnealing(AnytimeImprover):
+    """
+    Simulated annealing over 2-opt reversals and Or-opt chain moves.
+
+    Moves are drawn from candidate lists: a random stop x and one of its
+    neighbour_k nearest stops y, so most proposals are plausible ones that
+    make x and y adjacent. The temperature follows a geometric schedule over
+    the time budget rather than the iteration count, so a longer budget simply
+    cools more slowly. It starts where a cheap uphill move (a low percentile
+    of sampled ones) is accepted half the time.
+    """
+
+    name = "simulated_annealing"
+
+    SAMPLE_MOVES = 500
+    START_PERCENTILE = 10
+    CHECK_EVERY = 128
+
+    def __init__(self, cost: np.ndarray, time_limit_ms: float, seed: Optional[int] = None,
+                 symmetric: Optional[bool] = None, max_chain: int = 3, neighbor_k: int = 8,
+                 final_temperature_ratio: float = 1e-2, penalty: Optional[PriorityPenalty] = None):
+        super().__init__(cost, time_limit_ms, seed, symmetric, penalty)
+        self.max_chain = max_chain
+        self.neighbor_k = neighbor_k
+        self.final_temperature_ratio = final_temperature_ratio
+        self._at = None
+        self._route: List[int] = []
+        self._pos: List[int] = []
+        self._neighbors: List[List[int]] = []
+        self._fwd = np.zeros(0)
+        self._bwd = np.zeros(0)
+        self._urgency = np.zeros(0)
+        self._urgency_at = np.zeros(0)
+
+    def _refresh(self):
+        """Positions, the penalty's prefix sums and (on asymmetric matrices) prefix costs along the route."""
+        order = np.asarray(self._route, dtype=np.intp)
+        pos = np.empty(order.size, dtype=np.intp)
+        pos[order] = np.arange(order.size)
+        self._pos = pos.tolist()
+        if self._local_penalty is not None:
+            self._urgency, self._urgency_at = self._local_penalty.prefix(order)
+        if self.symmetric:
+            return
+        cost = self._local_cost
+        self._fwd = np.concatenate(([0.0], np.cumsum(cost[order[:-1], order[1:]])))
+        self._bwd = np.concatenate(([0.0], np.cumsum(cost[order[1:], order[:-1]])))
+
+    def _reversal_delta(self, i: int, j: int) -> float:
+        """Cost change of reversing route[i:j]; j == n reverses the tail of the open path."""
+        route = self._route
+        at = self._at
+        a, b, c = route[i - 1], route[i], route[j - 1]
+        delta = at(a, c) - at(a, b)
+        if j < len(route):
+            e = route[j]
+            delta += at(b, e) - at(c, e)
+        if not self.symmetric:
+            delta += (self._bwd[j - 1] - self._bwd[i]) - (self._fwd[j - 1] - self._fwd[i])
+        if self._local_penalty is not None:
+            delta += float(self._local_penalty.reversal(self._urgency, self._urgency_at, i, j))
+        return delta
+
+    def _random_move(self):
+        """Draw a random candidate-list move and return (delta, move), or None."""
+        route = self._route
+        at = self._at
+        n = len(route)
+        rng = self.rng
+
+        x = rng.randrange(n)
+        y = rng.choice(self._neighbors[x])
+        px, py = self._pos[x], self._pos[y]
+
+        if rng.random() < 0.5:
+            # Reverse the segment after x up to y so that x -> y becomes an edge
+            if py > px + 1:
+                i, j = px + 1, py + 1
+            elif px > py + 1 and py >= 1:
+                # Or reverse from y up to just before x so that y -> x does
+                i, j = py, px
+            else:
+                return None
+            if j - i < 2:
+                return None
+            return self._reversal_delta(i, j), ("reverse", i, j)
+
+        # Move the chain starting at y to just after x, optionally reversed
+        length = rng.randint(1, self.max_chain)
+        s = py
+        if s < 1 or s + length > n or s <= px < s + length or px == s - 1:
+            return None
+        first, last, prev = route[s], route[s + length - 1], route[s - 1]
+        delta = -at(prev, first)
+        if s + length < n:
+            nxt = route[s + length]
+            delta += at(prev, nxt) - at(last, nxt)
+
+        # x keeps its place; the stop after it in the remaining route
+        q = px + 1
+        if q == s:
+            q += length
+        nxt_x = route[q] if q < n else None
+
+        reverse = length > 1 and rng.random() < 0.5
+        head, tail = (last, first) if reverse else (first, last)
+        delta += at(x, head)
+        if nxt_x is not None:
+            delta += at(tail, nxt_x) - at(x, nxt_x)
+        if reverse and not self.symmetric:
+            delta += ((self._bwd[s + length - 1] - self._bwd[s]) -
+                      (self._fwd[s + length - 1] - self._fwd[s]))
+        if self._local_penalty is not None:
+            target = px + 1 if px < s else px + 1 - length
+            delta += self._local_penalty.chain_move(self._urgency, self._urgency_at, s, length, target, reverse)
+        return delta, ("move", s, length, px, reverse)
+
+    def _apply(self, move):
+        route = self._route
+        if move[0] == "reverse":
+            _, i, j = move
+            route[i:j] = route[i:j][::-1]
+        else:
+            _, s, length, px, reverse = move
+            chain = route[s:s + length]
+            if reverse:
+                chain.reverse()
+            del route[s:s + length]
+            target = px + 1 if px < s else px + 1 - length
+            route[target:target] = chain
+        self._refresh()
+
+    def _initial_temperature(self) -> float:
+        uphill = []
+        for _ in range(self.SAMPLE_MOVES):
+            proposal = self._random_move()
+            if proposal is not None and proposal[0] > EPSILON:
+                uphill.append(proposal[0])
+        if not uphill:
+            return 1.0
+        return float(np.percentile(uphill, self.START_PERCENTILE)) / math.log(2)
+
+    def run(self, route: List[int]) -> List[int]:
+        started = time.perf_counter()
+
+        # Search on the submatrix of the route's nodes, in local indices
+        nodes = np.asarray(route, dtype=np.intp)
+        cost = self._local_cost = self.cost[np.ix_(nodes, nodes)]
+        self._at = cost.item
+        self._localize(nodes)
+        self._route = list(range(len(nodes)))
+        self._refresh()
+        current = self.objective(cost, self._route)
+        self.initial_cost = self.best_cost = current
+        best_route = list(self._route)
+
+        if len(self._route) >= 4:
+            k = min(self.neighbor_k, len(nodes) - 1)
+            masked = cost + np.diag(np.full(len(nodes), np.inf))
+            self._neighbors = np.argsort(masked, axis=1, kind="stable")[:, :k].tolist()
+
+            budget = self.time_limit_ms / 1000.0
+            t0 = self._initial_temperature()
+            temperature = t0
+            while True:
+                if self.iterations % self.CHECK_EVERY == 0:
+                    progress = (time.perf_counter() - started) / budget if budget > 0 else 1.0
+                    if progress >= 1.0:
+                        break
+                    temperature = t0 * self.final_temperature_ratio ** progress
+                self.iterations += 1
+
+                proposal = self._random_move()
+                if proposal is None:
+                    continue
+                delta, move = proposal
+                if delta < -EPSILON or (delta > 0 and self.rng.random() < math.exp(-delta / temperature)):
+                    self._apply(move)
+                    current += delta
+                    if current < self.best_cost - EPSILON:
+                        # Re-cost to keep accumulated rounding out of the best-so-far
+                        current = self.objective(cost, self._route)
+                        if current < self.best_cost - EPSILON:
+                            self.best_cost = current
+                            best_route = list(self._route)
+                            self.improvements += 1
+
+        self.elapsed_ms = (time.perf_counter() - started) * 1000
+        return nodes[best_route].tolist()
+
+
+class GuidedLocalSearch(AnytimeImprover):
+    """
+    Guided local search (Voudouris & Tsang): after each local optimum the
+    route edges with the highest cost / (1 + penalty) utility are penalized,
+    and 2-opt / Or-opt descend again on the augmented cost
+    cost + lambda * penalty. lambda = alpha * (cost of the first local optimum
+    per edge), so penalties are scaled to the instance.
+    """
+
+    name = "guided_local_search"
+
+    def __init__(self, cost: np.ndarray, time_limit_ms: float, seed: Optional[int] = None,
+                 symmetric: Optional[bool] = None, alpha: float = 0.2,
+                 penalty: Optional[PriorityPenalty] = None):
+        super().__init__(cost, time_limit_ms, seed, symmetric, penalty)
+        self.alpha = alpha
+
+    def run(self, route: List[int]) -> List[int]:
+        started = time.perf_counter()
+        deadline = started + self.time_limit_ms / 1000.0
+
+        # Search on the submatrix of the route's nodes, in local indices
+        nodes = np.asarray(route, dtype=np.intp)
+        cost = self.cost[np.ix_(nodes, nodes)]
+        self._localize(nodes)
+        current = list(range(len(nodes)))
+        self.initial_cost = self.best_cost = self.objective(cost, current)
+        best_route = list(current)
+
+        if len(current) >= 4:
+            augmented = cost.copy()
+            penalties = np.zeros_like(cost)
+            weight = None
+            while time.perf_counter() < deadline:
+                self.iterations += 1
+                remaining_ms = (deadline - time.perf_counter()) * 1000
+                search = LocalSearch(
+                    augmented, [current],
+                    operators=[TwoOptOperator(), OrOptOperator()],
+                    time_budget_ms=max(remaining_ms, 1.0),
+                    symmetric=self.symmetric,
+                    penalty=self._local_penalty
+                )
+                current = search.run()[0]
+
+                true_cost = self.objective(cost, current)
+                if true_cost < self.best_cost - EPSILON:
+                    self.best_cost = true_cost
+                    best_route = list(current)
+                    self.improvements += 1
+                if weight is None:
+                    weight = self.alpha * true_cost / (len(current) - 1)
+                if weight <= 0:
+                    break
+
+                # Penalize the edges with maximum utility
+                order = np.asarray(current, dtype=np.intp)
+                src, dst = order[:-1], order[1:]
+                utility = cost[src, dst] / (1.0 + penalties[src, dst])
+                worst = utility >= utility.max() - EPSILON
+                src, dst = src[worst], dst[worst]
+                penalties[src, dst] += 1
+                augmented[src, dst] += weight
+                if self.symmetric:
+                    penalties[dst, src] += 1
+                    augmented[dst, src] += weight
+
+        self.elapsed_ms = (time.perf_counter() - started) * 1000
+        return nodes[best_route].tolist()
+
+
+IMPROVERS = {
+    SimulatedAnnealing.name: SimulatedAnnealing,
+    GuidedLocalSearch.name: GuidedLocalSearch
+}
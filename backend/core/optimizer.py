@@ -1,8 +1,26 @@
-import heapq
 import math
-from typing import List, Dict, Tuple, Optional
-from dataclasses import dataclass
-import json
+import time
+from datetime import datetime
+from typing import List, Dict, Tuple, Optional, Union
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from core.analytics import count_inversions, priority_adherence
+from core.candidate_costs import CandidateCosts
+from core.candidate_search import CandidateSearch
+from core.cost_matrix import CostMatrix
+from core.exact import BranchAndBound, held_karp
+from core.fleet import assign_routes, cheapest_insertion, clarke_wright, split_trips
+from core.local_search import LocalSearch
+from core.lower_bounds import reload_radial_bound, route_lower_bound
+from core.metaheuristics import IMPROVERS
+from core.priority import PriorityPenalty
+from core.geo import TRAFFIC_MULTIPLIERS, build_haversine_matrix, haversine_km, traffic_bucket
+from core.time_windows import TimeWindows, format_clock, parse_clock, time_window_insertion
+from core.tracing import Trace
+from core.travel_time import TimeDependentTravel, TrafficProfile
+from core.two_opt import TwoOptEngine
 
 @dataclass
 class DeliveryPoint:
@@ -36,7 +54,27 @@ class OptimizedRoute:
     total_distance_km: float
     total_time_minutes: int
     estimated_fuel_cost: float
-    optimization_score: float
+    # None when the route was built without analytics
+    optimization_score: Optional[float]
+    search_stats: Optional[Dict] = None
+    schedule: List[Dict] = field(default_factory=list)
+    time_window_violations: List[Dict] = field(default_factory=list)
+    # Stage timings of the solve when traced: [{"name", "duration_ms"}]
+    spans: List[Dict] = field(default_factory=list)
+    # Proven lower bound on the distance of any route through the same stops, and how it was found
+    lower_bound_km: Optional[float] = None
+    lower_bound_method: Optional[str] = None
+    # Totals of the stops driven in request order, the default baseline for savings
+    baseline: Optional[Dict] = None
+
+@dataclass
+class FleetPlan:
+    vehicles: List[Vehicle]
+    routes: List[OptimizedRoute]
+    loads: List[float]
+    additional_vehicles: int = 0
+    unassigned: List[str] = field(default_factory=list)
+    search_stats: Optional[Dict] = None
 
 class RouteOptimizer:
     def __init__(self):
@@ -56,77 +94,132 @@ class RouteOptimizer:
             "van": 20,
             "truck": 15
         }
+        # Wall-clock budgets for the improvement phase after 2-opt
+        self.local_search_time_budget_ms = 1000
+        self.metaheuristic_time_limit_ms = 2000
+        self.fleet_time_limit_ms = 2000
+        # Candidate list size for savings pairs and inter-route moves on fleets
+        self.fleet_neighbor_k = 20
+        # Budget for re-optimizing the routes along one cluster boundary of a decomposed fleet
+        self.boundary_repair_time_ms = 500
+        # Minutes spent at each stop, used for ETAs and time windows
+        self.service_time_minutes = 5
+        # Beyond this many points, single routes are solved on K-nearest candidate edges only
+        self.large_instance_points = 1500
+        self.candidate_neighbor_k = 16
+        self.candidate_time_budget_ms = 10000
+        # Exact mode: Held-Karp up to held_karp_max_stops, branch-and-bound up to exact_max_stops
+        self.held_karp_max_stops = 16
+        self.exact_max_stops = 40
+        self.exact_time_limit_ms = 5000
+        # Route scores use the Held-Karp bound up to this many stops, the plain 1-tree beyond
+        self.lower_bound_ascent_stops = 200
+        self.lower_bound_iterations = 30
+        # Default priority weights swept by priority_tradeoff()
+        self.tradeoff_weights = [0.0, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0]
+        # Re-linearizations of time-dependent travel times after the first solve
+        self.time_dependent_rounds = 3
 
     def calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """
         Calculate the Haversine distance between two points on Earth.
         Returns distance in kilometers.
         """
-        R = 6371  # Earth's radius in kilometers
-
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        delta_lat = math.radians(lat2 - lat1)
-        delta_lon = math.radians(lon2 - lon1)
-
-        a = (math.sin(delta_lat / 2) ** 2 +
-             math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-        return R * c
+        return haversine_km(lat1, lon1, lat2, lon2)
 
     def build_distance_matrix(self, points: List[DeliveryPoint],
-                            external_matrix: Optional[Dict] = None) -> Dict[str, Dict[str, Dict]]:
+                            external_matrix: Optional[Union[CostMatrix, Dict]] = None,
+                            vehicle_type: str = "van",
+                            traffic_multiplier: Optional[float] = None) -> CostMatrix:
         """
         Build a distance matrix between all points.
-        Uses external matrix if provided, otherwise calculates Haversine distances.
-        """
-        matrix = {}
-
-        for i, point1 in enumerate(points):
-            matrix[point1.id] = {}
-            for j, point2 in enumerate(points):
-                if i == j:
-                    matrix[point1.id][point2.id] = {
-                        "distance_km": 0.0,
-                        "duration_minutes": 0,
-                        "traffic_delay_minutes": 0
-                    }
-                else:
-                    # Use external matrix if available
-                    if external_matrix and point1.id in external_matrix and point2.id in external_matrix[point1.id]:
-                        matrix[point1.id][point2.id] = external_matrix[point1.id][point2.id]
-                    else:
-                        # Calculate Haversine distance
-                        distance = self.calculate_distance(
-                            point1.lat, point1.lon, point2.lat, point2.lon
-                        )
-                        # Estimate duration based on vehicle type (default to van)
-                        duration = (distance / 20) * 60  # 20 km/h average speed
-                        matrix[point1.id][point2.id] = {
-                            "distance_km": distance,
-                            "duration_minutes": int(duration),
-                            "traffic_delay_minutes": int(duration * 0.2)  # 20% traffic delay
-                        }
+        Uses external matrix entries where available, otherwise vectorized
+        Haversine distances with time-of-day traffic delay.
+        """
+        if traffic_multiplier is None:
+            traffic_multiplier = TRAFFIC_MULTIPLIERS[traffic_bucket()]
+
+        ids = [p.id for p in points]
+        matrix = build_haversine_matrix(
+            ids,
+            [p.lat for p in points],
+            [p.lon for p in points],
+            vehicle_type=vehicle_type,
+            traffic_multiplier=traffic_multiplier
+        )
+
+        if isinstance(external_matrix, CostMatrix):
+            # Copy the block of rows/columns shared with the external matrix
+            local = [k for k, point_id in enumerate(ids) if point_id in external_matrix]
+            if local:
+                remote = external_matrix.indices([ids[k] for k in local])
+                dst = np.ix_(local, local)
+                src = np.ix_(remote, remote)
+                matrix.distance_km[dst] = external_matrix.distance_km[src]
+                matrix.duration_minutes[dst] = external_matrix.duration_minutes[src]
+                matrix.traffic_delay_minutes[dst] = external_matrix.traffic_delay_minutes[src]
+        elif external_matrix:
+            for i, from_id in enumerate(ids):
+                row = external_matrix.get(from_id, {})
+                for j, to_id in enumerate(ids):
+                    if i != j and to_id in row:
+                        matrix.distance_km[i, j] = row[to_id]["distance_km"]
+                        matrix.duration_minutes[i, j] = row[to_id]["duration_minutes"]
+                        matrix.traffic_delay_minutes[i, j] = row[to_id]["traffic_delay_minutes"]
 
         return matrix
 
-    def calculate_route_cost(self, route: List[str], distance_matrix: Dict,
-                           vehicle: Vehicle, optimization_goal: str) -> float:
+    def ensure_cost_matrix(self, points: List[DeliveryPoint],
+                           distance_matrix: Optional[Union[CostMatrix, Dict]],
+                           vehicle_type: str = "van") -> CostMatrix:
         """
-        Calculate the total cost of a route based on optimization goal.
+        Return a CostMatrix covering the points, converting legacy nested
+        dicts and filling in missing pairs as needed.
         """
-        total_distance = 0.0
-        total_time = 0
-        total_fuel_cost = 0.0
+        if isinstance(distance_matrix, CostMatrix) and all(p.id in distance_matrix for p in points):
+            return distance_matrix
+        return self.build_distance_matrix(points, distance_matrix, vehicle_type=vehicle_type)
 
-        for i in range(len(route) - 1):
-            from_point = route[i]
-            to_point = route[i + 1]
+    def build_candidate_costs(self, points: List[DeliveryPoint], vehicle_type: str = "van",
+                              traffic_multiplier: Optional[float] = None) -> CandidateCosts:
+        """
+        Haversine costs for each point's candidate_neighbor_k nearest
+        neighbours only, found with a grid index: O(N * K) time and memory.
+        """
+        if traffic_multiplier is None:
+            traffic_multiplier = TRAFFIC_MULTIPLIERS[traffic_bucket()]
+        return CandidateCosts.from_points(
+            [p.id for p in points], [p.lat for p in points], [p.lon for p in points],
+            self.candidate_neighbor_k, vehicle_type=vehicle_type, traffic_multiplier=traffic_multiplier
+        )
 
-            segment_data = distance_matrix[from_point][to_point]
-            total_distance += segment_data["distance_km"]
-            total_time += segment_data["duration_minutes"] + segment_data["traffic_delay_minutes"]
+    def candidate_route(self, points: List[DeliveryPoint], start_point: DeliveryPoint,
+                        costs: CandidateCosts, optimization_goal: str, algorithm: str = "vnd",
+                        time_budget_ms: Optional[float] = None) -> Tuple[List[int], Dict]:
+        """
+        Build and improve a route on candidate edges: nearest neighbour over
+        the candidate lists, then 2-opt ("2opt") or 2-opt with Or-opt (every
+        other algorithm) restricted to candidate moves. Returns the route as
+        indices and search stats.
+        """
+        search = CandidateSearch(
+            costs, optimization_goal,
+            time_budget_ms=time_budget_ms if time_budget_ms is not None else self.candidate_time_budget_ms,
+            or_opt=algorithm != "2opt"
+        )
+        route = search.nearest_neighbor(costs.index[start_point.id], costs.indices([p.id for p in points]))
+        route = search.improve(route)
+        neighbourhood = "2opt" if algorithm == "2opt" else "vnd"
+        return route, {"algorithm": f"candidate_nearest_neighbor_with_{neighbourhood}", **search.stats()}
+
+    def calculate_route_cost(self, route: List[int], distance_matrix: CostMatrix,
+                           vehicle: Vehicle, optimization_goal: str) -> float:
+        """
+        Calculate the total cost of a route (matrix indices) based on optimization goal.
+        """
+        totals = distance_matrix.route_totals(route)
+        total_distance = totals["distance_km"]
+        total_time = totals["duration_minutes"] + totals["traffic_delay_minutes"]
 
         # Calculate fuel cost
         total_fuel_cost = (total_distance / vehicle.fuel_efficiency) * self.fuel_price_per_liter
@@ -154,41 +247,104 @@ class RouteOptimizer:
 
         return total_capacity_needed <= vehicle_capacity
 
-    def nearest_neighbor_tsp(self, points: List[DeliveryPoint], start_point: DeliveryPoint,
-                           distance_matrix: Dict, vehicle: Vehicle, optimization_goal: str) -> List[str]:
+    def uses_candidate_costs(self, all_points: List[DeliveryPoint]) -> bool:
         """
-        Solve TSP using nearest neighbor heuristic.
+        Whether a route through all_points (start location first) is solved
+        on candidate edges: more than large_instance_points and no windows.
         """
-        all_points = [start_point] + points
-        unvisited = set(p.id for p in points)
-        route = [start_point.id]
-        current = start_point.id
-
-        while unvisited:
-            nearest = None
-            min_cost = float('inf')
+        return len(all_points) > self.large_instance_points and not any(
+            p.time_window_start or p.time_window_end for p in all_points[1:]
+        )
 
-            for point_id in unvisited:
-                cost = distance_matrix[current][point_id]["distance_km"]
-                if optimization_goal == "time":
-                    cost = (distance_matrix[current][point_id]["duration_minutes"] +
-                           distance_matrix[current][point_id]["traffic_delay_minutes"])
-                elif optimization_goal == "fuel":
-                    cost = (distance_matrix[current][point_id]["distance_km"] /
-                           vehicle.fuel_efficiency) * self.fuel_price_per_liter
+    def check_route_request(self, delivery_points: List[DeliveryPoint], vehicle: Vehicle,
+                            optimization_goal: str = "time", algorithm: str = "vnd",
+                            priority_weight: float = 0.0, traffic_profile: Optional[TrafficProfile] = None,
+                            candidates: bool = False):
+        """
+        Raise ValueError for a single-route request that cannot be solved,
+        so callers can reject it before fetching travel costs. On a full
+        matrix all stops must fit one vehicle load. On candidate edges the
+        vehicle reloads at the start location between trips (reload_trips),
+        so each stop only has to fit on its own, but time windows, exact
+        mode, priority weights and time-dependent travel are unavailable.
+        """
+        if algorithm not in ("2opt", "vnd", "exact") and algorithm not in IMPROVERS:
+            raise ValueError(f"Unknown algorithm: {algorithm}")
+        if priority_weight < 0:
+            raise ValueError("Priority weight must be at least 0")
+        if algorithm == "exact" and len(delivery_points) > self.exact_max_stops:
+            raise ValueError(f"Exact mode supports at most {self.exact_max_stops} stops")
+        if not candidates:
+            if not self.check_capacity_constraints(delivery_points, vehicle):
+                raise ValueError("Vehicle capacity insufficient for all deliveries")
+            return
 
-                if cost < min_cost:
-                    min_cost = cost
-                    nearest = point_id
+        vehicle_capacity = self.capacity_limits[vehicle.capacity]
+        if any(self.size_weights[p.size] > vehicle_capacity for p in delivery_points):
+            raise ValueError("Vehicle capacity insufficient for a single delivery")
+        if any(p.time_window_start or p.time_window_end for p in delivery_points):
+            raise ValueError("Time windows need a full distance matrix")
+        if algorithm == "exact":
+            raise ValueError("Exact mode needs a full distance matrix")
+        if priority_weight > 0:
+            raise ValueError("Priority weights need a full distance matrix")
+        if traffic_profile is not None and optimization_goal == "time":
+            raise ValueError("Time-dependent travel needs a full distance matrix")
+
+    def reload_trips(self, route: List[int], points: List[DeliveryPoint], costs: CandidateCosts,
+                     vehicle: Vehicle, optimization_goal: str) -> List[int]:
+        """
+        The route with returns to its start (route[0]) to reload wherever
+        its stops exceed one vehicle load, placed by split_trips() at the
+        cheapest positions for the goal. Unchanged if the stops fit.
+        """
+        if self.check_capacity_constraints(points, vehicle):
+            return route
+        trips = split_trips(
+            route, self.load_demand(points, costs), self.capacity_limits[vehicle.capacity],
+            lambda i, j: costs.pair_costs(optimization_goal, i, j)
+        )
+        reloaded = [route[0]]
+        for t, trip in enumerate(trips):
+            if t:
+                reloaded.append(route[0])
+            reloaded.extend(trip)
+        return reloaded
+
+    def load_demand(self, points: List[DeliveryPoint], costs: CandidateCosts) -> np.ndarray:
+        """Size weight of every stop in points, indexed like costs (0 elsewhere)."""
+        demand = np.zeros(len(costs))
+        demand[costs.indices([p.id for p in points])] = [self.size_weights[p.size] for p in points]
+        return demand
 
-            route.append(nearest)
-            unvisited.remove(nearest)
-            current = nearest
+    def nearest_neighbor_tsp(self, points: List[DeliveryPoint], start_point: DeliveryPoint,
+                           distance_matrix: CostMatrix, vehicle: Vehicle, optimization_goal: str,
+                           penalty: Optional[PriorityPenalty] = None) -> List[int]:
+        """
+        Solve TSP using nearest neighbor heuristic.
+        Returns the route as matrix indices, starting at start_point.
+        With a penalty, serving j next delays every other unvisited stop by
+        one position, so the next stop minimizes cost - weight * urgency[j].
+        """
+        cost = distance_matrix.edge_costs(optimization_goal)
+        unvisited = np.asarray(distance_matrix.indices([p.id for p in points]), dtype=np.intp)
+        current = distance_matrix.index[start_point.id]
+        route = [current]
+
+        while unvisited.size:
+            step = cost[current, unvisited]
+            if penalty is not None:
+                step = step - penalty.weight * penalty.urgency[unvisited]
+            k = int(np.argmin(step))
+            current = int(unvisited[k])
+            route.append(current)
+            unvisited = np.delete(unvisited, k)
 
         return route
 
     def dijkstra_shortest_path(self, points: List[DeliveryPoint], start_point: DeliveryPoint,
-                             distance_matrix: Dict, vehicle: Vehicle, optimization_goal: str) -> List[str]:
+                             distance_matrix: CostMatrix, vehicle: Vehicle, optimization_goal: str,
+                             penalty: Optional[PriorityPenalty] = None) -> List[int]:
         """
         Use Dijkstra's algorithm to find optimal route.
         Modified for TSP-like problem with priority considerations.
@@ -200,55 +356,187 @@ class RouteOptimizer:
         sorted_points = self.apply_priority_weights(points)
 
         # Use nearest neighbor on priority-sorted points
-        return self.nearest_neighbor_tsp(sorted_points, start_point, distance_matrix, vehicle, optimization_goal)
+        return self.nearest_neighbor_tsp(sorted_points, start_point, distance_matrix, vehicle, optimization_goal,
+                                         penalty)
+
+    def priority_penalty(self, points: List[DeliveryPoint], distance_matrix: CostMatrix,
+                         priority_weight: float) -> Optional[PriorityPenalty]:
+        """The ordering penalty of points' priorities at priority_weight, or None at 0."""
+        if priority_weight < 0:
+            raise ValueError("Priority weight must be at least 0")
+        if priority_weight == 0:
+            return None
+        return PriorityPenalty.from_points(
+            distance_matrix.ids, {p.id: p.priority for p in points}, priority_weight
+        )
+
+    def priority_stats(self, route: List[int], distance_matrix: CostMatrix, optimization_goal: str,
+                       penalty: PriorityPenalty) -> Dict:
+        """Travel cost, ordering penalty and priority inversions of a route, for search stats."""
+        order = np.asarray(route, dtype=np.intp)
+        travel = float(distance_matrix.edge_costs(optimization_goal)[order[:-1], order[1:]].sum(dtype=np.float64))
+        # -urgency is priority - MAX_PRIORITY, so it has the same inversions as the priorities
+        urgency = penalty.urgency[order[1:]]
+        return {
+            "weight": penalty.weight,
+            "travel_cost": round(travel, 3),
+            "penalty": round(penalty.route_penalty(route), 3),
+            "inversions": count_inversions((-urgency).tolist())
+        }
 
-    def two_opt_improvement(self, route: List[str], distance_matrix: Dict,
-                          vehicle: Vehicle, optimization_goal: str) -> List[str]:
+    def build_time_windows(self, points: List[DeliveryPoint], start_location: DeliveryPoint,
+                           distance_matrix: CostMatrix, departure_time: Optional[str] = None) -> TimeWindows:
         """
-        Apply 2-opt improvement to the route.
+        Parse delivery time windows once for the whole solve. Routes leave at
+        departure_time, else at the start location's window start, else now.
         """
-        best_route = route.copy()
-        best_cost = self.calculate_route_cost(best_route, distance_matrix, vehicle, optimization_goal)
-        improved = True
+        return TimeWindows.from_points(
+            distance_matrix, points, self.departure_minutes(start_location, departure_time),
+            service_minutes=self.service_time_minutes, depot_id=start_location.id
+        )
 
-        while improved:
-            improved = False
-            for i in range(1, len(route) - 2):
-                for j in range(i + 1, len(route)):
-                    if j - i == 1:
-                        continue
+    def departure_minutes(self, start_location: DeliveryPoint, departure_time: Optional[str] = None) -> float:
+        """Departure in minutes after midnight: departure_time, the start location's window start, or now."""
+        departure = parse_clock(departure_time)
+        if departure is None:
+            departure = parse_clock(start_location.time_window_start)
+        if departure is None:
+            now = datetime.now()
+            departure = now.hour * 60 + now.minute
+        return departure
+
+    def time_window_route(self, points: List[DeliveryPoint], start_point: DeliveryPoint,
+                          distance_matrix: CostMatrix, optimization_goal: str,
+                          windows: TimeWindows) -> List[int]:
+        """
+        Build the initial route when windows bind: stops are inserted in order
+        of deadline at the cheapest position that keeps every window.
+        """
+        return time_window_insertion(
+            distance_matrix.edge_costs(optimization_goal),
+            distance_matrix.index[start_point.id],
+            distance_matrix.indices([p.id for p in points]),
+            windows
+        )
 
-                    # Create new route by reversing segment between i and j
-                    new_route = route[:i] + route[i:j][::-1] + route[j:]
-                    new_cost = self.calculate_route_cost(new_route, distance_matrix, vehicle, optimization_goal)
+    def two_opt_improvement(self, route: List[int], distance_matrix: CostMatrix,
+                          vehicle: Vehicle, optimization_goal: str,
+                          strategy: str = "first", neighbor_k: Optional[int] = None,
+                          dont_look_bits: bool = False,
+                          windows: Optional[TimeWindows] = None,
+                          stats: Optional[Dict] = None,
+                          penalty: Optional[PriorityPenalty] = None) -> List[int]:
+        """
+        Apply 2-opt improvement to the route.
+        Moves are scored as O(1) deltas by TwoOptEngine; the defaults reproduce
+        the classic first-improvement scan over every segment. With windows,
+        improving moves that make a stop (later) late are skipped; with a
+        penalty, moves are scored on travel cost plus ordering penalty. The
+        move and evaluation counts are written to stats when given.
+        """
+        route = list(route)
+        engine = TwoOptEngine(
+            distance_matrix.edge_costs(optimization_goal),
+            strategy=strategy,
+            neighbor_k=neighbor_k,
+            dont_look_bits=dont_look_bits,
+            penalty=penalty
+        )
+        if windows is not None:
+            engine.move_filter = windows.reversal_filter(route, lambda: engine.moves_applied)
+        engine.improve(route)
+        if stats is not None:
+            stats.update(moves=engine.moves_applied, evaluations=engine.evaluations)
+        return route
 
-                    if new_cost < best_cost:
-                        best_route = new_route
-                        best_cost = new_cost
-                        improved = True
-                        break
+    def local_search_improvement(self, route: List[int], distance_matrix: CostMatrix,
+                                 optimization_goal: str,
+                                 time_budget_ms: Optional[float] = None,
+                                 windows: Optional[TimeWindows] = None,
+                                 penalty: Optional[PriorityPenalty] = None) -> Tuple[List[int], Dict]:
+        """
+        Improve the route with a variable-neighbourhood descent over 2-opt,
+        Or-opt, swap and relocate moves. Returns the route and search stats.
+        """
+        search = LocalSearch(
+            distance_matrix.edge_costs(optimization_goal),
+            [route],
+            time_budget_ms=time_budget_ms if time_budget_ms is not None else self.local_search_time_budget_ms,
+            windows=windows,
+            penalty=penalty
+        )
+        improved = search.run()[0]
+        return improved, search.stats()
 
-                if improved:
-                    break
+    def metaheuristic_improvement(self, route: List[int], distance_matrix: CostMatrix,
+                                  optimization_goal: str, algorithm: str,
+                                  time_limit_ms: float, seed: Optional[int] = None,
+                                  penalty: Optional[PriorityPenalty] = None) -> Tuple[List[int], Dict]:
+        """
+        Run an anytime improver (simulated annealing or guided local search)
+        until the time limit. Returns the best route found and search stats.
+        """
+        improver = IMPROVERS[algorithm](
+            distance_matrix.edge_costs(optimization_goal), time_limit_ms, seed=seed, penalty=penalty
+        )
+        best = improver.run(route)
+        return best, improver.stats()
 
-            route = best_route
+    def exact_route(self, route: List[int], distance_matrix: CostMatrix, optimization_goal: str,
+                    time_limit_ms: Optional[float] = None,
+                    penalty: Optional[PriorityPenalty] = None) -> Tuple[List[int], Dict]:
+        """
+        Optimal route over the stops of a heuristic route (which stays the
+        incumbent): Held-Karp up to held_karp_max_stops stops, else
+        branch-and-bound with a 1-tree bound until time_limit_ms. Returns the
+        route and stats with the proven lower bound and optimality gap.
+        With a penalty, costs and bounds are of travel cost plus penalty.
+        """
+        order = np.asarray(route, dtype=np.intp)
+        cost = distance_matrix.edge_costs(optimization_goal)[np.ix_(order, order)].astype(np.float64)
+        local_penalty = penalty.subset(order) if penalty is not None else None
+        heuristic_cost = float(cost[np.arange(order.size - 1), np.arange(1, order.size)].sum())
+        if local_penalty is not None:
+            heuristic_cost += local_penalty.route_penalty(range(order.size))
+        stops = order.size - 1
+
+        if stops <= self.held_karp_max_stops:
+            started = time.perf_counter()
+            local, best_cost = held_karp(cost, local_penalty)
+            stats = {
+                "method": "held_karp",
+                "iterations": (1 << stops) * stops,
+                "improvements": int(best_cost < heuristic_cost - 1e-9),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 1),
+                "optimal": True,
+                "best_cost": round(best_cost, 3),
+                "lower_bound": round(best_cost, 3)
+            }
+        else:
+            search = BranchAndBound(
+                cost, time_budget_ms=time_limit_ms if time_limit_ms is not None else self.exact_time_limit_ms,
+                penalty=local_penalty
+            )
+            local = search.run(list(range(order.size)))
+            stats = {"method": "branch_and_bound", **search.stats()}
 
-        return best_route
+        best, lower = stats["best_cost"], stats["lower_bound"]
+        stats["gap"] = round(max(best - lower, 0.0) / best, 6) if best > 0 else 0.0
+        stats["heuristic_cost"] = round(heuristic_cost, 3)
+        stats["heuristic_gap"] = round(max(heuristic_cost - lower, 0.0) / heuristic_cost, 6) if heuristic_cost > 0 else 0.0
+        return order[local].tolist(), stats
 
-    def build_route_segments(self, route: List[str], distance_matrix: Dict) -> List[RouteSegment]:
+    def build_route_segments(self, route: List[int], distance_matrix: CostMatrix) -> List[RouteSegment]:
         """
         Build detailed route segments from the optimized route.
         """
         segments = []
 
         for i in range(len(route) - 1):
-            from_point = route[i]
-            to_point = route[i + 1]
-
-            segment_data = distance_matrix[from_point][to_point]
+            segment_data = distance_matrix.entry(route[i], route[i + 1])
             segment = RouteSegment(
-                from_point=from_point,
-                to_point=to_point,
+                from_point=distance_matrix.ids[route[i]],
+                to_point=distance_matrix.ids[route[i + 1]],
                 distance_km=segment_data["distance_km"],
                 duration_minutes=segment_data["duration_minutes"],
                 traffic_delay_minutes=segment_data["traffic_delay_minutes"]
@@ -257,33 +545,51 @@ class RouteOptimizer:
 
         return segments
 
-    def calculate_optimization_score(self, route: List[str], distance_matrix: Dict,
-                                   vehicle: Vehicle, points: List[DeliveryPoint]) -> float:
+    def route_distance_lower_bound(self, route: List[int], distance_matrix: Union[CostMatrix, CandidateCosts],
+                                   total_distance: float, points: Optional[List[DeliveryPoint]] = None,
+                                   vehicle: Optional[Vehicle] = None) -> Tuple[float, str]:
+        """
+        Lower bound on the distance of any open route from route[0] through
+        the same stops (see core.lower_bounds), with the route's own distance
+        as the ascent target. A route that reloads at its start (reload_trips)
+        also drives back there after each load, which that bound ignores, so
+        given its points and vehicle the radial bound on its loads is used
+        when larger.
+        """
+        iterations = self.lower_bound_iterations if len(route) - 1 <= self.lower_bound_ascent_stops else 0
+        bound, method = route_lower_bound(distance_matrix, route, "distance", total_distance, iterations)
+        if isinstance(distance_matrix, CandidateCosts) and route.count(route[0]) > 1 and points and vehicle:
+            radial = reload_radial_bound(distance_matrix, route[0], self.load_demand(points, distance_matrix),
+                                         self.capacity_limits[vehicle.capacity])
+            if radial > bound:
+                bound, method = radial, "reload_radial"
+        # Never above the route itself (float32 distances are summed in float64)
+        return min(bound, total_distance), method
+
+    def calculate_optimization_score(self, route: List[int], distance_matrix: CostMatrix,
+                                   vehicle: Vehicle, points: List[DeliveryPoint],
+                                   lower_bound_km: Optional[float] = None) -> float:
         """
         Calculate a confidence score for the optimization (0-1).
         Based on factors like route efficiency, priority adherence, capacity utilization.
+        Efficiency is the lower bound on the route distance over the distance
+        driven, so 1.0 means the route is proven optimal.
         """
-        # Calculate route efficiency compared to direct distances
-        total_route_distance = sum(
-            distance_matrix[route[i]][route[i + 1]]["distance_km"]
-            for i in range(len(route) - 1)
-        )
-
-        # Calculate theoretical minimum (sum of distances from start to each point)
-        start_point = route[0]
-        theoretical_min = sum(
-            distance_matrix[start_point][point_id]["distance_km"]
-            for point_id in route[1:]
-        )
+        total_route_distance = distance_matrix.route_totals(route)["distance_km"]
+        if lower_bound_km is None:
+            lower_bound_km, _ = self.route_distance_lower_bound(
+                route, distance_matrix, total_route_distance, points, vehicle
+            )
 
-        # Efficiency score (lower is better, so invert)
-        efficiency_score = theoretical_min / total_route_distance if total_route_distance > 0 else 0
+        efficiency_score = lower_bound_km / total_route_distance if total_route_distance > 0 else 1.0
 
         # Priority adherence score
-        priority_score = self.calculate_priority_adherence(route, points)
+        priority_score = self.calculate_priority_adherence(
+            [distance_matrix.ids[k] for k in route], points
+        )
 
-        # Capacity utilization score
-        capacity_score = self.calculate_capacity_utilization(points, vehicle)
+        # Capacity utilization score, per load when the route reloads at its start
+        capacity_score = self.calculate_capacity_utilization(points, vehicle, route.count(route[0]))
 
         # Combined score (weighted average)
         overall_score = (
@@ -296,32 +602,19 @@ class RouteOptimizer:
 
     def calculate_priority_adherence(self, route: List[str], points: List[DeliveryPoint]) -> float:
         """
-        Calculate how well the route adheres to delivery priorities.
+        Calculate how well the route adheres to delivery priorities: the share
+        of stop pairs where the higher priority (lower number) comes first.
         """
-        point_priorities = {p.id: p.priority for p in points}
+        return priority_adherence(route, {p.id: p.priority for p in points})
 
-        # Check if higher priority items (lower numbers) come first
-        priority_violations = 0
-        total_comparisons = 0
-
-        for i in range(1, len(route) - 1):
-            for j in range(i + 1, len(route)):
-                if route[i] in point_priorities and route[j] in point_priorities:
-                    total_comparisons += 1
-                    if point_priorities[route[i]] > point_priorities[route[j]]:
-                        priority_violations += 1
-
-        if total_comparisons == 0:
-            return 1.0
-
-        return 1.0 - (priority_violations / total_comparisons)
-
-    def calculate_capacity_utilization(self, points: List[DeliveryPoint], vehicle: Vehicle) -> float:
+    def calculate_capacity_utilization(self, points: List[DeliveryPoint], vehicle: Vehicle,
+                                       trips: int = 1) -> float:
         """
-        Calculate how efficiently the vehicle capacity is utilized.
+        Calculate how efficiently the vehicle capacity is utilized
+        (over all trips, for a route that reloads).
         """
         total_capacity_needed = sum(self.size_weights[p.size] for p in points)
-        vehicle_capacity = self.capacity_limits[vehicle.capacity]
+        vehicle_capacity = self.capacity_limits[vehicle.capacity] * trips
 
         utilization = total_capacity_needed / vehicle_capacity
 
@@ -331,12 +624,136 @@ class RouteOptimizer:
         else:
             return max(0.1, 1.0 - (utilization - 0.9) * 2)
 
+    def build_optimized_route(self, route: List[int], distance_matrix: CostMatrix, vehicle: Vehicle,
+                              points: List[DeliveryPoint], search_stats: Optional[Dict] = None,
+                              windows: Optional[TimeWindows] = None, analytics: bool = True,
+                              baseline_route: Optional[List[int]] = None) -> OptimizedRoute:
+        """
+        Assemble the OptimizedRoute (segments, totals, fuel cost and score)
+        for a route of matrix indices, with per-stop ETAs when windows are given.
+        points are the route's stops in request order, and baseline_route the
+        savings baseline (by default the stops driven in that order). Without
+        analytics the score, lower bound and savings baseline are left out.
+        """
+        # Build route segments
+        segments = self.build_route_segments(route, distance_matrix)
+
+        # Calculate totals
+        totals = distance_matrix.route_totals(route)
+        total_distance = totals["distance_km"]
+        total_time = totals["duration_minutes"] + totals["traffic_delay_minutes"]
+        estimated_fuel_cost = (total_distance / vehicle.fuel_efficiency) * self.fuel_price_per_liter
+
+        optimization_score = lower_bound_km = lower_bound_method = baseline = None
+        if analytics:
+            # The same stops driven in request order, as the savings baseline
+            if baseline_route is None:
+                baseline_route = [route[0]] + distance_matrix.indices([p.id for p in points])
+            baseline_totals = distance_matrix.route_totals(baseline_route)
+            baseline = {
+                "total_distance_km": round(baseline_totals["distance_km"], 2),
+                "total_time_minutes": int(
+                    baseline_totals["duration_minutes"] + baseline_totals["traffic_delay_minutes"]
+                ),
+                "estimated_fuel_cost": round(
+                    baseline_totals["distance_km"] / vehicle.fuel_efficiency * self.fuel_price_per_liter, 2
+                )
+            }
+
+            # Calculate optimization score
+            lower_bound_km, lower_bound_method = self.route_distance_lower_bound(
+                route, distance_matrix, total_distance, points, vehicle
+            )
+            optimization_score = self.calculate_optimization_score(
+                route, distance_matrix, vehicle, points, lower_bound_km
+            )
+
+        # Convert segments to dict format for JSON serialization
+        segments_dict = [
+            {
+                "from_point": segment.from_point,
+                "to_point": segment.to_point,
+                "distance_km": segment.distance_km,
+                "duration_minutes": segment.duration_minutes,
+                "traffic_delay_minutes": segment.traffic_delay_minutes
+            }
+            for segment in segments
+        ]
+
+        schedule, violations = windows.report(route, distance_matrix.ids) if windows is not None else ([], [])
+
+        return OptimizedRoute(
+            route_order=[distance_matrix.ids[k] for k in route],
+            segments=segments_dict,
+            total_distance_km=round(total_distance, 2),
+            total_time_minutes=int(total_time),
+            estimated_fuel_cost=round(estimated_fuel_cost, 2),
+            optimization_score=round(optimization_score, 3) if analytics else None,
+            search_stats=search_stats,
+            schedule=schedule,
+            time_window_violations=violations,
+            lower_bound_km=round(lower_bound_km, 3) if analytics else None,
+            lower_bound_method=lower_bound_method,
+            baseline=baseline
+        )
+
     def optimize(self, delivery_points: List[DeliveryPoint], vehicle: Vehicle,
-                start_location: DeliveryPoint, distance_matrix: Dict,
-                optimization_goal: str = "time") -> OptimizedRoute:
+                start_location: DeliveryPoint,
+                distance_matrix: Optional[Union[CostMatrix, CandidateCosts, Dict]],
+                optimization_goal: str = "time", algorithm: str = "vnd",
+                time_limit_ms: Optional[float] = None, seed: Optional[int] = None,
+                departure_time: Optional[str] = None, trace: bool = False,
+                analytics: bool = True, priority_weight: float = 0.0,
+                traffic_profile: Optional[TrafficProfile] = None) -> OptimizedRoute:
         """
         Main optimization method that orchestrates the route optimization process.
+        algorithm selects the improvement phase: "2opt" only, "vnd" (2-opt
+        followed by the full neighbourhood descent), an anytime improver
+        ("simulated_annealing", "guided_local_search") that runs after the
+        descent until time_limit_ms and returns the best route found, or
+        "exact" (exact_route() from the descent's route, with time_limit_ms
+        bounding branch-and-bound; no time windows).
+
+        Delivery time windows (HH:MM) are honoured from departure_time: the
+        route is built by deadline-ordered insertion and improving moves that
+        would make a stop late are rejected. Stops that cannot be reached in
+        time are reported in time_window_violations.
+
+        With more than large_instance_points points and no windows (or when
+        given CandidateCosts), the route is solved by candidate_route() on
+        K-nearest candidate edges instead of a dense matrix.
+
+        With a priority_weight above 0, priorities are a soft constraint: every
+        stage minimizes travel cost plus the PriorityPenalty at that weight
+        (full distance matrix only), and the penalty is reported in
+        search_stats["priority"].
+
+        With a traffic_profile and the "time" goal, travel times depend on
+        when each edge is driven (TimeDependentTravel from the matrix's
+        free-flow durations): the route is solved on edge costs at the
+        departure time and then refined by time_dependent_refinement(), so
+        totals, segments and ETAs follow the route's own schedule.
+
+        With trace, the duration of each stage is returned in the route's spans.
+        Without analytics the route carries no score or savings baseline.
         """
+        tracer = Trace(enabled=trace)
+        with tracer.span("optimize"):
+            optimized_route = self._optimize(
+                delivery_points, vehicle, start_location, distance_matrix, optimization_goal,
+                algorithm, time_limit_ms, seed, departure_time, tracer, analytics, priority_weight,
+                traffic_profile
+            )
+        optimized_route.spans = tracer.spans
+        return optimized_route
+
+    def _optimize(self, delivery_points: List[DeliveryPoint], vehicle: Vehicle,
+                  start_location: DeliveryPoint,
+                  distance_matrix: Optional[Union[CostMatrix, CandidateCosts, Dict]],
+                  optimization_goal: str, algorithm: str, time_limit_ms: Optional[float],
+                  seed: Optional[int], departure_time: Optional[str], tracer: Trace,
+                  analytics: bool = True, priority_weight: float = 0.0,
+                  traffic_profile: Optional[TrafficProfile] = None) -> OptimizedRoute:
         # Convert to internal format if needed
         if isinstance(delivery_points[0], dict):
             delivery_points = [
@@ -372,58 +789,414 @@ class RouteOptimizer:
                 fuel_efficiency=vehicle["fuel_efficiency"]
             )
 
-        # Check capacity constraints
+        all_points = [start_location] + delivery_points
+        # Large instances without windows never build the N x N matrix
+        candidates = isinstance(distance_matrix, CandidateCosts) or (
+            distance_matrix is None and self.uses_candidate_costs(all_points)
+        )
+        self.check_route_request(
+            delivery_points, vehicle, optimization_goal, algorithm, priority_weight, traffic_profile, candidates
+        )
+
+        if candidates:
+            if distance_matrix is None:
+                with tracer.span("matrix"):
+                    distance_matrix = self.build_candidate_costs(all_points, vehicle.type)
+            with tracer.span("candidate_search"):
+                route, search_stats = self.candidate_route(
+                    delivery_points, start_location, distance_matrix, optimization_goal, algorithm, time_limit_ms
+                )
+            with tracer.span("reload"):
+                route = self.reload_trips(route, delivery_points, distance_matrix, vehicle, optimization_goal)
+                baseline_route = None
+                if analytics:
+                    baseline_route = self.reload_trips(
+                        [route[0]] + distance_matrix.indices([p.id for p in delivery_points]),
+                        delivery_points, distance_matrix, vehicle, optimization_goal
+                    )
+            search_stats["trips"] = route.count(route[0])
+            with tracer.span("route_build"):
+                return self.build_optimized_route(
+                    route, distance_matrix, vehicle, delivery_points, search_stats, analytics=analytics,
+                    baseline_route=baseline_route
+                )
+
+        # Build distance matrix if not provided (legacy nested dicts are converted once here)
+        with tracer.span("matrix"):
+            distance_matrix = self.ensure_cost_matrix(all_points, distance_matrix, vehicle.type)
+
+        # Time-dependent travel: search on every edge as driven at the departure time first
+        travel_model = None
+        if traffic_profile is not None and optimization_goal == "time":
+            with tracer.span("time_dependent"):
+                travel_model = TimeDependentTravel.from_matrix(distance_matrix, traffic_profile)
+                distance_matrix = travel_model.linearize(
+                    distance_matrix, self.departure_minutes(start_location, departure_time)
+                )
+
+        # Parse time windows once; they only steer the search when one can bind
+        with tracer.span("time_windows"):
+            windows = self.build_time_windows(all_points, start_location, distance_matrix, departure_time)
+        active_windows = windows if windows.constrained else None
+        if algorithm == "exact" and active_windows is not None:
+            raise ValueError("Exact mode does not support time windows")
+        penalty = self.priority_penalty(delivery_points, distance_matrix, priority_weight)
+
+        with tracer.span("construction"):
+            if active_windows is not None:
+                optimal_route = self.time_window_route(
+                    delivery_points, start_location, distance_matrix, optimization_goal, windows
+                )
+                construction = "time_window_insertion"
+            else:
+                # Find optimal route using Dijkstra-inspired algorithm
+                optimal_route = self.dijkstra_shortest_path(
+                    delivery_points, start_location, distance_matrix, vehicle, optimization_goal, penalty
+                )
+                construction = "dijkstra"
+
+        # Apply 2-opt improvement
+        two_opt_stats: Dict = {}
+        with tracer.span("two_opt"):
+            improved_route = self.two_opt_improvement(
+                optimal_route, distance_matrix, vehicle, optimization_goal, windows=active_windows,
+                stats=two_opt_stats, penalty=penalty
+            )
+        search_stats = {"algorithm": f"{construction}_with_2opt"}
+
+        # Move stops and short chains that 2-opt cannot reach without reversing segments
+        if algorithm != "2opt":
+            with tracer.span("local_search"):
+                improved_route, vnd_stats = self.local_search_improvement(
+                    improved_route, distance_matrix, optimization_goal,
+                    time_limit_ms if algorithm != "exact" else None, windows=active_windows,
+                    penalty=penalty
+                )
+            search_stats = {"algorithm": f"{construction}_with_vnd", **vnd_stats}
+
+        # The descent's route is the incumbent (and the gap reference) of the exact search
+        if algorithm == "exact":
+            with tracer.span("exact"):
+                improved_route, exact_stats = self.exact_route(
+                    improved_route, distance_matrix, optimization_goal, time_limit_ms, penalty
+                )
+            search_stats = {"algorithm": exact_stats["method"], **exact_stats, "local_search": vnd_stats}
+
+        # Spend the rest of the time limit escaping the local optimum
+        if algorithm in IMPROVERS:
+            limit_ms = time_limit_ms if time_limit_ms is not None else self.metaheuristic_time_limit_ms
+            with tracer.span("metaheuristic"):
+                candidate_route, improver_stats = self.metaheuristic_improvement(
+                    improved_route, distance_matrix, optimization_goal, algorithm,
+                    max(limit_ms - vnd_stats["elapsed_ms"], 0.0), seed, penalty
+                )
+            # The improvers do not see windows, so keep their route only if no window suffers
+            if (active_windows is None or
+                    windows.total_lateness(candidate_route) <= windows.total_lateness(improved_route) + 1e-6):
+                improved_route = candidate_route
+            search_stats = {
+                "algorithm": f"{construction}_with_{algorithm}",
+                **improver_stats,
+                "elapsed_ms": round(vnd_stats["elapsed_ms"] + improver_stats["elapsed_ms"], 1),
+                "local_search": vnd_stats
+            }
+        search_stats["two_opt"] = two_opt_stats
+
+        if travel_model is not None:
+            with tracer.span("time_dependent_refinement"):
+                improved_route, distance_matrix, windows, search_stats["time_dependent"] = (
+                    self.time_dependent_refinement(
+                        improved_route, travel_model, distance_matrix, all_points, start_location,
+                        windows, penalty
+                    )
+                )
+
+        if penalty is not None:
+            search_stats["priority"] = self.priority_stats(improved_route, distance_matrix, optimization_goal, penalty)
+
+        with tracer.span("route_build"):
+            return self.build_optimized_route(
+                improved_route, distance_matrix, vehicle, delivery_points, search_stats, windows, analytics
+            )
+
+    def time_dependent_refinement(self, route: List[int], travel_model: TimeDependentTravel,
+                                  distance_matrix: CostMatrix, points: List[DeliveryPoint],
+                                  start_location: DeliveryPoint, windows: TimeWindows,
+                                  penalty: Optional[PriorityPenalty] = None
+                                  ) -> Tuple[List[int], CostMatrix, TimeWindows, Dict]:
+        """
+        Improve a route under time-dependent travel times. Each round freezes
+        every edge at its origin's departure along the current route
+        (TimeDependentTravel.linearize), so the static costs price the route
+        exactly, and runs 2-opt and the descent on them. A round's route is
+        kept only if its time-dependent driving time (plus penalty) improves
+        without more lateness; at most time_dependent_rounds rounds.
+
+        points include the start location. Returns the route, the matrix and
+        windows linearized at its schedule (for totals and ETAs) and stats.
+        """
+        started = time.perf_counter()
+        departure = windows.departure
+
+        def evaluate(candidate: List[int]) -> Tuple[np.ndarray, float, float]:
+            _, start = travel_model.schedule(candidate, departure, windows.earliest, windows.service)
+            objective = travel_model.route_travel(candidate, start, windows.service)
+            if penalty is not None:
+                objective += penalty.route_penalty(candidate)
+            lateness = float(np.maximum(start - windows.latest[np.asarray(candidate, dtype=np.intp)], 0.0).sum())
+            return start, objective, lateness
+
+        def linearize(route: List[int], start: np.ndarray) -> Tuple[CostMatrix, TimeWindows]:
+            depart = np.full(len(distance_matrix), departure)
+            order = np.asarray(route, dtype=np.intp)
+            depart[order] = start + windows.service[order]
+            matrix = travel_model.linearize(distance_matrix, depart)
+            return matrix, TimeWindows.from_points(
+                matrix, points, departure, service_minutes=self.service_time_minutes, depot_id=start_location.id
+            )
+
+        start, objective, lateness = evaluate(route)
+        initial = objective
+        rounds = 0
+        matrix, linear_windows = linearize(route, start)
+        budget_ms = self.local_search_time_budget_ms / max(self.time_dependent_rounds, 1)
+        for _ in range(self.time_dependent_rounds):
+            active_windows = linear_windows if linear_windows.constrained else None
+            candidate = self.two_opt_improvement(
+                route, matrix, None, "time", windows=active_windows, penalty=penalty
+            )
+            candidate, _ = self.local_search_improvement(
+                candidate, matrix, "time", budget_ms, windows=active_windows, penalty=penalty
+            )
+            rounds += 1
+            if candidate == route:
+                break
+            candidate_start, candidate_objective, candidate_lateness = evaluate(candidate)
+            if candidate_objective >= objective - 1e-6 or candidate_lateness > lateness + 1e-6:
+                break
+            route, start, objective, lateness = candidate, candidate_start, candidate_objective, candidate_lateness
+            matrix, linear_windows = linearize(route, start)
+
+        stats = {
+            "rounds": rounds,
+            "departure": format_clock(departure),
+            "initial_minutes": round(initial, 1),
+            "final_minutes": round(objective, 1),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 1)
+        }
+        return route, matrix, linear_windows, stats
+
+    def priority_tradeoff(self, delivery_points: List[DeliveryPoint], vehicle: Vehicle,
+                          start_location: DeliveryPoint, distance_matrix: Optional[Union[CostMatrix, Dict]],
+                          optimization_goal: str = "time", priority_weights: Optional[List[float]] = None,
+                          time_limit_ms: Optional[float] = None,
+                          departure_time: Optional[str] = None) -> List[Dict]:
+        """
+        Travel cost against priority adherence: one route per priority weight
+        (tradeoff_weights by default), swept in increasing order with each
+        descent warm-started from the previous weight's route, so the whole
+        sweep costs about one solve. time_limit_ms is shared by the weights.
+
+        Returns a point per weight with the route, its travel cost, its
+        priority delay (the ordering penalty at weight 1), adherence and
+        inversions; pareto_optimal marks the points no other point beats on
+        both travel cost and delay.
+        """
+        weights = sorted(set(priority_weights if priority_weights is not None else self.tradeoff_weights))
+        if not weights or weights[0] < 0:
+            raise ValueError("Priority weights must be at least 0")
+        if isinstance(distance_matrix, CandidateCosts):
+            raise ValueError("Priority weights need a full distance matrix")
         if not self.check_capacity_constraints(delivery_points, vehicle):
             raise ValueError("Vehicle capacity insufficient for all deliveries")
 
-        # Build distance matrix if not provided
         all_points = [start_location] + delivery_points
-        if not distance_matrix:
-            distance_matrix = self.build_distance_matrix(all_points)
+        distance_matrix = self.ensure_cost_matrix(all_points, distance_matrix, vehicle.type)
+        windows = self.build_time_windows(all_points, start_location, distance_matrix, departure_time)
+        active_windows = windows if windows.constrained else None
+        budget_ms = (time_limit_ms if time_limit_ms is not None else self.local_search_time_budget_ms) / len(weights)
+        delay = PriorityPenalty.from_points(distance_matrix.ids, {p.id: p.priority for p in delivery_points}, 1.0)
+        priorities = {p.id: p.priority for p in delivery_points}
+
+        if active_windows is not None:
+            route = self.time_window_route(delivery_points, start_location, distance_matrix, optimization_goal, windows)
+        else:
+            route = self.dijkstra_shortest_path(delivery_points, start_location, distance_matrix, vehicle,
+                                                optimization_goal)
+        points = []
+        for weight in weights:
+            penalty = self.priority_penalty(delivery_points, distance_matrix, weight)
+            route = self.two_opt_improvement(route, distance_matrix, vehicle, optimization_goal,
+                                             windows=active_windows, penalty=penalty)
+            route, _ = self.local_search_improvement(route, distance_matrix, optimization_goal, budget_ms,
+                                                     windows=active_windows, penalty=penalty)
+            stats = self.priority_stats(route, distance_matrix, optimization_goal, delay)
+            totals = distance_matrix.route_totals(route)
+            route_order = [distance_matrix.ids[k] for k in route]
+            points.append({
+                "priority_weight": weight,
+                "route_order": route_order,
+                "travel_cost": stats["travel_cost"],
+                "priority_delay": stats["penalty"],
+                "priority_adherence": round(priority_adherence(route_order, priorities), 4),
+                "priority_inversions": stats["inversions"],
+                "total_distance_km": round(totals["distance_km"], 2),
+                "total_time_minutes": int(totals["duration_minutes"] + totals["traffic_delay_minutes"])
+            })
+
+        for point in points:
+            point["pareto_optimal"] = not any(
+                other["travel_cost"] <= point["travel_cost"] and other["priority_delay"] <= point["priority_delay"] and
+                (other["travel_cost"], other["priority_delay"]) != (point["travel_cost"], point["priority_delay"])
+                for other in points
+            )
+        return points
+
+    def optimize_fleet(self, delivery_points: List[DeliveryPoint], vehicles: List[Vehicle],
+                       start_location: DeliveryPoint,
+                       distance_matrix: Optional[Union[CostMatrix, Dict]],
+                       optimization_goal: str = "time", allow_additional_vehicles: bool = True,
+                       time_limit_ms: Optional[float] = None,
+                       departure_time: Optional[str] = None, priority_weight: float = 0.0) -> FleetPlan:
+        """
+        Split deliveries across a fleet (capacitated VRP) instead of rejecting
+        them when one vehicle is too small.
+
+        Stops are weighted by size_weights and vehicles limited by
+        capacity_limits. Routes are built by Clarke-Wright savings, assigned
+        best-fit to vehicles, and improved by the local-search descent with
+        inter-route relocate, swap and 2-opt* moves. The matrix is built once
+        and shared by every route; travel times use the first vehicle's type.
+        When the fleet cannot carry everything, copies of its largest vehicle
+        are added (or the leftover stops reported as unassigned). Time windows
+        are honoured as in optimize(), with every vehicle leaving at
+        departure_time, and so is priority_weight (in the descent only).
+        """
+        if not vehicles:
+            raise ValueError("At least one vehicle is required")
 
-        # Find optimal route using Dijkstra-inspired algorithm
-        optimal_route = self.dijkstra_shortest_path(
-            delivery_points, start_location, distance_matrix, vehicle, optimization_goal
+        all_points = [start_location] + delivery_points
+        distance_matrix = self.ensure_cost_matrix(all_points, distance_matrix, vehicles[0].type)
+        cost = distance_matrix.edge_costs(optimization_goal)
+        depot = distance_matrix.index[start_location.id]
+        stops = distance_matrix.indices([p.id for p in delivery_points])
+
+        demand = np.zeros(len(distance_matrix), dtype=np.float64)
+        demand[stops] = [self.size_weights[p.size] for p in delivery_points]
+
+        windows = self.build_time_windows(all_points, start_location, distance_matrix, departure_time)
+        active_windows = windows if windows.constrained else None
+        penalty = self.priority_penalty(delivery_points, distance_matrix, priority_weight)
+
+        vehicles = list(vehicles)
+        fleet_size = len(vehicles)
+        largest = max(vehicles, key=lambda v: self.capacity_limits[v.capacity])
+        largest_capacity = self.capacity_limits[largest.capacity]
+        if allow_additional_vehicles:
+            # Add vans until the fleet can carry the total load
+            shortfall = demand.sum() - sum(self.capacity_limits[v.capacity] for v in vehicles)
+            if shortfall > 0:
+                vehicles.extend([largest] * math.ceil(shortfall / largest_capacity))
+        capacities = [float(self.capacity_limits[v.capacity]) for v in vehicles]
+
+        # Savings construction, then best-fit assignment of routes to vehicles
+        candidate_routes = clarke_wright(
+            cost, depot, stops, demand, largest_capacity,
+            max_routes=len(vehicles), neighbor_k=self.fleet_neighbor_k, windows=active_windows
         )
-
-        # Apply 2-opt improvement
-        improved_route = self.two_opt_improvement(
-            optimal_route, distance_matrix, vehicle, optimization_goal
+        candidate_loads = [float(demand[route[1:]].sum()) for route in candidate_routes]
+        assigned, leftover = assign_routes(candidate_routes, candidate_loads, capacities)
+        routes = [list(candidate_routes[r]) if r is not None else [depot] for r in assigned]
+        loads = [candidate_loads[r] if r is not None else 0.0 for r in assigned]
+
+        # Stops on routes no vehicle could take go to their cheapest feasible position
+        unassigned = []
+        for stop in (k for r in leftover for k in candidate_routes[r][1:]):
+            while not cheapest_insertion(cost, routes, loads, capacities, stop, demand[stop], active_windows):
+                if not allow_additional_vehicles:
+                    unassigned.append(distance_matrix.ids[stop])
+                    break
+                vehicles.append(largest)
+                capacities.append(float(largest_capacity))
+                routes.append([depot])
+                loads.append(0.0)
+
+        search = LocalSearch(
+            cost, routes, demand=demand, capacities=capacities,
+            time_budget_ms=time_limit_ms if time_limit_ms is not None else self.fleet_time_limit_ms,
+            neighbor_k=self.fleet_neighbor_k,
+            windows=active_windows,
+            penalty=penalty
         )
+        routes = search.run()
 
-        # Build route segments
-        segments = self.build_route_segments(improved_route, distance_matrix)
+        search_stats = {"algorithm": "clarke_wright_with_vnd", **search.stats()}
+        if penalty is not None:
+            search_stats["priority"] = {
+                "weight": penalty.weight,
+                "penalty": round(sum(penalty.route_penalty(route) for route in routes), 3)
+            }
 
-        # Calculate totals
-        total_distance = sum(segment.distance_km for segment in segments)
-        total_time = sum(
-            segment.duration_minutes + segment.traffic_delay_minutes
-            for segment in segments
-        )
-        estimated_fuel_cost = (total_distance / vehicle.fuel_efficiency) * self.fuel_price_per_liter
+        points_by_id = {p.id: p for p in delivery_points}
+        optimized_routes = []
+        for route, vehicle in zip(routes, vehicles):
+            route_points = [points_by_id[distance_matrix.ids[k]] for k in route[1:]]
+            optimized_routes.append(
+                self.build_optimized_route(route, distance_matrix, vehicle, route_points, windows=windows)
+            )
 
-        # Calculate optimization score
-        optimization_score = self.calculate_optimization_score(
-            improved_route, distance_matrix, vehicle, delivery_points
+        return FleetPlan(
+            vehicles=vehicles,
+            routes=optimized_routes,
+            loads=[round(load, 2) for load in search.loads],
+            additional_vehicles=len(vehicles) - fleet_size,
+            unassigned=unassigned,
+            search_stats=search_stats
         )
 
-        # Convert segments to dict format for JSON serialization
-        segments_dict = [
-            {
-                "from_point": segment.from_point,
-                "to_point": segment.to_point,
-                "distance_km": segment.distance_km,
-                "duration_minutes": segment.duration_minutes,
-                "traffic_delay_minutes": segment.traffic_delay_minutes
-            }
-            for segment in segments
+    def repair_fleet_routes(self, routes: List[List[str]], vehicles: List[Vehicle],
+                            delivery_points: List[DeliveryPoint], start_location: DeliveryPoint,
+                            distance_matrix: Optional[Union[CostMatrix, Dict]],
+                            optimization_goal: str = "time", time_limit_ms: Optional[float] = None,
+                            departure_time: Optional[str] = None, priority_weight: float = 0.0) -> FleetPlan:
+        """
+        Re-optimize a few existing routes together with the fleet descent
+        (inter-route relocate, swap and 2-opt* plus the intra-route moves),
+        e.g. the routes either side of a cluster boundary after a decomposed
+        solve. routes hold the stop ids of each vehicle's route, without the
+        start location; the result keeps the same vehicles in the same order.
+        """
+        all_points = [start_location] + delivery_points
+        distance_matrix = self.ensure_cost_matrix(all_points, distance_matrix, vehicles[0].type)
+        depot = distance_matrix.index[start_location.id]
+        demand = np.zeros(len(distance_matrix), dtype=np.float64)
+        demand[distance_matrix.indices([p.id for p in delivery_points])] = [
+            self.size_weights[p.size] for p in delivery_points
         ]
-
-        return OptimizedRoute(
-            route_order=improved_route,
-            segments=segments_dict,
-            total_distance_km=round(total_distance, 2),
-            total_time_minutes=int(total_time),
-            estimated_fuel_cost=round(estimated_fuel_cost, 2),
-            optimization_score=round(optimization_score, 3)
-        )
\ No newline at end of file
+        windows = self.build_time_windows(all_points, start_location, distance_matrix, departure_time)
+
+        search = LocalSearch(
+            distance_matrix.edge_costs(optimization_goal),
+            [[depot] + distance_matrix.indices(route) for route in routes],
+            demand=demand,
+            capacities=[float(self.capacity_limits[v.capacity]) for v in vehicles],
+            time_budget_ms=time_limit_ms if time_limit_ms is not None else self.boundary_repair_time_ms,
+            neighbor_k=self.fleet_neighbor_k,
+            windows=windows if windows.constrained else None,
+            penalty=self.priority_penalty(delivery_points, distance_matrix, priority_weight)
+        )
+        repaired = search.run()
+
+        points_by_id = {p.id: p for p in delivery_points}
+        return FleetPlan(
+            vehicles=list(vehicles),
+            routes=[
+                self.build_optimized_route(
+                    route, distance_matrix, vehicle,
+                    [points_by_id[distance_matrix.ids[k]] for k in route[1:]], windows=windows
+                )
+                for route, vehicle in zip(repaired, vehicles)
+            ],
+            loads=[round(load, 2) for load in search.loads],
+            search_stats={"algorithm": "vnd", **search.stats()}
+        )
@@ -0,0 +1,84 @@
+from typing import Dict, Sequence, Tuple, Union
+
+import numpy as np
+
+from core.analytics import MAX_PRIORITY
+
+ArrayLike = Union[int, np.ndarray]
+
+
+class PriorityPenalty:
+    """
+    Delivery priority as a soft ordering penalty in the route objective.
+
+    Each stop has an urgency of MAX_PRIORITY - priority (4 for priority 1,
+    0 for priority 5) and a route pays
+
+        weight * sum(urgency[route[k]] * k)
+
+    on top of its travel cost, i.e. weight cost units (minutes or km) for
+    every position an urgency unit waits. Serving stops in priority order
+    minimizes the penalty, so weight trades travel cost against priority
+    adherence: 0 ignores priorities, large weights sort by them.
+
+    Every move of the searches only shifts contiguous blocks of positions,
+    so its penalty change is O(1) from two prefix sums along the route:
+    U[k] = sum of urgencies at positions < k and P[k] = the same weighted
+    by position (see prefix()).
+    """
+
+    def __init__(self, urgency: np.ndarray, weight: float):
+        self.urgency = np.asarray(urgency, dtype=np.float64)
+        self.weight = float(weight)
+
+    @classmethod
+    def from_points(cls, ids: Sequence[str], priorities: Dict[str, int], weight: float) -> "PriorityPenalty":
+        """Urgencies by matrix index for ids; points without a priority (the start) get 0."""
+        urgency = np.asarray(
+            [max(MAX_PRIORITY - priorities[point_id], 0) if point_id in priorities else 0 for point_id in ids],
+            dtype=np.float64
+        )
+        return cls(urgency, weight)
+
+    def subset(self, nodes: Sequence[int]) -> "PriorityPenalty":
+        """The same penalty in the local indices of a submatrix over nodes."""
+        return PriorityPenalty(self.urgency[np.asarray(nodes, dtype=np.intp)], self.weight)
+
+    def prefix(self, order: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(U, P): prefix sums of urgency and of urgency * position along order, length n + 1."""
+        urgency = self.urgency[np.asarray(order, dtype=np.intp)]
+        positions = np.arange(urgency.size, dtype=np.float64)
+        return (np.concatenate(([0.0], np.cumsum(urgency))),
+                np.concatenate(([0.0], np.cumsum(urgency * positions))))
+
+    def route_penalty(self, route: Sequence[int]) -> float:
+        urgency = self.urgency[np.asarray(route, dtype=np.intp)]
+        return self.weight * float((urgency * np.arange(urgency.size)).sum())
+
+    def reversal(self, U: np.ndarray, P: np.ndarray, i: ArrayLike, j: ArrayLike) -> ArrayLike:
+        """Change from reversing route[i:j]: position k becomes i + j - 1 - k."""
+        return self.weight * ((i + j - 1) * (U[j] - U[i]) - 2.0 * (P[j] - P[i]))
+
+    def chain_move(self, U: np.ndarray, P: np.ndarray, s: int, length: int, t: ArrayLike,
+                   reverse: bool = False) -> ArrayLike:
+        """
+        Change from moving route[s:s + length] so that it starts at position t
+        of the new route (optionally reversed). The stops it jumps over shift
+        by length the other way.
+        """
+        chain = U[s + length] - U[s]
+        if reverse:
+            # Chain stop s + m lands at t + length - 1 - m
+            moved = (t + length - 1 - s) * chain - 2.0 * (P[s + length] - P[s] - s * chain)
+        else:
+            moved = (t - s) * chain
+        t = np.asarray(t)
+        earlier = np.minimum(t, s)
+        later = np.maximum(t, s) + length
+        passed = np.where(t < s, U[s] - U[earlier], -(U[later] - U[s + length]))
+        result = self.weight * (moved + length * passed)
+        return result if result.ndim else float(result)
+
+    def swap(self, urgency_i: ArrayLike, urgency_j: ArrayLike, i: ArrayLike, j: ArrayLike) -> ArrayLike:
+        """Change from exchanging the stops at positions i and j (of the same or different routes)."""
+        return self.weight * (urgency_i - urgency_j) * (j - i)
@@ -0,0 +1,590 @@
+import gzip
+import heapq
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import networkx as nx
+import numpy as np
+
+from core.geo import haversine_pairs_km
+from core.spatial_index import GridIndex
+
+# Free-flow speeds (km/h) by OSM highway class, for ways without a usable maxspeed tag
+HIGHWAY_SPEEDS_KMH = {
+    "motorway": 70, "motorway_link": 40, "trunk": 50, "trunk_link": 35,
+    "primary": 40, "primary_link": 30, "secondary": 35, "secondary_link": 25,
+    "tertiary": 30, "tertiary_link": 25, "unclassified": 25, "residential": 20,
+    "living_street": 10, "service": 15, "road": 20
+}
+
+# Speed of the straight-line leg between a point and the road node it is snapped to
+ACCESS_SPEED_KMH = 10.0
+
+# Path costs are packed into one int64: travel time in deciseconds above KEY_SHIFT bits of
+# distance in decimetres. Sums of keys are sums of both parts, and the smallest key is the
+# fastest path (shortest among equally fast ones), so one min() carries its distance along.
+KEY_SHIFT = 28
+DISTANCE_MASK = (1 << KEY_SHIFT) - 1
+# Far below the int64 limit, so adding the edges of a sweep to it cannot overflow
+UNREACHABLE = np.iinfo(np.int64).max // 4
+
+# Cells of the int64 distance block of a many-to-many sweep (64 MB)
+SWEEP_CELLS = 8_000_000
+
+
+def pack_keys(time_s: np.ndarray, distance_m: np.ndarray) -> np.ndarray:
+    """Packed keys of edges; every edge takes at least one decisecond."""
+    time_ds = np.maximum(np.rint(np.asarray(time_s, dtype=np.float64) * 10), 1).astype(np.int64)
+    distance_dm = np.rint(np.asarray(distance_m, dtype=np.float64) * 10).astype(np.int64)
+    return (time_ds << KEY_SHIFT) | distance_dm
+
+
+def unpack_keys(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(minutes, km) of packed path keys; unreachable entries become inf."""
+    keys = np.asarray(keys, dtype=np.int64)
+    reachable = keys < UNREACHABLE
+    minutes = np.where(reachable, (keys >> KEY_SHIFT) / 600.0, np.inf)
+    km = np.where(reachable, (keys & DISTANCE_MASK) / 10_000.0, np.inf)
+    return minutes, km
+
+
+def concat_ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, end) over the ranges, vectorized."""
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return offsets + np.arange(total)
+
+
+def parse_maxspeed(value: Optional[str]) -> Optional[float]:
+    """km/h of an OSM maxspeed tag ("50", "30 mph"), or None when not numeric."""
+    if not value:
+        return None
+    match = re.match(r"\s*([\d.]+)\s*(mph)?", value)
+    if not match:
+        return None
+    speed = float(match.group(1))
+    return speed * 1.609 if match.group(2) else speed
+
+
+class RoadGraph:
+    """
+    Directed road graph in compressed sparse row form.
+
+    Node k sits at (lats[k], lons[k]); its outgoing edges are
+    heads[indptr[k]:indptr[k + 1]], with their length in metres and
+    free-flow travel time in seconds. Two-way roads are two edges.
+    """
+
+    def __init__(self, lats: Sequence[float], lons: Sequence[float], tails: Sequence[int], heads: Sequence[int],
+                 distance_m: Sequence[float], time_s: Sequence[float]):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        tails = np.asarray(tails, dtype=np.int64)
+        order = np.argsort(tails, kind="stable")
+        self.heads = np.asarray(heads, dtype=np.int64)[order]
+        self.distance_m = np.asarray(distance_m, dtype=np.float64)[order]
+        self.time_s = np.asarray(time_s, dtype=np.float64)[order]
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(tails, minlength=self.lats.size))))
+
+    def __len__(self) -> int:
+        return self.lats.size
+
+    @property
+    def tails(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self)), np.diff(self.indptr))
+
+    @classmethod
+    def from_osm(cls, path: str, speeds: Optional[Dict[str, float]] = None) -> "RoadGraph":
+        """
+        Drivable ways of an OSM XML extract (.osm, or .osm.gz), streamed
+        with iterparse. Only nodes used by a drivable way become graph
+        nodes; every pair of consecutive way nodes is an edge, one-way when
+        the way is (oneway=-1 runs against the node order), driven at the
+        way's maxspeed or its highway class's speed.
+        """
+        speeds = speeds or HIGHWAY_SPEEDS_KMH
+        node_ids: List[int] = []
+        node_lats: List[float] = []
+        node_lons: List[float] = []
+        ways: List[Tuple[List[int], float, int]] = []
+
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rb") as f:
+            for _, element in ET.iterparse(f, events=("end",)):
+                if element.tag == "node":
+                    node_ids.append(int(element.get("id")))
+                    node_lats.append(float(element.get("lat")))
+                    node_lons.append(float(element.get("lon")))
+                elif element.tag == "way":
+                    tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+                    highway = tags.get("highway")
+                    if (highway in speeds and tags.get("area") != "yes" and
+                            tags.get("access") not in ("no", "private") and tags.get("motor_vehicle") != "no"):
+                        refs = [int(nd.get("ref")) for nd in element.iter("nd")]
+                        speed = parse_maxspeed(tags.get("maxspeed")) or speeds[highway]
+                        oneway = tags.get("oneway")
+                        direction = (-1 if oneway == "-1" else
+                                     1 if oneway in ("yes", "true", "1") or tags.get("junction") == "roundabout"
+                                     else 0)
+                        if len(refs) > 1:
+                            ways.append((refs, speed, direction))
+                if element.tag in ("node", "way", "relation"):
+                    element.clear()
+
+        ids = np.asarray(node_ids, dtype=np.int64)
+        order = np.argsort(ids)
+        ids = ids[order]
+        lats = np.asarray(node_lats)[order]
+        lons = np.asarray(node_lons)[order]
+
+        tails, heads, speed_kmh = [], [], []
+        for refs, speed, direction in ways:
+            position = np.searchsorted(ids, refs)
+            position = position[(position < ids.size) & (ids[np.minimum(position, ids.size - 1)] == refs)]
+            if position.size < 2:
+                continue
+            a, b = position[:-1], position[1:]
+            if direction >= 0:
+                tails.append(a)
+                heads.append(b)
+                speed_kmh.append(np.full(a.size, speed))
+            if direction <= 0:
+                tails.append(b)
+                heads.append(a)
+                speed_kmh.append(np.full(a.size, speed))
+        if not tails:
+            raise ValueError(f"No drivable ways in {path}")
+        tails = np.concatenate(tails)
+        heads = np.concatenate(heads)
+        speed_kmh = np.concatenate(speed_kmh)
+
+        # Keep the nodes on drivable ways only, renumbered densely
+        used = np.unique(np.concatenate((tails, heads)))
+        tails = np.searchsorted(used, tails)
+        heads = np.searchsorted(used, heads)
+        lats, lons = lats[used], lons[used]
+        distance_m = haversine_pairs_km(lats[tails], lons[tails], lats[heads], lons[heads], decimals=None) * 1000.0
+        return cls(lats, lons, tails, heads, distance_m, distance_m / (speed_kmh / 3.6))
+
+    def largest_component(self) -> "RoadGraph":
+        """
+        The largest strongly connected component, renumbered. Extracts cut
+        at their boundary leave one-way stubs that cannot be left (or
+        entered); keeping only the main component makes every pair of
+        snapped points mutually reachable.
+        """
+        graph = nx.DiGraph()
+        graph.add_nodes_from(range(len(self)))
+        graph.add_edges_from(zip(self.tails.tolist(), self.heads.tolist()))
+        keep = np.zeros(len(self), dtype=bool)
+        keep[list(max(nx.strongly_connected_components(graph), key=len))] = True
+
+        tails = self.tails
+        edges = keep[tails] & keep[self.heads]
+        renumber = np.cumsum(keep) - 1
+        return RoadGraph(self.lats[keep], self.lons[keep], renumber[tails[edges]], renumber[self.heads[edges]],
+                         self.distance_m[edges], self.time_s[edges])
+
+
+class ContractionHierarchy:
+    """
+    Contraction hierarchy over a RoadGraph, for exact shortest paths (by
+    travel time, with the distance driven) between many points at once.
+
+    Nodes are contracted one by one in order of importance (edge difference
+    plus contracted neighbours, updated lazily); contracting a node adds a
+    shortcut u -> w for every path u -> v -> w that no witness search finds
+    a path as short as. Each node gets a rank (its contraction order) and a
+    level, one above the highest level of the neighbours contracted before
+    it, so every edge of the hierarchy joins a lower level to a higher one.
+
+    Shortest paths then go up in rank from the source and down to the
+    target. many_to_many() computes them for whole sets of sources and
+    targets in two level-by-level NumPy sweeps (as in RPHAST): up the
+    levels over the nodes reachable upward from the sources, then down the
+    levels over the nodes the targets are reachable from, for a block of
+    sources at a time. Each level is a few gathers and element-wise mins,
+    so the Python cost is per level, not per node.
+    """
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray, rank: np.ndarray, level: np.ndarray,
+                 tails: np.ndarray, heads: np.ndarray, keys: np.ndarray, mids: np.ndarray):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.rank = np.asarray(rank, dtype=np.int64)
+        self.level = np.asarray(level, dtype=np.int64)
+        # Hierarchy edges in driving direction; mids[e] is the node a shortcut bypasses (-1 for roads)
+        self.tails = np.asarray(tails, dtype=np.int64)
+        self.heads = np.asarray(heads, dtype=np.int64)
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self.mids = np.asarray(mids, dtype=np.int64)
+
+        n = self.lats.size
+        upward = self.rank[self.heads] > self.rank[self.tails]
+        # Upward edges by tail, and downward edges by head (searched backwards from targets)
+        self._up = self._csr(self.tails[upward], np.flatnonzero(upward), n)
+        self._down = self._csr(self.heads[~upward], np.flatnonzero(~upward), n)
+        self._upward = upward
+        order = np.argsort(self.tails * n + self.heads)
+        self._edge_codes = (self.tails * n + self.heads)[order]
+        self._edge_order = order
+
+    @staticmethod
+    def _csr(nodes: np.ndarray, edges: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(nodes, kind="stable")
+        return np.concatenate(([0], np.cumsum(np.bincount(nodes, minlength=n)))), edges[order]
+
+    def __len__(self) -> int:
+        return self.lats.size
+
+    @classmethod
+    def build(cls, graph: RoadGraph, witness_settle_limit: int = 60) -> "ContractionHierarchy":
+        """Contract every node of graph. Witness searches settle at most witness_settle_limit nodes."""
+        n = len(graph)
+        out_adj: List[Dict[int, int]] = [{} for _ in range(n)]
+        in_adj: List[Dict[int, int]] = [{} for _ in range(n)]
+        for tail, head, key in zip(graph.tails.tolist(), graph.heads.tolist(),
+                                   pack_keys(graph.time_s, graph.distance_m).tolist()):
+            if tail != head and key < out_adj[tail].get(head, UNREACHABLE):
+                out_adj[tail][head] = key
+                in_adj[head][tail] = key
+        mids: Dict[Tuple[int, int], int] = {}
+
+        def witness_distances(source: int, avoid: int, limit: int, targets: Dict[int, int],
+                              settle_limit: int) -> Dict[int, int]:
+            # Tentative distances are real paths around avoid, so unsettled ones are valid witnesses too
+            dist = {source: 0}
+            heap = [(0, source)]
+            settled = 0
+            remaining = len(targets)
+            while heap:
+                d, x = heapq.heappop(heap)
+                if d > dist[x]:
+                    continue
+                if d > limit or settled >= settle_limit:
+                    break
+                settled += 1
+                if x in targets:
+                    remaining -= 1
+                    if not remaining:
+                        break
+                for y, key in out_adj[x].items():
+                    if y != avoid and d + key < dist.get(y, UNREACHABLE):
+                        dist[y] = d + key
+                        heapq.heappush(heap, (d + key, y))
+            return dist
+
+        def shortcuts(v: int, settle_limit: int = witness_settle_limit) -> List[Tuple[int, int, int]]:
+            outgoing = out_adj[v]
+            needed = []
+            if not outgoing:
+                return needed
+            for u, key_uv in in_adj[v].items():
+                targets = {w: key_vw for w, key_vw in outgoing.items() if w != u}
+                if not targets:
+                    continue
+                dist = witness_distances(u, v, key_uv + max(targets.values()), targets, settle_limit)
+                for w, key_vw in targets.items():
+                    if dist.get(w, UNREACHABLE) > key_uv + key_vw:
+                        needed.append((u, w, key_uv + key_vw))
+            return needed
+
+        contracted_neighbors = [0] * n
+
+        def priority(v: int) -> int:
+            return len(shortcuts(v)) - len(in_adj[v]) - len(out_adj[v]) + contracted_neighbors[v]
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        rank = np.empty(n, dtype=np.int64)
+        level = [0] * n
+        tails, heads, keys, bypassed = [], [], [], []
+        contracted = [False] * n
+        next_rank = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]:
+                continue
+            # Lazy update: contract v only if it is still the least important node
+            current = priority(v)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+
+            added = shortcuts(v)
+            contracted[v] = True
+            rank[v] = next_rank
+            next_rank += 1
+            for w, key in out_adj[v].items():
+                tails.append(v)
+                heads.append(w)
+                keys.append(key)
+                bypassed.append(mids.get((v, w), -1))
+                del in_adj[w][v]
+            for u, key in in_adj[v].items():
+                tails.append(u)
+                heads.append(v)
+                keys.append(key)
+                bypassed.append(mids.get((u, v), -1))
+                del out_adj[u][v]
+            for u, w, key in added:
+                if key < out_adj[u].get(w, UNREACHABLE):
+                    out_adj[u][w] = key
+                    in_adj[w][u] = key
+                    mids[(u, w)] = v
+
+            neighbors = set(out_adj[v]) | set(in_adj[v])
+            out_adj[v] = {}
+            in_adj[v] = {}
+            for w in neighbors:
+                contracted_neighbors[w] += 1
+                level[w] = max(level[w], level[v] + 1)
+
+        return cls(graph.lats, graph.lons, rank, level, tails, heads, keys, bypassed)
+
+    def save(self, path: str):
+        np.savez(path, lats=self.lats, lons=self.lons, rank=self.rank, level=self.level,
+                 tails=self.tails, heads=self.heads, keys=self.keys, mids=self.mids)
+
+    @classmethod
+    def load(cls, path: str) -> "ContractionHierarchy":
+        with np.load(path) as data:
+            return cls(data["lats"], data["lons"], data["rank"], data["level"],
+                       data["tails"], data["heads"], data["keys"], data["mids"])
+
+    def _closure(self, csr: Tuple[np.ndarray, np.ndarray], other_end: np.ndarray,
+                 starts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Nodes reachable from starts over the csr edges, and those edges."""
+        indptr, edges = csr
+        seen = np.zeros(len(self), dtype=bool)
+        frontier = np.unique(starts)
+        seen[frontier] = True
+        found = []
+        while frontier.size:
+            edge_ids = edges[concat_ranges(indptr[frontier], indptr[frontier + 1])]
+            found.append(edge_ids)
+            frontier = np.unique(other_end[edge_ids])
+            frontier = frontier[~seen[frontier]]
+            seen[frontier] = True
+        return np.flatnonzero(seen), np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+    def _sweep_levels(self, edge_ids: np.ndarray, sources: np.ndarray, targets: np.ndarray,
+                      position: np.ndarray, descending: bool) -> List[Tuple[np.ndarray, ...]]:
+        """
+        Relaxation steps of a sweep over edge_ids (from sources to targets
+        ends), one per level of the target end in sweep order: the distinct
+        local targets, and their incoming edges in slots, slot k holding the
+        k-th edge of every target that has one (the targets' rows, None for
+        all in slot 0, then the edges' local sources and keys). A slot is a
+        plain gather and min, which is several times faster than a
+        segmented reduceat over the level's edges.
+        """
+        source_nodes = sources[edge_ids]
+        target_nodes = targets[edge_ids]
+        target_level = self.level[target_nodes]
+        order = np.lexsort((target_nodes, -target_level if descending else target_level))
+        source_nodes, target_nodes, target_level = source_nodes[order], target_nodes[order], target_level[order]
+        keys = self.keys[edge_ids][order]
+
+        steps = []
+        level_starts = np.flatnonzero(np.diff(target_level, prepend=-1) != 0) if target_level.size else []
+        level_ends = list(level_starts[1:]) + [target_level.size]
+        for lo, hi in zip(level_starts, level_ends):
+            nodes = target_nodes[lo:hi]
+            runs = np.flatnonzero(np.diff(nodes, prepend=-1) != 0)
+            run_of_edge = np.cumsum(np.diff(nodes, prepend=-1) != 0) - 1
+            slot_of_edge = np.arange(hi - lo) - runs[run_of_edge]
+            slots = []
+            for k in range(int(slot_of_edge.max()) + 1):
+                edges = np.flatnonzero(slot_of_edge == k)
+                slots.append((None if k == 0 else run_of_edge[edges],
+                              position[source_nodes[lo:hi][edges]], keys[lo:hi][edges, None]))
+            steps.append((position[nodes[runs]], slots))
+        return steps
+
+    def many_to_many(self, sources: Sequence[int], targets: Sequence[int]) -> np.ndarray:
+        """Packed shortest-path keys from every source node to every target node (len(sources) x len(targets))."""
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        forward_nodes, up_edges = self._closure(self._up, self.heads, sources)
+        backward_nodes, down_edges = self._closure(self._down, self.tails, targets)
+
+        nodes = np.union1d(forward_nodes, backward_nodes)
+        position = np.full(len(self), -1, dtype=np.int64)
+        position[nodes] = np.arange(nodes.size)
+        up_steps = self._sweep_levels(up_edges, self.tails, self.heads, position, descending=False)
+        down_steps = self._sweep_levels(down_edges, self.tails, self.heads, position, descending=True)
+
+        result = np.empty((sources.size, targets.size), dtype=np.int64)
+        block = max(1, min(sources.size, SWEEP_CELLS // max(nodes.size, 1)))
+        target_positions = position[targets]
+        for start in range(0, sources.size, block):
+            stop = min(start + block, sources.size)
+            dist = np.full((nodes.size, stop - start), UNREACHABLE, dtype=np.int64)
+            dist[position[sources[start:stop]], np.arange(stop - start)] = 0
+            for head_positions, slots in up_steps + down_steps:
+                best = dist[head_positions]
+                for rows, tail_positions, keys in slots:
+                    relaxed = dist[tail_positions]
+                    relaxed += keys
+                    if rows is None:
+                        np.minimum(best, relaxed, out=best)
+                    else:
+                        best[rows] = np.minimum(best[rows], relaxed)
+                dist[head_positions] = best
+            result[start:stop] = dist[target_positions].T
+        return np.minimum(result, UNREACHABLE)
+
+    def _search(self, csr: Tuple[np.ndarray, np.ndarray], other_end: np.ndarray,
+                start: int) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """Dijkstra over one direction of the hierarchy: distances and the edge each node was reached by."""
+        indptr, edges = csr
+        dist = {start: 0}
+        via: Dict[int, int] = {}
+        heap = [(0, start)]
+        while heap:
+            d, x = heapq.heappop(heap)
+            if d > dist[x]:
+                continue
+            for e in edges[indptr[x]:indptr[x + 1]].tolist():
+                y = int(other_end[e])
+                if d + self.keys[e] < dist.get(y, UNREACHABLE):
+                    dist[y] = d + int(self.keys[e])
+                    via[y] = e
+                    heapq.heappush(heap, (dist[y], y))
+        return dist, via
+
+    def _unpack(self, edge: int, path: List[int]):
+        """Append the road nodes of a hierarchy edge after its tail."""
+        stack = [edge]
+        n = len(self)
+        while stack:
+            e = stack.pop()
+            mid = int(self.mids[e])
+            if mid < 0:
+                path.append(int(self.heads[e]))
+                continue
+            tail, head = int(self.tails[e]), int(self.heads[e])
+            halves = self._edge_order[np.searchsorted(self._edge_codes, [tail * n + mid, mid * n + head])]
+            stack.extend(reversed(halves.tolist()))
+
+    def path(self, source: int, target: int) -> List[int]:
+        """Road nodes of the shortest path from source to target (empty if unreachable)."""
+        forward, forward_via = self._search(self._up, self.heads, source)
+        backward, backward_via = self._search(self._down, self.tails, target)
+        meeting = min((node for node in forward if node in backward),
+                      key=lambda node: forward[node] + backward[node], default=None)
+        if meeting is None:
+            return []
+
+        up_edges = []
+        node = meeting
+        while node != source:
+            e = forward_via[node]
+            up_edges.append(e)
+            node = int(self.tails[e])
+        path = [source]
+        for e in reversed(up_edges):
+            self._unpack(e, path)
+        node = meeting
+        while node != target:
+            e = backward_via[node]
+            self._unpack(e, path)
+            node = int(self.heads[e])
+        return path
+
+
+class RoadNetwork:
+    """
+    Road travel costs between arbitrary coordinates: points are snapped to
+    their nearest road node, and costs are the shortest road path between
+    the nodes (fastest at free flow, with its length) plus the straight
+    access legs to and from the road at ACCESS_SPEED_KMH.
+    """
+
+    def __init__(self, hierarchy: ContractionHierarchy):
+        self.hierarchy = hierarchy
+        self.index = GridIndex(hierarchy.lats, hierarchy.lons)
+
+    @classmethod
+    def load(cls, path: str) -> "RoadNetwork":
+        """
+        Network from a saved hierarchy (.npz) or an OSM XML extract. An
+        extract's hierarchy is built once and saved next to it as
+        <path>.ch.npz, which later loads reuse.
+        """
+        if path.endswith(".npz"):
+            return cls(ContractionHierarchy.load(path))
+        cached = path + ".ch.npz"
+        if os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(path):
+            return cls(ContractionHierarchy.load(cached))
+        hierarchy = ContractionHierarchy.build(RoadGraph.from_osm(path).largest_component())
+        hierarchy.save(cached)
+        return cls(hierarchy)
+
+    def __len__(self) -> int:
+        return len(self.hierarchy)
+
+    def snap(self, lats: Sequence[float], lons: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest road node of every point, and the straight distance to it (km)."""
+        nodes = self.index.nearest_to(lats, lons)
+        access = haversine_pairs_km(lats, lons, self.hierarchy.lats[nodes], self.hierarchy.lons[nodes],
+                                    decimals=None)
+        return nodes, access.astype(np.float64)
+
+    def costs(self, origin_lats: Sequence[float], origin_lons: Sequence[float],
+              dest_lats: Sequence[float], dest_lons: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Free-flow minutes and km from every origin to every destination (inf where unreachable)."""
+        origins, origin_access = self.snap(origin_lats, origin_lons)
+        destinations, dest_access = self.snap(dest_lats, dest_lons)
+        unique_origins, origin_rows = np.unique(origins, return_inverse=True)
+        unique_destinations, dest_columns = np.unique(destinations, return_inverse=True)
+        keys = self.hierarchy.many_to_many(unique_origins, unique_destinations)[np.ix_(origin_rows, dest_columns)]
+        minutes, km = unpack_keys(keys)
+        access = origin_access[:, None] + dest_access[None, :]
+        return minutes + access * (60.0 / ACCESS_SPEED_KMH), km + access
+
+    def neighbor_costs(self, lats: Sequence[float], lons: Sequence[float], neighbors: np.ndarray,
+                       block: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Free-flow minutes and km from every point to each of its neighbours
+        (neighbors is N x K point indices), without the N x N matrix. Points
+        are taken in blocks of nearby ones (by grid cell of their road node),
+        whose neighbours mostly coincide, and each block is one
+        many-to-many query against the union of its neighbours.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        nodes, access = self.snap(lats, lons)
+        minutes = np.empty(neighbors.shape)
+        km = np.empty(neighbors.shape)
+        order = np.argsort(self.index.cell_of[nodes], kind="stable")
+        for start in range(0, order.size, block):
+            rows = order[start:start + block]
+            sources, source_rows = np.unique(nodes[rows], return_inverse=True)
+            targets, target_columns = np.unique(nodes[neighbors[rows]], return_inverse=True)
+            keys = self.hierarchy.many_to_many(sources, targets)
+            block_minutes, block_km = unpack_keys(
+                keys[source_rows[:, None], target_columns.reshape(rows.size, -1)]
+            )
+            legs = access[rows, None] + access[neighbors[rows]]
+            minutes[rows] = block_minutes + legs * (60.0 / ACCESS_SPEED_KMH)
+            km[rows] = block_km + legs
+        return minutes, km
+
+    def route_geometry(self, lats: Sequence[float], lons: Sequence[float]) -> List[List[List[float]]]:
+        """[[lat, lon], ...] of the road path of each leg between consecutive points, access legs included."""
+        nodes, _ = self.snap(lats, lons)
+        geometry = []
+        for k in range(len(nodes) - 1):
+            path = self.hierarchy.path(int(nodes[k]), int(nodes[k + 1]))
+            leg = [[float(lats[k]), float(lons[k])]]
+            leg += [[float(self.hierarchy.lats[node]), float(self.hierarchy.lons[node])] for node in path]
+            leg.append([float(lats[k + 1]), float(lons[k + 1])])
+            geometry.append(leg)
+        return geometry
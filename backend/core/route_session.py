@@ -0,0 +1,385 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.cost_matrix import CostMatrix
+from core.optimizer import DeliveryPoint, OptimizedRoute, RouteOptimizer, Vehicle
+from core.time_windows import TimeWindows, format_clock
+
+EPSILON = 1e-9
+
+
+def insertion_position(cost: np.ndarray, route: List[int], node: int,
+                       windows: Optional[TimeWindows] = None) -> int:
+    """
+    Index at which inserting node into the open route costs least. With
+    windows, positions are ranked by the lateness they cause first (zero
+    where the insertion keeps every window), then by cost.
+    """
+    order = np.asarray(route, dtype=np.intp)
+    xs = order
+    ys = np.append(order[1:], order[-1])
+    has_y = np.arange(order.size) < order.size - 1
+    delta = cost[xs, node].astype(np.float64) + np.where(has_y, cost[node, ys] - cost[xs, ys], 0.0)
+    if windows is None:
+        return int(np.argmin(delta)) + 1
+
+    size = windows.travel.shape[0]
+    start, slack, deadline = np.zeros(size), np.zeros(size), windows.latest.copy()
+    windows.refresh(route, start, slack, deadline)
+    late = windows.insertion_lateness(
+        start[xs] + windows.service[xs], xs, node, ys, has_y, start, slack, deadline
+    )
+    return int(np.lexsort((delta, late))[0]) + 1
+
+
+def local_repair(cost: np.ndarray, route: List[int], focus: Iterable[int],
+                 windows: Optional[TimeWindows] = None, radius: int = 4,
+                 max_moves: int = 25, max_window_checks: int = 32) -> int:
+    """
+    Best-improvement 2-opt and Or-opt over the part of the route around the
+    focus stops, applied in place. Only moves with an end within `radius`
+    positions of a focus stop are scored, so each round is O(radius * n)
+    instead of the O(n^2) of a full descent; stops touched by a move join the
+    focus. With windows, improving moves are re-simulated over the stretch
+    they reorder and skipped if a stop would become (later) late.
+    Returns the number of moves applied.
+    """
+    focus = set(focus)
+    size = cost.shape[0]
+    if windows is not None:
+        start, slack, deadline = np.zeros(size), np.zeros(size), windows.latest.copy()
+        windows.refresh(route, start, slack, deadline)
+
+    moves = 0
+    while moves < max_moves and len(route) >= 3:
+        n = len(route)
+        order = np.asarray(route, dtype=np.intp)
+        position = {node: k for k, node in enumerate(route)}
+        near = sorted({
+            k for node in focus if node in position
+            for k in range(max(1, position[node] - radius), min(n, position[node] + radius + 1))
+        })
+
+        # Prefix costs along and against the route price reversals on asymmetric matrices
+        fwd = np.concatenate(([0.0], np.cumsum(cost[order[:-1], order[1:]], dtype=np.float64)))
+        bwd = np.concatenate(([0.0], np.cumsum(cost[order[1:], order[:-1]], dtype=np.float64)))
+
+        candidates: List[Tuple[float, str, int, int, int]] = []
+
+        def collect(delta: np.ndarray, kind: str, first: np.ndarray, second: np.ndarray, extra: int = 0):
+            for k in np.flatnonzero(delta < -EPSILON):
+                candidates.append((float(delta[k]), kind, int(first[k]), int(second[k]), extra))
+
+        def reversal_delta(i: np.ndarray, j: np.ndarray) -> np.ndarray:
+            # Reverse route[i:j] (j <= n - 1): edges (a, b) and (c, e) become (a, c) and (b, e)
+            a, b, c, e = order[i - 1], order[i], order[j - 1], order[j]
+            return (cost[a, c].astype(np.float64) + cost[b, e] - cost[a, b] - cost[c, e] +
+                    (bwd[j - 1] - bwd[i]) - (fwd[j - 1] - fwd[i]))
+
+        for k in near:
+            # Reversals starting or ending next to a focus position
+            if k <= n - 3:
+                j = np.arange(k + 2, n)
+                collect(reversal_delta(np.full(j.size, k), j), "2opt", np.full(j.size, k), j)
+            if k >= 3:
+                i = np.arange(1, k - 1)
+                collect(reversal_delta(i, np.full(i.size, k)), "2opt", i, np.full(i.size, k))
+
+            # Chains of 1..3 stops starting at a focus position, moved anywhere (optionally reversed)
+            for length in range(1, 4):
+                if k + length > n:
+                    break
+                chain = order[k:k + length]
+                first, last, prev = chain[0], chain[-1], order[k - 1]
+                internal = fwd[k + length - 1] - fwd[k]
+                removal = float(cost[prev, first]) + internal
+                if k + length < n:
+                    nxt = order[k + length]
+                    removal += float(cost[last, nxt]) - float(cost[prev, nxt])
+                rest = np.concatenate((order[:k], order[k + length:]))
+                xs = rest
+                ys = np.append(rest[1:], rest[-1])
+                has_y = np.arange(rest.size) < rest.size - 1
+                base = np.where(has_y, -cost[xs, ys].astype(np.float64), 0.0)
+                slots = np.arange(rest.size)
+                forward = cost[xs, first] + np.where(has_y, cost[last, ys], 0.0) + base + internal - removal
+                forward[k - 1] = np.inf  # original position
+                collect(forward, "or_opt", np.full(rest.size, k), slots, length)
+                if length > 1:
+                    backward = (cost[xs, last] + np.where(has_y, cost[first, ys], 0.0) + base +
+                                (bwd[k + length - 1] - bwd[k]) - removal)
+                    collect(backward, "or_opt_reversed", np.full(rest.size, k), slots, length)
+
+        if not candidates:
+            break
+        candidates.sort()
+
+        applied = None
+        for delta, kind, p, q, length in candidates[:max_window_checks if windows is not None else 1]:
+            if kind == "2opt":
+                lo, hi, stretch = p, q, order[p:q][::-1].tolist()
+            else:
+                chain = order[p:p + length].tolist()
+                moved = chain[::-1] if kind == "or_opt_reversed" else chain
+                if q < p:
+                    lo, hi, stretch = q + 1, p + length, moved + order[q + 1:p].tolist()
+                else:
+                    lo, hi, stretch = p, q + length + 1, order[p + length:q + length + 1].tolist() + moved
+            if windows is None or windows.replacement_feasible(route, lo, hi, stretch, start, slack, deadline):
+                applied = (lo, hi, stretch)
+                break
+        if applied is None:
+            break
+
+        lo, hi, stretch = applied
+        route[lo:hi] = stretch
+        focus.update(stretch[:1] + stretch[-1:])
+        if windows is not None:
+            windows.refresh(route, start, slack, deadline)
+        moves += 1
+    return moves
+
+
+class RouteSession:
+    """
+    A live route that is edited with small deltas instead of re-solved.
+
+    The session keeps the CostMatrix and the route as matrix indices.
+    Inserting a stop adds one row and column to the matrix (removed stops keep
+    theirs, so adding them back is free), places the stop at its cheapest
+    position and repairs the route around it with local_repair. Removing a
+    stop repairs around the gap it leaves; moving one applies the requested
+    order as is. Time windows, when given, are honoured as in
+    RouteOptimizer.optimize. With analytics off, results skip the score and
+    savings baseline unless asked for.
+    """
+
+    REPAIR_RADIUS = 4
+    MAX_REPAIR_MOVES = 25
+
+    def __init__(self, optimizer: RouteOptimizer, points: Dict[str, DeliveryPoint],
+                 start_location: DeliveryPoint, vehicle: Vehicle, distance_matrix: CostMatrix,
+                 route: List[int], optimization_goal: str = "time", consider_traffic: bool = True,
+                 departure_time: Optional[str] = None, session_id: Optional[str] = None,
+                 analytics: bool = True):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.optimizer = optimizer
+        # Every point with a matrix row, including removed ones
+        self.points = points
+        self.start_location = start_location
+        self.vehicle = vehicle
+        self.distance_matrix = distance_matrix
+        self.route = route
+        self.optimization_goal = optimization_goal
+        self.consider_traffic = consider_traffic
+        self.analytics = analytics
+        self.version = 0
+        # Deltas of one session are applied one at a time
+        self.lock = asyncio.Lock()
+
+        # The departure is fixed once, so schedules stay comparable between deltas
+        windows = optimizer.build_time_windows(
+            self.delivery_points, start_location, distance_matrix, departure_time
+        )
+        self.departure_time = format_clock(windows.departure)
+
+    @classmethod
+    def from_route(cls, optimizer: RouteOptimizer, optimized_route: OptimizedRoute,
+                   delivery_points: List[DeliveryPoint], start_location: DeliveryPoint, vehicle: Vehicle,
+                   distance_matrix: CostMatrix, optimization_goal: str = "time",
+                   consider_traffic: bool = True, departure_time: Optional[str] = None,
+                   analytics: bool = True) -> "RouteSession":
+        """Start a session from a solved route and the matrix it was solved on."""
+        return cls.from_route_order(
+            optimizer, optimized_route.route_order, delivery_points, start_location, vehicle,
+            distance_matrix, optimization_goal, consider_traffic, departure_time, analytics
+        )
+
+    @classmethod
+    def from_route_order(cls, optimizer: RouteOptimizer, route_order: List[str],
+                         delivery_points: List[DeliveryPoint], start_location: DeliveryPoint, vehicle: Vehicle,
+                         distance_matrix: CostMatrix, optimization_goal: str = "time",
+                         consider_traffic: bool = True, departure_time: Optional[str] = None,
+                         analytics: bool = True) -> "RouteSession":
+        """Start a session from a route given as point ids (start location first)."""
+        if route_order[:1] != [start_location.id]:
+            raise ValueError("Route must begin at the start location")
+        if sorted(route_order[1:]) != sorted(p.id for p in delivery_points):
+            raise ValueError("Route must visit every delivery point exactly once")
+        points = {p.id: p for p in [start_location] + delivery_points}
+        return cls(
+            optimizer, points, start_location, vehicle, distance_matrix,
+            distance_matrix.indices(route_order), optimization_goal, consider_traffic, departure_time,
+            analytics=analytics
+        )
+
+    @property
+    def delivery_points(self) -> List[DeliveryPoint]:
+        """Stops currently on the route, in route order."""
+        return [self.points[self.distance_matrix.ids[k]] for k in self.route[1:]]
+
+    @property
+    def known_points(self) -> List[DeliveryPoint]:
+        """Points in matrix index order."""
+        return [self.points[point_id] for point_id in self.distance_matrix.ids]
+
+    def time_windows(self) -> TimeWindows:
+        return self.optimizer.build_time_windows(
+            self.delivery_points, self.start_location, self.distance_matrix, self.departure_time
+        )
+
+    def needs_costs(self, point: DeliveryPoint) -> bool:
+        """Whether inserting the point needs a new matrix row and column."""
+        known = self.points.get(point.id)
+        return known is None or (known.lat, known.lon) != (point.lat, point.lon)
+
+    def validate_insert(self, point: DeliveryPoint):
+        """Raise ValueError if the point cannot be added (checked before fetching its costs)."""
+        matrix = self.distance_matrix
+        if point.id == self.start_location.id or (point.id in matrix and matrix.index[point.id] in self.route):
+            raise ValueError(f"Point {point.id} is already on the route")
+        if not self.optimizer.check_capacity_constraints(self.delivery_points + [point], self.vehicle):
+            raise ValueError("Vehicle capacity insufficient for all deliveries")
+
+    def insert(self, point: DeliveryPoint,
+               costs: Optional[Tuple[Sequence[np.ndarray], Sequence[np.ndarray]]] = None) -> Dict:
+        """
+        Add a stop at its cheapest position and repair around it. costs are
+        the (outgoing, incoming) arrays against known_points, required when
+        needs_costs(point).
+        """
+        self.validate_insert(point)
+        if self.needs_costs(point):
+            if costs is None:
+                raise ValueError(f"Travel costs for {point.id} are required")
+            self.distance_matrix = self.distance_matrix.with_point(point.id, *costs)
+        self.points[point.id] = point
+
+        node = self.distance_matrix.index[point.id]
+        route = self.route
+        cost, windows = self._search_inputs(point)
+        route.insert(insertion_position(cost, route, node, windows), node)
+        return self._repair("insert", [node], cost, windows)
+
+    def remove(self, point_id: str) -> Dict:
+        """Drop a stop and repair around the gap it leaves."""
+        node = self.distance_matrix.index.get(point_id)
+        if point_id == self.start_location.id:
+            raise ValueError("The start location cannot be removed")
+        if node is None or node not in self.route:
+            raise ValueError(f"Point {point_id} is not on the route")
+        route = self.route
+        k = route.index(node)
+        del route[k]
+        cost, windows = self._search_inputs()
+        return self._repair("remove", route[k - 1:k + 1], cost, windows)
+
+    def move(self, point_id: str, position: int) -> Dict:
+        """Move a stop to a route position (1 = first stop) without re-optimizing."""
+        node = self.distance_matrix.index.get(point_id)
+        if point_id == self.start_location.id:
+            raise ValueError("The start location cannot be moved")
+        if node is None or node not in self.route:
+            raise ValueError(f"Point {point_id} is not on the route")
+        if not 1 <= position <= len(self.route) - 1:
+            raise ValueError(f"Position must be between 1 and {len(self.route) - 1}")
+        started = time.perf_counter()
+        self.route.remove(node)
+        self.route.insert(position, node)
+        self.version += 1
+        return {"algorithm": "manual_move", "iterations": 0, "improvements": 0,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    def result(self, search_stats: Optional[Dict] = None, analytics: Optional[bool] = None) -> OptimizedRoute:
+        """The current route as an OptimizedRoute; analytics defaults to the session's setting."""
+        windows = self.time_windows()
+        on_route = set(self.route[1:])
+        # Stops in the order they were requested or inserted, the savings baseline
+        requested = [point for point_id, point in self.points.items()
+                     if self.distance_matrix.index[point_id] in on_route]
+        return self.optimizer.build_optimized_route(
+            self.route, self.distance_matrix, self.vehicle, requested,
+            search_stats or {"algorithm": "route_session"}, windows,
+            self.analytics if analytics is None else analytics
+        )
+
+    def _search_inputs(self, extra: Optional[DeliveryPoint] = None) -> Tuple[np.ndarray, Optional[TimeWindows]]:
+        windows = self.optimizer.build_time_windows(
+            self.delivery_points + ([extra] if extra is not None else []),
+            self.start_location, self.distance_matrix, self.departure_time
+        )
+        return self.distance_matrix.edge_costs(self.optimization_goal), windows if windows.constrained else None
+
+    def _repair(self, kind: str, focus: List[int], cost: np.ndarray, windows: Optional[TimeWindows]) -> Dict:
+        started = time.perf_counter()
+        moves = local_repair(cost, self.route, focus, windows, self.REPAIR_RADIUS, self.MAX_REPAIR_MOVES)
+        self.version += 1
+        return {"algorithm": "cheapest_insertion_with_local_repair" if kind == "insert" else "local_repair",
+                "iterations": moves, "improvements": moves,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+class RouteSessionStore:
+    """
+    In-memory LRU store of route sessions. Sessions expire ttl_seconds after
+    their last use, and the least recently used one is dropped when the
+    store is full.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 3600):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Tuple[RouteSession, float]]" = OrderedDict()
+
+        self.created = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def add(self, session: RouteSession):
+        self._sessions[session.session_id] = (session, time.time() + self.ttl_seconds)
+        self._sessions.move_to_end(session.session_id)
+        self.created += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, session_id: str) -> Optional[RouteSession]:
+        """Look up a session and extend its lifetime; None if unknown or expired."""
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        session, expires_at = entry
+        if expires_at <= time.time():
+            del self._sessions[session_id]
+            self.expired += 1
+            return None
+        self._sessions[session_id] = (session, time.time() + self.ttl_seconds)
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def purge_expired(self) -> int:
+        """Drop expired sessions. Returns the number removed."""
+        now = time.time()
+        stale = [key for key, (_, expires_at) in self._sessions.items() if expires_at <= now]
+        for key in stale:
+            del self._sessions[key]
+        self.expired += len(stale)
+        return len(stale)
+
+    def stats(self) -> Dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "created": self.created,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "ttl_seconds": self.ttl_seconds
+        }
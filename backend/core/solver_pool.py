@@ -0,0 +1,357 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from core.candidate_costs import CandidateCosts
+from core.cost_matrix import CostMatrix
+from core.decomposition import FleetDecomposition
+from core.optimizer import DeliveryPoint, FleetPlan, OptimizedRoute, RouteOptimizer, Vehicle
+
+
+class SolverOverloadedError(Exception):
+    """Raised when the solver queue is full; callers should answer 503."""
+
+
+class SolverTimeoutError(Exception):
+    """Raised when a solve does not finish within its timeout."""
+
+
+@dataclass
+class MatrixPayload:
+    """
+    Compact, picklable form of a CostMatrix for worker processes.
+    Large matrices travel through one shared-memory block (distance, duration
+    and delay laid out back to back); small ones are sent as raw arrays.
+    CandidateCosts are O(N * K) and are pickled as they are.
+    """
+    ids: List[str]
+    shm_name: Optional[str] = None
+    arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+    candidates: Optional[CandidateCosts] = None
+
+
+# Matrices at least this large go through shared memory instead of the pipe
+SHARED_MEMORY_MIN_BYTES = 1 << 20
+
+_worker_optimizer: Optional[RouteOptimizer] = None
+
+
+def pack_matrix(matrix: Union[CostMatrix, CandidateCosts],
+                allow_shared: bool = True) -> Tuple[MatrixPayload, Optional[shared_memory.SharedMemory]]:
+    """Pack a matrix for a worker. The caller must unlink the returned block when done."""
+    if isinstance(matrix, CandidateCosts):
+        return MatrixPayload(ids=matrix.ids, candidates=matrix), None
+    arrays = (matrix.distance_km, matrix.duration_minutes, matrix.traffic_delay_minutes)
+    size = sum(a.nbytes for a in arrays)
+    if not allow_shared or size < SHARED_MEMORY_MIN_BYTES:
+        return MatrixPayload(ids=matrix.ids, arrays=arrays), None
+
+    block = shared_memory.SharedMemory(create=True, size=size)
+    offset = 0
+    for array in arrays:
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf, offset=offset)
+        view[...] = array
+        offset += array.nbytes
+    return MatrixPayload(ids=matrix.ids, shm_name=block.name), block
+
+
+def unpack_matrix(payload: MatrixPayload) -> Tuple[Union[CostMatrix, CandidateCosts], Optional[shared_memory.SharedMemory]]:
+    """Rebuild a CostMatrix in the worker; shared-memory arrays are zero-copy views."""
+    if payload.candidates is not None:
+        return payload.candidates, None
+    if payload.shm_name is None:
+        return CostMatrix(payload.ids, *payload.arrays), None
+
+    # Spawned workers share the parent's resource tracker, which unlinks the block
+    block = shared_memory.SharedMemory(name=payload.shm_name)
+
+    n = len(payload.ids)
+    views = []
+    offset = 0
+    for dtype in (np.float32, np.int32, np.int32):
+        view = np.ndarray((n, n), dtype=dtype, buffer=block.buf, offset=offset)
+        views.append(view)
+        offset += view.nbytes
+    return CostMatrix(payload.ids, *views), block
+
+
+def _init_worker():
+    global _worker_optimizer
+    _worker_optimizer = RouteOptimizer()
+
+
+def _solve_in_worker(method: str, payload: MatrixPayload, kwargs: Dict[str, Any]) -> Tuple[Any, float]:
+    """
+    Worker entry point: call RouteOptimizer.<method> with the unpacked matrix.
+    Returns the result and the solve time in seconds.
+    """
+    optimizer = _worker_optimizer or RouteOptimizer()
+    started = time.perf_counter()
+    matrix, block = unpack_matrix(payload)
+    try:
+        result = getattr(optimizer, method)(distance_matrix=matrix, **kwargs)
+    finally:
+        del matrix
+        if block is not None:
+            try:
+                block.close()
+            except BufferError:
+                pass
+    return result, time.perf_counter() - started
+
+
+class SolverPool:
+    """
+    Runs RouteOptimizer.optimize off the event loop in a process pool.
+
+    Requests beyond max_workers + max_queue_depth in flight are rejected with
+    SolverOverloadedError, and each solve is bounded by a timeout. A timed-out
+    solve that has already started keeps its worker until it finishes; one
+    that is still queued is cancelled. max_workers=0 runs solves in a thread
+    instead (useful for development and debugging).
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue_depth: Optional[int] = None,
+                 timeout_seconds: Optional[float] = None):
+        if max_workers is None:
+            max_workers = int(os.getenv('SOLVER_WORKERS', os.cpu_count() or 1))
+        if max_queue_depth is None:
+            max_queue_depth = int(os.getenv('SOLVER_MAX_QUEUE', 2 * max(max_workers, 1)))
+        if timeout_seconds is None:
+            timeout_seconds = float(os.getenv('SOLVER_TIMEOUT_SECONDS', 30))
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.timeout_seconds = timeout_seconds
+        self._executor = None
+
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.total_solve_seconds = 0.0
+        self.total_wait_seconds = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return max(self.max_workers, 1)
+
+    def get_executor(self):
+        """Create the executor lazily so importing the routes module stays cheap."""
+        if self._executor is None:
+            if self.max_workers == 0:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="solver")
+            else:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+        return self._executor
+
+    async def optimize(self, delivery_points: List[DeliveryPoint], vehicle: Vehicle,
+                       start_location: DeliveryPoint, distance_matrix: Union[CostMatrix, CandidateCosts],
+                       optimization_goal: str = "time", timeout_seconds: Optional[float] = None,
+                       **options) -> OptimizedRoute:
+        """Solve in the pool; raises SolverOverloadedError or SolverTimeoutError."""
+        return await self.run("optimize", distance_matrix, timeout_seconds, dict(
+            delivery_points=delivery_points, vehicle=vehicle, start_location=start_location,
+            optimization_goal=optimization_goal, **options
+        ))
+
+    async def optimize_fleet(self, delivery_points: List[DeliveryPoint], vehicles: List[Vehicle],
+                             start_location: DeliveryPoint, distance_matrix: CostMatrix,
+                             optimization_goal: str = "time", timeout_seconds: Optional[float] = None,
+                             **options) -> FleetPlan:
+        """Solve a fleet plan in the pool; same errors as optimize()."""
+        return await self.run("optimize_fleet", distance_matrix, timeout_seconds, dict(
+            delivery_points=delivery_points, vehicles=vehicles, start_location=start_location,
+            optimization_goal=optimization_goal, **options
+        ))
+
+    async def priority_tradeoff(self, delivery_points: List[DeliveryPoint], vehicle: Vehicle,
+                                start_location: DeliveryPoint, distance_matrix: CostMatrix,
+                                optimization_goal: str = "time", timeout_seconds: Optional[float] = None,
+                                **options) -> List[Dict]:
+        """Sweep priority weights in the pool; same errors as optimize()."""
+        return await self.run("priority_tradeoff", distance_matrix, timeout_seconds, dict(
+            delivery_points=delivery_points, vehicle=vehicle, start_location=start_location,
+            optimization_goal=optimization_goal, **options
+        ))
+
+    async def optimize_fleet_decomposed(self, delivery_points: List[DeliveryPoint], vehicles: List[Vehicle],
+                                        start_location: DeliveryPoint,
+                                        fetch_matrices: Callable[[List[List[DeliveryPoint]]], Awaitable[List[CostMatrix]]],
+                                        optimization_goal: str = "time", allow_additional_vehicles: bool = True,
+                                        time_limit_ms: Optional[float] = None,
+                                        departure_time: Optional[str] = None,
+                                        priority_weight: float = 0.0,
+                                        max_cluster_points: int = 300,
+                                        timeout_seconds: Optional[float] = None) -> FleetPlan:
+        """
+        Solve a large fleet plan cluster by cluster (see FleetDecomposition):
+        cluster solves run concurrently across the workers, then the routes
+        along each cluster boundary are repaired. fetch_matrices returns one
+        matrix per point list, so only the cluster and boundary blocks of the
+        full matrix are ever fetched. The whole solve counts as one request
+        for admission control and is bounded by one timeout.
+        """
+        started = time.perf_counter()
+        planner = RouteOptimizer()
+        decomposition = FleetDecomposition(
+            planner, delivery_points, vehicles, start_location,
+            allow_additional_vehicles=allow_additional_vehicles, max_cluster_points=max_cluster_points
+        )
+        problems = decomposition.cluster_problems()
+        waves = decomposition.boundary_waves()
+        if timeout_seconds is None:
+            # Clusters queue behind each other once there are more than workers
+            cluster_seconds = (time_limit_ms if time_limit_ms is not None else planner.fleet_time_limit_ms) / 1000
+            timeout_seconds = (self.timeout_seconds
+                               + math.ceil(len(problems) / self.capacity) * cluster_seconds
+                               + len(waves) * planner.boundary_repair_time_ms / 1000)
+        options = dict(optimization_goal=optimization_goal, departure_time=departure_time,
+                       priority_weight=priority_weight)
+        slots = asyncio.Semaphore(self.capacity)
+        solve_seconds = 0.0
+        self._admit()
+
+        async def execute(method: str, matrix: CostMatrix, kwargs: Dict[str, Any]) -> Any:
+            nonlocal solve_seconds
+            async with slots:
+                result, seconds = await self._execute(method, matrix, kwargs)
+            solve_seconds += seconds
+            return result
+
+        async def solve_clusters():
+            matrices = await fetch_matrices([[start_location] + cluster.points for _, cluster in problems])
+            plans = await asyncio.gather(*(
+                execute("optimize_fleet", matrix, dict(
+                    delivery_points=cluster.points, vehicles=cluster.vehicles, start_location=start_location,
+                    allow_additional_vehicles=allow_additional_vehicles, time_limit_ms=time_limit_ms, **options
+                ))
+                for (_, cluster), matrix in zip(problems, matrices)
+            ))
+            for (c, _), plan in zip(problems, plans):
+                decomposition.add_cluster_plan(c, plan)
+
+            for wave in waves:
+                repairs = [entry_ids for entry_ids in (decomposition.boundary_entries(a, b) for a, b in wave)
+                           if len(entry_ids) > 1]
+                if not repairs:
+                    continue
+                repair_problems = [decomposition.repair_problem(entry_ids) for entry_ids in repairs]
+                matrices = await fetch_matrices([[start_location] + stops for _, _, stops in repair_problems])
+                plans = await asyncio.gather(*(
+                    execute("repair_fleet_routes", matrix, dict(
+                        routes=routes, vehicles=route_vehicles, delivery_points=stops,
+                        start_location=start_location, **options
+                    ))
+                    for (routes, route_vehicles, stops), matrix in zip(repair_problems, matrices)
+                ))
+                for entry_ids, plan in zip(repairs, plans):
+                    decomposition.apply_repair(entry_ids, plan)
+
+        try:
+            await asyncio.wait_for(solve_clusters(), timeout=timeout_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise SolverTimeoutError(f"Optimization exceeded {timeout_seconds:g}s")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        elapsed = time.perf_counter() - started
+        self.completed += 1
+        self.total_solve_seconds += solve_seconds
+        self.total_wait_seconds += max(0.0, elapsed - solve_seconds)
+        return decomposition.fleet_plan(elapsed * 1000.0)
+
+    async def run(self, method: str, distance_matrix: Union[CostMatrix, CandidateCosts],
+                  timeout_seconds: Optional[float], kwargs: Dict[str, Any]) -> Any:
+        """Run RouteOptimizer.<method> in a worker with admission control and a timeout."""
+        self._admit()
+        timeout = timeout_seconds or self.timeout_seconds
+        started = time.perf_counter()
+        try:
+            # wait_for cancels the future on timeout, which drops it if still queued
+            result, solve_seconds = await asyncio.wait_for(
+                self._execute(method, distance_matrix, kwargs), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise SolverTimeoutError(f"Optimization exceeded {timeout:g}s")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        self.completed += 1
+        self.total_solve_seconds += solve_seconds
+        self.total_wait_seconds += max(0.0, time.perf_counter() - started - solve_seconds)
+        return result
+
+    def _admit(self):
+        """Count a new request in flight, or reject it when the queue is full."""
+        if self.in_flight >= self.capacity + self.max_queue_depth:
+            self.rejected += 1
+            raise SolverOverloadedError(
+                f"Solver queue full ({self.in_flight} requests in flight)"
+            )
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        self.submitted += 1
+
+    async def _execute(self, method: str, distance_matrix: Union[CostMatrix, CandidateCosts],
+                       kwargs: Dict[str, Any]) -> Tuple[Any, float]:
+        """Run one solve in the executor; returns the result and its solve time in seconds."""
+        # Threads share the parent's memory, so only worker processes need the shared block
+        payload, block = pack_matrix(distance_matrix, allow_shared=self.max_workers > 0)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.get_executor(), _solve_in_worker, method, payload, kwargs
+            )
+        finally:
+            if block is not None:
+                block.close()
+                block.unlink()
+
+    def stats(self) -> Dict:
+        """Pool saturation metrics for monitoring."""
+        busy = min(self.in_flight, self.capacity)
+        return {
+            "mode": "thread" if self.max_workers == 0 else "process",
+            "workers": self.capacity,
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": self.in_flight,
+            "busy_workers": busy,
+            "queued": self.in_flight - busy,
+            "saturation": round(self.in_flight / (self.capacity + self.max_queue_depth), 3),
+            "peak_in_flight": self.peak_in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "avg_solve_ms": round(1000 * self.total_solve_seconds / self.completed, 1) if self.completed else 0.0,
+            "avg_queue_wait_ms": round(1000 * self.total_wait_seconds / self.completed, 1) if self.completed else 0.0,
+            "timeout_seconds": self.timeout_seconds
+        }
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
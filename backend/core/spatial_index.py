@@ -0,0 +1,150 @@
+import math
+from typing import Optional, Sequence
+
+import numpy as np
+
+from core.geo import EARTH_RADIUS_KM
+
+
+class GridIndex:
+    """
+    Uniform grid over points projected to kilometres.
+
+    Points are projected equirectangularly around their mean latitude (well
+    under 1% error at city scale) and bucketed into square cells sized for
+    about points_per_cell points each. Only occupied cells are stored, as
+    ranges of the points sorted by cell, so memory is O(N) however sparse or
+    elongated the instance is. A nearest-point query looks at growing square
+    rings of cells around the point and stops once the ring is wider than the
+    best distance found, so it touches a handful of cells instead of every point.
+    """
+
+    def __init__(self, lats: Sequence[float], lons: Sequence[float], points_per_cell: float = 2.0):
+        lat = np.radians(np.asarray(lats, dtype=np.float64))
+        lon = np.radians(np.asarray(lons, dtype=np.float64))
+        self.size = lat.size
+        cos_lat = math.cos(float(lat.mean())) if self.size else 1.0
+        self.cos_lat = cos_lat
+        self.xy = np.column_stack((lon * cos_lat * EARTH_RADIUS_KM, lat * EARTH_RADIUS_KM))
+
+        origin = self.xy.min(axis=0) if self.size else np.zeros(2)
+        span = self.xy.max(axis=0) - origin if self.size else np.zeros(2)
+        # Cells hold ~points_per_cell points on average; degenerate (line-like) instances fall back to the long side
+        area = float(span[0] * span[1])
+        cell = math.sqrt(area * points_per_cell / max(self.size, 1))
+        cell = max(cell, float(span.max()) * points_per_cell / max(self.size, 1), 1e-6)
+        self.cell_km = cell
+        self.origin = origin
+
+        cells = np.floor((self.xy - origin) / cell).astype(np.int64)
+        self.columns = int(cells[:, 1].max()) + 1 if self.size else 1
+        self.rows = int(cells[:, 0].max()) + 1 if self.size else 1
+        self.cell_of = cells[:, 0] * self.columns + cells[:, 1]
+        self.order = np.argsort(self.cell_of, kind="stable")
+        self.sorted_cells = self.cell_of[self.order]
+
+    def cell_xy(self, k: int):
+        return divmod(int(self.cell_of[k]), self.columns)
+
+    def block(self, cx: int, cy: int, ring: int) -> np.ndarray:
+        """Points in the (2 * ring + 1)^2 cells centred on cell (cx, cy)."""
+        xs = np.arange(max(cx - ring, 0), min(cx + ring, self.rows - 1) + 1)
+        ys = np.arange(max(cy - ring, 0), min(cy + ring, self.columns - 1) + 1)
+        cell_ids = (xs[:, None] * self.columns + ys[None, :]).ravel()
+        lo = np.searchsorted(self.sorted_cells, cell_ids, side="left")
+        hi = np.searchsorted(self.sorted_cells, cell_ids, side="right")
+        hit = hi > lo
+        if not hit.any():
+            return np.zeros(0, dtype=np.intp)
+        return np.concatenate([self.order[a:b] for a, b in zip(lo[hit], hi[hit])])
+
+    def covers_all(self, cx: int, cy: int, ring: int) -> bool:
+        return cx - ring <= 0 and cy - ring <= 0 and cx + ring >= self.rows - 1 and cy + ring >= self.columns - 1
+
+    def knn(self, k: int) -> np.ndarray:
+        """
+        The k nearest other points of every point (N x k indices, nearest
+        first), computed one occupied cell at a time against the surrounding
+        block of cells. A cell's answer is exact once every member's k-th
+        distance is within the block's reach; otherwise the block grows.
+        """
+        k = min(k, self.size - 1)
+        neighbors = np.zeros((self.size, max(k, 0)), dtype=np.intp)
+        if k <= 0:
+            return neighbors
+
+        cell_ids, starts = np.unique(self.sorted_cells, return_index=True)
+        ends = np.append(starts[1:], self.size)
+        for cell_id, lo, hi in zip(cell_ids, starts, ends):
+            members = self.order[lo:hi]
+            cx, cy = divmod(int(cell_id), self.columns)
+            # Enough rings to hold k others at the average density
+            ring = max(1, int(math.ceil(math.sqrt(k / max(hi - lo, 1)) / 2)))
+            while True:
+                candidates = self.block(cx, cy, ring)
+                if candidates.size > k:
+                    diff = self.xy[members][:, None, :] - self.xy[candidates][None, :, :]
+                    d2 = np.einsum("mcj,mcj->mc", diff, diff)
+                    d2[members[:, None] == candidates[None, :]] = np.inf
+                    nearest = np.argpartition(d2, k - 1, axis=1)[:, :k]
+                    kth = np.take_along_axis(d2, nearest, axis=1).max(axis=1)
+                    # Anything outside the block is at least `ring` cells away from the centre cell
+                    if self.covers_all(cx, cy, ring) or (kth <= (ring * self.cell_km) ** 2).all():
+                        rank = np.argsort(np.take_along_axis(d2, nearest, axis=1), axis=1, kind="stable")
+                        neighbors[members] = candidates[np.take_along_axis(nearest, rank, axis=1)]
+                        break
+                elif self.covers_all(cx, cy, ring):
+                    raise ValueError("Not enough points for the requested neighbours")
+                ring += 1
+        return neighbors
+
+    def nearest(self, k: int, allowed: np.ndarray) -> Optional[int]:
+        """Nearest point to point k among those where allowed is True, or None."""
+        cx, cy = self.cell_xy(k)
+        ring = 1
+        while True:
+            candidates = self.block(cx, cy, ring)
+            candidates = candidates[allowed[candidates]]
+            if candidates.size:
+                diff = self.xy[candidates] - self.xy[k]
+                d2 = np.einsum("cj,cj->c", diff, diff)
+                best = int(np.argmin(d2))
+                if d2[best] <= (ring * self.cell_km) ** 2 or self.covers_all(cx, cy, ring):
+                    return int(candidates[best])
+            elif self.covers_all(cx, cy, ring):
+                return None
+            # Grow geometrically once the neighbourhood is exhausted
+            ring = ring * 2 if candidates.size == 0 else ring + 1
+
+    def nearest_to(self, lats: Sequence[float], lons: Sequence[float]) -> np.ndarray:
+        """
+        Index of the nearest indexed point to each (lat, lon), which need not
+        be indexed itself. Queries outside the grid start from the closest
+        cell, and the search radius discounts their distance to it.
+        """
+        lat = np.radians(np.asarray(lats, dtype=np.float64))
+        lon = np.radians(np.asarray(lons, dtype=np.float64))
+        queries = np.column_stack((lon * self.cos_lat * EARTH_RADIUS_KM, lat * EARTH_RADIUS_KM))
+        cells = np.floor((queries - self.origin) / self.cell_km).astype(np.int64)
+        cells = np.clip(cells, 0, [self.rows - 1, self.columns - 1])
+        # Distance from each query to its (clamped) cell's square, zero inside it
+        low = self.origin + cells * self.cell_km
+        outside = np.linalg.norm(np.maximum(np.maximum(low - queries, queries - low - self.cell_km), 0), axis=1)
+
+        nearest = np.empty(len(queries), dtype=np.intp)
+        for q, ((cx, cy), xy) in enumerate(zip(cells.tolist(), queries)):
+            ring = 1
+            while True:
+                candidates = self.block(cx, cy, ring)
+                if candidates.size:
+                    diff = self.xy[candidates] - xy
+                    d2 = np.einsum("cj,cj->c", diff, diff)
+                    best = int(np.argmin(d2))
+                    reach = max(ring * self.cell_km - outside[q], 0.0)
+                    if d2[best] <= reach ** 2 or self.covers_all(cx, cy, ring):
+                        nearest[q] = candidates[best]
+                        break
+                elif self.covers_all(cx, cy, ring):
+                    raise ValueError("Cannot search an empty index")
+                ring = ring * 2 if candidates.size == 0 else ring + 1
+        return nearest
@@ -0,0 +1,287 @@
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.cost_matrix import CostMatrix
+
+EPSILON = 1e-6
+# Trailing UTC offset of an ISO time: Z, +HH, -HH:MM or +HHMM
+UTC_OFFSET = re.compile(r"(?:Z|[+-]\d{2}(?::?\d{2})?)$", re.IGNORECASE)
+
+
+def parse_clock(value: Optional[str]) -> Optional[float]:
+    """
+    Parse "HH:MM" (also "HH:MM:SS" or the time part of an ISO datetime)
+    into minutes after midnight. Returns None for a missing value.
+    "24:00" is accepted as the end of the day; other times past 24:00 are not.
+    """
+    if value is None or not str(value).strip():
+        return None
+    text = str(value).strip()
+    if "T" in text:
+        text = text.split("T", 1)[1]
+    # Offsets are ignored: windows are local times at the stop
+    text = UTC_OFFSET.sub("", text)
+    parts = text.split(":")
+    try:
+        hours = int(parts[0])
+        minutes = int(parts[1]) if len(parts) > 1 else 0
+        seconds = float(parts[2]) if len(parts) > 2 else 0.0
+    except (ValueError, IndexError):
+        raise ValueError(f"Invalid time '{value}', expected HH:MM")
+    if not (0 <= hours <= 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+        raise ValueError(f"Invalid time '{value}', expected HH:MM")
+    if hours == 24 and (minutes or seconds):
+        raise ValueError(f"Invalid time '{value}', the latest time is 24:00")
+    return hours * 60 + minutes + seconds / 60
+
+
+def format_clock(minutes: float) -> str:
+    """Minutes after midnight as "HH:MM" (hours past 24 mean the next day)."""
+    total = int(round(minutes))
+    return f"{total // 60:02d}:{total % 60:02d}"
+
+
+class TimeWindows:
+    """
+    Delivery time windows and travel times for VRPTW routing.
+
+    Windows are parsed once into earliest/latest arrays indexed like the cost
+    matrix (stops without a window get [-inf, inf]). Service at a stop starts
+    at max(arrival, earliest); a stop is late when service starts after
+    latest. Routes leave the depot at `departure` (minutes after midnight).
+
+    Local search checks moves with forward time slack: for each stop, how far
+    its service start can be pushed back without making it or any later stop
+    late (or later than it already is). Inserting stops between x and y then
+    only needs the new start at the inserted stops and the push at y, which is
+    O(1) per candidate instead of re-simulating the route. Moves that reorder
+    a stretch of the route re-simulate just that stretch.
+    """
+
+    def __init__(self, travel: np.ndarray, earliest: np.ndarray, latest: np.ndarray,
+                 service: np.ndarray, departure: float):
+        self.travel = np.asarray(travel, dtype=np.float64)
+        self.earliest = np.asarray(earliest, dtype=np.float64)
+        self.latest = np.asarray(latest, dtype=np.float64)
+        self.service = np.asarray(service, dtype=np.float64)
+        self.departure = float(departure)
+
+    @classmethod
+    def from_points(cls, distance_matrix: CostMatrix, points: Sequence, departure: float,
+                    service_minutes: float = 0.0, depot_id: Optional[str] = None) -> "TimeWindows":
+        """
+        Parse the windows of DeliveryPoints against a CostMatrix (travel time
+        = duration + delay). The depot's window only sets the default
+        departure, so it is validated but not enforced.
+        """
+        n = len(distance_matrix)
+        earliest = np.full(n, -np.inf)
+        latest = np.full(n, np.inf)
+        service = np.zeros(n)
+        for point in points:
+            k = distance_matrix.index[point.id]
+            start = parse_clock(point.time_window_start)
+            end = parse_clock(point.time_window_end)
+            if start is not None and end is not None and end < start:
+                raise ValueError(f"Time window of {point.id} ends before it starts")
+            if point.id == depot_id:
+                continue
+            if start is not None:
+                earliest[k] = start
+            if end is not None:
+                latest[k] = end
+            service[k] = service_minutes
+        return cls(distance_matrix.edge_costs("time"), earliest, latest, service, departure)
+
+    @property
+    def constrained(self) -> bool:
+        """Whether any window can bind (otherwise routing ignores time)."""
+        return bool(np.isfinite(self.latest).any() or (self.earliest > self.departure).any())
+
+    def schedule(self, route: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Arrival and service-start times at every position of a route (O(n))."""
+        n = len(route)
+        arrival = np.empty(n)
+        start = np.empty(n)
+        arrival[0] = start[0] = self.departure
+        travel = self.travel
+        earliest = self.earliest
+        service = self.service
+        prev = route[0]
+        t = self.departure
+        for k in range(1, n):
+            node = route[k]
+            t = t + service[prev] + travel[prev, node]
+            arrival[k] = t
+            if t < earliest[node]:
+                t = earliest[node]
+            start[k] = t
+            prev = node
+        return arrival, start
+
+    def forward_slack(self, route: Sequence[int], arrival: np.ndarray, start: np.ndarray,
+                      deadline: np.ndarray) -> np.ndarray:
+        """
+        Forward time slack at every position against per-position deadlines:
+        slack[k] = min(deadline[k] - start[k], wait[k + 1] + slack[k + 1]).
+        """
+        n = len(route)
+        slack = np.empty(n)
+        running = np.inf
+        for k in range(n - 1, -1, -1):
+            running = min(deadline[k] - start[k], running)
+            slack[k] = running
+            running += start[k] - arrival[k]
+        return slack
+
+    def refresh(self, route: Sequence[int], start: np.ndarray, slack: np.ndarray, deadline: np.ndarray):
+        """
+        Recompute the per-stop arrays of one route in place. A stop's deadline
+        is its window end, or its current start if it is already late, so
+        moves may never make a stop later than it is.
+        """
+        arrival, begin = self.schedule(route)
+        nodes = np.asarray(route, dtype=np.intp)
+        deadline[nodes] = np.maximum(self.latest[nodes], begin)
+        start[nodes] = begin
+        slack[nodes] = self.forward_slack(route, arrival, begin, deadline[nodes])
+
+    def lateness(self, route: Sequence[int], start: Optional[np.ndarray] = None) -> np.ndarray:
+        """Minutes late at every position (0 when on time)."""
+        if start is None:
+            start = self.schedule(route)[1]
+        return np.maximum(start - self.latest[np.asarray(route, dtype=np.intp)], 0.0)
+
+    def total_lateness(self, route: Sequence[int]) -> float:
+        return float(self.lateness(route).sum())
+
+    def insertion_feasible(self, depart: np.ndarray, prev: np.ndarray, nodes: List, y: np.ndarray,
+                           has_y: np.ndarray, start: np.ndarray, slack: np.ndarray,
+                           deadline: np.ndarray) -> np.ndarray:
+        """
+        Vectorized check of inserting `nodes` (each a scalar or an array of
+        candidates) after stops leaving at `depart` from `prev` and before y.
+        start/slack/deadline are the per-stop arrays of the current routes.
+        """
+        ok = True
+        for node in nodes:
+            begin = np.maximum(depart + self.travel[prev, node], self.earliest[node])
+            ok &= begin <= deadline[node] + EPSILON
+            depart = begin + self.service[node]
+            prev = node
+        return ok & self.push_feasible(depart, prev, y, has_y, start, slack)
+
+    def push_feasible(self, depart: np.ndarray, prev, y: np.ndarray, has_y, start: np.ndarray,
+                      slack: np.ndarray) -> np.ndarray:
+        """Whether y (when present) can start after leaving prev at `depart` within its slack."""
+        begin = np.maximum(depart + self.travel[prev, y], self.earliest[y])
+        return ~np.asarray(has_y) | (begin - start[y] <= slack[y] + EPSILON)
+
+    def insertion_lateness(self, depart: np.ndarray, prev: np.ndarray, node: int, y: np.ndarray,
+                           has_y: np.ndarray, start: np.ndarray, slack: np.ndarray,
+                           deadline: np.ndarray) -> np.ndarray:
+        """
+        Lateness caused by inserting a stop after each prev (leaving at
+        `depart`) and before y: its own lateness plus the push at y beyond
+        y's slack. Zero exactly where the insertion is feasible; O(1) each.
+        """
+        begin = np.maximum(depart + self.travel[prev, node], self.earliest[node])
+        own = np.maximum(begin - deadline[node], 0.0)
+        push = np.maximum(begin + self.service[node] + self.travel[node, y], self.earliest[y]) - start[y]
+        excess = np.where(has_y, np.maximum(push - slack[y], 0.0), 0.0)
+        late = own + excess
+        return np.where(late > EPSILON, late, 0.0)
+
+    def replacement_feasible(self, route: Sequence[int], lo: int, hi: int, nodes: Sequence[int],
+                             start: np.ndarray, slack: np.ndarray, deadline: np.ndarray) -> bool:
+        """
+        Exact check of replacing route[lo:hi] (lo >= 1) with `nodes`: only the
+        new stretch is simulated, stopping at the first stop past its deadline,
+        and the unchanged tail is checked against its slack. O(len(nodes)).
+        """
+        travel = self.travel
+        prev = route[lo - 1]
+        t = start[prev] + self.service[prev]
+        for node in nodes:
+            t = max(t + travel[prev, node], self.earliest[node])
+            if t > deadline[node] + EPSILON:
+                return False
+            t += self.service[node]
+            prev = node
+        if hi >= len(route):
+            return True
+        y = route[hi]
+        return max(t + travel[prev, y], self.earliest[y]) - start[y] <= slack[y] + EPSILON
+
+    def reversal_filter(self, route: List[int], version: Callable[[], int]) -> Callable[[int, int], bool]:
+        """
+        TwoOptEngine move filter for a route the engine reverses in place;
+        the arrays are refreshed whenever version() (moves applied) changes.
+        """
+        size = self.travel.shape[0]
+        start = np.zeros(size)
+        slack = np.zeros(size)
+        deadline = self.latest.copy()
+        seen = [None]
+
+        def keeps_windows(i: int, j: int) -> bool:
+            if seen[0] != version():
+                self.refresh(route, start, slack, deadline)
+                seen[0] = version()
+            return self.replacement_feasible(route, i, j, route[i:j][::-1], start, slack, deadline)
+        return keeps_windows
+
+    def report(self, route: Sequence[int], ids: Sequence[str]) -> Tuple[List[Dict], List[Dict]]:
+        """Per-stop ETAs and the list of window violations for a route."""
+        arrival, start = self.schedule(route)
+        late = self.lateness(route, start)
+        stops = []
+        violations = []
+        for k, node in enumerate(route):
+            entry = {
+                "point_id": ids[node],
+                "arrival": format_clock(arrival[k]),
+                "service_start": format_clock(start[k]),
+                "wait_minutes": round(float(start[k] - arrival[k]), 1),
+                "window_start": format_clock(self.earliest[node]) if np.isfinite(self.earliest[node]) else None,
+                "window_end": format_clock(self.latest[node]) if np.isfinite(self.latest[node]) else None,
+                "late_minutes": round(float(late[k]), 1)
+            }
+            stops.append(entry)
+            if late[k] > EPSILON:
+                violations.append({"point_id": ids[node], "late_minutes": entry["late_minutes"]})
+        return stops, violations
+
+
+def time_window_insertion(cost: np.ndarray, depot: int, stops: Sequence[int],
+                          windows: TimeWindows) -> List[int]:
+    """
+    Build a route by inserting stops in order of their deadline (then opening
+    time) at the cheapest position that keeps every window, using forward
+    time slack for O(1) checks per position. Stops that fit nowhere go where
+    they cause the least lateness and show up as violations.
+    """
+    order = sorted(stops, key=lambda k: (windows.latest[k], windows.earliest[k]))
+    route = [depot]
+    size = windows.travel.shape[0]
+    start = np.zeros(size)
+    slack = np.zeros(size)
+    deadline = windows.latest.copy()
+
+    for stop in order:
+        nodes = np.asarray(route, dtype=np.intp)
+        xs = nodes
+        ys = np.append(nodes[1:], nodes[-1])
+        has_y = np.arange(nodes.size) < nodes.size - 1
+        delta = cost[xs, stop] + np.where(has_y, cost[stop, ys] - cost[xs, ys], 0.0)
+        late = windows.insertion_lateness(
+            start[xs] + windows.service[xs], xs, stop, ys, has_y, start, slack, deadline
+        )
+        p = int(np.lexsort((delta, late))[0])
+        route.insert(p + 1, int(stop))
+
+        # Late stops keep their lateness as the deadline so later inserts are not blocked
+        windows.refresh(route, start, slack, deadline)
+    return route
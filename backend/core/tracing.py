@@ -0,0 +1,66 @@
+import time
+from typing import Dict, List, Sequence
+
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: "Trace", name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, (time.perf_counter() - self.started) * 1000.0)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """
+    Wall-clock spans for the stages of one request.
+
+    with trace.span("two_opt"): ... records the stage's duration in ms.
+    Spans are flat and kept in the order they finish; stages that run in a
+    solver worker come back as plain dicts and are merged with extend().
+    A disabled trace hands out one shared no-op span, so instrumented code
+    costs a method call per stage when tracing is off; elapsed_ms() works
+    either way.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []
+
+    def span(self, name: str):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def add(self, name: str, duration_ms: float):
+        if self.enabled:
+            self.spans.append({"name": name, "duration_ms": round(duration_ms, 3)})
+
+    def extend(self, spans: Sequence[Dict], prefix: str = ""):
+        """Merge spans recorded elsewhere (e.g. in a worker), optionally prefixing their names."""
+        for span in spans:
+            self.add(prefix + span["name"], span["duration_ms"])
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000.0
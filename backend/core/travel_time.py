@@ -0,0 +1,177 @@
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from core.cost_matrix import CostMatrix
+from core.geo import BLOCK_ROWS, TRAFFIC_MULTIPLIERS, traffic_bucket
+
+DAY_MINUTES = 1440.0
+
+ArrayLike = Union[float, np.ndarray]
+
+
+class TrafficProfile:
+    """
+    Time-of-day traffic as piecewise-constant slowdown multipliers.
+
+    Between breakpoints[k] and breakpoints[k + 1] (minutes after midnight,
+    repeating every day) free-flow driving minutes take multipliers[k] real
+    minutes. Travel is integrated over the profile: progress(t) counts the
+    free-flow minutes that can be driven by time t, and an edge of d
+    free-flow minutes left at t arrives at time_at(progress(t) + d). The
+    travel time is then piecewise-linear in the departure time and FIFO (a
+    later departure never arrives earlier), so route schedules stay
+    monotone and an edge that starts at 9:30 is only slowed by the peak
+    until 10:00.
+
+    sampled_at is the time (minutes after midnight) a matrix's traffic
+    delays were observed at, if known; calibrate() then scales the profile
+    to those observations.
+    """
+
+    def __init__(self, breakpoints: Sequence[float], multipliers: Sequence[float],
+                 sampled_at: Optional[float] = None):
+        breakpoints = np.asarray(breakpoints, dtype=np.float64)
+        multipliers = np.asarray(multipliers, dtype=np.float64)
+        if breakpoints.size == 0 or breakpoints.size != multipliers.size:
+            raise ValueError("A traffic profile needs one multiplier per breakpoint")
+        if breakpoints[0] != 0 or np.any(np.diff(breakpoints) <= 0) or breakpoints[-1] >= DAY_MINUTES:
+            raise ValueError("Traffic profile breakpoints must rise from 0 within one day")
+        if np.any(multipliers <= 0):
+            raise ValueError("Traffic multipliers must be positive")
+        self.breakpoints = np.append(breakpoints, DAY_MINUTES)
+        self.multipliers = multipliers
+        self.sampled_at = sampled_at
+        # Free-flow minutes driven from midnight to each breakpoint
+        self._progress = np.concatenate(([0.0], np.cumsum(np.diff(self.breakpoints) / multipliers)))
+        self.day_progress = float(self._progress[-1])
+
+    @classmethod
+    def from_buckets(cls, multipliers: Optional[Dict[str, float]] = None,
+                     sampled_at: Optional[datetime] = None) -> "TrafficProfile":
+        """
+        Profile of the hourly peak/moderate/low buckets of traffic_bucket(),
+        with the multiplier of each bucket (TRAFFIC_MULTIPLIERS by default).
+        """
+        multipliers = multipliers or TRAFFIC_MULTIPLIERS
+        breakpoints, values = [], []
+        for hour in range(24):
+            value = multipliers[traffic_bucket(datetime(2000, 1, 1, hour))]
+            if not values or values[-1] != value:
+                breakpoints.append(hour * 60.0)
+                values.append(value)
+        clock = None if sampled_at is None else sampled_at.hour * 60 + sampled_at.minute
+        return cls(breakpoints, values, clock)
+
+    def multiplier(self, t: ArrayLike) -> ArrayLike:
+        """Slowdown multiplier in force at time t."""
+        k = np.searchsorted(self.breakpoints, np.mod(t, DAY_MINUTES), side="right") - 1
+        return self.multipliers[k]
+
+    def progress(self, t: ArrayLike) -> ArrayLike:
+        """Free-flow minutes drivable from midnight of day 0 up to time t."""
+        days, clock = np.divmod(t, DAY_MINUTES)
+        return days * self.day_progress + np.interp(clock, self.breakpoints, self._progress)
+
+    def time_at(self, progress: ArrayLike) -> ArrayLike:
+        """Inverse of progress(): the time by which `progress` free-flow minutes are driven."""
+        days, rest = np.divmod(progress, self.day_progress)
+        return days * DAY_MINUTES + np.interp(rest, self._progress, self.breakpoints)
+
+    def arrival(self, depart: ArrayLike, free_flow: ArrayLike) -> ArrayLike:
+        """Arrival time of edges of free_flow minutes left at depart (broadcasting)."""
+        return self.time_at(self.progress(depart) + free_flow)
+
+    def calibrate(self, matrix: CostMatrix) -> "TrafficProfile":
+        """
+        Scale the congestion (multiplier - 1) of every period so the
+        multiplier at sampled_at matches the matrix's observed ratio of
+        travel time in traffic to free-flow time. Unchanged without a sample
+        time, without observed traffic, or when the sample fell in a period
+        without congestion (which says nothing about the others).
+        """
+        if self.sampled_at is None:
+            return self
+        free_flow = matrix.duration_minutes.sum(dtype=np.int64)
+        if free_flow <= 0:
+            return self
+        observed = 1.0 + matrix.traffic_delay_minutes.sum(dtype=np.int64) / free_flow
+        expected = float(self.multiplier(self.sampled_at))
+        if expected <= 1.0 or observed <= 1.0:
+            return self
+        scale = (observed - 1.0) / (expected - 1.0)
+        return TrafficProfile(self.breakpoints[:-1], 1.0 + (self.multipliers - 1.0) * scale)
+
+
+class TimeDependentTravel:
+    """
+    Time-dependent travel times over a CostMatrix: each edge's free-flow
+    duration is driven through a TrafficProfile, so its travel time depends
+    on when it is left.
+
+    The local searches work on static matrices, so the solver linearizes:
+    linearize() freezes every edge at its origin's departure time along a
+    route, which makes that route's static cost exactly its time-dependent
+    cost (up to whole minutes) while moves stay O(1) to price. Re-linearizing
+    at the improved route's schedule and searching again converges on a
+    route that is good under its own departure times.
+    """
+
+    def __init__(self, free_flow: np.ndarray, profile: TrafficProfile):
+        self.free_flow = np.asarray(free_flow, dtype=np.float64)
+        self.profile = profile
+
+    @classmethod
+    def from_matrix(cls, matrix: CostMatrix, profile: TrafficProfile) -> "TimeDependentTravel":
+        """Travel over the matrix's free-flow durations, with the profile calibrated to its delays."""
+        return cls(matrix.duration_minutes, profile.calibrate(matrix))
+
+    def travel(self, i: ArrayLike, j: ArrayLike, depart: ArrayLike) -> ArrayLike:
+        """Minutes from i to j when leaving at depart."""
+        return self.profile.arrival(depart, self.free_flow[i, j]) - depart
+
+    def schedule(self, route: Sequence[int], departure: float, earliest: np.ndarray,
+                 service: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Arrival and service-start times at every position of a route leaving
+        at departure, as TimeWindows.schedule() but with time-dependent legs.
+        """
+        n = len(route)
+        arrival = np.empty(n)
+        start = np.empty(n)
+        arrival[0] = start[0] = departure
+        t = departure
+        for k in range(1, n):
+            prev, node = route[k - 1], route[k]
+            depart = t + service[prev]
+            t = float(self.profile.arrival(depart, self.free_flow[prev, node]))
+            arrival[k] = t
+            if t < earliest[node]:
+                t = earliest[node]
+            start[k] = t
+        return arrival, start
+
+    def route_travel(self, route: Sequence[int], start: np.ndarray, service: np.ndarray) -> float:
+        """Minutes spent driving along a route with the given service starts (waits excluded)."""
+        if len(route) < 2:
+            return 0.0
+        order = np.asarray(route, dtype=np.intp)
+        depart = start[:-1] + service[order[:-1]]
+        return float(self.travel(order[:-1], order[1:], depart).sum())
+
+    def linearize(self, matrix: CostMatrix, depart: ArrayLike) -> CostMatrix:
+        """
+        Static matrix with every edge from i left at depart[i] (or a single
+        departure for all): the time-dependent travel is stored as free-flow
+        duration plus traffic delay, in whole minutes like API matrices.
+        """
+        n = len(matrix)
+        depart = np.broadcast_to(np.asarray(depart, dtype=np.float64), (n,))
+        delay = np.empty((n, n), dtype=np.int32)
+        for start in range(0, n, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, n)
+            leave = depart[start:stop, None]
+            travel = self.profile.arrival(leave, self.free_flow[start:stop]) - leave
+            delay[start:stop] = np.maximum(np.rint(travel - self.free_flow[start:stop]), 0)
+        return CostMatrix(matrix.ids, matrix.distance_km, matrix.duration_minutes, delay)
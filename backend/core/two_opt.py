@@ -0,0 +1,273 @@
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.priority import PriorityPenalty
+
+
+class TwoOptEngine:
+    """
+    2-opt local search over a route of cost-matrix indices.
+
+    Each candidate move is scored as an O(1) edge-swap delta and applied by
+    reversing the route in place. The first position of the route (the start
+    location) never moves, and the route is open (no return leg), matching
+    RouteOptimizer.calculate_route_cost.
+
+    With the default settings (first improvement over the full neighbourhood)
+    the engine performs exactly the moves of the original slice-and-recost
+    implementation, just without re-costing the whole route per candidate.
+
+    An optional move_filter(i, j) vetoes improving moves, e.g. ones that
+    break a time window; it is only consulted for moves that improve the cost.
+    With a PriorityPenalty the objective adds its ordering penalty, priced
+    in O(1) per move from prefix sums along the route.
+    """
+
+    EPSILON = 1e-9
+
+    def __init__(self, cost: np.ndarray, strategy: str = "first",
+                 neighbor_k: Optional[int] = None, dont_look_bits: bool = False,
+                 symmetric: Optional[bool] = None,
+                 move_filter: Optional[Callable[[int, int], bool]] = None,
+                 penalty: Optional[PriorityPenalty] = None):
+        if strategy not in ("first", "best"):
+            raise ValueError("2-opt strategy must be first or best")
+        self.cost = cost
+        self.strategy = strategy
+        self.neighbor_k = neighbor_k
+        self.dont_look_bits = dont_look_bits
+        self.symmetric = self.is_symmetric(cost) if symmetric is None else symmetric
+        self.move_filter = move_filter
+        self.penalty = penalty
+
+        # Search statistics for the last call to improve()
+        self.evaluations = 0
+        self.moves_applied = 0
+
+        # Scalar lookups return Python floats, so deltas are never summed in float32
+        self._at = cost.item
+        self._route: List[int] = []
+        self._pos: Dict[int, int] = {}
+        self._fwd = np.zeros(0)
+        self._bwd = np.zeros(0)
+        self._urgency = np.zeros(0)
+        self._urgency_at = np.zeros(0)
+
+    @staticmethod
+    def is_symmetric(cost: np.ndarray) -> bool:
+        """Check whether cost[a, b] == cost[b, a] for every pair."""
+        return bool(np.array_equal(cost, cost.T))
+
+    def improve(self, route: List[int]) -> List[int]:
+        """
+        Improve the route in place until no improving 2-opt move remains.
+        Returns the same list for convenience.
+        """
+        self.evaluations = 0
+        self.moves_applied = 0
+        self._route = route
+        self._pos = {node: k for k, node in enumerate(route)}
+        self._refresh_prefix_sums()
+
+        if len(route) < 4:
+            return route
+
+        if self.neighbor_k is not None or self.dont_look_bits:
+            self._run_neighbor_search()
+        else:
+            self._run_full_search()
+
+        return route
+
+    def move_delta(self, i: int, j: int) -> float:
+        """
+        Cost change of reversing route[i:j] (1 <= i, i + 2 <= j <= len(route) - 1).
+        """
+        route = self._route
+        at = self._at
+        a, b, c, e = route[i - 1], route[i], route[j - 1], route[j]
+        delta = at(a, c) + at(b, e) - at(a, b) - at(c, e)
+        if not self.symmetric:
+            # Interior edges change direction when the segment is reversed
+            delta += float((self._bwd[j - 1] - self._bwd[i]) - (self._fwd[j - 1] - self._fwd[i]))
+        if self.penalty is not None:
+            delta += float(self.penalty.reversal(self._urgency, self._urgency_at, i, j))
+        self.evaluations += 1
+        return delta
+
+    def apply_move(self, i: int, j: int):
+        """Reverse route[i:j] in place and update positions."""
+        route = self._route
+        pos = self._pos
+        lo, hi = i, j - 1
+        while lo < hi:
+            route[lo], route[hi] = route[hi], route[lo]
+            pos[route[lo]] = lo
+            pos[route[hi]] = hi
+            lo += 1
+            hi -= 1
+        self._refresh_prefix_sums()
+        self.moves_applied += 1
+
+    def _refresh_prefix_sums(self):
+        """
+        Forward/backward prefix costs along the route, used to price segment
+        reversal in O(1) on asymmetric matrices, and the penalty's prefix sums.
+        """
+        if self.penalty is not None:
+            self._urgency, self._urgency_at = self.penalty.prefix(self._route)
+        if self.symmetric:
+            return
+        order = np.asarray(self._route, dtype=np.intp)
+        self._fwd = np.concatenate(([0.0], np.cumsum(self.cost[order[:-1], order[1:]], dtype=np.float64)))
+        self._bwd = np.concatenate(([0.0], np.cumsum(self.cost[order[1:], order[:-1]], dtype=np.float64)))
+
+    def _run_full_search(self):
+        """
+        Scan every (i, j) pair; apply the first or best improving move and rescan.
+        All j for a given i are scored in one vectorized step.
+        """
+        route = self._route
+        cost = self.cost
+        n = len(route)
+        first = self.strategy == "first"
+
+        while True:
+            order = np.asarray(route, dtype=np.intp)
+            best_move: Optional[Tuple[int, int]] = None
+            best_delta = -self.EPSILON
+
+            for i in range(1, n - 2):
+                a = order[i - 1]
+                b = order[i]
+                # j runs over i + 2 .. n - 1, so c = route[j - 1] and e = route[j]
+                c = order[i + 1:n - 1]
+                e = order[i + 2:n]
+                delta = (cost[a, c].astype(np.float64) + cost[b, e] -
+                         self._at(a, b) - cost[c, e])
+                if not self.symmetric:
+                    delta += (self._bwd[i + 1:n - 1] - self._bwd[i]) - (self._fwd[i + 1:n - 1] - self._fwd[i])
+                if self.penalty is not None:
+                    delta += self.penalty.reversal(self._urgency, self._urgency_at, i, np.arange(i + 2, n))
+
+                if self.move_filter is not None:
+                    delta = self._filter_row(delta, best_delta, i, first)
+
+                if first:
+                    hits = np.flatnonzero(delta < best_delta)
+                    if hits.size:
+                        self.evaluations += int(hits[0]) + 1
+                        best_move = (i, i + 2 + int(hits[0]))
+                        break
+                    self.evaluations += delta.size
+                else:
+                    self.evaluations += delta.size
+                    k = int(np.argmin(delta))
+                    if delta[k] < best_delta:
+                        best_delta = float(delta[k])
+                        best_move = (i, i + 2 + k)
+
+            if best_move is None:
+                return
+            self.apply_move(*best_move)
+
+    def _filter_row(self, delta: np.ndarray, threshold: float, i: int, first: bool) -> np.ndarray:
+        """
+        Veto improving moves of row i that the move filter rejects, in the
+        order the search would take them, until one is accepted.
+        """
+        hits = np.flatnonzero(delta < threshold)
+        if not first:
+            hits = hits[np.argsort(delta[hits], kind="stable")]
+        delta = delta.copy()
+        for k in hits:
+            if self.move_filter(i, i + 2 + int(k)):
+                break
+            delta[k] = np.inf
+        return delta
+
+    def _build_neighbor_lists(self) -> Dict[int, List[int]]:
+        """K nearest route nodes for each node, sorted by outgoing cost."""
+        nodes = np.asarray(self._route, dtype=np.intp)
+        k = self.neighbor_k if self.neighbor_k is not None else len(nodes) - 1
+        k = min(k, len(nodes) - 1)
+        sub = self.cost[np.ix_(nodes, nodes)].astype(np.float64)
+        np.fill_diagonal(sub, np.inf)
+        nearest = np.argsort(sub, axis=1, kind="stable")[:, :k]
+        return {int(nodes[r]): nodes[nearest[r]].tolist() for r in range(len(nodes))}
+
+    def _find_move(self, x: int, neighbors: List[int]) -> Optional[Tuple[int, int]]:
+        """Find an improving move that makes x adjacent to one of its neighbours."""
+        route = self._route
+        pos = self._pos
+        at = self._at
+        n = len(route)
+        p = pos[x]
+        first = self.strategy == "first"
+
+        # Neighbour lists are sorted, so once a new edge is no shorter than
+        # both edges currently at x, any remaining improving move gains at its
+        # other endpoint and is found from there instead. The ordering penalty
+        # can pay for a longer edge, so it scans the whole list.
+        longest_adjacent = max(
+            at(route[p - 1], x) if p > 0 else 0.0,
+            at(x, route[p + 1]) if p < n - 1 else 0.0
+        )
+
+        best_move: Optional[Tuple[int, int]] = None
+        best_delta = -self.EPSILON
+        for y in neighbors:
+            if self.symmetric and self.penalty is None and at(x, y) >= longest_adjacent:
+                break
+            q = pos[y]
+            lo, hi = (p, q) if p < q else (q, p)
+            if hi - lo < 2:
+                continue
+            # route[lo] and route[hi] become adjacent either as (a, c) or as (b, e)
+            candidates = []
+            if hi + 1 < n:
+                candidates.append((lo + 1, hi + 1))
+            if lo >= 1:
+                candidates.append((lo, hi))
+            for i, j in candidates:
+                delta = self.move_delta(i, j)
+                if delta < best_delta and (self.move_filter is None or self.move_filter(i, j)):
+                    best_delta = delta
+                    best_move = (i, j)
+                    if first:
+                        return best_move
+        return best_move
+
+    def _run_neighbor_search(self):
+        """Candidate-list search, optionally driven by a don't-look-bit queue."""
+        route = self._route
+        neighbors = self._build_neighbor_lists()
+
+        if not self.dont_look_bits:
+            improved = True
+            while improved:
+                improved = False
+                for x in list(route):
+                    move = self._find_move(x, neighbors[x])
+                    if move is not None:
+                        self.apply_move(*move)
+                        improved = True
+            return
+
+        queue = deque(route)
+        active = set(route)
+        while queue:
+            x = queue.popleft()
+            active.discard(x)
+            move = self._find_move(x, neighbors[x])
+            if move is None:
+                continue
+            i, j = move
+            touched = (route[i - 1], route[i], route[j - 1], route[j], x)
+            self.apply_move(i, j)
+            for node in touched:
+                if node not in active:
+                    active.add(node)
+                    queue.append(node)
@@ -1,12 +1,26 @@
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict, Optional
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Annotated, Any, List, Dict, Literal, Optional, Sequence, Union
+import asyncio
+import dataclasses
 import json
 import os
 from datetime import datetime
 import logging
 
+from core.analytics import point_histograms
+from core.candidate_costs import CandidateCosts
+from core.cost_matrix import CostMatrix
 from core.optimizer import RouteOptimizer, DeliveryPoint, Vehicle, OptimizedRoute
+from core.route_session import RouteSession, RouteSessionStore
+from core.solver_pool import SolverPool, SolverOverloadedError, SolverTimeoutError
+from core.time_windows import parse_clock
+from core.tracing import Trace
 from utils.google_maps import GoogleMapsClient
+from utils.metrics import OptimizeMetrics
+from utils.responses import FastJSONResponse, ndjson_line
+from utils.result_cache import OptimizationResultCache
+from utils.road_network_client import RoadNetworkClient
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -14,109 +28,356 @@ logger = logging.getLogger(__name__)
 
 # Create router
 router = APIRouter(prefix="/api/v1", tags=["route-optimization"])
+# Endpoints served at the app root for scrapers (GET /metrics); include it alongside router
+metrics_router = APIRouter(tags=["monitoring"])
 
 # Initialize services
 route_optimizer = RouteOptimizer()
-google_maps_client = GoogleMapsClient()
+# Travel costs from a local road graph (OSM extract or saved hierarchy) when set, else the Maps API or Haversine
+ROAD_NETWORK_PATH = os.getenv('ROAD_NETWORK_PATH')
+google_maps_client = RoadNetworkClient.from_path(ROAD_NETWORK_PATH) if ROAD_NETWORK_PATH else GoogleMapsClient()
+solver_pool = SolverPool()
+route_sessions = RouteSessionStore(
+    max_sessions=int(os.getenv('ROUTE_SESSION_MAX', 1000)),
+    ttl_seconds=float(os.getenv('ROUTE_SESSION_TTL_SECONDS', 3600))
+)
+
+# Solved /optimize routes (with their matrix) for identical requests; RESULT_CACHE_MAX=0 only coalesces
+result_cache = OptimizationResultCache(
+    max_entries=int(os.getenv('RESULT_CACHE_MAX', 256)),
+    ttl_seconds=float(os.getenv('RESULT_CACHE_TTL_SECONDS', 60)),
+    max_bytes=int(float(os.getenv('RESULT_CACHE_MAX_MB', 256)) * 2 ** 20),
+    size_of=lambda result: result[0].nbytes
+)
+
+# Per-stage spans in optimization_metadata and /metrics histograms; processing_time_ms is always measured
+TRACING_ENABLED = bool(int(os.getenv('TRACING_ENABLED', 1)))
+optimize_metrics = OptimizeMetrics()
+
+# Largest number of routes accepted by one /optimize/batch request
+MAX_BATCH_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 1000))
+
+# Largest number of priority weights swept by one /optimize/pareto request
+MAX_TRADEOFF_WEIGHTS = int(os.getenv('TRADEOFF_MAX_WEIGHTS', 20))
+
+# Routes with more points than this and no time windows only fetch costs to each point's nearest neighbours
+LARGE_INSTANCE_POINTS = int(os.getenv('LARGE_INSTANCE_POINTS', 1500))
+CANDIDATE_NEIGHBORS = int(os.getenv('CANDIDATE_NEIGHBORS', 16))
+route_optimizer.large_instance_points = LARGE_INSTANCE_POINTS
+
+# Fleets with more points than this are split into sweep clusters of about FLEET_CLUSTER_POINTS stops
+FLEET_DECOMPOSE_POINTS = int(os.getenv('FLEET_DECOMPOSE_POINTS', 1000))
+FLEET_CLUSTER_POINTS = int(os.getenv('FLEET_CLUSTER_POINTS', 300))
 
 # Pydantic models for validation (if using FastAPI with main.py)
-from pydantic import BaseModel, validator
+from pydantic import AfterValidator, BaseModel, Field, ValidationError, ValidationInfo, field_validator, model_validator
+
+# Per-point fields are checked by pydantic-core constraints, with no Python call per field
+Latitude = Annotated[float, Field(ge=-90, le=90)]
+Longitude = Annotated[float, Field(ge=-180, le=180)]
+PackageSize = Literal['small', 'medium', 'large']
+Priority = Annotated[int, Field(ge=1, le=5)]
+
+def check_clock(v: str) -> str:
+    parse_clock(v)
+    return v
+
+# Only runs for windows that are given; most stops have none
+ClockTime = Annotated[str, AfterValidator(check_clock)]
 
 class DeliveryPointModel(BaseModel):
     id: str
-    lat: float
-    lon: float
+    lat: Latitude
+    lon: Longitude
     address: str
-    size: str
-    priority: int
-    time_window_start: Optional[str] = None
-    time_window_end: Optional[str] = None
-
-    @validator('lat')
-    def validate_latitude(cls, v):
-        if not -90 <= v <= 90:
-            raise ValueError('Latitude must be between -90 and 90')
-        return v
+    size: PackageSize
+    priority: Priority
+    time_window_start: Optional[ClockTime] = None
+    time_window_end: Optional[ClockTime] = None
 
-    @validator('lon')
-    def validate_longitude(cls, v):
-        if not -180 <= v <= 180:
-            raise ValueError('Longitude must be between -180 and 180')
+    @field_validator('time_window_end')
+    @classmethod
+    def validate_time_window_order(cls, v, info: ValidationInfo):
+        start = parse_clock(info.data.get('time_window_start'))
+        end = parse_clock(v)
+        if start is not None and end is not None and end < start:
+            raise ValueError('Time window must end after it starts')
         return v
 
-    @validator('size')
-    def validate_size(cls, v):
-        if v not in ['small', 'medium', 'large']:
-            raise ValueError('Size must be small, medium, or large')
+class VehicleModel(BaseModel):
+    type: Literal['motorcycle', 'van', 'truck']
+    capacity: PackageSize
+    fuel_efficiency: Annotated[float, Field(gt=0)]
+
+class StopColumnsModel(BaseModel):
+    """
+    Delivery points as parallel arrays, one entry per stop: the columnar
+    alternative to a list of DeliveryPointModel objects. Each array is
+    validated element-wise in pydantic-core; address and the windows may
+    be left out (windows may also hold nulls).
+    """
+    id: List[str]
+    lat: List[Latitude]
+    lon: List[Longitude]
+    size: List[PackageSize]
+    priority: List[Priority]
+    address: Optional[List[str]] = None
+    time_window_start: Optional[List[Optional[ClockTime]]] = None
+    time_window_end: Optional[List[Optional[ClockTime]]] = None
+
+    @model_validator(mode='after')
+    def validate_columns(self):
+        n = len(self.id)
+        for name in ('lat', 'lon', 'size', 'priority', 'address', 'time_window_start', 'time_window_end'):
+            column = getattr(self, name)
+            if column is not None and len(column) != n:
+                raise ValueError(f'stops.{name} has {len(column)} entries, expected {n}')
+        if self.time_window_start is not None and self.time_window_end is not None:
+            for point_id, start, end in zip(self.id, self.time_window_start, self.time_window_end):
+                if start is not None and end is not None and parse_clock(end) < parse_clock(start):
+                    raise ValueError(f'Time window of {point_id} must end after it starts')
+        return self
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def to_delivery_points(self) -> List[DeliveryPoint]:
+        """The stops as the optimizer's DeliveryPoints, built column-wise."""
+        n = len(self.id)
+        none = [None] * n
+        return list(map(
+            DeliveryPoint, self.id, self.lat, self.lon, self.address or [''] * n, self.size, self.priority,
+            self.time_window_start or none, self.time_window_end or none
+        ))
+
+class OptimizationRequestModel(BaseModel):
+    # Stops as objects, or as parallel arrays in `stops` (exactly one of the two)
+    delivery_points: Optional[List[DeliveryPointModel]] = None
+    stops: Optional[StopColumnsModel] = None
+    vehicle: VehicleModel
+    start_location: DeliveryPointModel
+    consider_traffic: bool = True
+    optimization_goal: str = "time"
+    include_distance_matrix: bool = False
+    # Score, savings and insights; clients that only need the route can skip them
+    include_analytics: bool = True
+    # Path of every segment as [lat, lon] points (road paths with ROAD_NETWORK_PATH, straight lines otherwise)
+    include_geometry: bool = False
+    algorithm: str = "vnd"
+    time_limit_ms: Optional[int] = None
+    departure_time: Optional[str] = None
+    # Cost units per position a stop waits, per priority level above the lowest (0 = distance only)
+    priority_weight: float = 0.0
+    # Cost each edge by when it is driven (time goal with traffic only)
+    time_dependent: bool = False
+
+    @model_validator(mode='after')
+    def validate_delivery_points(self):
+        if (self.delivery_points is None) == (self.stops is None):
+            raise ValueError('Give the stops as either delivery_points or stops')
+        if self.stop_count() < 2:
+            raise ValueError('At least 2 delivery points are required')
+        return self
+
+    @field_validator('optimization_goal')
+    @classmethod
+    def validate_optimization_goal(cls, v):
+        if v not in ['time', 'distance', 'fuel']:
+            raise ValueError('Optimization goal must be time, distance, or fuel')
         return v
 
-    @validator('priority')
-    def validate_priority(cls, v):
-        if not 1 <= v <= 5:
-            raise ValueError('Priority must be between 1 and 5')
+    @property
+    def columnar(self) -> bool:
+        """Whether the stops came as arrays, so the response uses arrays too."""
+        return self.stops is not None
+
+    def stop_count(self) -> int:
+        return len(self.stops) if self.stops is not None else len(self.delivery_points)
+
+    def to_delivery_points(self) -> List[DeliveryPoint]:
+        """The stops as the optimizer's DeliveryPoints, from either format."""
+        if self.stops is not None:
+            return self.stops.to_delivery_points()
+        return [to_delivery_point(p) for p in self.delivery_points]
+
+    @field_validator('algorithm')
+    @classmethod
+    def validate_algorithm(cls, v):
+        if v not in ['2opt', 'vnd', 'simulated_annealing', 'guided_local_search', 'exact']:
+            raise ValueError('Algorithm must be 2opt, vnd, simulated_annealing, guided_local_search, or exact')
         return v
 
-class VehicleModel(BaseModel):
-    type: str
-    capacity: str
-    fuel_efficiency: float
-
-    @validator('type')
-    def validate_vehicle_type(cls, v):
-        if v not in ['motorcycle', 'van', 'truck']:
-            raise ValueError('Vehicle type must be motorcycle, van, or truck')
+    @field_validator('time_limit_ms')
+    @classmethod
+    def validate_time_limit(cls, v):
+        if v is not None and not 1 <= v <= 60000:
+            raise ValueError('Time limit must be between 1 and 60000 ms')
         return v
 
-    @validator('capacity')
-    def validate_capacity(cls, v):
-        if v not in ['small', 'medium', 'large']:
-            raise ValueError('Capacity must be small, medium, or large')
+    @field_validator('departure_time')
+    @classmethod
+    def validate_departure_time(cls, v):
+        parse_clock(v)
         return v
 
-    @validator('fuel_efficiency')
-    def validate_fuel_efficiency(cls, v):
-        if v <= 0:
-            raise ValueError('Fuel efficiency must be positive')
+    @field_validator('priority_weight')
+    @classmethod
+    def validate_priority_weight(cls, v):
+        if v < 0:
+            raise ValueError('Priority weight must be at least 0')
         return v
 
-class OptimizationRequestModel(BaseModel):
+class FleetOptimizationRequestModel(BaseModel):
     delivery_points: List[DeliveryPointModel]
-    vehicle: VehicleModel
+    vehicles: List[VehicleModel]
     start_location: DeliveryPointModel
     consider_traffic: bool = True
     optimization_goal: str = "time"
+    allow_additional_vehicles: bool = True
+    time_limit_ms: Optional[int] = None
+    departure_time: Optional[str] = None
+    priority_weight: float = 0.0
 
-    @validator('delivery_points')
+    @field_validator('delivery_points')
+    @classmethod
     def validate_delivery_points(cls, v):
-        if len(v) < 2:
-            raise ValueError('At least 2 delivery points are required')
+        if len(v) < 1:
+            raise ValueError('At least 1 delivery point is required')
         return v
 
-    @validator('optimization_goal')
+    @field_validator('vehicles')
+    @classmethod
+    def validate_vehicles(cls, v):
+        if len(v) < 1:
+            raise ValueError('At least 1 vehicle is required')
+        return v
+
+    @field_validator('optimization_goal')
+    @classmethod
     def validate_optimization_goal(cls, v):
         if v not in ['time', 'distance', 'fuel']:
             raise ValueError('Optimization goal must be time, distance, or fuel')
         return v
 
+    @field_validator('time_limit_ms')
+    @classmethod
+    def validate_time_limit(cls, v):
+        if v is not None and not 1 <= v <= 60000:
+            raise ValueError('Time limit must be between 1 and 60000 ms')
+        return v
+
+    @field_validator('departure_time')
+    @classmethod
+    def validate_departure_time(cls, v):
+        parse_clock(v)
+        return v
+
+    @field_validator('priority_weight')
+    @classmethod
+    def validate_priority_weight(cls, v):
+        if v < 0:
+            raise ValueError('Priority weight must be at least 0')
+        return v
+
+class PriorityTradeoffRequestModel(OptimizationRequestModel):
+    # Weights to sweep; the optimizer's default sweep when omitted
+    priority_weights: Optional[List[float]] = None
+
+    @field_validator('priority_weights')
+    @classmethod
+    def validate_priority_weights(cls, v):
+        if v is not None:
+            if not 1 <= len(v) <= MAX_TRADEOFF_WEIGHTS:
+                raise ValueError(f'Between 1 and {MAX_TRADEOFF_WEIGHTS} priority weights are allowed')
+            if any(w < 0 for w in v):
+                raise ValueError('Priority weights must be at least 0')
+        return v
+
+class BatchOptimizationRequestModel(BaseModel):
+    # Items are validated one by one so a bad item only fails its own result line
+    requests: List[Dict[str, Any]]
+
+    @field_validator('requests')
+    @classmethod
+    def validate_requests(cls, v):
+        if not 1 <= len(v) <= MAX_BATCH_REQUESTS:
+            raise ValueError(f'A batch must contain between 1 and {MAX_BATCH_REQUESTS} requests')
+        return v
+
+class RouteSessionRequestModel(OptimizationRequestModel):
+    # Adopt an already optimized order (start location first) instead of solving
+    route_order: Optional[List[str]] = None
+
+class RouteDeltaModel(BaseModel):
+    op: str
+    point: Optional[DeliveryPointModel] = None
+    point_id: Optional[str] = None
+    position: Optional[int] = None
+
+    @field_validator('op')
+    @classmethod
+    def validate_op(cls, v):
+        if v not in ['insert', 'remove', 'move']:
+            raise ValueError('Operation must be insert, remove, or move')
+        return v
+
+    @model_validator(mode='after')
+    def validate_delta_fields(self):
+        op = self.op
+        if op == 'insert' and self.point is None:
+            raise ValueError('Insert requires a point')
+        if op in ('remove', 'move') and not self.point_id:
+            raise ValueError(f'{op.capitalize()} requires a point_id')
+        if op == 'move' and self.position is None:
+            raise ValueError('Move requires a position')
+        return self
+
+def to_delivery_point(p: DeliveryPointModel) -> DeliveryPoint:
+    """
+    Convert a request model to the optimizer's DeliveryPoint. The model's
+    fields are the dataclass's, so its field dict is passed straight through.
+    """
+    return DeliveryPoint(**p.__dict__)
+
+def to_vehicle(v: VehicleModel) -> Vehicle:
+    """Convert a request model to the optimizer's Vehicle."""
+    return Vehicle(
+        type=v.type,
+        capacity=v.capacity,
+        fuel_efficiency=v.fuel_efficiency
+    )
+
 class RouteAnalytics:
     """Helper class for route analytics and performance metrics."""
 
     @staticmethod
     def calculate_savings(optimized_route: OptimizedRoute, baseline_route: Optional[Dict] = None) -> Dict:
         """
-        Calculate savings compared to a baseline route (e.g., unoptimized).
+        Calculate savings compared to a baseline route, by default the same
+        stops driven in request order, and the optimality gap: how far the
+        route's distance is at most above the best possible one.
         """
-        if not baseline_route:
-            # Create a simple baseline (direct routes from start to each point)
-            baseline_distance = optimized_route.total_distance_km * 1.3  # 30% more
-            baseline_time = optimized_route.total_time_minutes * 1.4     # 40% more
-            baseline_fuel_cost = optimized_route.estimated_fuel_cost * 1.3
+        if baseline_route:
+            baseline_name = "provided"
+        elif optimized_route.baseline:
+            baseline_route, baseline_name = optimized_route.baseline, "request_order"
+        else:
+            baseline_name = None
+        baseline_route = baseline_route or {}
+        baseline_distance = baseline_route.get('total_distance_km', optimized_route.total_distance_km)
+        baseline_time = baseline_route.get('total_time_minutes', optimized_route.total_time_minutes)
+        baseline_fuel_cost = baseline_route.get('estimated_fuel_cost', optimized_route.estimated_fuel_cost)
+
+        lower_bound = optimized_route.lower_bound_km
+        if lower_bound is None:
+            gap_percent = None
+        elif lower_bound > 0:
+            gap_percent = round(max(optimized_route.total_distance_km / lower_bound - 1.0, 0.0) * 100, 2)
         else:
-            baseline_distance = baseline_route.get('total_distance_km', 0)
-            baseline_time = baseline_route.get('total_time_minutes', 0)
-            baseline_fuel_cost = baseline_route.get('estimated_fuel_cost', 0)
+            gap_percent = 0.0 if optimized_route.total_distance_km == 0 else None
 
         return {
+            "baseline": baseline_name,
             "distance_saved_km": round(baseline_distance - optimized_route.total_distance_km, 2),
             "time_saved_minutes": int(baseline_time - optimized_route.total_time_minutes),
             "fuel_cost_saved": round(baseline_fuel_cost - optimized_route.estimated_fuel_cost, 2),
@@ -125,7 +386,10 @@ class RouteAnalytics:
             ) if baseline_distance > 0 else 0,
             "time_savings_percent": round(
                 ((baseline_time - optimized_route.total_time_minutes) / baseline_time * 100), 1
-            ) if baseline_time > 0 else 0
+            ) if baseline_time > 0 else 0,
+            "lower_bound_km": lower_bound,
+            "lower_bound_method": optimized_route.lower_bound_method,
+            "optimality_gap_percent": gap_percent
         }
 
     @staticmethod
@@ -134,26 +398,26 @@ class RouteAnalytics:
         """
         Generate insights about the optimized route.
         """
+        stops = max(len(optimized_route.route_order) - 1, 1)
+        histograms = point_histograms(delivery_points)
+        priorities = histograms["priorities"]
+        sizes = histograms["sizes"]
         insights = {
             "route_efficiency": {
                 "optimization_score": optimized_route.optimization_score,
                 "total_stops": len(optimized_route.route_order) - 1,
-                "average_distance_per_stop": round(
-                    optimized_route.total_distance_km / (len(optimized_route.route_order) - 1), 2
-                ),
-                "average_time_per_stop": round(
-                    optimized_route.total_time_minutes / (len(optimized_route.route_order) - 1), 1
-                )
+                "average_distance_per_stop": round(optimized_route.total_distance_km / stops, 2),
+                "average_time_per_stop": round(optimized_route.total_time_minutes / stops, 1)
             },
             "delivery_priorities": {
-                "high_priority_deliveries": len([p for p in delivery_points if p.priority == 1]),
-                "medium_priority_deliveries": len([p for p in delivery_points if p.priority == 2]),
-                "low_priority_deliveries": len([p for p in delivery_points if p.priority >= 3])
+                "high_priority_deliveries": priorities[0],
+                "medium_priority_deliveries": priorities[1],
+                "low_priority_deliveries": sum(priorities[2:])
             },
             "package_distribution": {
-                "small_packages": len([p for p in delivery_points if p.size == "small"]),
-                "medium_packages": len([p for p in delivery_points if p.size == "medium"]),
-                "large_packages": len([p for p in delivery_points if p.size == "large"])
+                "small_packages": sizes[0],
+                "medium_packages": sizes[1],
+                "large_packages": sizes[2]
             },
             "estimated_completion_time": {
                 "total_driving_time": optimized_route.total_time_minutes,
@@ -164,94 +428,586 @@ class RouteAnalytics:
 
         return insights
 
+def optimize_kwargs(request: OptimizationRequestModel) -> Dict:
+    """Solver pool arguments for a single-route request."""
+    return dict(
+        delivery_points=request.to_delivery_points(),
+        vehicle=to_vehicle(request.vehicle),
+        start_location=to_delivery_point(request.start_location),
+        optimization_goal=request.optimization_goal,
+        algorithm=request.algorithm,
+        time_limit_ms=request.time_limit_ms,
+        departure_time=request.departure_time,
+        trace=TRACING_ENABLED,
+        analytics=request.include_analytics,
+        priority_weight=request.priority_weight,
+        traffic_profile=(google_maps_client.get_traffic_profile()
+                         if request.time_dependent and request.consider_traffic else None),
+        # Leave the solve its full time limit on top of the usual timeout
+        timeout_seconds=solver_pool.timeout_seconds + (request.time_limit_ms or 0) / 1000
+    )
+
+def request_fingerprint(request: OptimizationRequestModel, options: Dict) -> str:
+    """
+    Result cache key of a single-route request: everything its solve depends
+    on. Stops stay in request order, which the savings baseline follows.
+    The traffic bucket (when traffic is considered) and the departure minute
+    the schedule starts from are part of the key, so a cached route is never
+    served with another period's traffic or stale ETAs.
+    """
+    start_location = options["start_location"]
+    return result_cache.fingerprint({
+        "delivery_points": [dataclasses.astuple(p) for p in options["delivery_points"]],
+        "start_location": dataclasses.astuple(start_location),
+        "vehicle": dataclasses.astuple(options["vehicle"]),
+        "optimization_goal": request.optimization_goal,
+        "traffic": google_maps_client.get_traffic_bucket() if request.consider_traffic else None,
+        "departure": route_optimizer.departure_minutes(start_location, request.departure_time),
+        "algorithm": request.algorithm,
+        "time_limit_ms": request.time_limit_ms,
+        "analytics": request.include_analytics,
+        "priority_weight": request.priority_weight,
+        "time_dependent": options["traffic_profile"] is not None
+    })
+
+async def fetch_route_costs(points: List[DeliveryPoint], consider_traffic: bool,
+                            vehicle_type: str) -> Union[CostMatrix, CandidateCosts]:
+    """
+    Full matrix for a route's points, or candidate-edge costs (N * K
+    elements instead of N^2) for large routes without time windows.
+    """
+    if route_optimizer.uses_candidate_costs(points):
+        return await google_maps_client.get_candidate_costs(
+            points, CANDIDATE_NEIGHBORS, consider_traffic=consider_traffic, vehicle_type=vehicle_type
+        )
+    return await google_maps_client.get_distance_matrix(
+        points, consider_traffic=consider_traffic, vehicle_type=vehicle_type
+    )
+
+def check_route_request(options: Dict, candidates: bool = False):
+    """
+    Raise ValueError for a single-route request (optimize_kwargs) that the
+    solver would reject, before any travel costs are fetched (and billed).
+    candidates: whether the route will be costed on candidate edges.
+    """
+    route_optimizer.check_route_request(
+        options["delivery_points"], options["vehicle"], options["optimization_goal"], options["algorithm"],
+        options["priority_weight"], options["traffic_profile"], candidates
+    )
+
+SEGMENT_COLUMNS = ("from_point", "to_point", "distance_km", "duration_minutes", "traffic_delay_minutes")
+
+def to_columns(rows: List[Dict], keys: Optional[Sequence[str]] = None) -> Dict[str, List]:
+    """Rows of dicts as one list per key (the first row's keys by default)."""
+    if keys is None:
+        keys = list(rows[0]) if rows else []
+    return {key: [row.get(key) for row in rows] for key in keys}
+
+def build_route_response(optimized_route: OptimizedRoute, distance_matrix: Union[CostMatrix, CandidateCosts],
+                         delivery_points: List, optimization_goal: str, consider_traffic: bool,
+                         include_distance_matrix: bool = False, trace: Optional[Trace] = None,
+                         include_analytics: bool = True, columnar: bool = False) -> Dict:
+    """
+    Response body of /optimize, also used for batch lines and route sessions.
+    trace is the request's trace; the solver's stage spans are merged into
+    it and, for solved routes, recorded in the /metrics histograms. Without
+    analytics, savings and insights are left out. Columnar responses (to
+    requests that sent `stops`) give segments and schedule as parallel
+    arrays and add route_index, each route stop's index in the request's
+    arrays (-1 for the start location).
+    """
+    if trace is None:
+        trace = Trace(enabled=TRACING_ENABLED)
+    trace.extend(optimized_route.spans)
+
+    # Generate analytics
+    analytics = {}
+    if include_analytics:
+        with trace.span("analytics"):
+            route_analytics = RouteAnalytics()
+            analytics["savings"] = route_analytics.calculate_savings(optimized_route)
+            analytics["insights"] = route_analytics.generate_route_insights(optimized_route, delivery_points)
+
+    if trace.enabled and optimized_route.spans:
+        optimize_metrics.observe(
+            trace.spans, len(delivery_points), optimization_goal, optimized_route.search_stats.get("two_opt")
+        )
+
+    response = {
+        "route_order": optimized_route.route_order,
+        "segments": optimized_route.segments,
+        "total_distance_km": optimized_route.total_distance_km,
+        "total_time_minutes": optimized_route.total_time_minutes,
+        "estimated_fuel_cost": optimized_route.estimated_fuel_cost,
+        "optimization_score": optimized_route.optimization_score,
+        "schedule": optimized_route.schedule,
+        "time_window_violations": optimized_route.time_window_violations,
+        **analytics,
+        "optimization_metadata": {
+            "algorithm_used": optimized_route.search_stats["algorithm"],
+            "iterations": optimized_route.search_stats.get("iterations", 0),
+            "improvements": optimized_route.search_stats.get("improvements", 0),
+            "search_time_ms": optimized_route.search_stats.get("elapsed_ms", 0.0),
+            "search_stats": {k: v for k, v in optimized_route.search_stats.items() if k != "algorithm"},
+            "optimization_goal": optimization_goal,
+            "consider_traffic": consider_traffic,
+            "timestamp": datetime.now().isoformat(),
+            "processing_time_ms": round(trace.elapsed_ms(), 1)
+        }
+    }
+    if trace.enabled:
+        response["optimization_metadata"]["spans"] = trace.spans
+    if columnar:
+        index = {p.id: k for k, p in enumerate(delivery_points)}
+        response["route_index"] = [index.get(point_id, -1) for point_id in optimized_route.route_order]
+        response["segments"] = to_columns(optimized_route.segments, SEGMENT_COLUMNS)
+        response["schedule"] = to_columns(optimized_route.schedule)
+
+    # The nested matrix is large, so it is only serialized on request (candidate edges only on large routes)
+    if include_distance_matrix:
+        response["distance_matrix"] = distance_matrix.to_nested()
+    return response
+
+def error_status(error: Exception) -> int:
+    """HTTP status for an optimization error, as the single-route endpoints answer it."""
+    if isinstance(error, ValueError):
+        return 400
+    if isinstance(error, SolverOverloadedError):
+        return 503
+    if isinstance(error, SolverTimeoutError):
+        return 504
+    return 500
+
 @router.post("/optimize", response_model=Dict)
 async def optimize_route_advanced(request: OptimizationRequestModel):
     """
     Advanced route optimization with detailed analytics and insights.
     """
+    trace = Trace(enabled=TRACING_ENABLED)
     try:
-        logger.info(f"Starting route optimization for {len(request.delivery_points)} delivery points")
+        logger.info(f"Starting route optimization for {request.stop_count()} delivery points")
 
         # Convert Pydantic models to internal format
-        delivery_points = [
-            DeliveryPoint(
-                id=p.id,
-                lat=p.lat,
-                lon=p.lon,
-                address=p.address,
-                size=p.size,
-                priority=p.priority,
-                time_window_start=p.time_window_start,
-                time_window_end=p.time_window_end
-            )
-            for p in request.delivery_points
-        ]
+        options = optimize_kwargs(request)
+        all_points = [options["start_location"]] + options["delivery_points"]
+        check_route_request(options, route_optimizer.uses_candidate_costs(all_points))
+
+        async def solve():
+            # Get distance matrix from Google Maps
+            with trace.span("fetch_costs"):
+                distance_matrix = await fetch_route_costs(all_points, request.consider_traffic,
+                                                          request.vehicle.type)
 
-        vehicle = Vehicle(
-            type=request.vehicle.type,
-            capacity=request.vehicle.capacity,
-            fuel_efficiency=request.vehicle.fuel_efficiency
+            # Optimize route in the solver pool so the event loop stays responsive (queueing included)
+            with trace.span("solve"):
+                optimized_route = await solver_pool.optimize(distance_matrix=distance_matrix, **options)
+            return distance_matrix, optimized_route
+
+        # Identical requests share one fetch and solve, and repeats within the TTL are served from the cache
+        (distance_matrix, optimized_route), cache_status = await result_cache.get_or_compute(
+            request_fingerprint(request, options), solve
         )
+        if cache_status != "miss":
+            # The solver stages ran for another request; keep them out of this trace and the histograms
+            optimized_route = dataclasses.replace(optimized_route, spans=[])
+
+        if request.include_geometry:
+            points = {p.id: p for p in [options["start_location"]] + options["delivery_points"]}
+            with trace.span("geometry"):
+                geometry = await google_maps_client.get_route_geometry(
+                    [points[point_id] for point_id in optimized_route.route_order]
+                )
 
-        start_location = DeliveryPoint(
-            id=request.start_location.id,
-            lat=request.start_location.lat,
-            lon=request.start_location.lon,
-            address=request.start_location.address,
-            size=request.start_location.size,
-            priority=request.start_location.priority,
-            time_window_start=request.start_location.time_window_start,
-            time_window_end=request.start_location.time_window_end
+        response = build_route_response(
+            optimized_route, distance_matrix, options["delivery_points"], request.optimization_goal,
+            request.consider_traffic, request.include_distance_matrix, trace, request.include_analytics,
+            request.columnar
         )
+        response["optimization_metadata"]["cache"] = cache_status
+        if request.include_geometry:
+            response["geometry"] = geometry
+        logger.info(f"Route optimization completed successfully ({cache_status}). "
+                    f"Score: {optimized_route.optimization_score}")
+        return FastJSONResponse(response)
+
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except SolverOverloadedError as e:
+        logger.warning(f"Solver overloaded: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except SolverTimeoutError as e:
+        logger.error(f"Optimization timed out: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"Optimization failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Optimization failed: {str(e)}")
+
+@router.post("/optimize/pareto", response_model=Dict)
+async def optimize_priority_tradeoff(request: PriorityTradeoffRequestModel):
+    """
+    Travel cost against priority adherence: one route per priority weight,
+    with the Pareto-optimal ones marked, to choose a priority_weight for /optimize.
+    """
+    try:
+        logger.info(f"Starting priority trade-off for {request.stop_count()} delivery points")
+        delivery_points = request.to_delivery_points()
+        start_location = to_delivery_point(request.start_location)
+        vehicle = to_vehicle(request.vehicle)
+        trace = Trace(enabled=TRACING_ENABLED)
 
-        # Get distance matrix from Google Maps
+        # Rejected before fetching: the sweep needs a full matrix and one vehicle load
         all_points = [start_location] + delivery_points
-        distance_matrix = await google_maps_client.get_distance_matrix(
-            all_points, consider_traffic=request.consider_traffic
-        )
+        if route_optimizer.uses_candidate_costs(all_points):
+            raise ValueError("Priority weights need a full distance matrix")
+        route_optimizer.check_route_request(delivery_points, vehicle)
 
-        # Optimize route
-        optimized_route = route_optimizer.optimize(
+        distance_matrix = await fetch_route_costs(all_points, request.consider_traffic, request.vehicle.type)
+        points = await solver_pool.priority_tradeoff(
             delivery_points=delivery_points,
             vehicle=vehicle,
             start_location=start_location,
             distance_matrix=distance_matrix,
-            optimization_goal=request.optimization_goal
+            optimization_goal=request.optimization_goal,
+            priority_weights=request.priority_weights,
+            time_limit_ms=request.time_limit_ms,
+            departure_time=request.departure_time,
+            timeout_seconds=solver_pool.timeout_seconds + (request.time_limit_ms or 0) / 1000
         )
 
-        # Generate analytics
-        analytics = RouteAnalytics()
-        savings = analytics.calculate_savings(optimized_route)
-        insights = analytics.generate_route_insights(optimized_route, request.delivery_points)
-
-        # Prepare response
-        response = {
-            "route_order": optimized_route.route_order,
-            "segments": optimized_route.segments,
-            "total_distance_km": optimized_route.total_distance_km,
-            "total_time_minutes": optimized_route.total_time_minutes,
-            "estimated_fuel_cost": optimized_route.estimated_fuel_cost,
-            "optimization_score": optimized_route.optimization_score,
-            "savings": savings,
-            "insights": insights,
+        return FastJSONResponse({
+            "points": points,
             "optimization_metadata": {
-                "algorithm_used": "dijkstra_with_2opt",
                 "optimization_goal": request.optimization_goal,
                 "consider_traffic": request.consider_traffic,
                 "timestamp": datetime.now().isoformat(),
-                "processing_time_ms": 0  # Could be implemented with timing
+                "processing_time_ms": round(trace.elapsed_ms(), 1)
             }
-        }
+        })
+
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except SolverOverloadedError as e:
+        logger.warning(f"Solver overloaded: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except SolverTimeoutError as e:
+        logger.error(f"Priority trade-off timed out: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"Priority trade-off failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Priority trade-off failed: {str(e)}")
+
+@router.post("/optimize/fleet", response_model=Dict)
+async def optimize_fleet(request: FleetOptimizationRequestModel):
+    """
+    Split deliveries across a fleet of vehicles (capacitated VRP).
+    Returns one route per vehicle; vehicles are added when the fleet is too small
+    unless allow_additional_vehicles is false.
+    """
+    try:
+        logger.info(f"Starting fleet optimization for {len(request.delivery_points)} delivery points "
+                    f"and {len(request.vehicles)} vehicles")
+
+        delivery_points = [to_delivery_point(p) for p in request.delivery_points]
+        vehicles = [to_vehicle(v) for v in request.vehicles]
+        start_location = to_delivery_point(request.start_location)
+
+        if len(delivery_points) > FLEET_DECOMPOSE_POINTS:
+            # Cluster-first: only each cluster's (and boundary's) block of the matrix is fetched
+            plan = await solver_pool.optimize_fleet_decomposed(
+                delivery_points=delivery_points,
+                vehicles=vehicles,
+                start_location=start_location,
+                fetch_matrices=lambda point_lists: google_maps_client.get_distance_matrices(
+                    point_lists, consider_traffic=request.consider_traffic, vehicle_type=request.vehicles[0].type
+                ),
+                optimization_goal=request.optimization_goal,
+                allow_additional_vehicles=request.allow_additional_vehicles,
+                time_limit_ms=request.time_limit_ms,
+                departure_time=request.departure_time,
+                priority_weight=request.priority_weight,
+                max_cluster_points=FLEET_CLUSTER_POINTS
+            )
+        else:
+            # One matrix for the whole fleet, shared by every route
+            distance_matrix = await google_maps_client.get_distance_matrix(
+                [start_location] + delivery_points, consider_traffic=request.consider_traffic,
+                vehicle_type=request.vehicles[0].type
+            )
+
+            plan = await solver_pool.optimize_fleet(
+                delivery_points=delivery_points,
+                vehicles=vehicles,
+                start_location=start_location,
+                distance_matrix=distance_matrix,
+                optimization_goal=request.optimization_goal,
+                allow_additional_vehicles=request.allow_additional_vehicles,
+                time_limit_ms=request.time_limit_ms,
+                departure_time=request.departure_time,
+                priority_weight=request.priority_weight,
+                timeout_seconds=solver_pool.timeout_seconds + (request.time_limit_ms or 0) / 1000
+            )
 
-        logger.info(f"Route optimization completed successfully. Score: {optimized_route.optimization_score}")
-        return response
+        routes = []
+        for k, (vehicle, route, load) in enumerate(zip(plan.vehicles, plan.routes, plan.loads)):
+            routes.append({
+                "vehicle_index": k,
+                "vehicle": {
+                    "type": vehicle.type,
+                    "capacity": vehicle.capacity,
+                    "fuel_efficiency": vehicle.fuel_efficiency
+                },
+                "additional_vehicle": k >= len(request.vehicles),
+                "load": load,
+                "capacity_limit": route_optimizer.capacity_limits[vehicle.capacity],
+                "route_order": route.route_order,
+                "segments": route.segments,
+                "total_distance_km": route.total_distance_km,
+                "total_time_minutes": route.total_time_minutes,
+                "estimated_fuel_cost": route.estimated_fuel_cost,
+                "optimization_score": route.optimization_score,
+                "schedule": route.schedule,
+                "time_window_violations": route.time_window_violations
+            })
+
+        logger.info(f"Fleet optimization completed: {sum(1 for r in routes if len(r['route_order']) > 1)} "
+                    f"vehicles used, {plan.additional_vehicles} added")
+        return FastJSONResponse({
+            "routes": routes,
+            "summary": {
+                "vehicles_used": sum(1 for r in routes if len(r["route_order"]) > 1),
+                "additional_vehicles": plan.additional_vehicles,
+                "unassigned_points": plan.unassigned,
+                "time_window_violations": sum(len(r.time_window_violations) for r in plan.routes),
+                "total_distance_km": round(sum(r.total_distance_km for r in plan.routes), 2),
+                "total_time_minutes": sum(r.total_time_minutes for r in plan.routes),
+                "estimated_fuel_cost": round(sum(r.estimated_fuel_cost for r in plan.routes), 2)
+            },
+            "optimization_metadata": {
+                "algorithm_used": plan.search_stats["algorithm"],
+                "iterations": plan.search_stats["iterations"],
+                "improvements": plan.search_stats["improvements"],
+                "search_time_ms": plan.search_stats["elapsed_ms"],
+                "search_stats": {k: v for k, v in plan.search_stats.items() if k != "algorithm"},
+                "optimization_goal": request.optimization_goal,
+                "consider_traffic": request.consider_traffic,
+                "timestamp": datetime.now().isoformat()
+            }
+        })
 
     except ValueError as e:
         logger.error(f"Validation error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
+    except SolverOverloadedError as e:
+        logger.warning(f"Solver overloaded: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except SolverTimeoutError as e:
+        logger.error(f"Fleet optimization timed out: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        logger.error(f"Optimization failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Optimization failed: {str(e)}")
+        logger.error(f"Fleet optimization failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Fleet optimization failed: {str(e)}")
+
+@router.post("/optimize/batch")
+async def optimize_batch(batch: BatchOptimizationRequestModel):
+    """
+    Optimize many independent routes and stream one NDJSON line per route as
+    soon as it is solved. Lines carry the request's index and either the
+    /optimize response or the error it would have returned.
+    """
+    logger.info(f"Starting batch optimization of {len(batch.requests)} routes")
+
+    lines: List[Dict] = []
+    requests: Dict[int, OptimizationRequestModel] = {}
+    for index, item in enumerate(batch.requests):
+        try:
+            request = OptimizationRequestModel.model_validate(item)
+            # Batch routes always get full matrices; rejected routes are left out of the matrix build
+            check_route_request(optimize_kwargs(request))
+            requests[index] = request
+        except ValidationError as e:
+            lines.append({"index": index, "status": "error", "status_code": 422, "detail": json.loads(e.json())})
+        except ValueError as e:
+            lines.append({"index": index, "status": "error", "status_code": 400, "detail": str(e)})
+
+    # Routes with the same travel settings share one matrix build, so common pairs are fetched once
+    groups: Dict[tuple, List[int]] = {}
+    for index, request in requests.items():
+        groups.setdefault((request.consider_traffic, request.vehicle.type), []).append(index)
+
+    # The batch uses at most one worker per solver process, leaving the queue to other requests
+    slots = asyncio.Semaphore(solver_pool.capacity)
+
+    async def solve(index: int, matrices: asyncio.Task, position: int) -> Dict:
+        request = requests[index]
+        trace = Trace(enabled=TRACING_ENABLED)
+        try:
+            options = optimize_kwargs(request)
+            with trace.span("fetch_costs"):
+                distance_matrix = (await matrices)[position]
+            with trace.span("solve"):
+                async with slots:
+                    optimized_route = await solver_pool.optimize(distance_matrix=distance_matrix, **options)
+            result = build_route_response(
+                optimized_route, distance_matrix, options["delivery_points"], request.optimization_goal,
+                request.consider_traffic, request.include_distance_matrix, trace, request.include_analytics,
+                request.columnar
+            )
+            return {"index": index, "status": "ok", "result": result}
+        except Exception as e:
+            logger.error(f"Batch item {index} failed: {str(e)}")
+            return {"index": index, "status": "error", "status_code": error_status(e), "detail": str(e)}
+
+    async def stream():
+        matrix_tasks = []
+        solves = []
+        for (consider_traffic, vehicle_type), indices in groups.items():
+            matrices = asyncio.ensure_future(google_maps_client.get_distance_matrices(
+                [[to_delivery_point(requests[k].start_location)] +
+                 requests[k].to_delivery_points() for k in indices],
+                consider_traffic=consider_traffic, vehicle_type=vehicle_type
+            ))
+            matrix_tasks.append(matrices)
+            solves.extend(asyncio.ensure_future(solve(k, matrices, position)) for position, k in enumerate(indices))
+        try:
+            for line in lines:
+                yield ndjson_line(line)
+            failed = len(lines)
+            for finished in asyncio.as_completed(solves):
+                line = await finished
+                failed += line["status"] != "ok"
+                yield ndjson_line(line)
+            logger.info(f"Batch optimization completed: {len(batch.requests) - failed} routes solved, {failed} failed")
+        finally:
+            # A client that disconnects early cancels the rest of the batch
+            for task in matrix_tasks + solves:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+def session_response(session: RouteSession, optimized_route: OptimizedRoute,
+                     trace: Optional[Trace] = None) -> Dict:
+    """Route response for a session, plus its id and version."""
+    response = build_route_response(
+        optimized_route, session.distance_matrix, session.delivery_points,
+        session.optimization_goal, session.consider_traffic, trace=trace,
+        include_analytics=optimized_route.optimization_score is not None
+    )
+    response["session_id"] = session.session_id
+    response["version"] = session.version
+    response["departure_time"] = session.departure_time
+    return response
+
+def get_session_or_404(session_id: str) -> RouteSession:
+    session = route_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Route session not found or expired")
+    return session
+
+@router.post("/sessions", response_model=Dict)
+async def create_route_session(request: RouteSessionRequestModel):
+    """
+    Optimize a route (or adopt route_order) and keep it as a live session
+    that accepts insert/remove/move deltas.
+    """
+    trace = Trace(enabled=TRACING_ENABLED)
+    try:
+        options = optimize_kwargs(request)
+        delivery_points = options["delivery_points"]
+        start_location = options["start_location"]
+        if request.route_order is None:
+            check_route_request(options)
+        with trace.span("fetch_costs"):
+            distance_matrix = await google_maps_client.get_distance_matrix(
+                [start_location] + delivery_points, consider_traffic=request.consider_traffic,
+                vehicle_type=request.vehicle.type
+            )
+
+        if request.route_order is not None:
+            session = RouteSession.from_route_order(
+                route_optimizer, request.route_order, delivery_points, start_location, options["vehicle"],
+                distance_matrix, request.optimization_goal, request.consider_traffic, request.departure_time,
+                request.include_analytics
+            )
+            optimized_route = session.result({"algorithm": "provided_route"})
+        else:
+            with trace.span("solve"):
+                optimized_route = await solver_pool.optimize(distance_matrix=distance_matrix, **options)
+            session = RouteSession.from_route(
+                route_optimizer, optimized_route, delivery_points, start_location, options["vehicle"],
+                distance_matrix, request.optimization_goal, request.consider_traffic, request.departure_time,
+                request.include_analytics
+            )
+        route_sessions.add(session)
+
+        logger.info(f"Created route session {session.session_id} with {len(delivery_points)} stops")
+        return FastJSONResponse(session_response(session, optimized_route, trace))
+
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except SolverOverloadedError as e:
+        logger.warning(f"Solver overloaded: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except SolverTimeoutError as e:
+        logger.error(f"Optimization timed out: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"Route session creation failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Route session creation failed: {str(e)}")
+
+@router.get("/sessions/{session_id}", response_model=Dict)
+async def get_route_session(session_id: str, analytics: Optional[bool] = None):
+    """
+    Current route of a session. analytics overrides the session's
+    include_analytics, e.g. to score a route edited without them.
+    """
+    session = get_session_or_404(session_id)
+    return FastJSONResponse(session_response(session, session.result(analytics=analytics)))
+
+@router.post("/sessions/{session_id}/deltas", response_model=Dict)
+async def apply_route_delta(session_id: str, delta: RouteDeltaModel):
+    """
+    Apply one delta to a live route. Inserts fetch travel costs for the new
+    stop only and repair the route around it; nothing is re-solved.
+    """
+    trace = Trace(enabled=TRACING_ENABLED)
+    session = get_session_or_404(session_id)
+    try:
+        async with session.lock:
+            if delta.op == "insert":
+                point = to_delivery_point(delta.point)
+                session.validate_insert(point)
+                costs = None
+                if session.needs_costs(point):
+                    costs = await google_maps_client.get_point_costs(
+                        session.known_points, point, consider_traffic=session.consider_traffic,
+                        vehicle_type=session.vehicle.type
+                    )
+                search_stats = session.insert(point, costs)
+            elif delta.op == "remove":
+                search_stats = session.remove(delta.point_id)
+            else:
+                search_stats = session.move(delta.point_id, delta.position)
+            optimized_route = session.result(search_stats)
+        return FastJSONResponse(session_response(session, optimized_route, trace))
+
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Route delta failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Route delta failed: {str(e)}")
+
+@router.delete("/sessions/{session_id}")
+async def delete_route_session(session_id: str):
+    """
+    End a route session.
+    """
+    if not route_sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Route session not found or expired")
+    return {"session_id": session_id, "deleted": True}
 
 @router.get("/sample-data")
 async def get_sample_data():
@@ -304,16 +1060,16 @@ async def validate_optimization_request(request: OptimizationRequestModel):
     """
     try:
         # Check capacity constraints
-        total_capacity_needed = sum(
-            {"small": 1.0, "medium": 1.5, "large": 2.0}[p.size]
-            for p in request.delivery_points
-        )
+        sizes = request.stops.size if request.columnar else [p.size for p in request.delivery_points]
+        total_capacity_needed = sum({"small": 1.0, "medium": 1.5, "large": 2.0}[size] for size in sizes)
         vehicle_capacity = {"small": 3, "medium": 8, "large": 15}[request.vehicle.capacity]
+        options = optimize_kwargs(request)
+        candidates = route_optimizer.uses_candidate_costs([options["start_location"]] + options["delivery_points"])
 
         validation_result = {
             "is_valid": True,
             "validation_details": {
-                "total_delivery_points": len(request.delivery_points),
+                "total_delivery_points": request.stop_count(),
                 "capacity_utilization": round(total_capacity_needed / vehicle_capacity, 2),
                 "capacity_sufficient": total_capacity_needed <= vehicle_capacity,
                 "vehicle_type": request.vehicle.type,
@@ -324,18 +1080,25 @@ async def validate_optimization_request(request: OptimizationRequestModel):
         }
 
         # Add warnings and recommendations
-        if total_capacity_needed > vehicle_capacity:
+        if total_capacity_needed > vehicle_capacity and not candidates:
             validation_result["is_valid"] = False
             validation_result["warnings"].append(
                 f"Vehicle capacity insufficient. Need {total_capacity_needed:.1f} units, have {vehicle_capacity}"
             )
+        if candidates:
+            # Large routes reload at the start location between trips, but lose some options
+            try:
+                check_route_request(options, candidates)
+            except ValueError as e:
+                validation_result["is_valid"] = False
+                validation_result["warnings"].append(str(e))
 
         if validation_result["validation_details"]["capacity_utilization"] < 0.5:
             validation_result["recommendations"].append(
                 "Consider using a smaller vehicle for better fuel efficiency"
             )
 
-        if len(request.delivery_points) > 15:
+        if request.stop_count() > 15:
             validation_result["warnings"].append(
                 "Large number of delivery points may increase optimization time"
             )
@@ -354,8 +1117,21 @@ async def health_check():
         "status": "healthy",
         "services": {
             "route_optimizer": "active",
-            "google_maps": "active" if google_maps_client.is_configured() else "mock_mode"
+            "google_maps": "active" if google_maps_client.is_configured() else "mock_mode",
+            "routing_engine": google_maps_client.engine
         },
+        "distance_matrix_cache": google_maps_client.cache.stats(),
+        "solver_pool": solver_pool.stats(),
+        "route_sessions": route_sessions.stats(),
+        "result_cache": result_cache.stats(),
         "version": "1.0.0",
         "timestamp": datetime.now().isoformat()
-    }
\ No newline at end of file
+    }
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus histograms of optimize stage durations and 2-opt moves,
+    labelled by stage, point count and goal (empty when tracing is off).
+    """
+    return PlainTextResponse(optimize_metrics.render(), media_type="text/plain; version=0.0.4")
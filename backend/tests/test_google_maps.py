@@ -0,0 +1,173 @@
+"""
+Tiled Distance Matrix fetching against a local fake of the API, served by
+aiohttp's test server. Every element the fake answers is 7 km / 10 min, so
+API values are easy to tell apart from Haversine estimates.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from utils.google_maps import GoogleMapsClient
+from utils.matrix_cache import DistanceMatrixCache
+
+API_ELEMENT = {
+    'status': 'OK',
+    'distance': {'value': 7000},
+    'duration': {'value': 600},
+    'duration_in_traffic': {'value': 600}
+}
+API_VALUE = (7.0, 10, 0)
+
+
+class FakeDistanceMatrixAPI:
+    """
+    Stand-in for /distancematrix/json. The first requests get the scripted
+    failures in order: an int is an HTTP status (with a REQUEST_DENIED body,
+    so only the HTTP status can make it retryable), a str a request-level
+    API status. Requests with fail_origin among their origins always get a
+    500.
+    """
+
+    def __init__(self, failures=(), fail_origin: Optional[str] = None):
+        self.failures = list(failures)
+        self.fail_origin = fail_origin
+        self.requests: List[Dict] = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        origins = request.query['origins'].split('|')
+        destinations = request.query['destinations'].split('|')
+        self.requests.append({'origins': origins, 'destinations': destinations, 'url_length': len(str(request.url))})
+
+        if self.failures:
+            failure = self.failures.pop(0)
+            if isinstance(failure, int):
+                return web.json_response({'status': 'REQUEST_DENIED', 'rows': []}, status=failure)
+            return web.json_response({'status': failure, 'rows': []})
+        if self.fail_origin in origins:
+            return web.Response(status=500, text='error')
+        return web.json_response({
+            'status': 'OK',
+            'rows': [{'elements': [API_ELEMENT] * len(destinations)} for _ in origins]
+        })
+
+
+@asynccontextmanager
+async def api_client(api: FakeDistanceMatrixAPI, **kwargs):
+    app = web.Application()
+    app.router.add_get('/distancematrix/json', api.handle)
+    server = TestServer(app)
+    await server.start_server()
+    client = GoogleMapsClient(
+        api_key='test-key', cache=DistanceMatrixCache(), base_url=f"http://{server.host}:{server.port}",
+        max_concurrency=4, elements_per_second=1e6, retry_backoff_seconds=0.01, **kwargs
+    )
+    try:
+        yield client
+    finally:
+        await client.close_session()
+        await server.close()
+
+
+def delivery_points(n: int, seed: int = 0) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    return [
+        {'id': f'P{i}', 'lat': round(float(lat), 6), 'lon': round(float(lon), 6)}
+        for i, (lat, lon) in enumerate(zip(28.5 + rng.uniform(0, 0.2, n), 77.1 + rng.uniform(0, 0.2, n)))
+    ]
+
+
+def matrix_values(matrix, i: int, j: int):
+    return (float(matrix.distance_km[i, j]), int(matrix.duration_minutes[i, j]),
+            int(matrix.traffic_delay_minutes[i, j]))
+
+
+@pytest.mark.parametrize('max_url_length', [GoogleMapsClient.MAX_URL_LENGTH, 600])
+def test_tiles_stay_within_request_limits(max_url_length):
+    points = delivery_points(60)
+    api = FakeDistanceMatrixAPI()
+
+    async def scenario():
+        async with api_client(api) as client:
+            client.MAX_URL_LENGTH = max_url_length
+            return await client.get_distance_matrix(points, consider_traffic=False)
+
+    matrix = asyncio.run(scenario())
+    assert len(api.requests) > 1
+    for request in api.requests:
+        origins, destinations = len(request['origins']), len(request['destinations'])
+        assert origins <= GoogleMapsClient.MAX_ORIGINS
+        assert destinations <= GoogleMapsClient.MAX_DESTINATIONS
+        assert origins * destinations <= GoogleMapsClient.MAX_ELEMENTS
+        assert request['url_length'] <= max_url_length
+
+    # Every pair came from the API, and none was requested twice
+    requested = [(o, d) for r in api.requests for o in r['origins'] for d in r['destinations'] if o != d]
+    assert len(requested) == len(set(requested)) == 60 * 59
+    for i in range(60):
+        for j in range(60):
+            assert matrix_values(matrix, i, j) == (API_VALUE if i != j else (0.0, 0, 0))
+
+
+@pytest.mark.parametrize('failure', [500, 503, 429, 'OVER_QUERY_LIMIT', 'UNKNOWN_ERROR'])
+def test_transient_failures_are_retried(failure):
+    points = delivery_points(5)
+    api = FakeDistanceMatrixAPI(failures=[failure, failure])
+
+    async def scenario():
+        async with api_client(api, max_retries=2) as client:
+            return await client.get_distance_matrix(points, consider_traffic=False)
+
+    matrix = asyncio.run(scenario())
+    assert len(api.requests) == 3
+    assert matrix_values(matrix, 0, 1) == API_VALUE
+
+
+@pytest.mark.parametrize('failure', [400, 'REQUEST_DENIED', 'INVALID_REQUEST'])
+def test_final_errors_are_not_retried(failure):
+    points = delivery_points(5)
+    api = FakeDistanceMatrixAPI(failures=[failure])
+
+    async def scenario():
+        async with api_client(api, max_retries=2) as client:
+            return await client.get_distance_matrix(points, consider_traffic=False), client
+
+    matrix, client = asyncio.run(scenario())
+    assert len(api.requests) == 1
+    expected = client.estimate_pairs([(0, 1)], [(p['lat'], p['lon']) for p in points], False, 'van')[0]
+    assert matrix_values(matrix, 0, 1) == pytest.approx(expected)
+
+
+def test_failed_tiles_fall_back_to_haversine():
+    points = delivery_points(40)
+    coords = [(p['lat'], p['lon']) for p in points]
+    coord_strings = [f"{lat},{lon}" for lat, lon in coords]
+    api = FakeDistanceMatrixAPI(fail_origin=coord_strings[0])
+
+    async def scenario():
+        async with api_client(api, max_retries=2) as client:
+            return await client.get_distance_matrix(points, consider_traffic=False), client
+
+    matrix, client = asyncio.run(scenario())
+    failed_requests = [r for r in api.requests if coord_strings[0] in r['origins']]
+    failed_pairs = {
+        (coord_strings.index(o), coord_strings.index(d))
+        for r in failed_requests for o in r['origins'] for d in r['destinations'] if o != d
+    }
+    # Each failing tile was tried once plus max_retries times
+    tiles = {(tuple(r['origins']), tuple(r['destinations'])) for r in failed_requests}
+    assert len(failed_requests) == 3 * len(tiles)
+
+    pairs = sorted(failed_pairs)
+    estimates = dict(zip(pairs, client.estimate_pairs(pairs, coords, False, 'van')))
+    for i in range(40):
+        for j in range(40):
+            if i == j:
+                continue
+            expected = estimates.get((i, j), API_VALUE)
+            assert matrix_values(matrix, i, j) == pytest.approx(expected)
+    assert any(estimates[pair] != API_VALUE for pair in pairs)
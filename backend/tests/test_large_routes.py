@@ -0,0 +1,148 @@
+"""
+Routes over LARGE_INSTANCE_POINTS: solved on candidate edges with reloads
+at the start location, and infeasible requests rejected before any travel
+costs are fetched.
+"""
+import asyncio
+import json
+import math
+
+import httpx
+import numpy as np
+import pytest
+from fastapi import FastAPI
+
+import routes.optimizer as api
+from core.optimizer import DeliveryPoint, RouteOptimizer, Vehicle
+from core.solver_pool import SolverPool
+from utils.result_cache import OptimizationResultCache
+
+SIZES = ["small", "medium", "large"]
+
+
+def large_instance(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    points = [
+        DeliveryPoint(f"S{i}", round(28.5 + float(rng.uniform(0, 0.3)), 6),
+                      round(77.05 + float(rng.uniform(0, 0.35)), 6), f"Stop {i}",
+                      SIZES[int(rng.integers(3))], int(rng.integers(1, 6)))
+        for i in range(n)
+    ]
+    return DeliveryPoint("DEPOT", 28.61, 77.2, "Warehouse", "small", 1), points
+
+
+def test_large_route_reloads_on_candidate_edges():
+    start, points = large_instance(2000)
+    optimizer = RouteOptimizer()
+    vehicle = Vehicle("van", "large", 10.0)
+    route = optimizer.optimize(points, vehicle, start, None, "distance", "2opt")
+
+    assert route.search_stats["algorithm"].startswith("candidate_")
+    order = route.route_order
+    assert order[0] == "DEPOT"
+    assert sorted(point_id for point_id in order if point_id != "DEPOT") == sorted(p.id for p in points)
+
+    # Every trip between reloads fits one load, and no more trips are made than needed
+    weights = {p.id: optimizer.size_weights[p.size] for p in points}
+    trips, load = 1, 0.0
+    for point_id in order[1:]:
+        if point_id == "DEPOT":
+            trips, load = trips + 1, 0.0
+            continue
+        load += weights[point_id]
+        assert load <= optimizer.capacity_limits["large"]
+    assert trips == route.search_stats["trips"]
+    assert trips >= math.ceil(sum(weights.values()) / optimizer.capacity_limits["large"])
+    assert len(route.segments) == len(order) - 1
+    assert route.total_distance_km < route.baseline["total_distance_km"]
+
+
+def request_body(points, start, vehicle_capacity="large", **options):
+    def as_json(p):
+        return {"id": p.id, "lat": p.lat, "lon": p.lon, "address": p.address, "size": p.size, "priority": p.priority}
+    return {
+        "delivery_points": [as_json(p) for p in points],
+        "vehicle": {"type": "van", "capacity": vehicle_capacity, "fuel_efficiency": 10.0},
+        "start_location": as_json(start),
+        "optimization_goal": "distance",
+        "include_analytics": False,
+        **options
+    }
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Cost fetches made by the routes, while solves run in a thread."""
+    calls = []
+    client = api.google_maps_client
+
+    def recorder(name):
+        fetch = getattr(client, name)
+
+        async def record(points, *args, **kwargs):
+            sizes = [len(route) for route in points] if name == "get_distance_matrices" else len(points)
+            calls.append((name, sizes))
+            return await fetch(points, *args, **kwargs)
+        return record
+
+    for name in ("get_distance_matrix", "get_distance_matrices", "get_candidate_costs"):
+        monkeypatch.setattr(client, name, recorder(name))
+    monkeypatch.setattr(api, "solver_pool", SolverPool(max_workers=0))
+    monkeypatch.setattr(api, "result_cache", OptimizationResultCache())
+    return calls
+
+
+def post(path: str, body: dict) -> httpx.Response:
+    app = FastAPI()
+    app.include_router(api.router)
+
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post(path, json=body, timeout=None)
+    return asyncio.run(send())
+
+
+def test_large_request_fetches_candidate_costs(fetches):
+    start, points = large_instance(1600)
+    response = post("/api/v1/optimize", request_body(points, start, algorithm="2opt"))
+    assert response.status_code == 200
+    assert response.json()["optimization_metadata"]["algorithm_used"].startswith("candidate_")
+    assert fetches == [("get_candidate_costs", 1601)]
+
+
+@pytest.mark.parametrize("n, capacity, options, detail", [
+    (10, "small", {}, "Vehicle capacity insufficient for all deliveries"),
+    (1600, "large", {"priority_weight": 1.0}, "Priority weights need a full distance matrix"),
+    (1600, "large", {"time_dependent": True, "optimization_goal": "time"},
+     "Time-dependent travel needs a full distance matrix"),
+])
+def test_infeasible_requests_fetch_nothing(fetches, n, capacity, options, detail):
+    start, points = large_instance(n)
+    response = post("/api/v1/optimize", request_body(points, start, capacity, **options))
+    assert response.status_code == 400
+    assert response.json()["detail"] == detail
+    assert fetches == []
+
+
+def test_infeasible_batch_routes_fetch_nothing(fetches):
+    start, points = large_instance(10)
+    body = {"requests": [request_body(points, start, "small"), request_body(points[:2], start, "large")]}
+    response = post("/api/v1/optimize/batch", body)
+    lines = sorted(map(json.loads, response.text.splitlines()), key=lambda line: line["index"])
+    assert [line["status"] for line in lines] == ["error", "ok"]
+    assert lines[0]["status_code"] == 400
+    # Only the feasible route was costed
+    assert fetches == [("get_distance_matrices", [3])]
+
+
+def test_reload_route_gap_counts_returns(fetches):
+    start, points = large_instance(1600)
+    response = post("/api/v1/optimize", request_body(points, start, algorithm="2opt", include_analytics=True))
+    assert response.status_code == 200
+    result = response.json()
+    savings = result["savings"]
+    # The degree bound alone ignores the drives back to reload and left a gap of ~500%
+    assert savings["lower_bound_method"] == "reload_radial"
+    assert 0 < savings["lower_bound_km"] < result["total_distance_km"]
+    assert savings["optimality_gap_percent"] < 50
+    assert result["optimization_score"] > 0.7
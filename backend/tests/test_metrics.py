@@ -0,0 +1,25 @@
+"""/metrics is served at the app root, not under the /api/v1 route prefix."""
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from routes.optimizer import metrics_router, router
+
+
+def get(path: str) -> httpx.Response:
+    app = FastAPI()
+    app.include_router(router)
+    app.include_router(metrics_router)
+
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path)
+    return asyncio.run(send())
+
+
+def test_metrics_served_at_root():
+    response = get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert get("/api/v1/metrics").status_code == 404
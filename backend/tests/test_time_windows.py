@@ -0,0 +1,31 @@
+"""Clock parsing for delivery windows and departure times."""
+import pytest
+
+from core.time_windows import parse_clock
+
+
+@pytest.mark.parametrize("value, minutes", [
+    ("10:00", 600.0),
+    ("10:00:30", 600.5),
+    ("24:00", 1440.0),
+    # Offsets of either sign are ignored: windows are local times at the stop
+    ("10:00Z", 600.0),
+    ("10:00+05:30", 600.0),
+    ("10:00-05:00", 600.0),
+    ("10:00:30-0330", 600.5),
+    ("2026-10-18T10:00:00-04:00", 600.0),
+    ("2026-10-18T10:00:00+00", 600.0),
+])
+def test_parse_clock(value, minutes):
+    assert parse_clock(value) == minutes
+
+
+@pytest.mark.parametrize("value", ["24:59", "24:30:10", "25:00", "10:60", "-05:00", "10:00-5", "noon"])
+def test_parse_clock_rejects(value):
+    with pytest.raises(ValueError):
+        parse_clock(value)
+
+
+def test_parse_clock_missing():
+    assert parse_clock(None) is None
+    assert parse_clock("  ") is None
@@ -1,12 +1,22 @@
 import os
 import json
-import math
 import asyncio
 import aiohttp
-from typing import List, Dict, Optional, Union
+import numpy as np
+from typing import List, Dict, Optional, Tuple, Union
 from datetime import datetime
 import logging
 
+from core.candidate_costs import CandidateCosts
+from core.cost_matrix import CostMatrix
+from core.travel_time import TrafficProfile
+from core.geo import (
+    TRAFFIC_MULTIPLIERS, VEHICLE_SPEEDS_KMH, build_haversine_matrix, haversine_distance_matrix,
+    haversine_km, traffic_bucket, travel_time_arrays
+)
+from utils.matrix_cache import DistanceMatrixCache
+from utils.rate_limiter import AsyncRateLimiter
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,24 +27,46 @@ class GoogleMapsClient:
     Falls back to mock data if API key is not configured.
     """
 
-    def __init__(self, api_key: Optional[str] = None):
+    # Distance Matrix API per-request limits
+    MAX_ORIGINS = 25
+    MAX_DESTINATIONS = 25
+    MAX_ELEMENTS = 100
+    MAX_URL_LENGTH = 8192
+
+    # Request-level statuses worth retrying; anything else (e.g. REQUEST_DENIED) is final
+    RETRYABLE_STATUSES = {'OVER_QUERY_LIMIT', 'UNKNOWN_ERROR'}
+
+    # Where travel costs come from, as reported by /health
+    engine = "google_maps"
+
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[DistanceMatrixCache] = None,
+                 base_url: Optional[str] = None, max_concurrency: Optional[int] = None,
+                 elements_per_second: Optional[float] = None, max_retries: int = 2,
+                 retry_backoff_seconds: float = 0.5, request_timeout_seconds: float = 10.0):
         self.api_key = api_key or os.getenv('GOOGLE_MAPS_API_KEY')
-        self.base_url = "https://maps.googleapis.com/maps/api"
+        self.base_url = base_url or os.getenv('GOOGLE_MAPS_BASE_URL', "https://maps.googleapis.com/maps/api")
         self.session: Optional[aiohttp.ClientSession] = None
 
+        # Tiles are fetched concurrently over one pooled session
+        self.max_concurrency = max_concurrency or int(os.getenv('DISTANCE_MATRIX_CONCURRENCY', 8))
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.request_timeout_seconds = request_timeout_seconds
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        rate = elements_per_second or float(os.getenv('DISTANCE_MATRIX_ELEMENTS_PER_SECOND', 1000))
+        self.rate_limiter = AsyncRateLimiter(rate, capacity=max(rate, self.MAX_ELEMENTS))
+
+        # Pair-level cache of API elements; the SQLite tier is enabled by DISTANCE_CACHE_DB
+        self.cache = cache or DistanceMatrixCache(
+            ttl_seconds=float(os.getenv('DISTANCE_CACHE_TTL_SECONDS', 6 * 3600)),
+            db_path=os.getenv('DISTANCE_CACHE_DB')
+        )
+
         # Traffic multipliers based on time of day
-        self.traffic_multipliers = {
-            "peak": 1.8,      # 8-10 AM, 5-7 PM
-            "moderate": 1.3,  # 10 AM - 5 PM
-            "low": 1.0        # 7 PM - 8 AM
-        }
+        self.traffic_multipliers = dict(TRAFFIC_MULTIPLIERS)
 
         # Base speeds for different vehicle types (km/h)
-        self.vehicle_speeds = {
-            "motorcycle": 25,
-            "van": 20,
-            "truck": 15
-        }
+        self.vehicle_speeds = dict(VEHICLE_SPEEDS_KMH)
 
     def is_configured(self) -> bool:
         """Check if Google Maps API key is set"""
@@ -43,7 +75,10 @@ class GoogleMapsClient:
     async def get_session(self) -> aiohttp.ClientSession:
         """Get or create an aiohttp session."""
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout_seconds)
+            )
         return self.session
 
     async def close_session(self):
@@ -54,23 +89,23 @@ class GoogleMapsClient:
 
     def calculate_haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Calculate Haversine distance between two points in kilometers."""
-        R = 6371  # Earth radius km
-        phi1, phi2 = math.radians(lat1), math.radians(lat2)
-        dphi = math.radians(lat2 - lat1)
-        dlambda = math.radians(lon2 - lon1)
-        a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
-        return R * (2 * math.atan2(math.sqrt(a), math.sqrt(1-a)))
+        return haversine_km(lat1, lon1, lat2, lon2)
+
+    def get_traffic_bucket(self, current_time: Optional[datetime] = None) -> str:
+        """Return traffic bucket (peak/moderate/low) based on time of day."""
+        return traffic_bucket(current_time)
 
     def get_traffic_multiplier(self, current_time: Optional[datetime] = None) -> float:
         """Return traffic multiplier based on time of day."""
-        now = current_time or datetime.now()
-        h = now.hour
-        if (8 <= h < 10) or (17 <= h < 19):
-            return self.traffic_multipliers['peak']
-        elif 10 <= h < 17:
-            return self.traffic_multipliers['moderate']
-        else:
-            return self.traffic_multipliers['low']
+        return self.traffic_multipliers[self.get_traffic_bucket(current_time)]
+
+    def get_traffic_profile(self, sampled_at: Optional[datetime] = None) -> TrafficProfile:
+        """
+        Time-of-day profile of the traffic multipliers, for costing each edge
+        when it is driven instead of at the current bucket. sampled_at (now
+        by default) is when matrices from this client observed their delays.
+        """
+        return TrafficProfile.from_buckets(self.traffic_multipliers, sampled_at or datetime.now())
 
     def estimate_duration_from_distance(self, distance_km: float, vehicle_type: str = 'van', consider_traffic: bool = True) -> int:
         """Estimate travel time (minutes) from distance and traffic."""
@@ -81,17 +116,20 @@ class GoogleMapsClient:
             base_minutes *= multiplier
         return int(base_minutes)
 
-    async def get_distance_matrix_from_api(self, origins: List[str], destinations: List[str], consider_traffic: bool = True) -> Optional[Dict]:
-        """Fetch distance matrix from Google Maps API."""
-        if not self.is_configured():
-            return None
+    async def request_distance_matrix(self, origins: List[str], destinations: List[str],
+                                      consider_traffic: bool = True,
+                                      mode: str = 'driving') -> Tuple[Optional[Dict], bool]:
+        """
+        Make one Distance Matrix request.
+        Returns (data, retryable); data is None when the request failed.
+        """
         session = await self.get_session()
         params = {
             'origins': '|'.join(origins),
             'destinations': '|'.join(destinations),
             'key': self.api_key,
             'units': 'metric',
-            'mode': 'driving'
+            'mode': mode
         }
         if consider_traffic:
             params['departure_time'] = 'now'
@@ -99,40 +137,283 @@ class GoogleMapsClient:
         url = f"{self.base_url}/distancematrix/json"
         try:
             async with session.get(url, params=params) as resp:
-                data = await resp.json()
+                # Rate limiting (429) and server errors are transient
+                if resp.status == 429 or resp.status >= 500:
+                    logger.error(f"Distance Matrix API HTTP {resp.status}")
+                    return None, True
+                data = await resp.json(content_type=None)
                 if resp.status == 200 and data.get('status') == 'OK':
-                    return data
-                else:
-                    logger.error(f"Distance Matrix API error: {data.get('status')}")
+                    return data, False
+                logger.error(f"Distance Matrix API error: {data.get('status')}")
+                return None, data.get('status') in self.RETRYABLE_STATUSES
         except Exception as e:
             logger.error(f"Error calling Distance Matrix API: {e}")
-        return None
-
-    def generate_mock_distance_matrix(self, points: List[Dict], consider_traffic: bool = True) -> Dict[str, Dict[str, Dict]]:
-        """Generate mock matrix via Haversine and traffic heuristics."""
-        matrix: Dict[str, Dict[str, Dict]] = {}
-        for i, p1 in enumerate(points):
-            id1 = p1.get('id', str(i))
-            matrix[id1] = {}
-            for j, p2 in enumerate(points):
-                id2 = p2.get('id', str(j))
-                if id1 == id2:
-                    matrix[id1][id2] = {'distance_km': 0.0, 'duration_minutes': 0, 'traffic_delay_minutes': 0}
-                else:
-                    dist = self.calculate_haversine_distance(p1['lat'], p1['lon'], p2['lat'], p2['lon'])
-                    dur = self.estimate_duration_from_distance(dist, consider_traffic=consider_traffic)
-                    no_traffic = self.estimate_duration_from_distance(dist, consider_traffic=False)
-                    delay = dur - no_traffic
-                    matrix[id1][id2] = {
-                        'distance_km': round(dist, 2),
-                        'duration_minutes': dur,
-                        'traffic_delay_minutes': int(delay)
-                    }
-        return matrix
-
-    async def get_distance_matrix(self, points: List[Union[Dict, object]], consider_traffic: bool = True) -> Dict[str, Dict[str, Dict]]:
-        """Return full distance matrix, API or mock fallback."""
-        # Normalize points to dicts
+        return None, True
+
+    async def get_distance_matrix_from_api(self, origins: List[str], destinations: List[str], consider_traffic: bool = True) -> Optional[Dict]:
+        """Fetch distance matrix from Google Maps API (single request, no tiling)."""
+        if not self.is_configured():
+            return None
+        data, _ = await self.request_distance_matrix(origins, destinations, consider_traffic)
+        return data
+
+    def plan_tiles(self, rows: List[int], columns: List[int],
+                   coord_strings: List[str]) -> List[Tuple[List[int], List[int]]]:
+        """
+        Split a rows x columns block into tiles within the per-request origin,
+        destination, element and URL-length limits.
+        """
+        col_size = min(len(columns), self.MAX_DESTINATIONS, self.MAX_ELEMENTS)
+        row_size = min(len(rows), self.MAX_ORIGINS, max(1, self.MAX_ELEMENTS // col_size))
+
+        # Each coordinate costs its own length plus an encoded '|' separator
+        longest = max(len(coord_strings[k]) for k in rows + columns) + 3
+        fixed = len(self.base_url) + 200
+        while (row_size + col_size) * longest + fixed > self.MAX_URL_LENGTH and row_size + col_size > 2:
+            if row_size >= col_size:
+                row_size -= 1
+            else:
+                col_size -= 1
+
+        return [
+            (rows[r:r + row_size], columns[c:c + col_size])
+            for r in range(0, len(rows), row_size)
+            for c in range(0, len(columns), col_size)
+        ]
+
+    async def fetch_tile(self, rows: List[int], columns: List[int], coord_strings: List[str],
+                         consider_traffic: bool, mode: str) -> Optional[Dict[Tuple[int, int], Optional[Tuple[float, int, int]]]]:
+        """
+        Fetch one tile under the concurrency and rate limits, retrying
+        transient failures with exponential backoff. Failed elements map to
+        None; returns None if the request itself never succeeded.
+        """
+        origins = [coord_strings[i] for i in rows]
+        destinations = [coord_strings[j] for j in columns]
+        data = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_backoff_seconds * (2 ** (attempt - 1)))
+            await self.rate_limiter.acquire(len(origins) * len(destinations))
+            async with self.semaphore:
+                data, retryable = await self.request_distance_matrix(origins, destinations, consider_traffic, mode)
+            if data is not None or not retryable:
+                break
+        if data is None:
+            return None
+
+        results: Dict[Tuple[int, int], Optional[Tuple[float, int, int]]] = {}
+        api_rows = data.get('rows', [])
+        for r, i in enumerate(rows):
+            elements = api_rows[r].get('elements', []) if r < len(api_rows) else []
+            for c, j in enumerate(columns):
+                if i != j:
+                    results[(i, j)] = self.parse_element(elements[c]) if c < len(elements) else None
+        return results
+
+    async def fetch_pairs(self, pairs: List[Tuple[int, int]], coord_strings: List[str], consider_traffic: bool,
+                          mode: str) -> Tuple[Dict[Tuple[int, int], Optional[Tuple[float, int, int]]], List[Tuple[int, int]]]:
+        """
+        Fetch arbitrary (origin, destination) pairs as concurrent tiles.
+        Missing pairs are grouped by origins that lack the same destinations,
+        so adding one stop to a known set costs one new row and one new column.
+        Returns per-element results plus the pairs whose tile request failed.
+        """
+        n = len(coord_strings)
+        missing_by_origin: Dict[int, List[int]] = {}
+        for i, j in pairs:
+            missing_by_origin.setdefault(i, []).append(j)
+
+        groups: Dict[Tuple[int, ...], List[int]] = {}
+        for i, columns in missing_by_origin.items():
+            # Mostly-missing rows also request their own diagonal so they share one group
+            if 2 * len(columns) >= n:
+                columns = sorted(columns + [i])
+            groups.setdefault(tuple(columns), []).append(i)
+
+        tiles = [
+            tile
+            for columns, rows in groups.items()
+            for tile in self.plan_tiles(rows, list(columns), coord_strings)
+        ]
+        results: Dict[Tuple[int, int], Optional[Tuple[float, int, int]]] = {}
+        unreachable: List[Tuple[int, int]] = []
+        tile_results = await asyncio.gather(*(
+            self.fetch_tile(rows, columns, coord_strings, consider_traffic, mode)
+            for rows, columns in tiles
+        ))
+        for (rows, columns), tile_result in zip(tiles, tile_results):
+            if tile_result is None:
+                unreachable.extend((i, j) for i in rows for j in columns if i != j)
+            else:
+                results.update(tile_result)
+        return results, unreachable
+
+    def generate_mock_distance_matrix(self, points: List[Dict], consider_traffic: bool = True,
+                                      vehicle_type: str = 'van') -> CostMatrix:
+        """Generate mock matrix via vectorized Haversine and traffic heuristics."""
+        ids = [p.get('id', str(i)) for i, p in enumerate(points)]
+        multiplier = self.get_traffic_multiplier() if consider_traffic else 1.0
+        return build_haversine_matrix(
+            ids,
+            [p['lat'] for p in points],
+            [p['lon'] for p in points],
+            vehicle_type=vehicle_type,
+            traffic_multiplier=multiplier
+        )
+
+    def get_travel_mode(self, vehicle_type: str = 'van') -> str:
+        """Distance Matrix API travel mode for a vehicle type."""
+        return 'driving'
+
+    def parse_element(self, element: Dict) -> Optional[Tuple[float, int, int]]:
+        """Convert one API element to (distance_km, duration_minutes, traffic_delay_minutes)."""
+        if element.get('status') != 'OK':
+            return None
+        dist_m = element['distance']['value']
+        dur_s = element['duration']['value']
+        dur_traffic = element.get('duration_in_traffic', {}).get('value', dur_s)
+        return round(dist_m/1000, 2), int(dur_s/60), int((dur_traffic - dur_s)/60)
+
+    def estimate_pairs(self, pairs: List[Tuple[int, int]], coords: List[Tuple[float, float]],
+                       consider_traffic: bool, vehicle_type: str) -> List[Tuple[float, int, int]]:
+        """Haversine estimates for pairs the API could not provide."""
+        distance = np.array([
+            round(haversine_km(coords[i][0], coords[i][1], coords[j][0], coords[j][1]), 2)
+            for i, j in pairs
+        ], dtype=np.float32)
+        multiplier = self.get_traffic_multiplier() if consider_traffic else 1.0
+        duration, delay = travel_time_arrays(distance, self.vehicle_speeds.get(vehicle_type, 20), multiplier)
+        return list(zip(distance.tolist(), duration.tolist(), delay.tolist()))
+
+    async def fetch_api_matrix(self, ids: List[str], coords: List[Tuple[float, float]],
+                               consider_traffic: bool = True, vehicle_type: str = 'van') -> CostMatrix:
+        """
+        Build the matrix from cached pairs plus tiled API calls for the missing
+        ones. Elements that still fail after retries get a Haversine estimate.
+        """
+        matrices = await self.fetch_api_matrices([ids], [coords], consider_traffic, vehicle_type)
+        return matrices[0]
+
+    async def fetch_api_matrices(self, id_lists: List[List[str]], coord_lists: List[List[Tuple[float, float]]],
+                                 consider_traffic: bool = True, vehicle_type: str = 'van') -> List[CostMatrix]:
+        """
+        Build several matrices with one cache lookup and one round of tiled API
+        calls. Coordinates are deduplicated across the matrices first, so a
+        pair shared by many of them (e.g. a common depot) is fetched once.
+        """
+        # Global index per distinct coordinate, and each matrix's local -> global map
+        unique: Dict[Tuple[float, float], int] = {}
+        local_to_global = [[unique.setdefault(c, len(unique)) for c in coords] for coords in coord_lists]
+
+        # Each pair belongs to the first matrix that needs it
+        owned: List[List[Tuple[int, int]]] = []
+        seen = set()
+        for order in local_to_global:
+            pairs = []
+            for i in order:
+                for j in order:
+                    if i != j and (i, j) not in seen:
+                        seen.add((i, j))
+                        pairs.append((i, j))
+            owned.append(pairs)
+        values = await self.resolve_pairs(owned, local_to_global, list(unique), consider_traffic, vehicle_type)
+
+        matrices = []
+        for ids, order in zip(id_lists, local_to_global):
+            matrix = CostMatrix(ids)
+            for i, gi in enumerate(order):
+                for j, gj in enumerate(order):
+                    # Repeated coordinates within one matrix stay at zero
+                    if gi != gj:
+                        matrix.distance_km[i, j], matrix.duration_minutes[i, j], matrix.traffic_delay_minutes[i, j] = values[(gi, gj)]
+            matrices.append(matrix)
+        return matrices
+
+    async def resolve_pairs(self, groups: List[List[Tuple[int, int]]], orders: List[List[int]],
+                            coords: List[Tuple[float, float]], consider_traffic: bool,
+                            vehicle_type: str) -> Dict[Tuple[int, int], Tuple[float, int, int]]:
+        """
+        Values for every (origin, destination) pair of coordinate indices:
+        cached pairs first, then tiled API calls for the rest, each group
+        tiled over the coordinates in its order. Elements that still fail
+        after retries get a Haversine estimate.
+        """
+        mode = self.get_travel_mode(vehicle_type)
+        bucket = self.get_traffic_bucket() if consider_traffic else 'free_flow'
+        coord_strings = [f"{lat},{lon}" for lat, lon in coords]
+
+        keys: Dict[Tuple[int, int], str] = {}
+        owner: Dict[Tuple[int, int], int] = {}
+        for g, pairs in enumerate(groups):
+            for i, j in pairs:
+                keys[(i, j)] = self.cache.pair_key(coords[i], coords[j], mode, bucket)
+                owner[(i, j)] = g
+        cached = self.cache.get_many(keys.values())
+
+        values: Dict[Tuple[int, int], Tuple[float, int, int]] = {}
+        missing = []
+        for pair, key in keys.items():
+            value = cached.get(key)
+            if value is None:
+                missing.append(pair)
+            else:
+                values[pair] = value
+
+        fetched: Dict[str, Tuple[float, int, int]] = {}
+        # Tile requests retry internally; failed elements of successful tiles are re-requested here
+        unreachable: List[Tuple[int, int]] = []
+        failed = missing
+        for attempt in range(self.max_retries + 1):
+            if not failed:
+                break
+            # Pairs are tiled per group, where rows share most of their missing columns
+            by_owner: Dict[int, List[Tuple[int, int]]] = {}
+            for pair in failed:
+                by_owner.setdefault(owner[pair], []).append(pair)
+            fetches = await asyncio.gather(*(
+                self.fetch_owned_pairs(pairs, orders[g], coord_strings, consider_traffic, mode)
+                for g, pairs in by_owner.items()
+            ))
+            failed = []
+            for results, lost in fetches:
+                unreachable.extend(lost)
+                for pair, value in results.items():
+                    if value is None:
+                        failed.append(pair)
+                    else:
+                        values[pair] = value
+                        fetched[keys[pair]] = value
+        self.cache.put_many(fetched)
+
+        failed += unreachable
+        if failed:
+            logger.warning(f"{len(failed)} matrix elements failed after retries; using Haversine estimates")
+            values.update(zip(failed, self.estimate_pairs(failed, coords, consider_traffic, vehicle_type)))
+
+        if missing:
+            logger.info(f"Fetched {len(fetched)} matrix elements, {len(cached)} served from cache")
+        return values
+
+    async def fetch_owned_pairs(self, pairs: List[Tuple[int, int]], order: List[int], coord_strings: List[str],
+                                consider_traffic: bool, mode: str) -> Tuple[Dict[Tuple[int, int], Optional[Tuple[float, int, int]]], List[Tuple[int, int]]]:
+        """
+        fetch_pairs for global coordinate pairs of one matrix, tiled in that
+        matrix's own index space so its rows group as they would on their own.
+        """
+        local = {}
+        for g in order:
+            local.setdefault(g, len(local))
+        to_global = list(local)
+        results, lost = await self.fetch_pairs(
+            [(local[i], local[j]) for i, j in pairs], [coord_strings[g] for g in to_global], consider_traffic, mode
+        )
+        return ({(to_global[i], to_global[j]): value for (i, j), value in results.items()},
+                [(to_global[i], to_global[j]) for i, j in lost])
+
+    @staticmethod
+    def normalize_points(points: List[Union[Dict, object]]) -> List[Dict]:
+        """Normalize DeliveryPoints or dicts to {'id', 'lat', 'lon'} dicts."""
         flat: List[Dict] = []
         for item in points:
             if hasattr(item, 'lat') and hasattr(item, 'lon'):
@@ -143,32 +424,105 @@ class GoogleMapsClient:
                 })
             else:
                 flat.append(item)
+        return flat
+
+    async def get_distance_matrix(self, points: List[Union[Dict, object]], consider_traffic: bool = True,
+                                  vehicle_type: str = 'van') -> CostMatrix:
+        """Return full distance matrix, API (with pair cache) or mock fallback."""
+        flat = self.normalize_points(points)
         ids = [p.get('id', str(i)) for i, p in enumerate(flat)]
-        coords = [f"{p['lat']},{p['lon']}" for p in flat]
         # Try API
-        api_data = await self.get_distance_matrix_from_api(coords, coords, consider_traffic)
-        if api_data and 'rows' in api_data:
-            matrix: Dict[str, Dict[str, Dict]] = {}
-            for i, origin in enumerate(api_data['origin_addresses']):
-                oid = ids[i]
-                matrix[oid] = {}
-                for j, dest in enumerate(api_data['destination_addresses']):
-                    element = api_data['rows'][i]['elements'][j]
-                    if element.get('status') == 'OK':
-                        dist_m = element['distance']['value']
-                        dur_s = element['duration']['value']
-                        dur_traffic = element.get('duration_in_traffic', {}).get('value', dur_s)
-                        matrix[oid][ids[j]] = {
-                            'distance_km': round(dist_m/1000, 2),
-                            'duration_minutes': int(dur_s/60),
-                            'traffic_delay_minutes': int((dur_traffic - dur_s)/60)
-                        }
-                    else:
-                        matrix[oid][ids[j]] = {'distance_km': 0.0, 'duration_minutes': 0, 'traffic_delay_minutes': 0}
-            return matrix
+        if self.is_configured():
+            coords = [(p['lat'], p['lon']) for p in flat]
+            return await self.fetch_api_matrix(ids, coords, consider_traffic, vehicle_type)
         # Fallback mock
         logger.info('Using mock distance matrix')
-        return self.generate_mock_distance_matrix(flat, consider_traffic)
+        return self.generate_mock_distance_matrix(flat, consider_traffic, vehicle_type)
+
+    async def get_distance_matrices(self, point_lists: List[List[Union[Dict, object]]],
+                                    consider_traffic: bool = True, vehicle_type: str = 'van') -> List[CostMatrix]:
+        """
+        Matrices for many independent point lists (e.g. a batch of routes).
+        With an API key, pairs shared between lists are looked up and fetched
+        once; the mock fallback builds each matrix directly.
+        """
+        flats = [self.normalize_points(points) for points in point_lists]
+        id_lists = [[p.get('id', str(i)) for i, p in enumerate(flat)] for flat in flats]
+        if self.is_configured():
+            coord_lists = [[(p['lat'], p['lon']) for p in flat] for flat in flats]
+            return await self.fetch_api_matrices(id_lists, coord_lists, consider_traffic, vehicle_type)
+        logger.info(f'Using mock distance matrices for {len(flats)} routes')
+        return [self.generate_mock_distance_matrix(flat, consider_traffic, vehicle_type) for flat in flats]
+
+    async def get_candidate_costs(self, points: List[Union[Dict, object]], k: int, consider_traffic: bool = True,
+                                  vehicle_type: str = 'van') -> CandidateCosts:
+        """
+        Costs for each point's k nearest neighbours only (N * k elements
+        instead of N^2), for instances too large for a full matrix. With an
+        API key the candidate edges are looked up and fetched like any other
+        pairs, and the estimate used for the remaining edges is calibrated
+        against them.
+        """
+        flat = self.normalize_points(points)
+        ids = [p.get('id', str(i)) for i, p in enumerate(flat)]
+        multiplier = self.get_traffic_multiplier() if consider_traffic else 1.0
+        costs = CandidateCosts.from_points(
+            ids, [p['lat'] for p in flat], [p['lon'] for p in flat], k,
+            vehicle_type=vehicle_type, traffic_multiplier=multiplier
+        )
+        if not self.is_configured():
+            logger.info(f'Using mock candidate costs for {len(ids)} points')
+            return costs
+
+        coords = [(p['lat'], p['lon']) for p in flat]
+        neighbors = costs.neighbors.tolist()
+        pairs = [(i, j) for i, row in enumerate(neighbors) for j in row]
+        values = await self.resolve_pairs([pairs], [list(range(len(ids)))], coords, consider_traffic, vehicle_type)
+        table = np.array([values[pair] for pair in pairs], dtype=np.float64).reshape(costs.neighbors.shape + (3,))
+        costs.distance_km[...] = table[..., 0]
+        costs.duration_minutes[...] = table[..., 1]
+        costs.traffic_delay_minutes[...] = table[..., 2]
+        costs.symmetric = False
+        costs.calibrate()
+        return costs
+
+    async def get_point_costs(self, points: List[Union[Dict, object]], new_point: Union[Dict, object],
+                              consider_traffic: bool = True, vehicle_type: str = 'van'
+                              ) -> Tuple[Tuple[np.ndarray, np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Costs from and to one new point against existing points, i.e. the row
+        and column that extend their matrix. Returns (outgoing, incoming),
+        each as (distance_km, duration_minutes, traffic_delay_minutes) arrays.
+        Only these 2n pairs are looked up or fetched.
+        """
+        flat = self.normalize_points(list(points) + [new_point])
+        n = len(flat) - 1
+        if self.is_configured():
+            coords = [(p['lat'], p['lon']) for p in flat]
+            pairs = [(n, j) for j in range(n)] + [(j, n) for j in range(n)]
+            values = await self.resolve_pairs([pairs], [list(range(n + 1))], coords, consider_traffic, vehicle_type)
+
+            def as_arrays(pair_values: List[Tuple[float, int, int]]):
+                table = np.array(pair_values, dtype=np.float64).reshape(-1, 3)
+                return table[:, 0].astype(np.float32), table[:, 1].astype(np.int32), table[:, 2].astype(np.int32)
+
+            return (as_arrays([values[(n, j)] for j in range(n)]),
+                    as_arrays([values[(j, n)] for j in range(n)]))
+        # Mock costs are symmetric, so one Haversine row serves both directions
+        distance = haversine_distance_matrix(
+            [flat[n]['lat']], [flat[n]['lon']], [p['lat'] for p in flat[:n]], [p['lon'] for p in flat[:n]]
+        )[0]
+        multiplier = self.get_traffic_multiplier() if consider_traffic else 1.0
+        duration, delay = travel_time_arrays(distance, self.vehicle_speeds.get(vehicle_type, 20), multiplier)
+        return (distance, duration, delay), (distance, duration, delay)
+
+    async def get_route_geometry(self, points: List[Union[Dict, object]]) -> List[List[List[float]]]:
+        """
+        [[lat, lon], ...] of each leg between consecutive points. Distance
+        Matrix results carry no paths, so legs are straight lines here.
+        """
+        flat = self.normalize_points(points)
+        return [[[a['lat'], a['lon']], [b['lat'], b['lon']]] for a, b in zip(flat, flat[1:])]
 
 # Example usage
 if __name__ == '__main__':
@@ -186,7 +540,7 @@ if __name__ == '__main__':
     async def test():
         client = GoogleMapsClient()
         matrix = await client.get_distance_matrix(sample)
-        print(json.dumps(matrix, indent=2))
+        print(json.dumps(matrix.to_nested(), indent=2))
         await client.close_session()
 
     asyncio.run(test())
@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+# (distance_km, duration_minutes, traffic_delay_minutes)
+PairValue = Tuple[float, int, int]
+
+
+class DistanceMatrixCache:
+    """
+    Pair-level cache for Distance Matrix elements.
+
+    Keys are rounded origin/destination coordinates plus travel mode and
+    traffic bucket, so overlapping requests only fetch the pairs they have
+    not seen yet. Lookups hit an in-memory LRU first and an optional SQLite
+    file second; both tiers expire entries after ttl_seconds.
+    """
+
+    SQLITE_CHUNK = 500
+    PURGE_INTERVAL_SECONDS = 600
+
+    def __init__(self, max_entries: int = 200_000, ttl_seconds: float = 6 * 3600,
+                 db_path: Optional[str] = None, precision: int = 5):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.precision = precision
+        self.db_path = db_path
+        self._memory: "OrderedDict[str, Tuple[PairValue, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._last_purge = time.time()
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pairs ("
+            " pair_key TEXT PRIMARY KEY,"
+            " distance_km REAL NOT NULL,"
+            " duration_minutes INTEGER NOT NULL,"
+            " traffic_delay_minutes INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def pair_key(self, origin: Tuple[float, float], destination: Tuple[float, float],
+                 mode: str, bucket: str) -> str:
+        """Cache key for one origin/destination pair."""
+        p = self.precision
+        return (f"{origin[0]:.{p}f},{origin[1]:.{p}f}|{destination[0]:.{p}f},{destination[1]:.{p}f}"
+                f"|{mode}|{bucket}")
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, PairValue]:
+        """Look up keys in memory, then on disk. Returns only the keys found."""
+        now = time.time()
+        found: Dict[str, PairValue] = {}
+        pending = []
+
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is None:
+                    pending.append(key)
+                    continue
+                value, expires_at = entry
+                if expires_at <= now:
+                    del self._memory[key]
+                    self.expired += 1
+                    pending.append(key)
+                    continue
+                self._memory.move_to_end(key)
+                found[key] = value
+            self.memory_hits += len(found)
+
+            if pending and self._db is not None:
+                for start in range(0, len(pending), self.SQLITE_CHUNK):
+                    chunk = pending[start:start + self.SQLITE_CHUNK]
+                    rows = self._db.execute(
+                        "SELECT pair_key, distance_km, duration_minutes, traffic_delay_minutes, expires_at"
+                        f" FROM pairs WHERE pair_key IN ({','.join('?' * len(chunk))}) AND expires_at > ?",
+                        (*chunk, now)
+                    ).fetchall()
+                    for key, distance_km, duration, delay, expires_at in rows:
+                        value = (distance_km, duration, delay)
+                        found[key] = value
+                        self._remember(key, value, expires_at)
+                        self.disk_hits += 1
+
+            self.misses += sum(1 for key in pending if key not in found)
+
+        return found
+
+    def put_many(self, entries: Dict[str, PairValue]):
+        """Store freshly fetched pairs in both tiers."""
+        if not entries:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            for key, value in entries.items():
+                self._remember(key, value, expires_at)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO pairs VALUES (?, ?, ?, ?, ?)",
+                    [(key, *value, expires_at) for key, value in entries.items()]
+                )
+                self._db.commit()
+
+        if time.time() - self._last_purge > self.PURGE_INTERVAL_SECONDS:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Drop expired entries from both tiers. Returns the number removed."""
+        now = time.time()
+        self._last_purge = now
+        with self._lock:
+            stale = [key for key, (_, expires_at) in self._memory.items() if expires_at <= now]
+            for key in stale:
+                del self._memory[key]
+            removed = len(stale)
+            if self._db is not None:
+                removed += self._db.execute("DELETE FROM pairs WHERE expires_at <= ?", (now,)).rowcount
+                self._db.commit()
+            self.expired += removed
+        return removed
+
+    def _remember(self, key: str, value: PairValue, expires_at: float):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "persistent": self._db is not None,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
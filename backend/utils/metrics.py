@@ -0,0 +1,83 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Seconds; stages range from sub-millisecond bookkeeping to multi-second searches
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+# Upper bounds of the point-count label, so label cardinality stays fixed
+POINT_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def point_bucket(points: int) -> str:
+    """Point-count label value, e.g. "26-50" or "5001+"."""
+    k = bisect_left(POINT_BUCKETS, points)
+    if k == len(POINT_BUCKETS):
+        return f"{POINT_BUCKETS[-1] + 1}+"
+    lower = POINT_BUCKETS[k - 1] + 1 if k else 1
+    return f"{lower}-{POINT_BUCKETS[k]}"
+
+
+class Histogram:
+    """A Prometheus histogram with a fixed label set (cumulative buckets, sum and count per series)."""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label values -> (per-bucket counts with a final +Inf slot, sum)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, labels: Tuple[str, ...]):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total[0]:.6g}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+class OptimizeMetrics:
+    """
+    Histograms of the optimize pipeline for /metrics: the duration of each
+    traced stage and the 2-opt move count per solve, labelled by stage,
+    point-count bucket and optimization goal. Rendered in the Prometheus
+    text exposition format without a client library.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_seconds = Histogram(
+            "route_optimize_stage_seconds", "Duration of each optimize pipeline stage.",
+            ("stage", "points", "goal"), DURATION_BUCKETS
+        )
+        self.two_opt_moves = Histogram(
+            "route_two_opt_moves", "2-opt moves applied per route solve.",
+            ("points", "goal"), COUNT_BUCKETS
+        )
+
+    def observe(self, spans: Sequence[Dict], points: int, goal: str, two_opt: Optional[Dict] = None):
+        bucket = point_bucket(points)
+        with self._lock:
+            for span in spans:
+                self.stage_seconds.observe(span["duration_ms"] / 1000.0, (span["name"], bucket, goal))
+            if two_opt:
+                self.two_opt_moves.observe(two_opt.get("moves", 0), (bucket, goal))
+
+    def render(self) -> str:
+        with self._lock:
+            lines = self.stage_seconds.render() + self.two_opt_moves.render()
+        return "\n".join(lines) + "\n"
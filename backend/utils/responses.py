@@ -0,0 +1,25 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import Response
+
+# NumPy arrays and scalars are written directly; dict keys need not be strings
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response encoded by orjson in one C pass. Returned from an
+    endpoint, it also skips FastAPI's jsonable_encoder walk over the body,
+    which is most of the cost of serializing a large route.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+def ndjson_line(content: Any) -> bytes:
+    """One NDJSON line (newline included) for a streamed response."""
+    return orjson.dumps(content, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
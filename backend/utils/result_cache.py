@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class OptimizationResultCache:
+    """
+    In-memory LRU cache of solved routes, keyed by a request fingerprint.
+
+    Entries expire ttl_seconds after they were solved, and the least
+    recently used ones are dropped beyond max_entries or when the cached
+    values hold more than max_bytes (as reported by size_of, e.g. the
+    matrix's nbytes). Concurrent requests for a key that is still being
+    solved are coalesced: they await the same task instead of starting
+    their own, so only one solve runs. The task is shielded, so a client
+    that disconnects does not cancel the solve for the others. Failed
+    solves are not cached.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 60.0, max_bytes: int = 256 * 2 ** 20,
+                 size_of: Callable[[Any], int] = lambda value: 0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._pending: Dict[str, "asyncio.Future"] = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def fingerprint(request: Dict) -> str:
+        """Digest of a JSON-serializable canonical request; dict key order does not matter."""
+        canonical = json.dumps(request, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        """
+        The cached value for key, or compute()'s. Returns (value, status)
+        with status "hit" (served from the cache), "coalesced" (joined an
+        identical solve in flight) or "miss" (solved for this request).
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at, size = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value, "hit"
+            self._drop(key)
+            self.expired += 1
+
+        task = self._pending.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task), "coalesced"
+
+        self.misses += 1
+        task = asyncio.ensure_future(compute())
+        self._pending[key] = task
+        task.add_done_callback(lambda done: self._settle(key, done))
+        return await asyncio.shield(task), "miss"
+
+    def _settle(self, key: str, task: "asyncio.Future"):
+        self._pending.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        value = task.result()
+        size = self.size_of(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (value, time.time() + self.ttl_seconds, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def purge_expired(self) -> int:
+        """Drop expired entries. Returns the number removed."""
+        now = time.time()
+        stale = [key for key, (_, expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in stale:
+            self._drop(key)
+        self.expired += len(stale)
+        return len(stale)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring."""
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._pending),
+            "memory_mb": round(self._bytes / 2 ** 20, 1),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "ttl_seconds": self.ttl_seconds
+        }
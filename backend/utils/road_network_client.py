@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+from core.candidate_costs import CandidateCosts
+from core.cost_matrix import CostMatrix
+from core.geo import VEHICLE_SPEEDS_KMH
+from core.road_network import RoadNetwork
+from utils.google_maps import GoogleMapsClient
+
+logger = logging.getLogger(__name__)
+
+
+class RoadNetworkClient(GoogleMapsClient):
+    """
+    Maps client that costs travel on a local road graph (an OSM extract, see
+    core.road_network) instead of the Distance Matrix API or straight lines.
+
+    Road minutes are free-flow times for a van; other vehicles are scaled
+    by their speed relative to a van, and traffic delays come from the
+    time-of-day multipliers as for the mock matrices. Road searches run in a
+    thread so the event loop stays responsive.
+    """
+
+    engine = "road_network"
+
+    def __init__(self, network: RoadNetwork, **kwargs):
+        super().__init__(**kwargs)
+        self.network = network
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs) -> "RoadNetworkClient":
+        """Client over an OSM XML extract or a saved hierarchy (.npz)."""
+        network = RoadNetwork.load(path)
+        logger.info(f"Loaded road network {path} with {len(network)} nodes")
+        return cls(network, **kwargs)
+
+    def cost_arrays(self, minutes: np.ndarray, km: np.ndarray, consider_traffic: bool,
+                    vehicle_type: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(distance_km, duration_minutes, traffic_delay_minutes) of free-flow van minutes and road km."""
+        minutes = minutes * (VEHICLE_SPEEDS_KMH["van"] / self.vehicle_speeds.get(vehicle_type, 20))
+        multiplier = self.get_traffic_multiplier() if consider_traffic else 1.0
+        return (np.round(km, 2).astype(np.float32), minutes.astype(np.int32),
+                (minutes * (multiplier - 1.0)).astype(np.int32))
+
+    async def get_distance_matrix(self, points: List[Union[Dict, object]], consider_traffic: bool = True,
+                                  vehicle_type: str = 'van') -> CostMatrix:
+        """Full matrix of road costs between the points."""
+        flat = self.normalize_points(points)
+        ids = [p.get('id', str(i)) for i, p in enumerate(flat)]
+        lats = np.array([p['lat'] for p in flat], dtype=np.float64)
+        lons = np.array([p['lon'] for p in flat], dtype=np.float64)
+        minutes, km = await asyncio.to_thread(self.network.costs, lats, lons, lats, lons)
+        # Repeated coordinates stay at zero, as with the API
+        same = (lats[:, None] == lats[None, :]) & (lons[:, None] == lons[None, :])
+        minutes[same] = 0
+        km[same] = 0
+        return CostMatrix(ids, *self.cost_arrays(minutes, km, consider_traffic, vehicle_type))
+
+    async def get_distance_matrices(self, point_lists: List[List[Union[Dict, object]]],
+                                    consider_traffic: bool = True, vehicle_type: str = 'van') -> List[CostMatrix]:
+        """Matrices for many independent point lists, one road query each."""
+        return [await self.get_distance_matrix(points, consider_traffic, vehicle_type) for points in point_lists]
+
+    async def get_candidate_costs(self, points: List[Union[Dict, object]], k: int, consider_traffic: bool = True,
+                                  vehicle_type: str = 'van') -> CandidateCosts:
+        """
+        Road costs for each point's k nearest neighbours only; the estimate
+        for other edges is calibrated against them, as for API candidates.
+        """
+        flat = self.normalize_points(points)
+        ids = [p.get('id', str(i)) for i, p in enumerate(flat)]
+        multiplier = self.get_traffic_multiplier() if consider_traffic else 1.0
+        costs = CandidateCosts.from_points(
+            ids, [p['lat'] for p in flat], [p['lon'] for p in flat], k,
+            vehicle_type=vehicle_type, traffic_multiplier=multiplier
+        )
+        minutes, km = await asyncio.to_thread(self.network.neighbor_costs, costs.lats, costs.lons, costs.neighbors)
+        costs.distance_km[...], costs.duration_minutes[...], costs.traffic_delay_minutes[...] = self.cost_arrays(
+            minutes, km, consider_traffic, vehicle_type
+        )
+        costs.symmetric = False
+        costs.calibrate()
+        return costs
+
+    async def get_point_costs(self, points: List[Union[Dict, object]], new_point: Union[Dict, object],
+                              consider_traffic: bool = True, vehicle_type: str = 'van'
+                              ) -> Tuple[Tuple[np.ndarray, np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Road costs from and to one new point against existing points: (outgoing, incoming)."""
+        flat = self.normalize_points(list(points) + [new_point])
+        lats = np.array([p['lat'] for p in flat], dtype=np.float64)
+        lons = np.array([p['lon'] for p in flat], dtype=np.float64)
+        outgoing = await asyncio.to_thread(self.network.costs, lats[-1:], lons[-1:], lats[:-1], lons[:-1])
+        incoming = await asyncio.to_thread(self.network.costs, lats[:-1], lons[:-1], lats[-1:], lons[-1:])
+        return (self.cost_arrays(outgoing[0][0], outgoing[1][0], consider_traffic, vehicle_type),
+                self.cost_arrays(incoming[0][:, 0], incoming[1][:, 0], consider_traffic, vehicle_type))
+
+    async def get_route_geometry(self, points: List[Union[Dict, object]]) -> List[List[List[float]]]:
+        """Road path of each leg between consecutive points."""
+        flat = self.normalize_points(points)
+        return await asyncio.to_thread(
+            self.network.route_geometry, [p['lat'] for p in flat], [p['lon'] for p in flat]
+        )